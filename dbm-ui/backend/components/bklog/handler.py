@@ -11,8 +11,9 @@ specific language governing permissions and limitations under the License.
 
 import json
 import logging
+import time
 from datetime import datetime
-from typing import Dict, List
+from typing import Dict, Iterator, List, Optional
 
 from backend import env
 from backend.components import BKLogApi
@@ -21,13 +22,251 @@ from backend.utils.time import datetime2str
 
 logger = logging.getLogger("root")
 
+# 分页查询的每页条数
+BKLOG_PAGE_SIZE = 1000
+# ES 单次查询可翻页的最大条数(max_result_window)，超过时需要拆分时间范围
+BKLOG_MAX_RESULT_WINDOW = 10000
+# scroll 上下文的保留时间
+BKLOG_SCROLL_TIMEOUT = "1m"
+# 日志的时间字段(毫秒时间戳)
+BKLOG_TIME_FIELD = "dtEventTimeStamp"
+BKLOG_SORT_LIST = [[BKLOG_TIME_FIELD, "asc"], ["gseIndex", "asc"], ["iterationIndex", "asc"]]
+
+
+class BKLogHit(object):
+    """
+    日志平台返回的单条日志，采集的日志内容(_source.log)在首次访问时才解析
+    查询下推了 fields 时只返回清洗后的这些字段，日志内容直接取自 _source，无需解析原始日志
+    """
+
+    __slots__ = ("hit", "fields", "_log")
+
+    def __init__(self, hit: Dict, fields: Optional[List[str]] = None):
+        self.hit = hit
+        self.fields = set(fields) if fields else None
+        self._log = None
+
+    @property
+    def source(self) -> Dict:
+        return self.hit["_source"]
+
+    @property
+    def index(self) -> str:
+        return self.hit.get("_index", "")
+
+    @property
+    def raw_log(self) -> str:
+        return self.source.get("log", "")
+
+    @property
+    def log(self) -> Dict:
+        """日志内容，返回了原始日志时解析原始日志，否则为查询返回的 fields 字段"""
+        if self._log is None:
+            if self.fields is None or "log" in self.source:
+                self._log = json.loads(self.raw_log)
+            else:
+                self._log = {key: value for key, value in self.source.items() if key in self.fields}
+        return self._log
+
+    def to_snake_dict(self) -> Dict:
+        return {pascal_to_snake(key): value for key, value in self.log.items()}
+
+
+class BKLogSearch(object):
+    """
+    日志平台的流式查询，逐条生成 BKLogHit，不受单次查询条数的限制
+    - 优先使用 scroll 翻页；日志平台未返回 scroll_id 时退化为 start/size 翻页，
+      时间范围内的日志超过 ES 可翻页的最大条数时按时间二分拆分后分别查询
+    - filters(日志平台的 filter 条件)、query_string 和 fields(_source 字段投影)一起下推到查询中
+    - 记录查询次数、日志条数和查询耗时，查询结束时输出
+    """
+
+    def __init__(
+        self,
+        collector: str,
+        start_time: datetime,
+        end_time: datetime,
+        query_string: str = "*",
+        filters: Optional[List[Dict]] = None,
+        fields: Optional[List[str]] = None,
+        sort_list: Optional[List[List[str]]] = None,
+        page_size: int = BKLOG_PAGE_SIZE,
+        limit: Optional[int] = None,
+        use_admin: bool = True,
+    ):
+        """
+        @param collector: 采集项名称
+        @param start_time: 开始时间
+        @param end_time: 结束时间
+        @param query_string: 过滤条件
+        @param filters: 日志平台的 filter 条件，如 [{"field": "serverIp", "operator": "is one of", "value": [...]}]
+        @param fields: 需要返回的 _source 字段(如清洗后的字段，文本采集项可只返回原始日志 log)，为空时返回全部字段
+        @param sort_list: 排序条件
+        @param page_size: 每页条数
+        @param limit: 最多返回的条数，为空时返回全部
+        @param use_admin: 是否以 admin 身份查询
+        """
+        self.indices = f"{env.DBA_APP_BK_BIZ_ID}_bklog.{collector}"
+        self.start_time = start_time
+        self.end_time = end_time
+        self.query_string = query_string
+        self.filters = filters
+        self.fields = fields
+        self.sort_list = sort_list or BKLOG_SORT_LIST
+        self.page_size = min(page_size, limit) if limit else page_size
+        self.limit = limit
+        self.use_admin = use_admin
+
+        self.query_count = 0
+        self.hit_count = 0
+        self.latency = 0.0
+        self.max_latency = 0.0
+
+    @property
+    def stats(self) -> Dict:
+        return {
+            "query_count": self.query_count,
+            "hit_count": self.hit_count,
+            "latency": round(self.latency, 3),
+            "max_latency": round(self.max_latency, 3),
+        }
+
+    def _request(self, api, params: Dict) -> Dict:
+        begin = time.perf_counter()
+        try:
+            return api(params, use_admin=self.use_admin)
+        finally:
+            cost = time.perf_counter() - begin
+            self.query_count += 1
+            self.latency += cost
+            self.max_latency = max(self.max_latency, cost)
+
+    def _search(self, start_time: datetime, end_time: datetime, start: int, size: int, scroll: str = None) -> Dict:
+        params = {
+            "indices": self.indices,
+            "start_time": datetime2str(start_time),
+            "end_time": datetime2str(end_time),
+            "query_string": self.query_string,
+            "start": start,
+            "size": size,
+            "sort_list": self.sort_list,
+        }
+        if self.filters:
+            params["filter"] = self.filters
+        if self.fields:
+            # 时间和排序字段用于翻页去重和调用方归并，始终返回
+            sort_fields = [field for field, __ in self.sort_list]
+            params["_source"] = {"includes": list(dict.fromkeys([*self.fields, BKLOG_TIME_FIELD, *sort_fields]))}
+        if scroll:
+            params["scroll"] = scroll
+        return self._request(BKLogApi.esquery_search, params)
+
+    @staticmethod
+    def _get_total(resp: Dict) -> int:
+        total = resp["hits"].get("total", 0)
+        # ES7 以上的 total 为 {"value": xx, "relation": "eq"}
+        return total["value"] if isinstance(total, dict) else total
+
+    def _paginate(self, start_time: datetime, end_time: datetime, resp: Dict = None) -> Iterator[Dict]:
+        """按 start/size 翻页，resp 为已查询的第一页"""
+        resp = resp or self._search(start_time, end_time, 0, self.page_size)
+        total = self._get_total(resp)
+        if total > BKLOG_MAX_RESULT_WINDOW:
+            # 查询时间精度为秒，拆分点取整秒，一秒内的日志仍超过最大条数时无法再拆分
+            middle_time = (start_time + (end_time - start_time) / 2).replace(microsecond=0)
+            if start_time < middle_time < end_time:
+                yield from self._paginate_split(start_time, middle_time, end_time)
+                return
+            logger.error(
+                "[bklog] %s logs in %s-%s exceed %s, only the first ones are returned",
+                self.indices,
+                start_time,
+                end_time,
+                BKLOG_MAX_RESULT_WINDOW,
+            )
+
+        start = 0
+        max_count = min(total, BKLOG_MAX_RESULT_WINDOW)
+        while True:
+            hits = resp["hits"]["hits"]
+            yield from hits
+
+            start += len(hits)
+            if len(hits) < self.page_size or start >= max_count:
+                return
+            resp = self._search(start_time, end_time, start, min(self.page_size, max_count - start))
+
+    def _paginate_split(self, start_time: datetime, middle_time: datetime, end_time: datetime) -> Iterator[Dict]:
+        """
+        拆分为 [start_time, middle_time] 和 [middle_time, end_time] 分别翻页
+        查询时间只精确到秒，两段在 middle_time 这一秒内重叠，保证不遗漏这一秒内的日志，重叠的日志按 _id 去重
+        """
+        halves = [(start_time, middle_time), (middle_time, end_time)]
+        if self.sort_list[0] == [BKLOG_TIME_FIELD, "desc"]:
+            halves.reverse()
+
+        middle_timestamp = int(middle_time.timestamp() * 1000)
+        overlap_ids = set()
+        for hit in self._paginate(*halves[0]):
+            if middle_timestamp <= int(hit["_source"][BKLOG_TIME_FIELD]) < middle_timestamp + 1000:
+                overlap_ids.add(hit["_id"])
+            yield hit
+        for hit in self._paginate(*halves[1]):
+            if hit["_id"] not in overlap_ids:
+                yield hit
+
+    def _scroll(self) -> Iterator[Dict]:
+        resp = self._search(self.start_time, self.end_time, 0, self.page_size, scroll=BKLOG_SCROLL_TIMEOUT)
+        scroll_id = resp.get("_scroll_id")
+        if not scroll_id:
+            # 日志平台未开启 scroll 时按 start/size 翻页，第一页可以复用
+            yield from self._paginate(self.start_time, self.end_time, resp)
+            return
+
+        hits = resp["hits"]["hits"]
+        while hits:
+            yield from hits
+            if len(hits) < self.page_size:
+                return
+            resp = self._request(
+                BKLogApi.esquery_scroll,
+                {"indices": self.indices, "scroll_id": scroll_id, "scroll": BKLOG_SCROLL_TIMEOUT},
+            )
+            scroll_id = resp.get("_scroll_id") or scroll_id
+            hits = resp["hits"]["hits"]
+
+    def __iter__(self) -> Iterator[BKLogHit]:
+        try:
+            if self.limit == self.page_size:
+                # 一页即可满足条数限制时只查询一次，无需翻页或创建 scroll 上下文
+                hits = self._search(self.start_time, self.end_time, 0, self.page_size)["hits"]["hits"]
+            else:
+                hits = self._scroll()
+            for hit in hits:
+                self.hit_count += 1
+                yield BKLogHit(hit, self.fields)
+                if self.limit and self.hit_count >= self.limit:
+                    return
+        finally:
+            logger.info("[bklog] search %s(%s) finished, stats: %s", self.indices, self.query_string, self.stats)
+
+    def iter_logs(self) -> Iterator[Dict]:
+        """逐条生成解析后的日志，字段名转换为蛇形"""
+        for hit in self:
+            yield hit.to_snake_dict()
+
 
 class BKLogHandler(object):
     """封装bklog查询的通用函数"""
 
     @classmethod
     def query_logs(
-        cls, collector: str, start_time: datetime, end_time: datetime, query_string="*", size=1000
+        cls,
+        collector: str,
+        start_time: datetime,
+        end_time: datetime,
+        query_string="*",
+        size: Optional[int] = BKLOG_PAGE_SIZE,
     ) -> List[Dict]:
         """
         从日志平台获取对应采集项的日志
@@ -35,23 +274,31 @@ class BKLogHandler(object):
         @param start_time: 开始时间
         @param end_time: 结束时间
         @param query_string: 过滤条件
-        @param size: 返回条数
-        """
-        resp = BKLogApi.esquery_search(
-            {
-                "indices": f"{env.DBA_APP_BK_BIZ_ID}_bklog.{collector}",
-                "start_time": datetime2str(start_time),
-                "end_time": datetime2str(end_time),
-                "query_string": query_string,
-                "start": 0,
-                "size": size,
-                "sort_list": [["dtEventTimeStamp", "asc"], ["gseIndex", "asc"], ["iterationIndex", "asc"]],
-            },
-            use_admin=True,
-        )
-        backup_logs = []
-        for hit in resp["hits"]["hits"]:
-            raw_log = json.loads(hit["_source"]["log"])
-            backup_logs.append({pascal_to_snake(key): value for key, value in raw_log.items()})
-
-        return backup_logs
+        @param size: 返回条数，默认只查询一页；显式传入 None 时滚动查询返回全部日志
+        """
+        return list(BKLogSearch(collector, start_time, end_time, query_string, limit=size).iter_logs())
+
+    @classmethod
+    def iter_logs(
+        cls,
+        collector: str,
+        start_time: datetime,
+        end_time: datetime,
+        query_string="*",
+        page_size=BKLOG_PAGE_SIZE,
+        filters: Optional[List[Dict]] = None,
+        fields: Optional[List[str]] = None,
+    ) -> Iterator[Dict]:
+        """
+        逐条获取采集项在时间范围内的全部日志，不受单次查询条数的限制
+        @param collector: 采集项名称
+        @param start_time: 开始时间
+        @param end_time: 结束时间
+        @param query_string: 过滤条件
+        @param page_size: 每页条数
+        @param filters: 日志平台的 filter 条件
+        @param fields: 需要返回的 _source 字段
+        """
+        return BKLogSearch(
+            collector, start_time, end_time, query_string, filters=filters, fields=fields, page_size=page_size
+        ).iter_logs()
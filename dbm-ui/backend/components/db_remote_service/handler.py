@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import logging
+from collections import defaultdict
+from typing import Dict, Iterable, List, NamedTuple, Tuple
+
+from django.utils.translation import ugettext as _
+
+from backend.components.db_remote_service.client import DRSApi
+from backend.components.exception import DataAPIException
+from backend.components.proxy_api import ProxyAPI
+from backend.utils.basic import chunk_lists
+from backend.utils.batch_request import request_multi_thread
+
+logger = logging.getLogger("root")
+
+# 单次 DRS 请求的最大地址数，避免单个请求耗时过长
+DRS_RPC_BATCH_SIZE = 20
+
+
+class DRSRpcResult(NamedTuple):
+    address: str
+    result: str = ""
+    error: str = ""
+
+
+class DRSHandler(object):
+    """封装DRS查询的通用函数"""
+
+    @staticmethod
+    def _rpc(rpc: ProxyAPI, rpc_params: Dict) -> List[Dict]:
+        try:
+            return rpc(rpc_params)
+        except Exception as e:  # pylint: disable=broad-except
+            # 单个请求失败时，该请求的所有地址都记为失败，不影响其他请求
+            logger.error("[drs_rpc] addresses %s request failed: %s", rpc_params["addresses"], e)
+            return [{"address": address, "result": "", "error": str(e)} for address in rpc_params["addresses"]]
+
+    @classmethod
+    def multi_rpc(
+        cls,
+        rpc: ProxyAPI,
+        addresses: Iterable[Tuple[int, str]],
+        params: Dict,
+        batch_size: int = DRS_RPC_BATCH_SIZE,
+    ) -> Dict[str, DRSRpcResult]:
+        """
+        对一批地址并发执行同一个DRS命令，按云区域分组后分批请求
+        @param rpc: DRS接口，如 DRSApi.redis_rpc、DRSApi.twemproxy_rpc
+        @param addresses: (bk_cloud_id, ip:port) 列表
+        @param params: 除 addresses/bk_cloud_id 以外的请求参数
+        @param batch_size: 单次请求的最大地址数
+        @return: {ip:port: DRSRpcResult}，每个地址都有结果，失败的地址 error 不为空
+        """
+        cloud_addresses: Dict[int, List[str]] = defaultdict(list)
+        for bk_cloud_id, address in dict.fromkeys(addresses):
+            cloud_addresses[bk_cloud_id].append(address)
+
+        params_list = [
+            {"rpc": rpc, "rpc_params": {**params, "addresses": chunk, "bk_cloud_id": bk_cloud_id}}
+            for bk_cloud_id, cloud_address_list in cloud_addresses.items()
+            for chunk in chunk_lists(cloud_address_list, batch_size)
+        ]
+        if len(params_list) == 1:
+            resps = [cls._rpc(**params_list[0])]
+        else:
+            resps = request_multi_thread(cls._rpc, params_list, get_data=lambda x: x[1], in_order=True)
+
+        results: Dict[str, DRSRpcResult] = {}
+        for rpc_params, resp in zip(params_list, resps):
+            for item in resp or []:
+                results[item["address"]] = DRSRpcResult(
+                    address=item["address"], result=item.get("result") or "", error=item.get("error") or ""
+                )
+            for address in rpc_params["rpc_params"]["addresses"]:
+                if address not in results:
+                    results[address] = DRSRpcResult(address=address, error=_("DRS 未返回该地址的执行结果"))
+        return results
+
+    @staticmethod
+    def raise_for_errors(results: Dict[str, DRSRpcResult]):
+        """存在执行失败的地址时抛出异常"""
+        errors = {address: ret.error for address, ret in results.items() if ret.error}
+        if errors:
+            raise DataAPIException(_("DRS 执行失败: {}").format(errors))
+
+    @classmethod
+    def redis_rpc(cls, addresses: Iterable[Tuple[int, str]], params: Dict) -> Dict[str, DRSRpcResult]:
+        return cls.multi_rpc(DRSApi.redis_rpc, addresses, params)
+
+    @classmethod
+    def twemproxy_rpc(cls, addresses: Iterable[Tuple[int, str]], params: Dict) -> Dict[str, DRSRpcResult]:
+        return cls.multi_rpc(DRSApi.twemproxy_rpc, addresses, params)
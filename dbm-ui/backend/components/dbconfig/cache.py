@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import copy
+import json
+import logging
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from backend import env
+from backend.utils.basic import chunk_lists
+
+logger = logging.getLogger("root")
+
+"""
+DBConfig 的流程级读缓存
+
+流程构造时同一个集群/模块/层级的配置往往会被不同的 payload 反复查询，这里在 dbconfig_cache_scope 的作用域内
+(ticket 构造流程时会自动开启)缓存 query_conf_item 的结果:
+- 缓存 key 为 (bk_biz_id, level_name, level_value, conf_file, conf_type, format) 以及 namespace/level_info/conf_name
+- 只缓存纯查询，带 method(生成/发布配置)的请求有副作用，始终透传到 DBConfig
+- upsert_conf_item/save_conf_item 会使同一配置文件(namespace, conf_type, conf_file)的缓存失效，
+  因为上层级的修改会被下层级继承，这里不区分层级直接整体失效
+- prefetch_conf_items 通过 batch_get_conf_item 一次性拉取一批对象的指定配置项，
+  注意 batchget 只返回对象本层级的配置，不会继承上层级，因此只适用于集群密码这类保存在对象本身层级的配置
+"""
+
+# 每次 batchget 的对象数
+DBCONFIG_PREFETCH_BATCH_SIZE = 200
+
+
+class DBConfigCacheScope(object):
+    def __init__(self):
+        self.items: Dict[Tuple, Dict] = {}
+        self.prefetched: Dict[Tuple, Dict[str, str]] = {}
+        self.stats: Dict[str, int] = defaultdict(int)
+
+
+_local = threading.local()
+
+
+def get_current_scope() -> Optional[DBConfigCacheScope]:
+    if not env.DBCONFIG_FLOW_CACHE_ENABLE:
+        return None
+    return getattr(_local, "scope", None)
+
+
+@contextmanager
+def dbconfig_cache_scope():
+    """
+    开启 DBConfig 读缓存的作用域，可嵌套，嵌套时复用最外层的缓存
+    """
+    if getattr(_local, "scope", None) is not None:
+        yield _local.scope
+        return
+
+    _local.scope = DBConfigCacheScope()
+    try:
+        yield _local.scope
+    finally:
+        scope, _local.scope = _local.scope, None
+        if scope.stats:
+            logger.info("[dbconfig_cache] scope finished, stats: %s", dict(scope.stats))
+
+
+def _conf_file_key(namespace: str, conf_type: str, conf_file: str) -> Tuple:
+    return str(namespace), str(conf_type), str(conf_file)
+
+
+def get_conf_item_cache_key(params: Dict) -> Tuple:
+    return (
+        str(params.get("bk_biz_id")),
+        str(params.get("level_name")),
+        str(params.get("level_value")),
+        str(params.get("conf_file")),
+        str(params.get("conf_type")),
+        str(params.get("format")),
+        str(params.get("namespace")),
+        json.dumps(params.get("level_info") or {}, sort_keys=True),
+        str(params.get("conf_name") or ""),
+    )
+
+
+def invalidate_conf_file(namespace: str, conf_type: str, conf_file: str):
+    """使某个配置文件的所有缓存失效"""
+    scope = get_current_scope()
+    if scope is None:
+        return
+    file_key = _conf_file_key(namespace, conf_type, conf_file)
+    for key in [key for key in scope.items if (key[6], key[4], key[3]) == file_key]:
+        scope.items.pop(key)
+    for key in [key for key in scope.prefetched if key[:3] == file_key]:
+        scope.prefetched.pop(key)
+    scope.stats["invalidations"] += 1
+
+
+class CachedQueryConfItem(object):
+    """query_conf_item 的读缓存包装，其余属性透传给原始的 DataAPI"""
+
+    def __init__(self, api):
+        self.api = api
+
+    def __getattr__(self, item):
+        return getattr(self.api, item)
+
+    def __call__(self, params=None, *args, **kwargs):
+        scope = get_current_scope()
+        # 有副作用的请求、原始返回等场景不走缓存
+        if scope is None or not params or params.get("method") or args or kwargs.get("raw"):
+            return self.api(params, *args, **kwargs)
+
+        key = get_conf_item_cache_key(params)
+        if key in scope.items:
+            scope.stats["hits"] += 1
+        else:
+            scope.stats["misses"] += 1
+            scope.items[key] = self.api(params, **kwargs)
+        # 调用方可能会修改返回的配置内容，这里返回副本
+        return copy.deepcopy(scope.items[key])
+
+
+class InvalidatingConfItemWriter(object):
+    """upsert_conf_item/save_conf_item 的包装，写入后使对应配置文件的缓存失效"""
+
+    def __init__(self, api):
+        self.api = api
+
+    def __getattr__(self, item):
+        return getattr(self.api, item)
+
+    def __call__(self, params=None, *args, **kwargs):
+        try:
+            return self.api(params, *args, **kwargs)
+        finally:
+            conf_file_info = (params or {}).get("conf_file_info") or {}
+            invalidate_conf_file(
+                conf_file_info.get("namespace"), conf_file_info.get("conf_type"), conf_file_info.get("conf_file")
+            )
+
+
+def prefetch_conf_items(
+    namespace: str,
+    conf_type: str,
+    conf_file: str,
+    level_name: str,
+    level_values: Iterable[str],
+    conf_names: List[str],
+) -> Dict[str, Dict[str, str]]:
+    """
+    批量获取一批对象的指定配置项，返回 {level_value: {conf_name: conf_value}}
+    在缓存作用域内时，已预取过的对象不再重复查询，结果也会写入缓存供 get_prefetched_conf_items 读取
+    """
+    from backend.components import DBConfigApi
+
+    scope = get_current_scope()
+    file_key = _conf_file_key(namespace, conf_type, conf_file)
+    conf_names = sorted(set(conf_names))
+
+    result: Dict[str, Dict[str, str]] = {}
+    missing: List[str] = []
+    for level_value in dict.fromkeys(str(value) for value in level_values):
+        key = (*file_key, str(level_name), level_value)
+        cached = scope.prefetched.get(key) if scope else None
+        if cached is not None and all(name in cached for name in conf_names):
+            result[level_value] = {name: cached[name] for name in conf_names if cached[name] is not None}
+        else:
+            missing.append(level_value)
+
+    for values in chunk_lists(missing, DBCONFIG_PREFETCH_BATCH_SIZE):
+        data = DBConfigApi.batch_get_conf_item(
+            params={
+                "namespace": namespace,
+                "conf_type": conf_type,
+                "conf_file": conf_file,
+                "level_name": level_name,
+                "level_values": values,
+                "conf_name": ",".join(conf_names),
+            }
+        )
+        content = data.get("content") or {}
+        for level_value in values:
+            items = content.get(level_value) or {}
+            result[level_value] = items
+            if scope:
+                key = (*file_key, str(level_name), level_value)
+                # 未配置的配置项也记录下来，避免重复查询
+                scope.prefetched[key] = {
+                    **scope.prefetched.get(key, {}),
+                    **{name: items.get(name) for name in conf_names},
+                }
+        if scope:
+            scope.stats["prefetch_calls"] += 1
+
+    return result
+
+
+def get_prefetched_conf_items(
+    namespace: str, conf_type: str, conf_file: str, level_name: str, level_value: str, conf_names: List[str]
+) -> Optional[Dict[str, Any]]:
+    """
+    读取预取的配置项，只要有一个配置项未预取过就返回 None，由调用方自行查询
+    预取过但未配置的配置项不会出现在返回结果中
+    """
+    scope = get_current_scope()
+    if scope is None:
+        return None
+    key = (*_conf_file_key(namespace, conf_type, conf_file), str(level_name), str(level_value))
+    cached = scope.prefetched.get(key)
+    if cached is None or not all(name in cached for name in conf_names):
+        return None
+    scope.stats["prefetch_hits"] += 1
+    return {name: cached[name] for name in conf_names if cached[name] is not None}
@@ -14,6 +14,7 @@ from django.utils.translation import ugettext_lazy as _
 from ..base import BaseApi
 from ..domains import DBCONFIG_APIGW_DOMAIN
 from ..utils.handlers import get_first_item_from_list
+from .cache import CachedQueryConfItem, InvalidatingConfItemWriter
 
 
 class _DBConfigApi(BaseApi):
@@ -46,22 +47,29 @@ class _DBConfigApi(BaseApi):
             url="bkconfig/v1/confname/list",
             description=_("查询定义的配置名列表"),
         )
-        self.query_conf_item = self.generate_data_api(
-            method="POST",
-            url="bkconfig/v1/confitem/query",
-            description=_("查询配置项列表"),
-            # 这里保证每个版本在统一层级只会有一份配置文件
-            after_request=get_first_item_from_list,
+        # 在 dbconfig_cache_scope 作用域内，查询会走流程级缓存，写入会使缓存失效
+        self.query_conf_item = CachedQueryConfItem(
+            self.generate_data_api(
+                method="POST",
+                url="bkconfig/v1/confitem/query",
+                description=_("查询配置项列表"),
+                # 这里保证每个版本在统一层级只会有一份配置文件
+                after_request=get_first_item_from_list,
+            )
         )
-        self.save_conf_item = self.generate_data_api(
-            method="POST",
-            url="bkconfig/v1/confitem/save",
-            description=_("保存不可变配置（如字符集等）"),
+        self.save_conf_item = InvalidatingConfItemWriter(
+            self.generate_data_api(
+                method="POST",
+                url="bkconfig/v1/confitem/save",
+                description=_("保存不可变配置（如字符集等）"),
+            )
         )
-        self.upsert_conf_item = self.generate_data_api(
-            method="POST",
-            url="bkconfig/v1/confitem/upsert",
-            description=_("编辑发布层级（业务、集群、模块）配置"),
+        self.upsert_conf_item = InvalidatingConfItemWriter(
+            self.generate_data_api(
+                method="POST",
+                url="bkconfig/v1/confitem/upsert",
+                description=_("编辑发布层级（业务、集群、模块）配置"),
+            )
         )
         self.batch_get_conf_item = self.generate_data_api(
             method="POST",
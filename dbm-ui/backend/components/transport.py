@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3 import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.util import Retry, parse_url
+
+from backend import env
+
+"""
+DataAPI 的连接池传输层
+
+每个进程内按 (scheme, host, port, 是否携带客户端证书) 维护一个 HTTPAdapter，adapter 内部的 urllib3 连接池
+负责 keep-alive 连接复用，因此同一域名的 ESB/APIGW 请求不再重复进行 TCP+TLS 握手。
+
+- session 仍然是每次请求独立创建的，headers/cookies 不会在线程间串用，可以安全地在 batch_request 的线程池中使用
+- adapter 以进程号隔离，celery/gunicorn fork 出的子进程不会复用父进程的 socket
+- 通过 get_transport_stats 可以查看每个域名的连接复用命中/握手次数和握手耗时
+"""
+
+
+class TransportStats(object):
+    """连接池命中统计，按 host:port 聚合"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._requests = defaultdict(int)
+        self._handshakes = defaultdict(int)
+        self._handshake_time = defaultdict(float)
+
+    def record_request(self, host: str):
+        with self._lock:
+            self._requests[host] += 1
+
+    def record_handshake(self, host: str, cost: float):
+        with self._lock:
+            self._handshakes[host] += 1
+            self._handshake_time[host] += cost
+
+    def reset(self):
+        with self._lock:
+            self._requests.clear()
+            self._handshakes.clear()
+            self._handshake_time.clear()
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """
+        导出统计信息，握手次数即为连接池未命中次数
+        """
+        with self._lock:
+            stats = {}
+            for host, requests_count in self._requests.items():
+                misses = self._handshakes.get(host, 0)
+                stats[host] = {
+                    "requests": requests_count,
+                    "pool_hits": max(requests_count - misses, 0),
+                    "pool_misses": misses,
+                    "handshake_time": round(self._handshake_time.get(host, 0), 6),
+                }
+            return stats
+
+
+transport_stats = TransportStats()
+
+
+class _TimedConnectionMixin(object):
+    """记录建立连接(TCP+TLS握手)的耗时，只有新建连接或者连接失效重连时才会走到 connect"""
+
+    def connect(self):
+        start_time = time.perf_counter()
+        try:
+            super().connect()
+        finally:
+            transport_stats.record_handshake(f"{self.host}:{self.port}", time.perf_counter() - start_time)
+
+
+class TimedHTTPConnection(_TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class TimedHTTPSConnection(_TimedConnectionMixin, HTTPSConnection):
+    pass
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """
+    带握手统计的 HTTPAdapter，连接池大小即为该域名允许保持的最大 keep-alive 连接数
+    """
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {"http": TimedHTTPConnectionPool, "https": TimedHTTPSConnectionPool}
+
+    def send(self, request, *args, **kwargs):
+        url = parse_url(request.url)
+        transport_stats.record_request(f"{url.host}:{url.port or (443 if url.scheme == 'https' else 80)}")
+        return super().send(request, *args, **kwargs)
+
+
+class PooledTransport(object):
+    """进程内共享的 adapter 注册表"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._adapters: Dict[Tuple[str, bool], PooledHTTPAdapter] = {}
+
+    @staticmethod
+    def _get_pool_maxsize(host: str) -> int:
+        return int(env.DATA_API_POOL_HOST_MAXSIZE.get(host, env.DATA_API_POOL_MAXSIZE))
+
+    @staticmethod
+    def _get_prefix(url: str) -> Tuple[str, str]:
+        parsed = parse_url(url)
+        return f"{parsed.scheme}://{parsed.netloc}/", parsed.host
+
+    def get_adapter(self, url: str, with_cert: bool = False) -> Tuple[str, PooledHTTPAdapter]:
+        prefix, host = self._get_prefix(url)
+        key = (prefix, with_cert)
+        # fork 后的子进程需要丢弃父进程的连接池
+        if self._pid != os.getpid() or key not in self._adapters:
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._adapters, self._pid = {}, os.getpid()
+                if key not in self._adapters:
+                    self._adapters[key] = PooledHTTPAdapter(
+                        pool_connections=1,
+                        pool_maxsize=self._get_pool_maxsize(host),
+                        pool_block=env.DATA_API_POOL_BLOCK,
+                        # 仅对建立连接失败做一次重试，已发送的请求不重放
+                        max_retries=Retry(total=1, connect=1, read=False, redirect=False, status=False),
+                    )
+        return prefix, self._adapters[key]
+
+    def session(self, url: str, with_cert: bool = False) -> requests.Session:
+        """
+        创建挂载了共享 adapter 的 session，session 本身很轻量，连接由 adapter 持有
+        """
+        prefix, adapter = self.get_adapter(url, with_cert)
+        session = requests.Session()
+        session.mount(prefix, adapter)
+        return session
+
+    def clear(self):
+        with self._lock:
+            for adapter in self._adapters.values():
+                adapter.close()
+            self._adapters = {}
+
+
+pooled_transport = PooledTransport()
+
+
+def get_transport_stats() -> Dict[str, Dict]:
+    return transport_stats.snapshot()
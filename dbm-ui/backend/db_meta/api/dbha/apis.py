@@ -11,7 +11,7 @@ specific language governing permissions and limitations under the License.
 import logging
 from collections import defaultdict
 from datetime import datetime, timezone
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Set, Tuple
 
 import validators
 from django.core.exceptions import ObjectDoesNotExist
@@ -45,6 +45,7 @@ from backend.db_meta.models import (
     StorageInstanceTuple,
 )
 from backend.db_meta.request_validator import DBHASwapRequestSerializer, DBHAUpdateStatusRequestSerializer
+from backend.db_meta.signals import bump_topo_version
 from backend.flow.utils.cc_manage import CcManage
 from backend.flow.utils.sqlserver.sqlserver_host import Host
 
@@ -176,39 +177,90 @@ def instances(
     return [ele for ele in flat_instances if ele["cluster_id"] not in disabled_dbha_cluster_ids]
 
 
+def _resolve_instances(addresses: List[Tuple[str, int]], bk_cloud_id: int) -> Dict[Tuple[str, int], Tuple[Any, int]]:
+    """
+    一次性解析 (ip, port) -> (实例模型, 实例ID)，存储实例优先，与逐个 get 的查找顺序保持一致
+    """
+    ips, ports = {ip for ip, __ in addresses}, {port for __, port in addresses}
+    resolved: Dict[Tuple[str, int], Tuple[Any, int]] = {}
+    for model in [ProxyInstance, StorageInstance]:
+        for inst_id, ip, port in model.objects.filter(
+            machine__ip__in=ips, port__in=ports, machine__bk_cloud_id=bk_cloud_id
+        ).values_list("id", "machine__ip", "port"):
+            resolved[(ip, port)] = (model, inst_id)
+    return resolved
+
+
+def _refresh_cluster_status(cluster_ids: Set[int]):
+    """
+    批量更新实例状态不会触发 update_cluster_status 信号，这里对受影响的集群重新计算状态
+    """
+    clusters = list(Cluster.objects.filter(id__in=cluster_ids).exclude(status=ClusterStatus.TEMPORARY.value))
+    status_flags_map = Cluster.get_status_flags_map(clusters)
+    for cluster in clusters:
+        target_status = ClusterStatus.ABNORMAL.value if status_flags_map[cluster.id] else ClusterStatus.NORMAL.value
+        if cluster.status != target_status:
+            cluster.status = target_status
+            cluster.save(update_fields=["status"])
+
+
 @transaction.atomic
-def update_status(payloads: List, bk_cloud_id: int):
+def bulk_update_status(payloads: List, bk_cloud_id: int, ignore_missing: bool = True) -> List[Dict]:
     """
-    ToDo 验证 status
+    批量更新实例状态，每张表只查询一次，按目标状态分组更新，并返回每个实例的处理结果
+    @param payloads: [{"ip": "", "port": 0, "status": ""}]
+    @param bk_cloud_id: 云区域ID
+    @param ignore_missing: 为 False 时存在实例不存在则直接报错，不做任何修改
     """
     DBHAUpdateStatusRequestSerializer(data={"payloads": payloads}).is_valid(raise_exception=True)
-    for pl in payloads:
-        ip = pl["ip"]
-        port = pl["port"]
 
-        try:
-            storage_obj = StorageInstance.objects.get(machine__ip=ip, port=port, machine__bk_cloud_id=bk_cloud_id)
-            cluster = storage_obj.cluster.first()
+    addresses = [(pl["ip"], int(pl["port"])) for pl in payloads]
+    resolved = _resolve_instances(addresses, bk_cloud_id)
+    if not ignore_missing:
+        for ip, port in addresses:
+            if (ip, port) not in resolved:
+                raise InstanceNotExistException(_("实例ip={}, port={}不存在，请检查输入参数或相关数据").format(ip, port))
 
-            storage_obj.status = pl["status"]
-            storage_obj.save(update_fields=["status"])
-        except ObjectDoesNotExist:
-            try:
-                proxy_obj = ProxyInstance.objects.get(machine__ip=ip, port=port, machine__bk_cloud_id=bk_cloud_id)
-                cluster = proxy_obj.cluster.first()
+    # 同一实例出现多次时以最后一次上报为准
+    status_ids: Dict[Any, Dict[str, Set[int]]] = defaultdict(lambda: defaultdict(set))
+    results, target_status = [], {}
+    for pl, address in zip(payloads, addresses):
+        result = {"ip": address[0], "port": address[1], "status": pl["status"], "result": True, "message": ""}
+        if address not in resolved:
+            result.update(result=False, message=_("实例ip={}, port={}不存在").format(*address))
+        else:
+            target_status[resolved[address]] = pl["status"]
+        results.append(result)
+
+    for (model, inst_id), status in target_status.items():
+        status_ids[model][status].add(inst_id)
+
+    unavailable_cluster_ids, affected_cluster_ids = set(), set()
+    for model, ids_by_status in status_ids.items():
+        through, field = model.cluster.through, f"{model.__name__.lower()}_id"
+        for status, inst_ids in ids_by_status.items():
+            model.objects.filter(id__in=inst_ids).exclude(status=status).update(status=status)
+            cluster_ids = set(
+                through.objects.filter(**{f"{field}__in": inst_ids}).values_list("cluster_id", flat=True)
+            )
+            if status == InstanceStatus.UNAVAILABLE.value:
+                unavailable_cluster_ids |= cluster_ids
+            affected_cluster_ids |= cluster_ids
 
-                proxy_obj.status = pl["status"]
-                proxy_obj.save(update_fields=["status"])
-            except ObjectDoesNotExist:
-                raise InstanceNotExistException(_("实例ip={}, port={}不存在，请检查输入参数或相关数据").format(ip, port))
-            except Exception as e:
-                raise e
-        except Exception as e:
-            raise e
+    # 有实例不可用的集群直接置为异常，其余受影响的集群重新计算状态
+    if unavailable_cluster_ids:
+        Cluster.objects.filter(id__in=unavailable_cluster_ids).update(status=ClusterStatus.ABNORMAL.value)
+    _refresh_cluster_status(affected_cluster_ids - unavailable_cluster_ids)
 
-        if cluster and pl["status"] == InstanceStatus.UNAVAILABLE.value:
-            cluster.status = ClusterStatus.ABNORMAL.value
-            cluster.save(update_fields=["status"])
+    bump_topo_version()
+    return results
+
+
+def update_status(payloads: List, bk_cloud_id: int) -> List[Dict]:
+    """
+    ToDo 验证 status
+    """
+    return bulk_update_status(payloads, bk_cloud_id, ignore_missing=False)
 
 
 @transaction.atomic
@@ -217,21 +269,32 @@ def swap_role(payloads: List, bk_cloud_id: int):
     可以用来操作 tendbha 和 tendbcluster 的存储层
     """
     DBHASwapRequestSerializer(data={"payloads": payloads}).is_valid(raise_exception=True)
-    for pl in payloads:
-        ins1 = pl["instance1"]
-        ins2 = pl["instance2"]
 
-        ins1_obj = StorageInstance.objects.get(
-            machine__ip=ins1["ip"], port=ins1["port"], machine__bk_cloud_id=bk_cloud_id
+    # 一次性查询所有涉及的实例和同步关系
+    addresses = [(ins["ip"], int(ins["port"])) for pl in payloads for ins in [pl["instance1"], pl["instance2"]]]
+    instances = {
+        (obj.machine.ip, obj.port): obj
+        for obj in StorageInstance.objects.select_related("machine").filter(
+            machine__ip__in={ip for ip, __ in addresses},
+            port__in={port for __, port in addresses},
+            machine__bk_cloud_id=bk_cloud_id,
         )
-        ins2_obj = StorageInstance.objects.get(
-            machine__ip=ins2["ip"], port=ins2["port"], machine__bk_cloud_id=bk_cloud_id
+    }
+    inst_ids = [obj.id for obj in instances.values()]
+    tuples = set(
+        StorageInstanceTuple.objects.filter(Q(ejector_id__in=inst_ids) | Q(receiver_id__in=inst_ids)).values_list(
+            "ejector_id", "receiver_id"
         )
+    )
 
-        if (
-            not StorageInstanceTuple.objects.filter(ejector=ins1_obj, receiver=ins2_obj).exists()
-            and not StorageInstanceTuple.objects.filter(ejector=ins2_obj, receiver=ins1_obj).exists()
-        ):
+    for pl in payloads:
+        ins1_address, ins2_address = [(pl[key]["ip"], int(pl[key]["port"])) for key in ["instance1", "instance2"]]
+        for ip, port in [ins1_address, ins2_address]:
+            if (ip, port) not in instances:
+                raise InstanceNotExistException(_("实例ip={}, port={}不存在，请检查输入参数或相关数据").format(ip, port))
+
+        ins1_obj, ins2_obj = instances[ins1_address], instances[ins2_address]
+        if (ins1_obj.id, ins2_obj.id) not in tuples and (ins2_obj.id, ins1_obj.id) not in tuples:
             raise Exception(
                 "no replicate relate between {}:{} {}:{}".format(
                     ins1_obj.machine.ip, ins1_obj.port, ins2_obj.machine.ip, ins2_obj.port
@@ -245,6 +308,9 @@ def swap_role(payloads: List, bk_cloud_id: int):
             raise Exception("repeater found, may be not prod cluster")
 
         __swap(ins1_obj, ins2_obj)
+        # 同步关系已互换，后续 payload 校验使用互换后的关系
+        tuples.discard((ins1_obj.id, ins2_obj.id))
+        tuples.add((ins2_obj.id, ins1_obj.id))
 
 
 def __swap(ins1: StorageInstance, ins2: StorageInstance):
@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Set, Tuple
+
+import validators
+
+from backend import env
+from backend.constants import DEFAULT_BK_CLOUD_ID, IP_PORT_DIVIDER
+from backend.db_meta import flatten, meta_validator, request_validator
+from backend.db_meta.enums import InstancePhase
+from backend.db_meta.models import ClusterDBHAExt, ClusterEntry, ProxyInstance, StorageInstance
+from backend.db_meta.signals import get_topo_change_counter
+
+logger = logging.getLogger("root")
+
+"""
+dbha/instances 的拓扑快照
+
+dbha agent 会高频轮询 dbha/instances，而拓扑本身变化很少。这里把全量实例拉平后缓存在进程内存中:
+- db_meta 相关模型变更时(见 signals.bump_topo_version)递增全局变更计数器，计数器存放在 cache 中以便多进程共享
+- 计数器变化、快照超时或者有屏蔽到期时才重新构建快照，其余请求全部在内存中过滤
+- 快照版本为内容摘要，客户端带上版本号请求时，未变化则返回 not_modified，也可以按版本获取增量
+"""
+
+# 进程内保留的历史版本数，用于增量计算
+DBHA_TOPO_HISTORY_SIZE = 5
+
+
+class InstanceMeta(object):
+    """快照中每个实例用于过滤的附加信息"""
+
+    __slots__ = ("bk_host_id", "cluster_ids", "cluster_types", "entries")
+
+    def __init__(self, bk_host_id: int, cluster_ids: Set[int], cluster_types: Set[str], entries: Set[str]):
+        self.bk_host_id = bk_host_id
+        self.cluster_ids = cluster_ids
+        self.cluster_types = cluster_types
+        self.entries = entries
+
+
+class TopoSnapshot(object):
+    def __init__(self, counter: int, expire_at: float, rows: Dict[Tuple, Dict], metas: Dict[Tuple, InstanceMeta]):
+        self.counter = counter
+        self.expire_at = expire_at
+        # 实例 key 为 (bk_cloud_id, ip, port)
+        self.rows = rows
+        self.metas = metas
+        self.digests = {key: self._row_digest(row, metas[key]) for key, row in rows.items()}
+        self.version = hashlib.md5("".join(sorted(self.digests.values())).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _row_digest(row: Dict, meta: InstanceMeta) -> str:
+        content = json.dumps(
+            [row, meta.bk_host_id, sorted(meta.cluster_types), sorted(meta.entries)], sort_keys=True, default=str
+        )
+        return hashlib.md5(content.encode("utf-8")).hexdigest()
+
+    def is_valid(self, counter: int) -> bool:
+        return self.counter == counter and time.time() < self.expire_at
+
+
+class InstanceFilter(object):
+    """与 api.dbha.instances 保持一致的过滤条件，在内存中对快照进行过滤"""
+
+    def __init__(
+        self,
+        logical_city_ids: Optional[List[int]] = None,
+        addresses: Optional[List[str]] = None,
+        statuses: Optional[List[str]] = None,
+        bk_cloud_id: int = DEFAULT_BK_CLOUD_ID,
+        cluster_types: Optional[List[str]] = None,
+        hash_cnt: Optional[int] = None,
+        hash_value: Optional[int] = None,
+    ):
+        self.logical_city_ids = set(request_validator.validated_integer_list(logical_city_ids) or [])
+        self.statuses = set(request_validator.validated_str_list(statuses) or [])
+        self.bk_cloud_id = int(bk_cloud_id)
+        self.cluster_types = set(cluster_types or [])
+        self.hash_cnt = int(hash_cnt) if hash_cnt is not None else None
+        self.hash_value = int(hash_value) if hash_value is not None else None
+
+        self.ips, self.instances, self.domains = set(), set(), set()
+        for ad in [ad for ad in request_validator.validated_str_list(addresses) or [] if len(ad.strip()) > 0]:
+            if validators.ipv4(ad):
+                self.ips.add(ad)
+            elif meta_validator.instance(ad):
+                ip, port = ad.split(IP_PORT_DIVIDER)
+                self.instances.add((ip, int(port)))
+            elif validators.domain(ad):
+                self.domains.add(ad)
+            else:
+                logger.warning("{} is not a valid ip, instance or domain".format(ad))
+
+    def match(self, row: Dict, meta: InstanceMeta) -> bool:
+        if self.ips or self.instances or self.domains:
+            if not (
+                row["ip"] in self.ips
+                or (row["ip"], row["port"]) in self.instances
+                or not self.domains.isdisjoint(meta.entries)
+            ):
+                return False
+        if self.logical_city_ids and row["logical_city_id"] not in self.logical_city_ids:
+            return False
+        if self.statuses and row["status"] not in self.statuses:
+            return False
+        if self.cluster_types and self.cluster_types.isdisjoint(meta.cluster_types):
+            return False
+        if self.hash_cnt is not None and self.hash_value is not None:
+            if meta.bk_host_id % self.hash_cnt != self.hash_value:
+                return False
+        return True
+
+
+class TopoSnapshotManager(object):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot: Optional[TopoSnapshot] = None
+        self._history: "OrderedDict[str, Dict[Tuple, str]]" = OrderedDict()
+
+    @staticmethod
+    def _collect_metas(model, entries: Dict[int, Set[str]]) -> Dict[Tuple, InstanceMeta]:
+        metas: Dict[Tuple, InstanceMeta] = {}
+        for ip, port, bk_cloud_id, bk_host_id, cluster_id, cluster_type in (
+            model.objects.exclude(phase=InstancePhase.TRANS_STAGE)
+            .values_list(
+                "machine__ip",
+                "port",
+                "machine__bk_cloud_id",
+                "machine__bk_host_id",
+                "cluster__id",
+                "cluster__cluster_type",
+            )
+            .iterator()
+        ):
+            key = (bk_cloud_id, ip, port)
+            if key not in metas:
+                metas[key] = InstanceMeta(bk_host_id, set(), set(), set())
+            if cluster_id:
+                metas[key].cluster_ids.add(cluster_id)
+                metas[key].cluster_types.add(cluster_type)
+                metas[key].entries.update(entries.get(cluster_id, set()))
+        return metas
+
+    def _build(self, counter: int) -> TopoSnapshot:
+        now = datetime.now(timezone.utc)
+        # 与 api.dbha.instances 一致，先清理屏蔽到期的集群
+        if ClusterDBHAExt.objects.filter(end_time__lt=now).delete()[0]:
+            counter = get_topo_change_counter()
+        dbha_ext = dict(ClusterDBHAExt.objects.values_list("cluster_id", "end_time"))
+
+        # 快照最多保留到下一个屏蔽到期的时间点，保证屏蔽到期后能及时恢复探测
+        expire_at = time.time() + env.DBHA_TOPO_SNAPSHOT_TTL
+        if dbha_ext:
+            expire_at = min(expire_at, min(dbha_ext.values()).timestamp())
+
+        entries: Dict[int, Set[str]] = defaultdict(set)
+        for cluster_id, entry in ClusterEntry.objects.values_list("cluster_id", "entry").iterator():
+            entries[cluster_id].add(entry)
+
+        metas = {
+            **self._collect_metas(StorageInstance, entries),
+            **self._collect_metas(ProxyInstance, entries),
+        }
+
+        rows: Dict[Tuple, Dict] = {}
+        storage_qs = StorageInstance.objects.exclude(phase=InstancePhase.TRANS_STAGE)
+        proxy_qs = ProxyInstance.objects.exclude(phase=InstancePhase.TRANS_STAGE)
+        for row in flatten.storage_instance(storage_qs) + flatten.proxy_instance(proxy_qs):
+            if row["cluster_id"] in dbha_ext:
+                continue
+            key = (row["bk_cloud_id"], row["ip"], row["port"])
+            if key in metas:
+                rows[key] = row
+
+        return TopoSnapshot(counter, expire_at, rows, {key: metas[key] for key in rows})
+
+    def get_snapshot(self) -> TopoSnapshot:
+        counter = get_topo_change_counter()
+        snapshot = self._snapshot
+        if snapshot and snapshot.is_valid(counter):
+            return snapshot
+
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot and snapshot.is_valid(counter):
+                return snapshot
+
+            start_time = time.time()
+            snapshot = self._build(counter)
+            self._history[snapshot.version] = snapshot.digests
+            self._history.move_to_end(snapshot.version)
+            while len(self._history) > DBHA_TOPO_HISTORY_SIZE:
+                self._history.popitem(last=False)
+            self._snapshot = snapshot
+            logger.info(
+                "[dbha_topo_snapshot] rebuild snapshot, counter: %s, version: %s, instances: %s, cost: %.3fs",
+                counter,
+                snapshot.version,
+                len(snapshot.rows),
+                time.time() - start_time,
+            )
+            return snapshot
+
+    def query(self, version: Optional[str] = None, delta: bool = False, **filter_kwargs) -> Dict:
+        """
+        按条件查询快照
+        @param version: 客户端持有的版本，与当前版本一致时返回 not_modified
+        @param delta: 是否返回相对 version 的增量，历史版本已淘汰时退化为全量
+        """
+        snapshot = self.get_snapshot()
+        result = {"version": snapshot.version, "not_modified": False, "delta": False, "instances": [], "removed": []}
+        if version and version == snapshot.version:
+            result["not_modified"] = True
+            return result
+
+        instance_filter = InstanceFilter(**filter_kwargs)
+        old_digests = self._history.get(version) if (delta and version) else None
+        if old_digests is None:
+            result["instances"] = [
+                row
+                for key, row in snapshot.rows.items()
+                if key[0] == instance_filter.bk_cloud_id and instance_filter.match(row, snapshot.metas[key])
+            ]
+            return result
+
+        # 增量: 新增或者变化且仍满足过滤条件的实例放入 instances，其余变化的实例视为移除
+        instances, removed = [], []
+        changed_keys = {key for key, digest in snapshot.digests.items() if old_digests.get(key) != digest}
+        changed_keys.update(key for key in old_digests if key not in snapshot.digests)
+        for key in changed_keys:
+            if key[0] != instance_filter.bk_cloud_id:
+                continue
+            row = snapshot.rows.get(key)
+            if row and instance_filter.match(row, snapshot.metas[key]):
+                instances.append(row)
+            else:
+                removed.append(f"{key[1]}{IP_PORT_DIVIDER}{key[2]}")
+        result.update(delta=True, instances=instances, removed=removed)
+        return result
+
+
+topo_snapshot_manager = TopoSnapshotManager()
+
+
+def instances_snapshot(version: Optional[str] = None, delta: bool = False, **filter_kwargs) -> Dict:
+    return topo_snapshot_manager.query(version=version, delta=delta, **filter_kwargs)
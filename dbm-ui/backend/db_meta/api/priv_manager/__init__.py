@@ -9,4 +9,4 @@ an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express o
 specific language governing permissions and limitations under the License.
 """
 from . import mysql, sqlserver
-from .biz_clusters import biz_clusters
+from .biz_clusters import biz_clusters, biz_clusters_need_stream, stream_biz_clusters
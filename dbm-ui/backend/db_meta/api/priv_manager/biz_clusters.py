@@ -8,84 +8,156 @@ Unless required by applicable law or agreed to in writing, software distributed
 an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
 specific language governing permissions and limitations under the License.
 """
-from typing import List, Optional
+import json
+from typing import Dict, Iterator, List, Optional
+
+from django.db.models import QuerySet
 
 from backend.configuration.constants import SystemSettingsEnum
 from backend.configuration.models.system import SystemSettings
 from backend.db_meta.enums import InstanceInnerRole
-from backend.db_meta.models import Cluster
+from backend.db_meta.models import Cluster, ProxyInstance, StorageInstance
 
+# 集群数超过该值时，接口以流式返回
+BIZ_CLUSTERS_STREAM_THRESHOLD = 2000
 
-def biz_clusters(bk_biz_id: int, immute_domains: Optional[List[str]]):
-    res = []
+STORAGE_FIELDS = (
+    "cluster_id",
+    "storageinstance__machine__ip",
+    "storageinstance__port",
+    "storageinstance__instance_inner_role",
+    "storageinstance__instance_role",
+    "storageinstance__machine__bk_cloud_id",
+    "storageinstance__status",
+    "storageinstance__bk_instance_id",
+)
+PROXY_FIELDS = (
+    "cluster_id",
+    "proxyinstance__machine__ip",
+    "proxyinstance__port",
+    "proxyinstance__admin_port",
+    "proxyinstance__machine__bk_cloud_id",
+    "proxyinstance__status",
+    "proxyinstance__bk_instance_id",
+)
 
-    qs = Cluster.objects.prefetch_related(
-        "storageinstance_set", "proxyinstance_set", "storageinstance_set__machine", "proxyinstance_set__machine"
-    ).filter(bk_biz_id=bk_biz_id)
 
+def _biz_cluster_qs(bk_biz_id: int, immute_domains: Optional[List[str]]) -> QuerySet:
+    qs = Cluster.objects.filter(bk_biz_id=bk_biz_id)
     if immute_domains:
         qs = qs.filter(immute_domain__in=immute_domains)
+    return qs
+
+
+def _group_by_cluster(rows: Iterator[tuple]) -> Iterator[tuple]:
+    """把按 cluster_id 排序的实例行按集群分组，返回 (cluster_id, [row...])"""
+    cluster_id, group = None, []
+    for row in rows:
+        if row[0] != cluster_id:
+            if group:
+                yield cluster_id, group
+            cluster_id, group = row[0], []
+        group.append(row[1:])
+    if group:
+        yield cluster_id, group
 
+
+def iter_biz_clusters(bk_biz_id: int, immute_domains: Optional[List[str]]) -> Iterator[Dict]:
+    """
+    逐个生成业务下的集群及其实例信息
+    集群、存储实例、接入层实例各一次查询，三者都按 cluster_id 排序后归并，查询次数与集群数量无关
+    """
+    cluster_qs = _biz_cluster_qs(bk_biz_id, immute_domains)
     padding_clusters = SystemSettings.get_setting_value(SystemSettingsEnum.PADDING_PROXY_CLUSTER_LIST.value) or []
 
-    for cluster in qs:
-        res.append(
-            {
-                "id": cluster.id,
-                "immute_domain": cluster.immute_domain,
-                "cluster_type": cluster.cluster_type,
-                "bk_biz_id": bk_biz_id,
-                "db_module_id": cluster.db_module_id,
-                "bk_cloud_id": cluster.bk_cloud_id,
-                "padding_proxy": cluster.immute_domain in padding_clusters,
-                "proxies": [
-                    {
-                        "ip": ele.machine.ip,
-                        "port": ele.port,
-                        "admin_port": ele.admin_port,
-                        "bk_cloud_id": ele.machine.bk_cloud_id,
-                        "status": ele.status,
-                        "bk_instance_id": ele.bk_instance_id,
-                    }
-                    for ele in cluster.proxyinstance_set.all()
-                ],
-                "master_storage_instances": [
-                    {
-                        "ip": ele.machine.ip,
-                        "port": ele.port,
-                        "instance_inner_role": ele.instance_inner_role,
-                        "instance_role": ele.instance_role,
-                        "bk_cloud_id": ele.machine.bk_cloud_id,
-                        "status": ele.status,
-                        "bk_instance_id": ele.bk_instance_id,
-                    }
-                    for ele in cluster.storageinstance_set.filter(instance_inner_role=InstanceInnerRole.MASTER.value)
-                ],
-                "slave_storage_instances": [
-                    {
-                        "ip": ele.machine.ip,
-                        "port": ele.port,
-                        "instance_inner_role": ele.instance_inner_role,
-                        "instance_role": ele.instance_role,
-                        "bk_cloud_id": ele.machine.bk_cloud_id,
-                        "status": ele.status,
-                        "bk_instance_id": ele.bk_instance_id,
-                    }
-                    for ele in cluster.storageinstance_set.filter(instance_inner_role=InstanceInnerRole.SLAVE.value)
-                ],
-                "storages": [
-                    {
-                        "ip": ele.machine.ip,
-                        "port": ele.port,
-                        "instance_inner_role": ele.instance_inner_role,
-                        "instance_role": ele.instance_role,
-                        "bk_cloud_id": ele.machine.bk_cloud_id,
-                        "status": ele.status,
-                        "bk_instance_id": ele.bk_instance_id,
-                    }
-                    for ele in cluster.storageinstance_set.all()
-                ],
-            }
-        )
-
-    return res
+    # 直接查询多对多的关联表，每个 (实例, 集群) 一行
+    storage_rows = (
+        StorageInstance.cluster.through.objects.filter(cluster__in=cluster_qs)
+        .order_by("cluster_id", "storageinstance_id")
+        .values_list(*STORAGE_FIELDS)
+        .iterator()
+    )
+    proxy_rows = (
+        ProxyInstance.cluster.through.objects.filter(cluster__in=cluster_qs)
+        .order_by("cluster_id", "proxyinstance_id")
+        .values_list(*PROXY_FIELDS)
+        .iterator()
+    )
+    storage_groups = _group_by_cluster(storage_rows)
+    proxy_groups = _group_by_cluster(proxy_rows)
+    next_storage = next(storage_groups, None)
+    next_proxy = next(proxy_groups, None)
+
+    for cluster_id, immute_domain, cluster_type, db_module_id, bk_cloud_id in (
+        cluster_qs.order_by("id")
+        .values_list("id", "immute_domain", "cluster_type", "db_module_id", "bk_cloud_id")
+        .iterator()
+    ):
+        storages, proxies = [], []
+        if next_storage and next_storage[0] == cluster_id:
+            rows = next_storage[1]
+            storages = [
+                {
+                    "ip": ip,
+                    "port": port,
+                    "instance_inner_role": instance_inner_role,
+                    "instance_role": instance_role,
+                    "bk_cloud_id": instance_bk_cloud_id,
+                    "status": status,
+                    "bk_instance_id": bk_instance_id,
+                }
+                for ip, port, instance_inner_role, instance_role, instance_bk_cloud_id, status, bk_instance_id in rows
+            ]
+            next_storage = next(storage_groups, None)
+        if next_proxy and next_proxy[0] == cluster_id:
+            proxies = [
+                {
+                    "ip": ip,
+                    "port": port,
+                    "admin_port": admin_port,
+                    "bk_cloud_id": instance_bk_cloud_id,
+                    "status": status,
+                    "bk_instance_id": bk_instance_id,
+                }
+                for ip, port, admin_port, instance_bk_cloud_id, status, bk_instance_id in next_proxy[1]
+            ]
+            next_proxy = next(proxy_groups, None)
+
+        yield {
+            "id": cluster_id,
+            "immute_domain": immute_domain,
+            "cluster_type": cluster_type,
+            "bk_biz_id": bk_biz_id,
+            "db_module_id": db_module_id,
+            "bk_cloud_id": bk_cloud_id,
+            "padding_proxy": immute_domain in padding_clusters,
+            "proxies": proxies,
+            "master_storage_instances": [
+                ele for ele in storages if ele["instance_inner_role"] == InstanceInnerRole.MASTER.value
+            ],
+            "slave_storage_instances": [
+                ele for ele in storages if ele["instance_inner_role"] == InstanceInnerRole.SLAVE.value
+            ],
+            "storages": storages,
+        }
+
+
+def biz_clusters(bk_biz_id: int, immute_domains: Optional[List[str]]):
+    return list(iter_biz_clusters(bk_biz_id, immute_domains))
+
+
+def biz_clusters_need_stream(bk_biz_id: int, immute_domains: Optional[List[str]]) -> bool:
+    return _biz_cluster_qs(bk_biz_id, immute_domains).count() > BIZ_CLUSTERS_STREAM_THRESHOLD
+
+
+def stream_biz_clusters(bk_biz_id: int, immute_domains: Optional[List[str]], envelope: Dict) -> Iterator[str]:
+    """
+    以流式 JSON 返回集群信息，envelope 为响应的其余字段，集群列表放在 data 中
+    """
+    envelope_json = json.dumps({**envelope, "data": None})
+    # 把 "data": null 替换为逐个集群输出的列表
+    prefix, suffix = envelope_json.split('"data": null', 1)
+    yield prefix + '"data": ['
+    for index, cluster in enumerate(iter_biz_clusters(bk_biz_id, immute_domains)):
+        yield ("," if index else "") + json.dumps(cluster)
+    yield "]" + suffix
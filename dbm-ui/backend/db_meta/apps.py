@@ -43,8 +43,22 @@ class DBMeta(AppConfig):
     name = "backend.db_meta"
 
     def ready(self):
-        from backend.db_meta.models import ProxyInstance, StorageInstance
-        from backend.db_meta.signals import update_cluster_status
+        from backend.db_meta.models import (
+            BKCity,
+            CLBEntryDetail,
+            Cluster,
+            ClusterDBHAExt,
+            ClusterEntry,
+            ExtraProcessInstance,
+            LogicalCity,
+            Machine,
+            PolarisEntryDetail,
+            ProxyInstance,
+            StorageInstance,
+            StorageInstanceTuple,
+            TenDBClusterSpiderExt,
+        )
+        from backend.db_meta.signals import bump_topo_version, update_cluster_status
 
         post_migrate.connect(init_db_meta, sender=self)
         # 当实例进行修改或者删除时，更新集群状态
@@ -54,3 +68,30 @@ class DBMeta(AppConfig):
         post_delete.connect(update_cluster_status, sender=ProxyInstance)
         m2m_changed.connect(update_cluster_status, sender=StorageInstance.cluster.through)
         m2m_changed.connect(update_cluster_status, sender=ProxyInstance.cluster.through)
+
+        # 拓扑变更时递增 dbha 拓扑快照的变更计数器
+        for model in [
+            BKCity,
+            CLBEntryDetail,
+            Cluster,
+            ClusterDBHAExt,
+            ClusterEntry,
+            ExtraProcessInstance,
+            LogicalCity,
+            Machine,
+            PolarisEntryDetail,
+            ProxyInstance,
+            StorageInstance,
+            StorageInstanceTuple,
+            TenDBClusterSpiderExt,
+        ]:
+            post_save.connect(bump_topo_version, sender=model, dispatch_uid=f"dbha_topo_save_{model.__name__}")
+            post_delete.connect(bump_topo_version, sender=model, dispatch_uid=f"dbha_topo_delete_{model.__name__}")
+        for through in [
+            StorageInstance.cluster.through,
+            StorageInstance.bind_entry.through,
+            ProxyInstance.cluster.through,
+            ProxyInstance.bind_entry.through,
+            ProxyInstance.storageinstance.through,
+        ]:
+            m2m_changed.connect(bump_topo_version, sender=through, dispatch_uid=f"dbha_topo_m2m_{through.__name__}")
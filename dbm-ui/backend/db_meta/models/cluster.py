@@ -11,13 +11,14 @@ specific language governing permissions and limitations under the License.
 
 import json
 import logging
+from collections import defaultdict
 from datetime import datetime, timezone
-from typing import Dict, List
+from typing import Dict, Iterable, List, Optional, Set, Tuple
 
 from django.core.cache import cache
 from django.core.exceptions import ObjectDoesNotExist
 from django.db import models
-from django.db.models import Count, Q, QuerySet
+from django.db.models import Count, QuerySet
 from django.forms import model_to_dict
 from django.utils.translation import ugettext_lazy as _
 
@@ -46,6 +47,51 @@ from backend.ticket.models import ClusterOperateRecord
 
 logger = logging.getLogger("root")
 
+# 实现了 status flag 的集群类型，及其中需要检查 proxy 状态的集群类型
+STATUS_FLAG_PROXY_CLUSTER_TYPES = [ClusterType.TenDBHA.value, ClusterType.TenDBCluster.value]
+STATUS_FLAG_CLUSTER_TYPES = [*STATUS_FLAG_PROXY_CLUSTER_TYPES, ClusterType.TenDBSingle.value]
+
+# 计算访问端口和中控地址需要的实例字段
+ACCESS_INSTANCE_FIELDS = {
+    "storage": ["port", "instance_role", "machine_type"],
+    "proxy": ["port", "machine_type", "tendbclusterspiderext__spider_role", "machine__ip"],
+}
+
+
+def get_access_port_rule(cluster_type: str) -> Optional[Tuple[str, Dict[str, str]]]:
+    """
+    集群访问端口的取值规则，返回 (storage/proxy, 实例过滤条件)，取满足条件的第一个实例的端口
+    riak 的端口固定，没有规则的集群类型返回 None
+    """
+    if cluster_type in [ClusterType.TenDBSingle, ClusterType.RedisInstance]:
+        return "storage", {}
+    if cluster_type in [ClusterType.TenDBHA, *ClusterType.db_type_to_cluster_types(DBType.Redis)]:
+        return "proxy", {}
+    if cluster_type == ClusterType.TenDBCluster:
+        return "proxy", {"tendbclusterspiderext__spider_role": TenDBClusterSpiderRole.SPIDER_MASTER}
+    if cluster_type == ClusterType.MongoShardedCluster:
+        return "proxy", {"machine_type": MachineType.MONGOS}
+    if cluster_type == ClusterType.MongoReplicaSet:
+        return "storage", {"machine_type": MachineType.MONGODB}
+    storage_roles = {
+        ClusterType.Es: InstanceRole.ES_MASTER,
+        ClusterType.Kafka: InstanceRole.BROKER,
+        ClusterType.Hdfs: InstanceRole.HDFS_NAME_NODE,
+        ClusterType.Pulsar: InstanceRole.PULSAR_BROKER,
+        ClusterType.Doris: InstanceRole.DORIS_FOLLOWER,
+    }
+    if cluster_type in storage_roles:
+        return "storage", {"instance_role": storage_roles[cluster_type]}
+    return None
+
+
+def first_matched_instance(instances: List[Dict], conditions: Dict[str, str]) -> Optional[Dict]:
+    """取第一个满足过滤条件的实例"""
+    return next(
+        (instance for instance in instances if all(instance[key] == value for key, value in conditions.items())),
+        None,
+    )
+
 
 class Cluster(AuditedModel):
     name = models.CharField(max_length=64, default="", help_text=_("集群英文名"))
@@ -130,24 +176,32 @@ class Cluster(AuditedModel):
         """
         处理当前的动作是否和集群正在运行的动作存在执行互斥
         """
+        if not ticket_type:
+            return
+
+        cluster_exclusive_infos = ClusterOperateRecord.objects.get_exclusive_operations(
+            ticket_type, cluster_ids, **kwargs
+        )
+        if not cluster_exclusive_infos:
+            return
+
+        # 存在互斥操作，则抛出错误让用户后续重试该inner flow，一次性给出所有互斥的集群
+        exclusive_msgs = []
         for cluster_id in cluster_ids:
-            exclusive_infos = cls.is_exclusive(cluster_id, ticket_type, **kwargs)
-            if not exclusive_infos:
+            if cluster_id not in cluster_exclusive_infos:
                 continue
-
-            # 存在互斥操作，则抛出错误让用户后续重试该inner flow
             exclusive_infos = [
                 (
                     f'{TicketType.get_choice_label(info["exclusive_ticket"].ticket_type)}'
                     f'(ticket_id:{info["exclusive_ticket"].id})'
                 )
-                for info in exclusive_infos
+                for info in cluster_exclusive_infos[cluster_id]
             ]
-            raise ClusterExclusiveOperateException(
-                _("当前操作「{}」与集群(id:{})的操作「{}」存在执行互斥").format(
-                    TicketType.get_choice_label(ticket_type), cluster_id, ",".join(exclusive_infos)
-                )
-            )
+            exclusive_msgs.append(_("集群(id:{})的操作「{}」").format(cluster_id, ",".join(exclusive_infos)))
+
+        raise ClusterExclusiveOperateException(
+            _("当前操作「{}」与{}存在执行互斥").format(TicketType.get_choice_label(ticket_type), "; ".join(exclusive_msgs))
+        )
 
     def can_access(self) -> (bool, str):
         # 判断集群的状态是否正常
@@ -159,14 +213,15 @@ class Cluster(AuditedModel):
 
         return True, ""
 
-    @property
-    def proxy_version(self):
-        if self.cluster_type in [
+    @classmethod
+    def get_proxy_version(cls, cluster_type: str) -> str:
+        """集群接入层的版本只与集群类型有关"""
+        if cluster_type in [
             ClusterType.TendisPredixyRedisCluster,
             ClusterType.TendisPredixyTendisplusCluster,
         ]:
             return PredixyVersion.PredixyLatest
-        if self.cluster_type in [
+        if cluster_type in [
             ClusterType.TendisTwemproxyTendisplusIns,
             ClusterType.TendisTwemproxyRedisInstance,
             ClusterType.TwemproxyTendisSSDInstance,
@@ -175,41 +230,82 @@ class Cluster(AuditedModel):
         return LATEST
 
     @property
-    def __status_flag(self):
-        if self.cluster_type == ClusterType.TenDBHA.value:
+    def proxy_version(self):
+        return self.get_proxy_version(self.cluster_type)
+
+    @classmethod
+    def _compose_status_flag(
+        cls, cluster_type: str, proxy_unavailable: bool, unavailable_storage_roles: Set[str]
+    ) -> ClusterStatusFlags:
+        """根据不可用的proxy和storage角色，组装集群的状态标志"""
+        if cluster_type == ClusterType.TenDBHA.value:
             flag_obj = ClusterDBHAStatusFlags(0)
-            if self.proxyinstance_set.filter(status=InstanceStatus.UNAVAILABLE.value).exists():
+            if proxy_unavailable:
                 flag_obj |= ClusterDBHAStatusFlags.ProxyUnavailable
-            if self.storageinstance_set.filter(
-                status=InstanceStatus.UNAVAILABLE.value, instance_inner_role=InstanceInnerRole.MASTER.value
-            ).exists():
+            if InstanceInnerRole.MASTER.value in unavailable_storage_roles:
                 flag_obj |= ClusterDBHAStatusFlags.BackendMasterUnavailable
-            if self.storageinstance_set.filter(
-                status=InstanceStatus.UNAVAILABLE.value, instance_inner_role=InstanceInnerRole.SLAVE.value
-            ).exists():
+            if InstanceInnerRole.SLAVE.value in unavailable_storage_roles:
                 flag_obj |= ClusterDBHAStatusFlags.BackendSlaveUnavailable
-        elif self.cluster_type == ClusterType.TenDBCluster.value:
+        elif cluster_type == ClusterType.TenDBCluster.value:
             flag_obj = ClusterTenDBClusterStatusFlag(0)
-            if self.proxyinstance_set.filter(status=InstanceStatus.UNAVAILABLE.value).exists():
+            if proxy_unavailable:
                 flag_obj |= ClusterTenDBClusterStatusFlag.SpiderUnavailable
-            if self.storageinstance_set.filter(
-                status=InstanceStatus.UNAVAILABLE.value, instance_inner_role=InstanceInnerRole.MASTER.value
-            ).exists():
+            if InstanceInnerRole.MASTER.value in unavailable_storage_roles:
                 flag_obj |= ClusterTenDBClusterStatusFlag.RemoteMasterUnavailable
-            if self.storageinstance_set.filter(
-                status=InstanceStatus.UNAVAILABLE.value, instance_inner_role=InstanceInnerRole.SLAVE.value
-            ).exists():
+            if InstanceInnerRole.SLAVE.value in unavailable_storage_roles:
                 flag_obj |= ClusterTenDBClusterStatusFlag.RemoteSlaveUnavailable
-        elif self.cluster_type == ClusterType.TenDBSingle.value:
+        elif cluster_type == ClusterType.TenDBSingle.value:
             flag_obj = ClusterDBSingleStatusFlags(0)
-            if self.storageinstance_set.filter(status=InstanceStatus.UNAVAILABLE.value).exists():
+            if unavailable_storage_roles:
                 flag_obj |= ClusterDBSingleStatusFlags.SingleUnavailable
         else:
-            logger.debug(_("{} 未实现 status flag,".format(self.cluster_type)))
+            logger.debug(_("{} 未实现 status flag,".format(cluster_type)))
             flag_obj = ClusterStatusFlags(0)
 
         return flag_obj
 
+    @classmethod
+    def get_status_flags_map(cls, clusters: Iterable["Cluster"]) -> Dict[int, ClusterStatusFlags]:
+        """
+        批量计算集群的状态标志，最多两次聚合查询
+        @param clusters: 集群列表，需要包含 id 和 cluster_type
+        """
+        clusters = list(clusters)
+        flag_cluster_ids = [cluster.id for cluster in clusters if cluster.cluster_type in STATUS_FLAG_CLUSTER_TYPES]
+        proxy_cluster_ids = [
+            cluster.id for cluster in clusters if cluster.cluster_type in STATUS_FLAG_PROXY_CLUSTER_TYPES
+        ]
+
+        unavailable_proxy_cluster_ids: Set[int] = set()
+        if proxy_cluster_ids:
+            unavailable_proxy_cluster_ids = set(
+                cls.objects.filter(id__in=proxy_cluster_ids, proxyinstance__status=InstanceStatus.UNAVAILABLE.value)
+                .values_list("id", flat=True)
+                .distinct()
+            )
+
+        unavailable_storage_roles: Dict[int, Set[str]] = defaultdict(set)
+        if flag_cluster_ids:
+            for cluster_id, inner_role in (
+                cls.objects.filter(id__in=flag_cluster_ids, storageinstance__status=InstanceStatus.UNAVAILABLE.value)
+                .values_list("id", "storageinstance__instance_inner_role")
+                .distinct()
+            ):
+                unavailable_storage_roles[cluster_id].add(inner_role)
+
+        return {
+            cluster.id: cls._compose_status_flag(
+                cluster.cluster_type,
+                cluster.id in unavailable_proxy_cluster_ids,
+                unavailable_storage_roles.get(cluster.id, set()),
+            )
+            for cluster in clusters
+        }
+
+    @property
+    def __status_flag(self):
+        return self.get_status_flags_map([self])[self.id]
+
     @property
     def status_flag(self):
         return self.__status_flag.value
@@ -228,10 +324,81 @@ class Cluster(AuditedModel):
         else:
             raise DBMetaException(message=_("{} 未实现 main_storage_instance".format(self.cluster_type)))
 
+    @classmethod
+    def _get_instance_rows(cls, cluster_ids: List[int], source: str) -> Dict[int, List[Dict]]:
+        """
+        一次查询获取一批集群的存储/接入层实例的关键字段，按实例ID排序，与 first() 取到的实例一致
+        @param source: storage 或 proxy
+        """
+        fields = ACCESS_INSTANCE_FIELDS[source]
+        rows = (
+            cls.objects.filter(id__in=cluster_ids)
+            .order_by(f"{source}instance__id")
+            .values_list("id", *[f"{source}instance__{field}" for field in fields])
+        )
+        cluster_instances: Dict[int, List[Dict]] = defaultdict(list)
+        for cluster_id, *values in rows:
+            # 没有实例的集群会关联出一行空值
+            if values[0] is not None:
+                cluster_instances[cluster_id].append(dict(zip(fields, values)))
+        return cluster_instances
+
+    @classmethod
+    def get_access_port_map(cls, clusters: Iterable["Cluster"]) -> Dict[int, int]:
+        """
+        批量获取集群的访问端口，存储和接入层各最多一次查询，规则见 get_access_port_rule
+        @param clusters: 集群列表，需要包含 id, name 和 cluster_type
+        """
+        clusters = list(clusters)
+        rules = {cluster.id: get_access_port_rule(cluster.cluster_type) for cluster in clusters}
+        instance_rows: Dict[str, Dict[int, List[Dict]]] = {}
+        for source in ACCESS_INSTANCE_FIELDS:
+            cluster_ids = [cluster_id for cluster_id, rule in rules.items() if rule and rule[0] == source]
+            instance_rows[source] = cls._get_instance_rows(cluster_ids, source) if cluster_ids else {}
+
+        access_port_map: Dict[int, int] = {}
+        for cluster in clusters:
+            rule = rules[cluster.id]
+            if cluster.cluster_type == ClusterType.Riak:
+                access_port_map[cluster.id] = DEFAULT_RIAK_PORT
+                continue
+            if not rule:
+                access_port_map[cluster.id] = None
+                continue
+
+            source, conditions = rule
+            instance = first_matched_instance(instance_rows[source].get(cluster.id, []), conditions)
+            if not instance:
+                logger.warning(_("无法访问集群[{}]的访问端口，请检查实例信息").format(cluster.name))
+            access_port_map[cluster.id] = instance["port"] if instance else 0
+        return access_port_map
+
+    @classmethod
+    def get_access_info_map(cls, clusters: Iterable["Cluster"], with_ctl_primary: bool = False) -> Dict[int, Dict]:
+        """
+        批量获取集群的访问信息，查询次数与集群数量无关
+        @param clusters: 集群列表，需要包含 id, name, cluster_type 和 bk_cloud_id
+        @param with_ctl_primary: 是否查询 tendbcluster 的中控 primary，需要通过 DRS 查询，每个云区域一次请求
+        @return: {cluster_id: {"access_port": ..., "proxy_version": ..., "ctl_primary": ...}}
+        """
+        clusters = list(clusters)
+        access_port_map = cls.get_access_port_map(clusters)
+        ctl_primary_map = cls.get_tendbcluster_ctl_primary_map(clusters) if with_ctl_primary else {}
+
+        access_info_map: Dict[int, Dict] = {}
+        for cluster in clusters:
+            access_info_map[cluster.id] = {
+                "access_port": access_port_map[cluster.id],
+                "proxy_version": cls.get_proxy_version(cluster.cluster_type),
+            }
+            if with_ctl_primary:
+                access_info_map[cluster.id]["ctl_primary"] = ctl_primary_map.get(cluster.id, "")
+        return access_info_map
+
     @property
     def access_port(self) -> int:
         """
-        获取集群的访问端口，如果要批量查询，请使用prefetch预存instance得queryset
+        获取集群的访问端口，如果要批量查询，请使用 get_access_port_map
         tendbsingle: 只有一台机器，直接取那个port
         tendbha, redis: 取proxy的一台port
         tendbcluster: 主域名取spider master的port   从域名取spider slave的port
@@ -244,90 +411,113 @@ class Cluster(AuditedModel):
         mongo_replicaset: 去存储节点的port
         sqlserver: ?
         """
-        try:
-            if self.cluster_type == ClusterType.TenDBSingle:
-                return self.storageinstance_set.first().port
-            elif self.cluster_type == ClusterType.RedisInstance:
-                return self.storageinstance_set.first().port
-            elif self.cluster_type in [ClusterType.TenDBHA, *ClusterType.db_type_to_cluster_types(DBType.Redis)]:
-                return self.proxyinstance_set.first().port
-            elif self.cluster_type == ClusterType.TenDBCluster:
-                spider_master_filter = Q(tendbclusterspiderext__spider_role=TenDBClusterSpiderRole.SPIDER_MASTER)
-                return self.proxyinstance_set.filter(spider_master_filter).first().port
-            elif self.cluster_type == ClusterType.Es:
-                return self.storageinstance_set.filter(instance_role=InstanceRole.ES_MASTER).first().port
-            elif self.cluster_type == ClusterType.Kafka:
-                return self.storageinstance_set.filter(instance_role=InstanceRole.BROKER).first().port
-            elif self.cluster_type == ClusterType.Hdfs:
-                return self.storageinstance_set.filter(instance_role=InstanceRole.HDFS_NAME_NODE).first().port
-            elif self.cluster_type == ClusterType.Pulsar:
-                return self.storageinstance_set.filter(instance_role=InstanceRole.PULSAR_BROKER).first().port
-            elif self.cluster_type == ClusterType.Riak:
-                return DEFAULT_RIAK_PORT
-            elif self.cluster_type == ClusterType.MongoShardedCluster:
-                return self.proxyinstance_set.filter(machine_type=MachineType.MONGOS).first().port
-            elif self.cluster_type == ClusterType.MongoReplicaSet:
-                return self.storageinstance_set.filter(machine_type=MachineType.MONGODB).first().port
-            elif self.cluster_type == ClusterType.Doris:
-                return self.storageinstance_set.filter(instance_role=InstanceRole.DORIS_FOLLOWER).first().port
-        except AttributeError:
-            logger.warning(_("无法访问集群[]的访问端口，请检查实例信息").format(self.name))
-            return 0
+        return self.get_access_port_map([self])[self.id]
 
     def get_partition_port(self):
         """
-        获取集群在分区管理的端口号
+        获取集群在分区管理的端口号，与集群的访问端口一致，批量查询请使用 get_access_port_map
         tendbsingle 是mysql的端口
-        tendbcluster 是proxy的端口
+        tendbha 是proxy的端口
+        tendbcluster 是spider master的端口
         """
-        if self.cluster_type == ClusterType.TenDBSingle:
-            return self.storageinstance_set.first().port
-        elif self.cluster_type == ClusterType.TenDBHA:
-            return self.proxyinstance_set.first().port
-        # TODO: tendbcluster的端口是spider master？
-        elif self.cluster_type == ClusterType.TenDBCluster:
-            return (
-                self.proxyinstance_set.filter(tendbclusterspiderext__spider_role=TenDBClusterSpiderRole.SPIDER_MASTER)
-                .first()
-                .port
-            )
+        if self.cluster_type in [ClusterType.TenDBSingle, ClusterType.TenDBHA, ClusterType.TenDBCluster]:
+            return self.access_port
 
-    def tendbcluster_ctl_primary_address(self) -> str:
+    @classmethod
+    def _query_ctl_primary(cls, bk_cloud_id: int, ctl_addresses: List[str]) -> Dict[str, Dict[str, str]]:
         """
-        查询并返回 tendbcluster 的中控 primary
-        集群类型不是 TenDBCluster 时会抛出异常
-        返回值是 "ip:port" 形式的字符串
+        通过 DRS 批量查询同一云区域下的中控 primary
+        @return: {ctl_address: {"primary": "ip:port", "error_msg": ""}}，没有查询到 primary 时返回中控地址本身
         """
-        if self.cluster_type != ClusterType.TenDBCluster.value:
-            raise DBMetaException(message=_("{} 类型集群没有中控节点".format(self.cluster_type)))
-
-        spider_instance = self.proxyinstance_set.filter(
-            tendbclusterspiderext__spider_role=TenDBClusterSpiderRole.SPIDER_MASTER
-        ).first()  # 随便拿一个spider-master接入层
-
-        ctl_address = "{}{}{}".format(spider_instance.machine.ip, IP_PORT_DIVIDER, spider_instance.port + 1000)
-
-        logger.info("ctl address: {}".format(ctl_address))
         res = DRSApi.rpc(
             {
-                "addresses": [ctl_address],
+                "addresses": ctl_addresses,
                 "cmds": ["tdbctl get primary"],
                 "force": False,
-                "bk_cloud_id": self.bk_cloud_id,
+                "bk_cloud_id": bk_cloud_id,
             }
         )
         logger.info("tdbctl get primary res: {}".format(res))
 
-        if res[0]["error_msg"]:
-            raise DBMetaException(message=_("get primary failed: {}".format(res[0]["error_msg"])))
+        ctl_primary_infos: Dict[str, Dict[str, str]] = {}
+        for ctl_address, result in zip(ctl_addresses, res):
+            # 优先以返回结果中的地址对应，避免依赖返回顺序
+            if result.get("address") in ctl_addresses:
+                ctl_address = result["address"]
+            if result["error_msg"]:
+                ctl_primary_infos[ctl_address] = {"primary": "", "error_msg": result["error_msg"]}
+                continue
 
-        primary_info_table_data = res[0]["cmd_results"][0]["table_data"]
-        if primary_info_table_data:
-            return "{}{}{}".format(
-                primary_info_table_data[0]["HOST"], IP_PORT_DIVIDER, primary_info_table_data[0]["PORT"]
-            )
-        else:
-            return ctl_address
+            primary_info_table_data = result["cmd_results"][0]["table_data"]
+            primary = ctl_address
+            if primary_info_table_data:
+                primary = "{}{}{}".format(
+                    primary_info_table_data[0]["HOST"], IP_PORT_DIVIDER, primary_info_table_data[0]["PORT"]
+                )
+            ctl_primary_infos[ctl_address] = {"primary": primary, "error_msg": ""}
+        return ctl_primary_infos
+
+    @classmethod
+    def _get_ctl_addresses(cls, clusters: List["Cluster"]) -> Dict[int, str]:
+        """获取 tendbcluster 的中控地址，随便拿一个spider-master接入层，中控端口为 spider 端口 + 1000"""
+        cluster_ids = [cluster.id for cluster in clusters if cluster.cluster_type == ClusterType.TenDBCluster.value]
+        if not cluster_ids:
+            return {}
+
+        ctl_addresses: Dict[int, str] = {}
+        __, spider_master_conditions = get_access_port_rule(ClusterType.TenDBCluster)
+        for cluster_id, proxies in cls._get_instance_rows(cluster_ids, "proxy").items():
+            spider_master = first_matched_instance(proxies, spider_master_conditions)
+            if spider_master:
+                ip, port = spider_master["machine__ip"], spider_master["port"]
+                ctl_addresses[cluster_id] = f"{ip}{IP_PORT_DIVIDER}{port + 1000}"
+        return ctl_addresses
+
+    @classmethod
+    def get_tendbcluster_ctl_primary_map(cls, clusters: Iterable["Cluster"]) -> Dict[int, str]:
+        """
+        批量查询 tendbcluster 的中控 primary，一次数据库查询，每个云区域一次 DRS 请求
+        非 tendbcluster 集群以及查询失败的集群不会出现在返回结果中
+        """
+        clusters = list(clusters)
+        ctl_addresses = cls._get_ctl_addresses(clusters)
+
+        cloud_ctl_addresses: Dict[int, List[str]] = defaultdict(list)
+        for cluster in clusters:
+            if cluster.id in ctl_addresses:
+                cloud_ctl_addresses[cluster.bk_cloud_id].append(ctl_addresses[cluster.id])
+
+        ctl_primary_infos: Dict[str, Dict[str, str]] = {}
+        for bk_cloud_id, addresses in cloud_ctl_addresses.items():
+            ctl_primary_infos.update(cls._query_ctl_primary(bk_cloud_id, addresses))
+
+        ctl_primary_map: Dict[int, str] = {}
+        for cluster_id, ctl_address in ctl_addresses.items():
+            info = ctl_primary_infos.get(ctl_address) or {"primary": "", "error_msg": "no result"}
+            if info["error_msg"]:
+                logger.warning("get primary of ctl {} failed: {}".format(ctl_address, info["error_msg"]))
+                continue
+            ctl_primary_map[cluster_id] = info["primary"]
+        return ctl_primary_map
+
+    def tendbcluster_ctl_primary_address(self) -> str:
+        """
+        查询并返回 tendbcluster 的中控 primary
+        集群类型不是 TenDBCluster 时会抛出异常
+        返回值是 "ip:port" 形式的字符串
+        """
+        if self.cluster_type != ClusterType.TenDBCluster.value:
+            raise DBMetaException(message=_("{} 类型集群没有中控节点".format(self.cluster_type)))
+
+        ctl_address = self._get_ctl_addresses([self]).get(self.id)
+        if not ctl_address:
+            raise DBMetaException(message=_("集群{}没有 spider master 接入层").format(self.immute_domain))
+        logger.info("ctl address: {}".format(ctl_address))
+
+        info = self._query_ctl_primary(self.bk_cloud_id, [ctl_address])[ctl_address]
+        if info["error_msg"]:
+            raise DBMetaException(message=_("get primary failed: {}".format(info["error_msg"])))
+        return info["primary"]
 
     @classmethod
     def get_cluster_stats(cls, cluster_types) -> dict:
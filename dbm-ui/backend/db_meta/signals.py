@@ -11,11 +11,17 @@ specific language governing permissions and limitations under the License.
 import logging
 from typing import Union
 
+from django.core.cache import cache
+from django.db import transaction
+
 from backend.db_meta.enums import ClusterStatus
 from backend.db_meta.models import Cluster, ProxyInstance, StorageInstance
 
 logger = logging.getLogger("root")
 
+# dbha 拓扑快照的全局变更计数器
+DBHA_TOPO_CHANGE_COUNTER_KEY = "dbha_topo_change_counter"
+
 
 def update_cluster_status(sender, instance: Union[StorageInstance, ProxyInstance, Cluster], **kwargs):
     """
@@ -28,14 +34,15 @@ def update_cluster_status(sender, instance: Union[StorageInstance, ProxyInstance
     if isinstance(instance, Cluster):
         clusters = [instance]
     else:
-        clusters = instance.cluster.all()
+        clusters = list(instance.cluster.all())
 
+    status_flags_map = Cluster.get_status_flags_map(clusters)
     for cluster in clusters:
         # 忽略临时集群
         if cluster.status == ClusterStatus.TEMPORARY.value:
             return
         origin_status = cluster.status
-        if cluster.status_flag:
+        if status_flags_map[cluster.id]:
             target_status = ClusterStatus.ABNORMAL.value
         else:
             target_status = ClusterStatus.NORMAL.value
@@ -43,3 +50,22 @@ def update_cluster_status(sender, instance: Union[StorageInstance, ProxyInstance
             cluster.status = target_status
             logger.info("[signals] update cluster status, origin: %s, target: %s", origin_status, target_status)
             cluster.save(update_fields=["status"])
+
+
+def _incr_topo_change_counter():
+    try:
+        cache.incr(DBHA_TOPO_CHANGE_COUNTER_KEY)
+    except ValueError:
+        cache.set(DBHA_TOPO_CHANGE_COUNTER_KEY, 1, None)
+
+
+def bump_topo_version(*args, **kwargs):
+    """
+    拓扑变更时递增 dbha 拓扑快照的变更计数器，事务提交后才递增，避免重建快照时读到未提交的数据
+    批量 update/bulk_update 不会触发信号，这类场景需要手动调用本函数
+    """
+    transaction.on_commit(_incr_topo_change_counter)
+
+
+def get_topo_change_counter() -> int:
+    return cache.get(DBHA_TOPO_CHANGE_COUNTER_KEY) or 0
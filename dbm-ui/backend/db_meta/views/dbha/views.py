@@ -10,13 +10,14 @@ specific language governing permissions and limitations under the License.
 """
 import logging
 
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
 from rest_framework.decorators import api_view
 from rest_framework.request import Request
 
+from backend import env
 from backend.db_meta import api
 
 logger = logging.getLogger("root")
@@ -58,14 +59,40 @@ def cities(request: Request):
             collectionFormat="multi",
         ),
         openapi.Parameter(name="bk_cloud_id", in_=openapi.IN_QUERY, type=openapi.TYPE_INTEGER),
+        openapi.Parameter(name="version", in_=openapi.IN_QUERY, type=openapi.TYPE_STRING),
+        openapi.Parameter(name="delta", in_=openapi.IN_QUERY, type=openapi.TYPE_BOOLEAN),
     ],
 )
 @api_view(["GET"])
 # @permission_classes([AllowAny])
 @csrf_exempt
 def instances(request: Request):
+    """
+    开启拓扑快照时，可以通过 version 参数或 If-None-Match 头带上已持有的版本:
+    - 版本未变化时返回 304
+    - delta=true 时返回相对该版本的增量 {"instances": [...], "removed": ["ip:port"]}
+    """
     try:
-        return JsonResponse({"code": 0, "msg": "", "data": api.dbha.instances(**request.query_params)})
+        if not env.DBHA_TOPO_SNAPSHOT_ENABLE:
+            return JsonResponse({"code": 0, "msg": "", "data": api.dbha.instances(**request.query_params)})
+
+        params = request.query_params.dict()
+        for key in ["logical_city_ids", "addresses", "statuses", "cluster_types"]:
+            if key in request.query_params:
+                params[key] = request.query_params.getlist(key)
+        version = params.pop("version", None) or request.headers.get("If-None-Match", "").strip('"') or None
+        delta = str(params.pop("delta", "")).lower() in ["true", "1"]
+
+        result = api.dbha.instances_snapshot(version=version, delta=delta, **params)
+        if result["not_modified"]:
+            response = HttpResponse(status=304)
+        elif result["delta"]:
+            data = {"instances": result["instances"], "removed": result["removed"]}
+            response = JsonResponse({"code": 0, "msg": "", "data": data, "version": result["version"]})
+        else:
+            response = JsonResponse({"code": 0, "msg": "", "data": result["instances"], "version": result["version"]})
+        response["ETag"] = f'"{result["version"]}"'
+        return response
     except Exception as e:
         return JsonResponse({"code": 1, "msg": "{}".format(e), "data": ""})
 
@@ -8,7 +8,7 @@ Unless required by applicable law or agreed to in writing, software distributed
 an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
 specific language governing permissions and limitations under the License.
 """
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from drf_yasg.utils import swagger_auto_schema
 from rest_framework.decorators import api_view
@@ -66,15 +66,20 @@ def sqlserver_ha_cluster_instances(request: Request):
 @csrf_exempt
 @api_view(["GET"])
 def biz_clusters(request: Request):
+    bk_biz_id = request.query_params.get("bk_biz_id")
+    immute_domains = request.query_params.getlist("immute_domains")
     try:
+        # 集群数很多的业务以流式返回，避免一次性构造完整的响应
+        if api.priv_manager.biz_clusters_need_stream(bk_biz_id, immute_domains):
+            return StreamingHttpResponse(
+                api.priv_manager.stream_biz_clusters(bk_biz_id, immute_domains, envelope={"msg": "", "code": 0}),
+                content_type="application/json",
+            )
         return JsonResponse(
             {
                 "msg": "",
                 "code": 0,
-                "data": api.priv_manager.biz_clusters(
-                    bk_biz_id=request.query_params.get("bk_biz_id"),
-                    immute_domains=request.query_params.getlist("immute_domains"),
-                ),
+                "data": api.priv_manager.biz_clusters(bk_biz_id=bk_biz_id, immute_domains=immute_domains),
             }
         )
     except Exception as e:  # pylint: disable=broad-except
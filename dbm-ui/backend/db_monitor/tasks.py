@@ -51,10 +51,8 @@ def update_app_policy(bk_biz_id, notify_group_id, db_type):
         return
 
     # 逐个策略更新
+    plat_group_id = NoticeGroup.get_groups(PLAT_BIZ_ID, id_name="id").get(db_type)
     for policy in MonitorPolicy.objects.filter(db_type=db_type, bk_biz_id=bk_biz_id):
-        plat_groups = NoticeGroup.get_groups(PLAT_BIZ_ID, id_name="id")
-        plat_group_id = plat_groups.get(policy.db_type)
-
         old_notify_groups = copy.deepcopy(policy.notify_groups)
 
         # 移除平台告警组
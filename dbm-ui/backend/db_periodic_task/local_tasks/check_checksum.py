@@ -1,24 +1,31 @@
-import json
 import logging
 from collections import defaultdict
 from datetime import datetime, timedelta
+from typing import Dict, List, Tuple
 
 from blueapps.core.celery.celery import app
 from celery.schedules import crontab
+from django.db import transaction
 from django.utils import timezone
 from django.utils.translation import ugettext as _
 
-from backend import env
-from backend.components import BKLogApi
+from backend.components.bklog.handler import BKLogSearch
 from backend.db_meta.enums import ClusterType, InstanceInnerRole
-from backend.db_meta.models import Cluster
+from backend.db_meta.models import Cluster, StorageInstance
 from backend.db_periodic_task.local_tasks.register import register_periodic_task
 from backend.db_periodic_task.utils import TimeUnit, calculate_countdown
 from backend.db_report.models import ChecksumCheckReport, ChecksumInstance
-from backend.utils.time import datetime2str
+from backend.utils.basic import chunk_lists
 
 logger = logging.getLogger("celery")
 
+# 每个任务检查的集群数，同一批集群的校验日志按云区域合并查询
+CHECKSUM_CLUSTER_BATCH_SIZE = 50
+# 批量写入校验结果的批次大小
+CHECKSUM_REPORT_BATCH_SIZE = 1000
+# 校验结果为文本采集项，日志内容只在原始日志中，查询时只返回原始日志
+CHECKSUM_LOG_FIELDS = ["log"]
+
 
 class Checksum:
     """备库实例的校验结果"""
@@ -59,15 +66,18 @@ def auto_check_checksum():
         )
     )
     cluster_type_filter = [ClusterType.TenDBHA.value, ClusterType.TenDBCluster.value]
-    cluster_ids = list(Cluster.objects.filter(cluster_type__in=cluster_type_filter).values_list("id", flat=True))
-    count = len(cluster_ids)
+    cluster_ids = list(
+        Cluster.objects.filter(cluster_type__in=cluster_type_filter).order_by("id").values_list("id", flat=True)
+    )
+    cluster_id_batches = list(chunk_lists(cluster_ids, CHECKSUM_CLUSTER_BATCH_SIZE))
+    count = len(cluster_id_batches)
     # 所有集群的校验结果检查，在一个小时内完成
-    for index, cluster_id in enumerate(cluster_ids):
+    for index, batch_cluster_ids in enumerate(cluster_id_batches):
         countdown = calculate_countdown(count=count, index=index, duration=TimeUnit.HOUR)
-        logger.info("cluster({}) checksum will be run after {} seconds.".format(cluster_id, countdown))
-        check_cluster_checksum.apply_async(
+        logger.info("clusters({}) checksum will be run after {} seconds.".format(batch_cluster_ids, countdown))
+        check_clusters_checksum.apply_async(
             kwargs={
-                "cluster_id": cluster_id,
+                "cluster_ids": batch_cluster_ids,
                 "start_time": start_time,
                 "end_time": end_time,
                 "log_start_time": log_start_time,
@@ -76,40 +86,63 @@ def auto_check_checksum():
         )
 
 
-@app.task
-def check_cluster_checksum(cluster_id: int, start_time: datetime, end_time: datetime, log_start_time: datetime):
-    try:
-        cluster = Cluster.objects.get(id=cluster_id)
-    except Cluster.DoesNotExist:
-        # 忽略不在dbm meta信息中的集群
-        logger.error(_("无法在dbm meta中查询到集群{}的相关信息，请排查该集群的状态".format(cluster_id)))
-        return
-    # 备库以及repeater上报校验数据
+def get_slave_instances(cluster_ids: List[int]) -> Dict[int, List[Tuple[str, int]]]:
+    """一次查询获取集群上报校验数据的备库以及repeater实例，返回 {cluster_id: [(ip, port)...]}"""
     inner_role_filter = [InstanceInnerRole.SLAVE.value, InstanceInnerRole.REPEATER.value]
-    instances = cluster.storageinstance_set.filter(instance_inner_role__in=inner_role_filter)
-    machines = [instance.machine.ip for instance in instances]
-    machines = list(tuple(machines))
-    if len(machines) <= 0:
-        return
-    # BKLogApi.esquery_search的过滤条件filter
-    # 获取近2天的日志
+    cluster_slaves: Dict[int, List[Tuple[str, int]]] = defaultdict(list)
+    for cluster_id, ip, port in (
+        StorageInstance.cluster.through.objects.filter(
+            cluster_id__in=cluster_ids, storageinstance__instance_inner_role__in=inner_role_filter
+        )
+        .order_by("storageinstance_id")
+        .values_list("cluster_id", "storageinstance__machine__ip", "storageinstance__port")
+    ):
+        cluster_slaves[cluster_id].append((ip, port))
+    return cluster_slaves
+
+
+def index_checksum_logs(
+    bk_cloud_id: int, machines: List[str], start_time: datetime, end_time: datetime, log_start_time: datetime
+) -> Dict[Tuple[int, str, int], Checksum]:
+    """
+    查询一批机器近2天的校验日志，每条日志只解析一次，按 (cluster_id, ip, port) 索引为实例的校验结果
+    """
+    # 日志平台的过滤条件filter
     machine_filter = [
         {"field": "serverIp", "operator": "is one of", "value": machines},
-        {"field": "cloudId", "operator": "is", "value": cluster.bk_cloud_id},
+        {"field": "cloudId", "operator": "is", "value": bk_cloud_id},
     ]
+    checksums: Dict[Tuple[int, str, int], Checksum] = {}
+    for hit in BKLogSearch(
+        "mysql_checksum_result",
+        log_start_time,
+        end_time,
+        filters=machine_filter,
+        fields=CHECKSUM_LOG_FIELDS,
+        sort_list=[["dtEventTimeStamp", "desc"]],
+        use_admin=False,
+    ):
+        log = hit.log
+        key = (log["cluster_id"], log["ip"], log["port"])
+        checksum = checksums.get(key)
+        if checksum is None:
+            checksum = checksums[key] = Checksum(log["ip"], log["port"])
+            checksum.reported = True
+        # 日志按时间倒序返回，master端口取时间范围内最早的一条日志
+        checksum.master_port = log["master_port"]
+        log_timestamp = round(int(hit.source["dtEventTimeStamp"]) / 1000)
+        log_datetime = datetime.fromtimestamp(log_timestamp).astimezone(timezone.utc)
+        is_consistent = log["master_crc"] == log["this_crc"] and log["master_cnt"] == log["this_cnt"]
+        # 检查校验日志，数据是否一致；近1天上报的日志中数据不一致，记录到报告中
+        if (not is_consistent) and log_datetime >= start_time:
+            checksum.add_not_consistent_table(log["db"], log["tbl"])
+    return checksums
 
-    resp = BKLogApi.esquery_search(
-        {
-            "indices": "{}_bklog.mysql_checksum_result".format(env.DBA_APP_BK_BIZ_ID),
-            "start_time": datetime2str(log_start_time),
-            "end_time": datetime2str(end_time),
-            "filter": machine_filter,
-            "start": 0,
-            "size": 10000,
-            "sort_list": [["dtEventTimeStamp", "desc"]],
-        }
-    )
 
+def evaluate_cluster_checksum(
+    cluster: Cluster, slaves: List[Tuple[str, int]], checksums: Dict[Tuple[int, str, int], Checksum]
+) -> Tuple[ChecksumCheckReport, List[Checksum]]:
+    """根据索引的校验结果生成集群的校验报告(未保存)，以及校验失败的备库实例"""
     # 数据不一致的实例列表
     fail = []
     # 没有校验的实例列表
@@ -117,23 +150,8 @@ def check_cluster_checksum(cluster_id: int, start_time: datetime, end_time: date
     err_msg = ""
     status = True
     # 检查每个备库实例的校验日志
-    for instance in instances:
-        slave_ip = instance.machine.ip
-        slave_port = instance.port
-        checksum = Checksum(slave_ip, slave_port)
-        for hit in resp["hits"]["hits"]:
-            log = json.loads(hit["_source"]["log"])
-            # 过滤出本集群本实例的日志
-            if log["cluster_id"] == cluster.id:
-                if log["ip"] == slave_ip and log["port"] == slave_port:
-                    checksum.reported = True
-                    checksum.master_port = log["master_port"]
-                    log_timestamp = round(int(hit["_source"]["dtEventTimeStamp"]) / 1000)
-                    log_datetime = datetime.fromtimestamp(log_timestamp).astimezone(timezone.utc)
-                    is_consistent = log["master_crc"] == log["this_crc"] and log["master_cnt"] == log["this_cnt"]
-                    # 检查校验日志，数据是否一致；近1天上报的日志中数据不一致，记录到报告中
-                    if (not is_consistent) and log_datetime >= start_time:
-                        checksum.add_not_consistent_table(log["db"], log["tbl"])
+    for slave_ip, slave_port in slaves:
+        checksum = checksums.get((cluster.id, slave_ip, slave_port)) or Checksum(slave_ip, slave_port)
         if not checksum.reported:
             not_reported.append(checksum)
         elif len(checksum.details) > 0:
@@ -150,7 +168,7 @@ def check_cluster_checksum(cluster_id: int, start_time: datetime, end_time: date
             err_msg = err_msg + _(";近2天未校验")
     fail.extend(not_reported)
     # 集群的校验结果
-    report = ChecksumCheckReport.objects.create(
+    report = ChecksumCheckReport(
         bk_biz_id=cluster.bk_biz_id,
         bk_cloud_id=cluster.bk_cloud_id,
         cluster=cluster.immute_domain,
@@ -160,13 +178,58 @@ def check_cluster_checksum(cluster_id: int, start_time: datetime, end_time: date
         # 校验status失败的备库实例的个数
         fail_slaves=len(fail),
     )
-    for f in fail:
-        # 每个备库实例的校验结果
-        ChecksumInstance.objects.create(
-            ip=f.ip,
-            port=f.port,
-            master_ip=f.master_ip,
-            master_port=f.master_port,
-            details=f.details,
-            report=report,
+    return report, fail
+
+
+@app.task
+def check_clusters_checksum(
+    cluster_ids: List[int], start_time: datetime, end_time: datetime, log_start_time: datetime
+):
+    """批量检查一批集群的校验结果，同一云区域的集群合并查询日志"""
+    clusters = {cluster.id: cluster for cluster in Cluster.objects.filter(id__in=cluster_ids)}
+    for cluster_id in set(cluster_ids) - set(clusters):
+        # 忽略不在dbm meta信息中的集群
+        logger.error(_("无法在dbm meta中查询到集群{}的相关信息，请排查该集群的状态".format(cluster_id)))
+
+    cluster_slaves = get_slave_instances(list(clusters))
+    cloud_machines: Dict[int, set] = defaultdict(set)
+    for cluster_id, slaves in cluster_slaves.items():
+        cloud_machines[clusters[cluster_id].bk_cloud_id].update(ip for ip, _port in slaves)
+
+    checksums: Dict[Tuple[int, str, int], Checksum] = {}
+    for bk_cloud_id, machines in cloud_machines.items():
+        checksums.update(index_checksum_logs(bk_cloud_id, sorted(machines), start_time, end_time, log_start_time))
+
+    reports: List[Tuple[ChecksumCheckReport, List[Checksum]]] = [
+        evaluate_cluster_checksum(clusters[cluster_id], cluster_slaves[cluster_id], checksums)
+        for cluster_id in sorted(cluster_slaves)
+    ]
+    with transaction.atomic():
+        # 没有失败实例的报告批量写入；有失败实例的报告需要关联实例，MySQL 下 bulk_create 不会回填主键，逐个创建
+        ChecksumCheckReport.objects.bulk_create(
+            [report for report, fail in reports if not fail], batch_size=CHECKSUM_REPORT_BATCH_SIZE
         )
+        instances: List[ChecksumInstance] = []
+        for report, fail in reports:
+            if not fail:
+                continue
+            report.save()
+            instances.extend(
+                ChecksumInstance(
+                    ip=f.ip,
+                    port=f.port,
+                    master_ip=f.master_ip,
+                    master_port=f.master_port,
+                    details=f.details,
+                    report=report,
+                )
+                for f in fail
+            )
+        # 每个备库实例的校验结果
+        ChecksumInstance.objects.bulk_create(instances, batch_size=CHECKSUM_REPORT_BATCH_SIZE)
+
+
+@app.task
+def check_cluster_checksum(cluster_id: int, start_time: datetime, end_time: datetime, log_start_time: datetime):
+    """检查单个集群的校验结果，兼容已投递的任务"""
+    check_clusters_checksum([cluster_id], start_time, end_time, log_start_time)
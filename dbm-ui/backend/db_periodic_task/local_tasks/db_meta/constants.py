@@ -173,5 +173,9 @@ QUERY_TEMPLATE = {
         "heartbeat": """
         avg by (target,bk_biz_id,app,bk_cloud_id, cluster_domain, cluster_type, instance_role)
         (avg_over_time(custom:dbm_report_channel:redis_dbmon_heart_beat{{cluster_domain="{cluster_domain}"}}[1m]))""",
+        "heartbeat_domains": """
+        avg by (target,bk_biz_id,app,bk_cloud_id, cluster_domain, cluster_type, instance_role)
+        (avg_over_time(
+            custom:dbm_report_channel:redis_dbmon_heart_beat{{cluster_domain=~"{cluster_domains}"}}[1m]))""",
     },
 }
@@ -11,63 +11,45 @@ specific language governing permissions and limitations under the License.
 from django.utils.translation import ugettext as _
 
 from backend.db_meta.enums import ClusterType, InstanceInnerRole, InstanceRole, MachineType
-from backend.db_meta.models import Cluster
 from backend.db_report.enums import MetaCheckSubType
-from backend.db_report.models import MetaCheckReport
+
+from .engine import ClusterRow, MetaSnapshot, meta_check_rule, run_meta_check_rules
 
 
 def check_cluster_topo():
-    _check_tendbsingle_topo()
-    _check_tendbha_topo()
-    _check_tendbcluster_topo()
+    run_meta_check_rules([_check_tendbsingle_topo])
+
+
+def _topo_report(snapshot: MetaSnapshot, cluster: ClusterRow, messages: list):
+    if messages:
+        yield snapshot.report(MetaCheckSubType.ClusterTopo.value, ", ".join(messages), cluster=cluster)
 
 
-def _check_tendbsingle_topo():
+# 集群拓扑巡检尚未纳入每日巡检，只在显式调用 check_cluster_topo 时执行
+@meta_check_rule(cluster_types=[ClusterType.TenDBSingle.value], scheduled=False)
+def _check_tendbsingle_topo(snapshot: MetaSnapshot, cluster: ClusterRow):
     """
     有且只有一个存储实例
     """
-    for c in Cluster.objects.filter(cluster_type=ClusterType.TenDBSingle):
-        messages = []
-        if c.proxyinstance_set.exists():
-            messages.append(_("有 {} 个接入层实例".format(c.proxyinstance_set.count())))
-
-        if c.storageinstance_set.count() != 1:
-            messages.append(_("有 {} 个存储层实例".format(c.storageinstance_set.count())))
-
-        ins = c.storageinstance_set.get()
+    messages = []
+    proxies, storages = snapshot.get_cluster_proxies(cluster.id), snapshot.get_cluster_storages(cluster.id)
+    if proxies:
+        messages.append(_("有 {} 个接入层实例").format(len(proxies)))
+
+    if len(storages) != 1:
+        messages.append(_("有 {} 个存储层实例").format(len(storages)))
+    else:
+        ins = storages[0]
+        machine_type = snapshot.machines[ins.machine_id].machine_type
         if not (
-            ins.machine.machine_type == MachineType.SINGLE.value
+            machine_type == MachineType.SINGLE.value
             and ins.instance_role == InstanceRole.ORPHAN.value
             and ins.instance_inner_role == InstanceInnerRole.ORPHAN.value
         ):
             messages.append(
-                _(
-                    "实例 {} ({}-{}-{}) 与集群类型不匹配".format(
-                        ins.ip_port, ins.machine.machine_type, ins.instance_role, ins.instance_inner_role
-                    )
+                _("实例 {} ({}-{}-{}) 与集群类型不匹配").format(
+                    snapshot.ip_port(ins), machine_type, ins.instance_role, ins.instance_inner_role
                 )
             )
 
-        if messages:
-            MetaCheckReport.objects.create(
-                bk_biz_id=c.bk_biz_id,
-                bk_cloud_id=c.bk_cloud_id,
-                cluster=c.immute_domain,
-                cluster_type=ClusterType.TenDBSingle,
-                status=False,
-                msg=", ".join(messages),
-                subtype=MetaCheckSubType.ClusterTopo.value,
-            )
-
-
-def _check_tendbha_topo():
-    """
-    1. 至少 2 个 proxy
-    2. 1 个 master
-    3. 至少 1 个 slave
-    """
-    Cluster.objects.filter(cluster_type=ClusterType.TenDBHA)
-
-
-def _check_tendbcluster_topo():
-    Cluster.objects.filter(cluster_type=ClusterType.TenDBCluster)
+    return _topo_report(snapshot, cluster, messages)
@@ -8,38 +8,33 @@ Unless required by applicable law or agreed to in writing, software distributed
 an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
 specific language governing permissions and limitations under the License.
 """
+from django.utils.translation import ugettext as _
 
-from django.db.models import Count, Q, QuerySet
-from django.utils.translation import ugettext_lazy as _
-
-from backend.db_meta.models import ProxyInstance, StorageInstance
 from backend.db_report.enums import MetaCheckSubType
-from backend.db_report.models import MetaCheckReport
+
+from .engine import MetaSnapshot, meta_check_rule, run_meta_check_rules
 
 
 def check_instance_belong():
+    run_meta_check_rules([_instance_belong])
+
+
+@meta_check_rule()
+def _instance_belong(snapshot: MetaSnapshot):
     """
     所有实例都应该属于唯一一个集群
     """
-    _instance_belong(StorageInstance.objects.all())
-    _instance_belong(ProxyInstance.objects.all())
-
-
-def _instance_belong(qs: QuerySet):
-    for ins in qs.annotate(cluster_count=Count("cluster")).filter(~Q(cluster_count=1)):
-        if ins.cluster.exists():  # 大于 1 个集群
-            msg = _("{} 属于 {} 个集群".format(ins.ip_port, ins.cluster.count()))  # ToDo 详情
-        else:  # 不属于任何集群
-            msg = _("{} 不属于任何集群".format(ins.ip_port))
+    for instances, instance_cluster_ids in [
+        (snapshot.storages, snapshot.storage_cluster_ids),
+        (snapshot.proxies, snapshot.proxy_cluster_ids),
+    ]:
+        for ins in instances.values():
+            cluster_count = len(instance_cluster_ids.get(ins.id, []))
+            if cluster_count == 1:
+                continue
 
-        MetaCheckReport.objects.create(
-            bk_biz_id=ins.bk_biz_id,
-            bk_cloud_id=ins.machine.bk_cloud_id,
-            ip=ins.machine.ip,
-            port=ins.port,
-            cluster_type=ins.cluster_type,
-            machine_type=ins.machine.machine_type,
-            status=False,
-            msg=msg,
-            subtype=MetaCheckSubType.InstanceBelong.value,
-        )
+            if cluster_count:  # 大于 1 个集群
+                msg = _("{} 属于 {} 个集群").format(snapshot.ip_port(ins), cluster_count)  # ToDo 详情
+            else:  # 不属于任何集群
+                msg = _("{} 不属于任何集群").format(snapshot.ip_port(ins))
+            yield snapshot.report(MetaCheckSubType.InstanceBelong.value, msg, instance=ins)
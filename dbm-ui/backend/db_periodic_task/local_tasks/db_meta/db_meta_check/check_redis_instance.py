@@ -8,29 +8,41 @@ Unless required by applicable law or agreed to in writing, software distributed
 an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
 specific language governing permissions and limitations under the License.
 """
-
 import logging
-from collections import defaultdict
+from typing import Dict
 
-from django.core.exceptions import ObjectDoesNotExist
-from django.db.models import Q
-from django.utils.translation import ugettext_lazy as _
+from django.utils.translation import ugettext as _
 
 from backend.db_meta.enums import ClusterType, InstanceRole, InstanceStatus
-from backend.db_meta.models import Cluster
 from backend.db_report.enums import MetaCheckSubType
-from backend.db_report.models import MetaCheckReport
 from backend.ticket.constants import TicketType
-from backend.ticket.models.ticket import ClusterOperateRecord
+
+from .engine import ClusterRow, InstanceRow, MetaSnapshot, meta_check_rule, run_meta_check_rules
 
 logger = logging.getLogger("root")
 
+# 执行过禁用/删除单据的集群不检查
+IGNORE_TICKET_TYPES = [
+    TicketType.REDIS_INSTANCE_CLOSE.value,
+    TicketType.REDIS_PROXY_CLOSE.value,
+    TicketType.REDIS_DESTROY.value,
+    TicketType.REDIS_INSTANCE_DESTROY.value,
+]
+
 
 def check_redis_instance():
-    _check_redis_instance()
+    run_meta_check_rules([_check_redis_instance])
 
 
-def _check_redis_instance():
+@meta_check_rule(
+    cluster_types=[
+        ClusterType.TendisPredixyTendisplusCluster.value,
+        ClusterType.TwemproxyTendisSSDInstance.value,
+        ClusterType.TendisTwemproxyRedisInstance.value,
+        ClusterType.TendisRedisCluster.value,
+    ]
+)
+def _check_redis_instance(snapshot: MetaSnapshot, cluster: ClusterRow):
     """
     孤立实例检查 （孤立的proxy小于2个proxy，孤立的master，孤立的slave）
      ALONE_PROXY
@@ -45,136 +57,78 @@ def _check_redis_instance():
      REDIS_INSTANCE_PROXY_CLOSE = TicketEnumField("REDIS_INSTANCE_PROXY_CLOSE", _("Redis 主从集群禁用"), register_iam=False)
      REDIS_INSTANCE_DESTROY = TicketEnumField("REDIS_INSTANCE_DESTROY", _("Redis 主从集群删除"), _("集群管理"))
     """
-
-    # 构建查询条件:tendisplus,ssd,cache 三种类型一起检查,巡检0点发起
-    query = (
-        Q(cluster_type=ClusterType.TendisPredixyTendisplusCluster)
-        | Q(cluster_type=ClusterType.TwemproxyTendisSSDInstance)
-        | Q(cluster_type=ClusterType.TendisTwemproxyRedisInstance)
-        | Q(cluster_type=ClusterType.TendisRedisCluster)
-    )
-    # 遍历集群
-    for c in Cluster.objects.filter(query):
-        logger.info("meta_check: start by {}".format(c))
-        if check_ignore(c):
+    if cluster.id in snapshot.get_operated_cluster_ids(IGNORE_TICKET_TYPES):
+        logger.info("meta_check: will ignore cluster {} , 4 it has destory label".format(cluster.immute_domain))
+        return
+
+    proxies, storages = snapshot.get_cluster_proxies(cluster.id), snapshot.get_cluster_storages(cluster.id)
+    # proxy节点数不能小于2
+    if len(proxies) < 2:
+        msg = _("cluster:{} now had proxies[{}] < 2").format(cluster.immute_domain, len(proxies))
+        yield snapshot.report(MetaCheckSubType.AloneInstance.value, msg, cluster=cluster, ip="none")
+
+    # 检查master对应的slave是否缺失
+    master_slave_map: Dict[str, str] = {}
+    for master_obj in storages:
+        if master_obj.instance_role != InstanceRole.REDIS_MASTER.value:
+            continue
+        slaves = snapshot.get_receivers(master_obj.id)
+        if not slaves:
+            msg = _("集群{}的master：{} 获取slave失败").format(cluster.immute_domain, snapshot.ip_port(master_obj))
+            yield create_meta_alone_report(snapshot, cluster, master_obj, msg)
             continue
-        # proxy节点数不能小于2
-        if c.proxyinstance_set.count() < 2:
-            msg = _("cluster:{} now had proxies[{}] < 2").format(c.immute_domain, c.proxyinstance_set.count())
-            MetaCheckReport.objects.create(
-                bk_biz_id=c.bk_biz_id,
-                bk_cloud_id=c.bk_cloud_id,
-                ip="none",
-                cluster=c.immute_domain,
-                cluster_type=c.cluster_type,
-                status=False,
-                msg=msg,
-                subtype=MetaCheckSubType.AloneInstance.value,
-            )
-
-        # 检查master对应的slave是否缺失
-        master_slave_map, slave_master_map = defaultdict(), defaultdict()
-        for master_obj in c.storageinstance_set.filter(instance_role=InstanceRole.REDIS_MASTER.value):
-            try:
-                slave_obj = master_obj.as_ejector.get().receiver
-            except ObjectDoesNotExist:
-                logger.error("Error occurred while getting slave_obj")
-                msg = _("集群{}的master：{} 获取slave失败").format(c.immute_domain, master_obj)
-                create_meta_alone_report(c, master_obj, msg)
-                raise NotImplementedError(_("集群{}的master{}get slave_obj failed".format(c.immute_domain, master_obj)))
 
+        master_ip = snapshot.machines[master_obj.machine_id].ip
+        for slave_obj in slaves:
             # 集群不支持一个主多个从架构
-            ifslave = master_slave_map.get(master_obj.machine.ip)
-            if ifslave and ifslave != slave_obj.machine.ip:
-                msg = _("unsupport mutil slave with cluster {} 4:{}".format(c.immute_domain, master_obj.machine.ip))
-                create_meta_alone_report(c, master_obj, msg)
-                raise Exception(
-                    "unsupport mutil slave with cluster {} 4:{}".format(c.immute_domain, master_obj.machine.ip)
-                )
-            else:
-                master_slave_map[master_obj.machine.ip] = slave_obj.machine.ip
+            slave_ip = snapshot.machines[slave_obj.machine_id].ip
+            if master_slave_map.setdefault(master_ip, slave_ip) != slave_ip:
+                msg = _("unsupport mutil slave with cluster {} 4:{}").format(cluster.immute_domain, master_ip)
+                yield create_meta_alone_report(snapshot, cluster, master_obj, msg)
             # 没获取到对应端口
-            if master_obj.port != slave_obj.port:
-                msg = _("集群{}的master实例：{} 没有slave").format(c.immute_domain, master_obj)
-                create_meta_alone_report(c, master_obj, msg)
-
-        # 检查slave对应的master是否缺失
-        for slave_obj in c.storageinstance_set.filter(instance_role=InstanceRole.REDIS_SLAVE.value):
-            try:
-                master_obj = slave_obj.as_receiver.get().ejector
-            except ObjectDoesNotExist:
-                logger.error("Error occurred while getting master_obj")
-                msg = _("集群{}的slave：{} 获取master失败").format(c.immute_domain, slave_obj)
-                create_meta_alone_report(c, slave_obj, msg)
-                raise NotImplementedError(_("集群{}的slave{} get master_obj failed".format(c.immute_domain, slave_obj)))
+            elif master_obj.port != slave_obj.port:
+                msg = _("集群{}的master实例：{} 没有slave").format(cluster.immute_domain, snapshot.ip_port(master_obj))
+                yield create_meta_alone_report(snapshot, cluster, master_obj, msg)
+
+    # 检查slave对应的master是否缺失
+    slave_master_map: Dict[str, str] = {}
+    for slave_obj in storages:
+        if slave_obj.instance_role != InstanceRole.REDIS_SLAVE.value:
+            continue
+        masters = snapshot.get_ejectors(slave_obj.id)
+        if not masters:
+            msg = _("集群{}的slave：{} 获取master失败").format(cluster.immute_domain, snapshot.ip_port(slave_obj))
+            yield create_meta_alone_report(snapshot, cluster, slave_obj, msg)
+            continue
 
+        slave_ip = snapshot.machines[slave_obj.machine_id].ip
+        for master_obj in masters:
             # 不支持一从多主
-            ifmaster = slave_master_map.get(slave_obj.machine.ip)
-            if ifmaster and ifmaster != master_obj.machine.ip:
-                msg = _("unsupport mutil master with cluster {} 4:{}".format(c.immute_domain, slave_obj.machine.ip))
-                create_meta_alone_report(c, slave_obj, msg)
-                raise Exception(
-                    "unsupport mutil master for cluster {}:{}".format(c.immute_domain, slave_obj.machine.ip)
-                )
-            else:
-                slave_master_map[slave_obj.machine.ip] = master_obj.machine.ip
+            master_ip = snapshot.machines[master_obj.machine_id].ip
+            if slave_master_map.setdefault(slave_ip, master_ip) != master_ip:
+                msg = _("unsupport mutil master with cluster {} 4:{}").format(cluster.immute_domain, slave_ip)
+                yield create_meta_alone_report(snapshot, cluster, slave_obj, msg)
             # 没获取到对应端口
-            if slave_obj.port != master_obj.port:
-                msg = _("集群{}的slave实例：{} 没有master").format(c.immute_domain, slave_obj)
-                create_meta_alone_report(c, slave_obj, msg)
-        # 实例状态异常
-        for instance_obj in c.storageinstance_set.filter():
-            create_meta_statue_report(c, instance_obj)
-        # proxy状态异常
-        for instance_obj in c.proxyinstance_set.filter():
-            create_meta_statue_report(c, instance_obj)
-
-
-def check_ignore(cluster) -> bool:
-    ignore_tickets = [
-        TicketType.REDIS_INSTANCE_CLOSE.value,
-        TicketType.REDIS_PROXY_CLOSE.value,
-        TicketType.REDIS_DESTROY.value,
-        TicketType.REDIS_INSTANCE_CLOSE.value,
-        TicketType.REDIS_INSTANCE_DESTROY.value,
-    ]
-    if ClusterOperateRecord.objects.filter(ticket__ticket_type__in=ignore_tickets, cluster_id=cluster.id).exists():
-        logger.info("meta_check: will ignore cluster {} , 4 it has destory label".format(cluster))
-        return True
-    return False
+            elif slave_obj.port != master_obj.port:
+                msg = _("集群{}的slave实例：{} 没有master").format(cluster.immute_domain, snapshot.ip_port(slave_obj))
+                yield create_meta_alone_report(snapshot, cluster, slave_obj, msg)
 
+    # 实例状态异常
+    for instance_obj in [*storages, *proxies]:
+        if instance_obj.status != InstanceStatus.RUNNING:
+            yield create_meta_statue_report(snapshot, cluster, instance_obj)
 
-def create_meta_statue_report(c, instance_obj):
+
+def create_meta_statue_report(snapshot: MetaSnapshot, cluster: ClusterRow, instance_obj: InstanceRow):
     """
-    实例状态不为running的写入表中
+    实例状态不为running的巡检报告
     """
-    if instance_obj.status != InstanceStatus.RUNNING:
-        msg = _("集群{}的实例:{}实例状态异常:{}").format(c.immute_domain, instance_obj.ip_port, instance_obj.status)
-        MetaCheckReport.objects.create(
-            bk_biz_id=c.bk_biz_id,
-            bk_cloud_id=c.bk_cloud_id,
-            ip=instance_obj.machine.ip,
-            port=instance_obj.port,
-            cluster=c.immute_domain,
-            cluster_type=c.cluster_type,
-            status=False,
-            msg=msg,
-            subtype=MetaCheckSubType.StatusAbnormal.value,
-        )
-
-
-def create_meta_alone_report(c, instance_obj, msg):
+    msg = _("集群{}的实例:{}实例状态异常:{}").format(cluster.immute_domain, snapshot.ip_port(instance_obj), instance_obj.status)
+    return snapshot.report(MetaCheckSubType.StatusAbnormal.value, msg, cluster=cluster, instance=instance_obj)
+
+
+def create_meta_alone_report(snapshot: MetaSnapshot, cluster: ClusterRow, instance_obj: InstanceRow, msg: str):
     """
-    孤立实例写入表中
+    孤立实例的巡检报告
     """
-    MetaCheckReport.objects.create(
-        bk_biz_id=c.bk_biz_id,
-        bk_cloud_id=c.bk_cloud_id,
-        ip=instance_obj.machine.ip,
-        port=instance_obj.port,
-        cluster=c.immute_domain,
-        cluster_type=c.cluster_type,
-        status=False,
-        msg=msg,
-        subtype=MetaCheckSubType.AloneInstance.value,
-    )
+    return snapshot.report(MetaCheckSubType.AloneInstance.value, msg, cluster=cluster, instance=instance_obj)
@@ -8,56 +8,40 @@ Unless required by applicable law or agreed to in writing, software distributed
 an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
 specific language governing permissions and limitations under the License.
 """
-from django.core.exceptions import ObjectDoesNotExist
-from django.utils.translation import ugettext_lazy as _
+from django.utils.translation import ugettext as _
 
 from backend.db_meta.enums import InstanceInnerRole
-from backend.db_meta.models import StorageInstanceTuple
 from backend.db_report.enums import MetaCheckSubType
-from backend.db_report.models import MetaCheckReport
+
+from .engine import MetaSnapshot, meta_check_rule, run_meta_check_rules
 
 
 def check_replicate_role():
+    run_meta_check_rules([_check_replicate_role])
+
+
+@meta_check_rule()
+def _check_replicate_role(snapshot: MetaSnapshot):
     """
     ejector 只能是 master, repeater; 即不能是 slave
     receiver 只能是 slave, repeater; 即不能是 master
     """
-    for bad_ejector_tuple in StorageInstanceTuple.objects.filter(
-        ejector__instance_inner_role=InstanceInnerRole.SLAVE.value
-    ):
-        ejector = bad_ejector_tuple.ejector
-        try:
-            MetaCheckReport.objects.create(
-                bk_biz_id=ejector.bk_biz_id,
-                bk_cloud_id=ejector.machine.bk_cloud_id,
-                ip=ejector.machine.ip,
-                port=ejector.port,
-                cluster=ejector.cluster.get().immute_domain,
-                cluster_type=ejector.cluster_type,
-                machine_type=ejector.machine.machine_type,
-                status=False,
-                msg=_("{} {} 不能作为同步 ejector".format(ejector.ip_port, ejector.instance_inner_role)),
-                subtype=MetaCheckSubType.ReplicateRole.value,
-            )
-        except ObjectDoesNotExist:  # 忽略实例没有集群关系的异常, instance-belong 会发现这个错误
-            pass
-
-    for bad_receiver_tuple in StorageInstanceTuple.objects.filter(
-        receiver__instance_inner_role=InstanceInnerRole.MASTER.value
-    ):
-        receiver = bad_receiver_tuple.ejector
-        try:
-            MetaCheckReport.objects.create(
-                bk_biz_id=receiver.bk_biz_id,
-                bk_cloud_id=receiver.machine.bk_cloud_id,
-                ip=receiver.machine.ip,
-                port=receiver.port,
-                cluster=receiver.cluster.get().immute_domain,
-                cluster_type=receiver.cluster_type,
-                machine_type=receiver.machine.machine_type,
-                status=False,
-                msg=_("{} {} 不能作为同步 receiver".format(receiver.ip_port, receiver.instance_inner_role)),
-                subtype=MetaCheckSubType.ReplicateRole.value,
+    for ejector_id, receiver_id in snapshot.tuples:
+        for ins, bad_role, msg in [
+            (snapshot.storages[ejector_id], InstanceInnerRole.SLAVE.value, _("{} {} 不能作为同步 ejector")),
+            (snapshot.storages[receiver_id], InstanceInnerRole.MASTER.value, _("{} {} 不能作为同步 receiver")),
+        ]:
+            if ins.instance_inner_role != bad_role:
+                continue
+
+            cluster = snapshot.get_storage_cluster(ins.id)
+            # 忽略实例没有集群关系的异常, instance-belong 会发现这个错误
+            if not cluster:
+                continue
+
+            yield snapshot.report(
+                MetaCheckSubType.ReplicateRole.value,
+                msg.format(snapshot.ip_port(ins), ins.instance_inner_role),
+                instance=ins,
+                cluster=cluster,
             )
-        except ObjectDoesNotExist:  # 忽略实例没有集群关系的异常, instance-belong 会发现这个错误
-            pass
@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import logging
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from backend.db_meta.models import Cluster, Machine, ProxyInstance, StorageInstance, StorageInstanceTuple
+from backend.db_report.models import MetaCheckReport
+from backend.ticket.models.ticket import ClusterOperateRecord
+
+logger = logging.getLogger("celery")
+
+"""
+元数据巡检规则引擎
+
+MetaSnapshot 一次性加载集群、实例、机器、主从元组、访问入口到内存中的精简表，查询次数与对象数量无关
+巡检规则通过 meta_check_rule 声明:
+- 指定 cluster_types 的为集群规则，规则函数为 rule(snapshot, cluster)，对每个该类型的集群执行一次
+- 未指定 cluster_types 的为全局规则，规则函数为 rule(snapshot)，执行一次
+规则函数返回(或 yield)巡检报告，所有规则执行完后批量写入
+"""
+
+# 批量写入巡检报告的批次大小
+META_CHECK_REPORT_BATCH_SIZE = 1000
+
+
+class ClusterRow(NamedTuple):
+    id: int
+    bk_biz_id: int
+    bk_cloud_id: int
+    immute_domain: str
+    cluster_type: str
+
+
+class MachineRow(NamedTuple):
+    ip: str
+    bk_cloud_id: int
+    machine_type: str
+
+
+class InstanceRow(NamedTuple):
+    id: int
+    bk_biz_id: int
+    machine_id: int
+    port: int
+    status: str
+    cluster_type: str
+    # 接入层实例没有实例角色
+    instance_role: str = ""
+    instance_inner_role: str = ""
+
+
+class MetaSnapshot(object):
+    """元数据快照，实例行中只保留巡检需要的字段"""
+
+    def __init__(self):
+        self.clusters: Dict[int, ClusterRow] = {}
+        self.machines: Dict[int, MachineRow] = {}
+        self.storages: Dict[int, InstanceRow] = {}
+        self.proxies: Dict[int, InstanceRow] = {}
+        # 集群与实例的双向关系
+        self.cluster_storage_ids: Dict[int, List[int]] = defaultdict(list)
+        self.cluster_proxy_ids: Dict[int, List[int]] = defaultdict(list)
+        self.storage_cluster_ids: Dict[int, List[int]] = defaultdict(list)
+        self.proxy_cluster_ids: Dict[int, List[int]] = defaultdict(list)
+        # 主从元组 (ejector_id, receiver_id)
+        self.tuples: List[Tuple[int, int]] = []
+        self.receiver_ids: Dict[int, List[int]] = defaultdict(list)
+        self.ejector_ids: Dict[int, List[int]] = defaultdict(list)
+        self._operated_cluster_ids: Dict[Tuple[str, ...], Set[int]] = {}
+
+    @classmethod
+    def load(cls) -> "MetaSnapshot":
+        snapshot = cls()
+        snapshot.clusters = {
+            row[0]: ClusterRow(*row)
+            for row in Cluster.objects.values_list("id", "bk_biz_id", "bk_cloud_id", "immute_domain", "cluster_type")
+        }
+        snapshot.machines = {
+            row[0]: MachineRow(*row[1:])
+            for row in Machine.objects.values_list("bk_host_id", "ip", "bk_cloud_id", "machine_type")
+        }
+
+        instance_fields = ["id", "bk_biz_id", "machine_id", "port", "status", "cluster_type"]
+        storage_fields = [*instance_fields, "instance_role", "instance_inner_role"]
+        snapshot.storages = {
+            row[0]: InstanceRow(*row) for row in StorageInstance.objects.values_list(*storage_fields).iterator()
+        }
+        snapshot.proxies = {
+            row[0]: InstanceRow(*row) for row in ProxyInstance.objects.values_list(*instance_fields).iterator()
+        }
+
+        for storage_id, cluster_id in StorageInstance.cluster.through.objects.values_list(
+            "storageinstance_id", "cluster_id"
+        ).iterator():
+            snapshot.cluster_storage_ids[cluster_id].append(storage_id)
+            snapshot.storage_cluster_ids[storage_id].append(cluster_id)
+        for proxy_id, cluster_id in ProxyInstance.cluster.through.objects.values_list(
+            "proxyinstance_id", "cluster_id"
+        ).iterator():
+            snapshot.cluster_proxy_ids[cluster_id].append(proxy_id)
+            snapshot.proxy_cluster_ids[proxy_id].append(cluster_id)
+
+        snapshot.tuples = list(StorageInstanceTuple.objects.values_list("ejector_id", "receiver_id").iterator())
+        for ejector_id, receiver_id in snapshot.tuples:
+            snapshot.receiver_ids[ejector_id].append(receiver_id)
+            snapshot.ejector_ids[receiver_id].append(ejector_id)
+        return snapshot
+
+    def get_cluster_storages(self, cluster_id: int) -> List[InstanceRow]:
+        return [self.storages[storage_id] for storage_id in self.cluster_storage_ids.get(cluster_id, [])]
+
+    def get_cluster_proxies(self, cluster_id: int) -> List[InstanceRow]:
+        return [self.proxies[proxy_id] for proxy_id in self.cluster_proxy_ids.get(cluster_id, [])]
+
+    def get_receivers(self, storage_id: int) -> List[InstanceRow]:
+        return [self.storages[receiver_id] for receiver_id in self.receiver_ids.get(storage_id, [])]
+
+    def get_ejectors(self, storage_id: int) -> List[InstanceRow]:
+        return [self.storages[ejector_id] for ejector_id in self.ejector_ids.get(storage_id, [])]
+
+    def get_storage_cluster(self, storage_id: int) -> Optional[ClusterRow]:
+        """获取存储实例所属的唯一集群，不属于或属于多个集群时返回 None"""
+        cluster_ids = self.storage_cluster_ids.get(storage_id, [])
+        return self.clusters.get(cluster_ids[0]) if len(cluster_ids) == 1 else None
+
+    def ip_port(self, instance: InstanceRow) -> str:
+        return f"{self.machines[instance.machine_id].ip}:{instance.port}"
+
+    def get_operated_cluster_ids(self, ticket_types: Iterable[str]) -> Set[int]:
+        """获取执行过指定单据的集群，同一组单据类型只查询一次"""
+        key = tuple(sorted(set(ticket_types)))
+        if key not in self._operated_cluster_ids:
+            self._operated_cluster_ids[key] = set(
+                ClusterOperateRecord.objects.filter(ticket__ticket_type__in=key).values_list("cluster_id", flat=True)
+            )
+        return self._operated_cluster_ids[key]
+
+    def report(
+        self, subtype: str, msg: str, cluster: ClusterRow = None, instance: InstanceRow = None, **kwargs
+    ) -> MetaCheckReport:
+        """构造巡检报告，优先使用集群的业务和云区域信息"""
+        fields = {"status": False, "msg": msg, "subtype": subtype}
+        if instance:
+            machine = self.machines[instance.machine_id]
+            fields.update(
+                bk_biz_id=instance.bk_biz_id,
+                bk_cloud_id=machine.bk_cloud_id,
+                ip=machine.ip,
+                port=instance.port,
+                cluster_type=instance.cluster_type,
+                machine_type=machine.machine_type,
+            )
+        if cluster:
+            fields.update(
+                bk_biz_id=cluster.bk_biz_id,
+                bk_cloud_id=cluster.bk_cloud_id,
+                cluster=cluster.immute_domain,
+                cluster_type=cluster.cluster_type,
+            )
+        fields.update(kwargs)
+        return MetaCheckReport(**fields)
+
+
+class MetaCheckRuleError(Exception):
+    """巡检规则执行失败，报告写入后抛出，避免失败的规则被静默忽略"""
+
+
+@dataclass
+class MetaCheckRule:
+    name: str
+    func: Callable
+    cluster_types: Optional[List[str]] = None
+    # 是否在每日巡检中执行，为 False 时只能显式指定执行
+    scheduled: bool = True
+
+
+# 已注册的巡检规则，按注册顺序执行
+META_CHECK_RULES: Dict[str, MetaCheckRule] = {}
+
+
+def meta_check_rule(cluster_types: Optional[List[str]] = None, scheduled: bool = True):
+    """注册巡检规则，cluster_types 为空时为全局规则，scheduled 为 False 的规则不在每日巡检中执行"""
+
+    def decorator(func: Callable) -> Callable:
+        name = f"{func.__module__.rsplit('.', 1)[-1]}.{func.__name__}"
+        META_CHECK_RULES[name] = MetaCheckRule(name=name, func=func, cluster_types=cluster_types, scheduled=scheduled)
+        return func
+
+    return decorator
+
+
+def evaluate_meta_check_rules(
+    snapshot: MetaSnapshot, rules: Iterable[MetaCheckRule]
+) -> Tuple[List[MetaCheckReport], List[str]]:
+    """
+    在快照上执行巡检规则，单个集群/规则的异常不影响其他规则
+    @return: (巡检报告, 执行失败的规则及原因)
+    """
+    clusters_by_type: Dict[str, List[ClusterRow]] = defaultdict(list)
+    for cluster in snapshot.clusters.values():
+        clusters_by_type[cluster.cluster_type].append(cluster)
+
+    reports: List[MetaCheckReport] = []
+    errors: List[str] = []
+    for rule in rules:
+        if rule.cluster_types is None:
+            try:
+                reports.extend(rule.func(snapshot) or [])
+            except Exception as e:  # pylint: disable=broad-except
+                logger.exception("meta_check: rule %s failed: %s", rule.name, e)
+                errors.append(f"{rule.name}: {e}")
+            continue
+
+        for cluster_type in rule.cluster_types:
+            for cluster in clusters_by_type[cluster_type]:
+                try:
+                    reports.extend(rule.func(snapshot, cluster) or [])
+                except Exception as e:  # pylint: disable=broad-except
+                    logger.exception("meta_check: rule %s failed on %s: %s", rule.name, cluster.immute_domain, e)
+                    errors.append(f"{rule.name}({cluster.immute_domain}): {e}")
+    return reports, errors
+
+
+def run_meta_check_rules(rule_funcs: Optional[List[Callable]] = None) -> int:
+    """
+    加载元数据快照，执行巡检规则并批量写入巡检报告，返回报告数量
+    有规则执行失败时，其他规则的报告正常写入，最后抛出 MetaCheckRuleError
+    @param rule_funcs: 需要执行的规则函数，为空时执行所有每日巡检的规则
+    """
+    rules = list(META_CHECK_RULES.values())
+    if rule_funcs is not None:
+        rules = [rule for rule in rules if rule.func in rule_funcs]
+    else:
+        rules = [rule for rule in rules if rule.scheduled]
+
+    snapshot = MetaSnapshot.load()
+    reports, errors = evaluate_meta_check_rules(snapshot, rules)
+    MetaCheckReport.objects.bulk_create(reports, batch_size=META_CHECK_REPORT_BATCH_SIZE)
+    logger.info(
+        "meta_check: %s rules on %s clusters, %s storages, %s proxies, %s reports",
+        len(rules),
+        len(snapshot.clusters),
+        len(snapshot.storages),
+        len(snapshot.proxies),
+        len(reports),
+    )
+    if errors:
+        raise MetaCheckRuleError(f"meta_check: {len(errors)} rule errors: {'; '.join(errors[:10])}")
+    return len(reports)
@@ -14,9 +14,9 @@ from celery.schedules import crontab
 
 from backend.db_periodic_task.local_tasks.register import register_periodic_task
 
-from .check_instance_belong import check_instance_belong
-from .check_redis_instance import check_redis_instance
-from .check_replicate_role import check_replicate_role
+# 导入各巡检模块以注册巡检规则
+from . import check_cluster_topo, check_instance_belong, check_redis_instance, check_replicate_role  # noqa
+from .engine import run_meta_check_rules
 
 logger = logging.getLogger("celery")
 
@@ -24,8 +24,6 @@ logger = logging.getLogger("celery")
 @register_periodic_task(run_every=crontab(minute=3, hour=2))
 def db_meta_check_task():
     """
-    巡检校验元数据
+    巡检校验元数据，一次加载元数据快照执行所有巡检规则
     """
-    check_redis_instance()
-    check_instance_belong()
-    check_replicate_role()
+    run_meta_check_rules()
@@ -9,13 +9,18 @@ an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express o
 specific language governing permissions and limitations under the License.
 """
 import datetime
+import hashlib
 import json
 import logging
 import os
+from collections import defaultdict
+from typing import Dict, Optional, Tuple
 
 from blueapps.core.celery.celery import app
 from celery.schedules import crontab
 from django.core.cache import cache
+from django.db import connections
+from django.db.models import Count, Max
 from django.utils import timezone
 
 from backend import env
@@ -27,9 +32,22 @@ from backend.db_monitor.models import CollectInstance, DispatchGroup, MonitorPol
 from backend.db_monitor.tasks import update_app_policy
 from backend.db_periodic_task.local_tasks.register import register_periodic_task
 from backend.db_periodic_task.utils import TimeUnit, calculate_countdown
+from backend.utils.batch_request import request_multi_thread
 
 logger = logging.getLogger("celery")
 
+# 平台告警策略模板的同步清单: {模板相对路径: {"hash": 内容摘要, "key": 策略唯一标识, "version": 版本, "deleted": 是否删除}}
+PLAT_POLICY_MANIFEST_CACHE_KEY = "sync_plat_monitor_policy_manifest"
+# 自定义策略的告警组同步指纹: {"业务ID:db类型": 指纹}
+CUSTOM_POLICY_FINGERPRINT_CACHE_KEY = "sync_custom_monitor_policy_fingerprints"
+
+
+class PlatPolicySyncResult:
+    SYNCED = "synced"
+    SKIPPED = "skipped"
+    DELETED = "deleted"
+    FAILED = "failed"
+
 
 @register_periodic_task(run_every=crontab(hour="*/6", minute="0"))
 def update_local_notice_group():
@@ -71,86 +89,180 @@ def update_dba_notice_group(dba_id: int):
         logger.exception("[local_notice_group] update_or_create notice group error: %s", e)
 
 
+def load_plat_policy_template(tpl_path: str, content: bytes) -> Optional[Tuple[MonitorPolicy, bool]]:
+    """解析平台告警策略模板，返回 (策略, 是否已删除)，模板不合法时返回 None"""
+    try:
+        template_dict = json.loads(content)
+        # 监控API不支持传入额外的字段
+        template_dict.pop("export_at", "")
+        policy_name = template_dict["name"]
+    except json.decoder.JSONDecodeError:
+        logger.error("[sync_plat_monitor_policy] load template failed: %s", tpl_path)
+        return None
+
+    deleted = template_dict.pop("deleted", False)
+
+    if not template_dict.get("details"):
+        logger.error(("[sync_plat_monitor_policy] template %s has no details" % tpl_path))
+        return None
+
+    # patch template
+    template_dict["details"]["labels"] = list(set(template_dict["details"]["labels"]))
+    template_dict["details"]["name"] = policy_name
+    template_dict["details"]["priority"] = TargetPriority.PLATFORM.value
+    # 平台策略仅开启基于分派通知
+    template_dict["details"]["notice"]["options"]["assign_mode"] = ["by_rule"]
+
+    return MonitorPolicy(**template_dict), deleted
+
+
+def sync_plat_policy(policy: MonitorPolicy, deleted: bool, synced_policy: Optional[MonitorPolicy]) -> str:
+    """同步单个平台告警策略到本地和监控，返回同步结果"""
+    policy_name = policy.name
+    logger.info("[sync_plat_monitor_policy] start sync bkm alarm policy: %s " % policy_name)
+    if deleted and not synced_policy:
+        # 已删除的模板无需再创建策略
+        return PlatPolicySyncResult.SKIPPED
+
+    if synced_policy:
+        if deleted:
+            logger.info("[sync_plat_monitor_policy] delete old alarm: %s " % policy_name)
+            try:
+                synced_policy.delete()
+            except Exception as e:  # pylint: disable=broad-except
+                logger.exception("[sync_plat_monitor_policy] delete bkm alarm policy error: %s, %s ", policy_name, e)
+                return PlatPolicySyncResult.FAILED
+            return PlatPolicySyncResult.DELETED
+
+        if synced_policy.version >= policy.version:
+            logger.info("[sync_plat_monitor_policy] skip same version alarm: %s " % policy_name)
+            return PlatPolicySyncResult.SKIPPED
+
+        for keeped_field in MonitorPolicy.KEEPED_FIELDS:
+            setattr(policy, keeped_field, getattr(synced_policy, keeped_field))
+
+        policy.details["id"] = synced_policy.monitor_policy_id
+        logger.info("[sync_plat_monitor_policy] update bkm alarm policy: %s " % policy_name)
+    else:
+        logger.info("[sync_plat_monitor_policy] create bkm alarm policy: %s " % policy_name)
+
+    try:
+        # fetch targets/test_rules/notify_rules/notify_groups from parent details
+        for attr, value in policy.parse_details().items():
+            setattr(policy, attr, value)
+
+        policy.save()
+        logger.info("[sync_plat_monitor_policy] save bkm alarm policy success: %s", policy_name)
+        return PlatPolicySyncResult.SYNCED
+    except BkMonitorSaveAlarmException as e:
+        logger.error("[sync_plat_monitor_policy] save bkm alarm policy failed: %s, %s ", policy_name, e)
+        return PlatPolicySyncResult.FAILED
+    except Exception as e:  # pylint: disable=broad-except
+        # 并发同步时单个策略的异常不影响其他策略
+        logger.exception("[sync_plat_monitor_policy] sync bkm alarm policy error: %s, %s ", policy_name, e)
+        return PlatPolicySyncResult.FAILED
+
+
+def sync_plat_policy_in_thread(policy: MonitorPolicy, deleted: bool, synced_policy: Optional[MonitorPolicy]) -> str:
+    try:
+        return sync_plat_policy(policy, deleted, synced_policy)
+    finally:
+        # 工作线程的数据库连接不会随任务结束关闭，这里主动关闭，避免连接在常驻的 celery worker 中堆积
+        connections.close_all()
+
+
+def is_plat_policy_synced(manifest_entry: Dict, synced_policies: Dict[Tuple, MonitorPolicy]) -> bool:
+    """模板内容未变化时，已同步的策略仍与上次同步的结果一致，则无需重新解析和下发"""
+    if manifest_entry.get("invalid"):
+        return True
+    synced_policy = synced_policies.get(tuple(manifest_entry["key"]))
+    if manifest_entry["deleted"]:
+        return synced_policy is None
+    return synced_policy is not None and synced_policy.version >= manifest_entry["version"]
+
+
 @register_periodic_task(run_every=crontab(minute="*/5"))
-def sync_plat_monitor_policy():
-    """同步平台告警策略"""
+def sync_plat_monitor_policy(force: bool = False):
+    """
+    同步平台告警策略
+    通过模板内容摘要清单跳过未变化的模板，清单丢失或 force=True 时全量同步，全量同步也会按策略版本跳过下发
+    """
     skip_dir = "v1"
     now = datetime.datetime.now(timezone.utc)
     logger.warning("[sync_plat_monitor_policy] sync bkm alarm policy start: %s", now)
 
-    # 逐个json导入，本地+远程
-    updated_policies = 0
+    # 读取模板内容并计算摘要，读取文件的开销远小于解析和下发
+    tpl_contents: Dict[str, bytes] = {}
     for root, dirs, files in os.walk(TPLS_ALARM_DIR):
         if skip_dir in dirs:
             dirs.remove(skip_dir)
-
         for alarm_tpl in files:
-            with open(os.path.join(root, alarm_tpl), "r", encoding="utf-8") as f:
-                logger.info("[sync_plat_monitor_policy] start sync bkm alarm tpl: %s " % alarm_tpl)
-                try:
-                    template_dict = json.loads(f.read())
-                    # 监控API不支持传入额外的字段
-                    template_dict.pop("export_at", "")
-                    policy_name = template_dict["name"]
-                except json.decoder.JSONDecodeError:
-                    logger.error("[sync_plat_monitor_policy] load template failed: %s", alarm_tpl)
-                    continue
-
-                deleted = template_dict.pop("deleted", False)
-
-                if not template_dict.get("details"):
-                    logger.error(("[sync_plat_monitor_policy] template %s has no details" % alarm_tpl))
-                    continue
-
-                # patch template
-                template_dict["details"]["labels"] = list(set(template_dict["details"]["labels"]))
-                template_dict["details"]["name"] = policy_name
-                template_dict["details"]["priority"] = TargetPriority.PLATFORM.value
-                # 平台策略仅开启基于分派通知
-                template_dict["details"]["notice"]["options"]["assign_mode"] = ["by_rule"]
-
-                policy = MonitorPolicy(**template_dict)
-
-            policy_name = policy.name
-            logger.info("[sync_plat_monitor_policy] start sync bkm alarm policy: %s " % policy_name)
-            try:
-                synced_policy = MonitorPolicy.objects.get(
-                    bk_biz_id=policy.bk_biz_id, db_type=policy.db_type, name=policy_name
-                )
-
-                if deleted:
-                    logger.info("[sync_plat_monitor_policy] delete old alarm: %s " % policy_name)
-                    synced_policy.delete()
-                    continue
-
-                if synced_policy.version >= policy.version:
-                    logger.info("[sync_plat_monitor_policy] skip same version alarm: %s " % policy_name)
-                    continue
-
-                for keeped_field in MonitorPolicy.KEEPED_FIELDS:
-                    setattr(policy, keeped_field, getattr(synced_policy, keeped_field))
-
-                policy.details["id"] = synced_policy.monitor_policy_id
-                logger.info("[sync_plat_monitor_policy] update bkm alarm policy: %s " % policy_name)
-            except MonitorPolicy.DoesNotExist:
-                logger.info("[sync_plat_monitor_policy] create bkm alarm policy: %s " % policy_name)
-
-            try:
-                # fetch targets/test_rules/notify_rules/notify_groups from parent details
-                for attr, value in policy.parse_details().items():
-                    setattr(policy, attr, value)
-
-                policy.save()
-                updated_policies += 1
-                logger.error("[sync_plat_monitor_policy] save bkm alarm policy success: %s", policy_name)
-            except BkMonitorSaveAlarmException as e:
-                logger.error("[sync_plat_monitor_policy] save bkm alarm policy failed: %s, %s ", policy_name, e)
+            tpl_path = os.path.join(root, alarm_tpl)
+            with open(tpl_path, "rb") as f:
+                tpl_contents[os.path.relpath(tpl_path, TPLS_ALARM_DIR)] = f.read()
+    tpl_hashes = {tpl_path: hashlib.md5(content).hexdigest() for tpl_path, content in tpl_contents.items()}
+
+    # 内容变化的模板需要重新解析
+    manifest: Dict[str, Dict] = {} if force else cache.get(PLAT_POLICY_MANIFEST_CACHE_KEY) or {}
+    unchanged_tpls = [path for path, tpl_hash in tpl_hashes.items() if manifest.get(path, {}).get("hash") == tpl_hash]
+    parsed_tpls: Dict[str, Optional[Tuple[MonitorPolicy, bool]]] = {
+        path: load_plat_policy_template(path, tpl_contents[path]) for path in tpl_hashes if path not in unchanged_tpls
+    }
+
+    # 一次查询获取所有模板对应的已同步策略
+    policy_names = [parsed[0].name for parsed in parsed_tpls.values() if parsed] + [
+        manifest[path]["key"][2] for path in unchanged_tpls if not manifest[path].get("invalid")
+    ]
+    synced_policies = {
+        (policy.bk_biz_id, policy.db_type, policy.name): policy
+        for policy in MonitorPolicy.objects.filter(name__in=policy_names)
+    }
+
+    # 内容未变化，但已同步的策略被修改或删除的模板，也需要重新同步
+    new_manifest: Dict[str, Dict] = {}
+    for path in unchanged_tpls:
+        if is_plat_policy_synced(manifest[path], synced_policies):
+            new_manifest[path] = manifest[path]
+        else:
+            parsed_tpls[path] = load_plat_policy_template(path, tpl_contents[path])
+    skipped_count = len(new_manifest)
+
+    # 逐个模板同步，下发监控的操作并发执行
+    tpl_paths, params_list = [], []
+    for path, parsed in parsed_tpls.items():
+        if not parsed:
+            new_manifest[path] = {"hash": tpl_hashes[path], "invalid": True}
+            continue
+        policy, deleted = parsed
+        key = (policy.bk_biz_id, policy.db_type, policy.name)
+        tpl_paths.append(path)
+        params_list.append({"policy": policy, "deleted": deleted, "synced_policy": synced_policies.get(key)})
+    results = request_multi_thread(sync_plat_policy_in_thread, params_list, get_data=lambda x: x, in_order=True)
+
+    sync_counts: Dict[str, int] = defaultdict(int)
+    for path, (params, result) in zip(tpl_paths, results):
+        sync_counts[result] += 1
+        # 同步失败的模板不记录到清单中，下次重试
+        if result == PlatPolicySyncResult.FAILED:
+            continue
+        policy = params["policy"]
+        new_manifest[path] = {
+            "hash": tpl_hashes[path],
+            "key": [policy.bk_biz_id, policy.db_type, policy.name],
+            "version": policy.version,
+            "deleted": params["deleted"],
+        }
+    cache.set(PLAT_POLICY_MANIFEST_CACHE_KEY, new_manifest, None)
 
     logger.warning(
-        "[sync_plat_monitor_policy] finish sync bkm alarm policy end: %s, update_cnt: %s",
+        "[sync_plat_monitor_policy] finish sync bkm alarm policy end: %s, update_cnt: %s, "
+        "unchanged_tpl_cnt: %s, sync_counts: %s",
         datetime.datetime.now(timezone.utc) - now,
-        updated_policies,
+        sync_counts[PlatPolicySyncResult.SYNCED],
+        skipped_count,
+        dict(sync_counts),
     )
+    return {"unchanged": skipped_count, **sync_counts}
 
 
 @register_periodic_task(run_every=crontab(minute="*/5"))
@@ -178,28 +290,71 @@ def sync_plat_dispatch_policy():
             dispatch_group.save()
 
 
+def get_custom_policy_fingerprints(bk_biz_id: int = None, db_type: str = None) -> Dict[Tuple, str]:
+    """
+    计算各业务各db类型自定义策略的指纹: 策略数量、最大ID、最近修改时间
+    策略通过 save 修改时会刷新 update_at，指纹不变说明上次同步后策略未被修改
+    """
+    policies = MonitorPolicy.objects.exclude(bk_biz_id=PLAT_BIZ_ID)
+    if bk_biz_id is not None:
+        policies = policies.filter(bk_biz_id=bk_biz_id, db_type=db_type)
+    return {
+        (row["bk_biz_id"], row["db_type"]): f"{row['count']}-{row['max_id']}-{row['max_update_at']}"
+        for row in policies.values("bk_biz_id", "db_type")
+        .order_by()
+        .annotate(count=Count("id"), max_id=Max("id"), max_update_at=Max("update_at"))
+    }
+
+
 @register_periodic_task(run_every=crontab(minute="*/5"))
 def sync_custom_monitor_policy():
     """同步自定义监控策略的告警组设置
-    1. 提取各业务各db类型的最新"业务dba"告警组
-    2. 逐个业务逐个db类型比对:
+    1. 一次性提取各业务各db类型的最新"业务dba"告警组
+    2. 逐个业务逐个db类型比对告警组和策略指纹，与上次同步时一致则跳过，否则更新告警组发生变化的策略
     """
 
     logger.info("sync_custom_monitor_policy started")
-    cloned_policies = MonitorPolicy.objects.exclude(bk_biz_id=PLAT_BIZ_ID)
-    bk_biz_ids = cloned_policies.values_list("bk_biz_id", flat=True).distinct()
-
-    for bk_biz_id in bk_biz_ids:
-        plat_groups = NoticeGroup.get_groups(PLAT_BIZ_ID, id_name="id")
-        expected_groups = NoticeGroup.get_groups(bk_biz_id, id_name="id")
-
-        # 逐个db类型更新
-        for db_type in cloned_policies.filter(bk_biz_id=bk_biz_id).values_list("db_type", flat=True).distinct():
-            plat_group = plat_groups.get(db_type)
-            expected_group = expected_groups.get(db_type, plat_group)
-
-            logger.info("sync_custom_monitor_policy: %s, %s, %s", bk_biz_id, expected_group, db_type)
+    # {bk_biz_id: {db_type: group_id}}
+    biz_groups: Dict[int, Dict[str, int]] = defaultdict(dict)
+    for bk_biz_id, db_type, group_id in NoticeGroup.objects.filter(is_built_in=True).values_list(
+        "bk_biz_id", "db_type", "id"
+    ):
+        biz_groups[bk_biz_id][db_type] = group_id
+    plat_groups = biz_groups[PLAT_BIZ_ID]
+
+    # {"业务ID:db类型": "期望告警组:平台告警组:策略指纹"}
+    synced_fingerprints: Dict[str, str] = cache.get(CUSTOM_POLICY_FINGERPRINT_CACHE_KEY) or {}
+    fingerprints: Dict[str, str] = {}
+    updated_count = 0
+    for (bk_biz_id, db_type), policy_fingerprint in get_custom_policy_fingerprints().items():
+        plat_group = plat_groups.get(db_type)
+        expected_group = biz_groups[bk_biz_id].get(db_type, plat_group)
+        key = f"{bk_biz_id}:{db_type}"
+        fingerprints[key] = f"{expected_group}:{plat_group}:{policy_fingerprint}"
+        if synced_fingerprints.get(key) == fingerprints[key]:
+            continue
+
+        logger.info("sync_custom_monitor_policy: %s, %s, %s", bk_biz_id, expected_group, db_type)
+        try:
             update_app_policy(bk_biz_id, expected_group, db_type)
+        except Exception as e:  # pylint: disable=broad-except
+            # 更新失败不记录指纹，下次重试
+            logger.exception("sync_custom_monitor_policy failed: %s, %s, %s", bk_biz_id, db_type, e)
+            fingerprints.pop(key)
+            continue
+
+        # 更新策略后刷新指纹，避免下次同步重复比对
+        policy_fingerprint = get_custom_policy_fingerprints(bk_biz_id, db_type).get((bk_biz_id, db_type))
+        fingerprints[key] = f"{expected_group}:{plat_group}:{policy_fingerprint}"
+        updated_count += 1
+
+    cache.set(CUSTOM_POLICY_FINGERPRINT_CACHE_KEY, fingerprints, None)
+    logger.info(
+        "sync_custom_monitor_policy finished, updated: %s, unchanged: %s",
+        updated_count,
+        len(fingerprints) - updated_count,
+    )
+    return updated_count
 
 
 @register_periodic_task(run_every=crontab(minute="*/5"))
@@ -11,6 +11,7 @@ specific language governing permissions and limitations under the License.
 import copy
 import datetime
 import logging
+from collections import defaultdict
 from datetime import timedelta
 
 from django.db.models import Q
@@ -29,9 +30,14 @@ from backend.db_periodic_task.local_tasks.db_meta.constants import QUERY_TEMPLAT
 from backend.db_report.enums import DbmonHeartbeatReportSubType
 from backend.db_report.models import DbmonHeartbeatReport
 from backend.db_services.redis.util import is_predixy_proxy_type, is_twemproxy_proxy_type
+from backend.utils.basic import chunk_lists
 
 logger = logging.getLogger("root")
 
+# 分组查询时每批的集群数，以及单次查询返回的最大序列数(每个节点一条序列)
+DBMON_HEARTBEAT_QUERY_CHUNK_SIZE = 200
+DBMON_HEARTBEAT_QUERY_SLIMIT = 20000
+
 
 def check_dbmon_heart_beat():
     _check_dbmon_heart_beat()
@@ -58,6 +64,34 @@ def query_by_cluster_dimension(cluster_domain, cap_key="heartbeat", cluster_type
         logger.error(f"Error occurred while doing  BKMonitorV3Api.unify_query(: {e}")
         raise NotImplementedError("{} get dbmon heartbeat failed from BKMonitorV3Api ".format(cluster_domain))
 
+    return parse_heartbeat_series(series)
+
+
+def query_by_cluster_domains(cluster_domains, cluster_type="dbmon"):
+    """
+    一次查询一批集群的心跳，按 cluster_domain 和 target 分组返回
+    """
+    query_template = QUERY_TEMPLATE[cluster_type]
+    end_time = datetime.datetime.now(timezone.utc)
+    start_time = end_time - datetime.timedelta(minutes=query_template["range"])
+    params = copy.deepcopy(UNIFY_QUERY_PARAMS)
+    params["bk_biz_id"] = env.DBA_APP_BK_BIZ_ID
+    params["start_time"] = int(start_time.timestamp())
+    params["end_time"] = int(end_time.timestamp())
+    params["slimit"] = DBMON_HEARTBEAT_QUERY_SLIMIT
+    # 域名中的 . 在 promql 的正则字符串中需要转义为 \\.
+    params["query_configs"][0]["promql"] = query_template["heartbeat_domains"].format(
+        cluster_domains="|".join(domain.replace(".", "\\\\.") for domain in cluster_domains)
+    )
+    series = BKMonitorV3Api.unify_query(params, use_admin=True)["series"]
+
+    domain_heartbeat_data = defaultdict(list)
+    for data in parse_heartbeat_series(series):
+        domain_heartbeat_data[data["dimensions"].get("cluster_domain")].append(data)
+    return domain_heartbeat_data
+
+
+def parse_heartbeat_series(series):
     dbmon_heartbeat_data = []
     for item in series:
         found = False
@@ -96,6 +130,123 @@ def get_report_subtype_for_proxy(cluster_type):
     return heart_beat_subtype
 
 
+def build_missing_heartbeat_reports(c, cluster_info, missing_heartbeat_ips, app, redis_dba):
+    """
+    为缺失心跳的节点生成心跳超时记录
+    """
+    reports = []
+    for ip in missing_heartbeat_ips:
+        # 如果是后端存储节点，再区分cache ,ssd ,tendisplus
+        if ip in cluster_info["redis_master_ips_set"] or ip in cluster_info["redis_slave_ips_set"]:
+            heart_beat_subtype = get_report_subtype_for_storage(c.cluster_type)
+            # 获取端口范围：30000-30010
+            port_ranges = []
+            if ip in cluster_info["redis_master_ips_set"]:
+                redis_set = cluster_info["redis_master_set"]
+            elif ip in cluster_info["redis_slave_ips_set"]:
+                redis_set = cluster_info["redis_slave_set"]
+            else:
+                raise NotImplementedError("Dbmon ip:{} not in cluster:{}".format(ip, c.immute_domain))
+            # ssd 和cache 有segment，tendisplus没有
+            for item in redis_set:
+                if item.startswith(ip):
+                    if is_twemproxy_proxy_type(c.cluster_type):
+                        # 格式为 "ip:port range"
+                        ip_port, range = item.split(" ")
+                        ip, port = ip_port.split(IP_PORT_DIVIDER)
+                        port_ranges.append(port)
+                    elif c.cluster_type == ClusterType.TendisPredixyTendisplusCluster.value:
+                        # 格式为 "ip:port"
+                        ip, port = item.split(IP_PORT_DIVIDER)
+                        port_ranges.append(port)
+                    else:
+                        raise NotImplementedError("Dbmon Not supported tendis type:{}".format(c.cluster_type))
+            if len(port_ranges) > 1:
+                start_port = min(port_ranges)
+                end_port = max(port_ranges)
+                port_range = f"{start_port}-{end_port}"
+            # tendisplus 后面线上是部署1个实例
+            elif len(port_ranges) == 1:
+                port_range = port_ranges
+            else:
+                raise NotImplementedError("Dbmon ip:{} not get port_ranges for cluster:{}".format(ip, c.immute_domain))
+            instance = "{} {}".format(ip, port_range)
+        # 如果是代理proxy，再区分是twemproxy还是predixy
+        elif ip in cluster_info["twemproxy_ips_set"]:
+            twemproxy_ports = cluster_info.get("twemproxy_ports", [])
+            instance = "{} {}".format(ip, twemproxy_ports[0])
+            heart_beat_subtype = get_report_subtype_for_proxy(c.cluster_type)
+        else:
+            raise NotImplementedError(" %s is not identified in Dbmon" % ip)
+        msg = _("实例 {} dbmon 心跳超时").format(instance)
+        reports.append(
+            DbmonHeartbeatReport(
+                creator=c.creator,
+                bk_biz_id=c.bk_biz_id,
+                bk_cloud_id=c.bk_cloud_id,
+                status=False,
+                msg=msg,
+                cluster_type=heart_beat_subtype,
+                cluster=c.immute_domain,
+                instance=instance,
+                app=app,
+                dba=redis_dba,
+            )
+        )
+        logger.warning(_("+===+++++=== 实例 {} dbmon 心跳超时  +++++===++++ ".format(instance)))
+    return reports
+
+
+def get_cluster_nodes(cluster_info):
+    return [
+        *cluster_info["redis_master_ips_set"],
+        *cluster_info["redis_slave_ips_set"],
+        *cluster_info["twemproxy_ips_set"],
+    ]
+
+
+def _check_dbmon_heart_beat_grouped(clusters):
+    """
+    按集群分批查询心跳: 每批集群只查询一次监控和一次集群拓扑，心跳超时记录批量写入
+    """
+    clusters = list(clusters)
+    biz_ids = {c.bk_biz_id for c in clusters}
+    biz_apps = dict(AppCache.objects.filter(bk_biz_id__in=biz_ids).values_list("bk_biz_id", "db_app_abbr"))
+    biz_dbas = {}
+
+    for chunk in chunk_lists(clusters, DBMON_HEARTBEAT_QUERY_CHUNK_SIZE):
+        domains = [c.immute_domain for c in chunk]
+        try:
+            domain_heartbeat_data = query_by_cluster_domains(domains)
+            cluster_infos = {
+                info["id"]: info for info in api.cluster.nosqlcomm.other.get_clusters_details([c.id for c in chunk])
+            }
+        except Exception as e:  # pylint: disable=broad-except
+            logger.error("get dbmon heartbeat failed for clusters %s: %s", domains, e)
+            continue
+
+        reports = []
+        for c in chunk:
+            try:
+                if c.bk_biz_id not in biz_dbas:
+                    biz_dbas[c.bk_biz_id] = DBAdministrator().get_biz_db_type_admins(c.bk_biz_id, DBType.Redis)
+                cluster_info = cluster_infos[c.id]
+                missing_heartbeat_ips = set(get_cluster_nodes(cluster_info)) - {
+                    data["dimensions"]["target"]
+                    for data in domain_heartbeat_data.get(c.immute_domain, [])
+                    if data["value"] == 1
+                }
+                reports.extend(
+                    build_missing_heartbeat_reports(
+                        c, cluster_info, missing_heartbeat_ips, biz_apps[c.bk_biz_id], biz_dbas[c.bk_biz_id]
+                    )
+                )
+            except Exception as e:  # pylint: disable=broad-except
+                logger.error("check dbmon heartbeat failed for cluster %s: %s", c.immute_domain, e)
+
+        DbmonHeartbeatReport.objects.bulk_create(reports)
+
+
 def _check_dbmon_heart_beat():
     """
     获取dbmon心跳信息
@@ -111,20 +262,21 @@ def _check_dbmon_heart_beat():
         | Q(cluster_type=ClusterType.TwemproxyTendisSSDInstance)
         | Q(cluster_type=ClusterType.TendisTwemproxyRedisInstance)
     ) & Q(create_at__lt=timezone.now() - timedelta(hours=2))
+    if env.DBMON_HEARTBEAT_GROUPED_QUERY:
+        _check_dbmon_heart_beat_grouped(Cluster.objects.filter(query).order_by("id"))
+        return
+
     # 遍历集群
     for c in Cluster.objects.filter(query):
         logger.info("+===+++++===  start check {} dbmon heartbeat +++++===++++ ".format(c.immute_domain))
         logger.info("+===+++++===  cluster type is: {} +++++===++++ ".format(c.cluster_type))
         # 初始化集群机器列表
-        cluster_nodes = []
         try:
             cluster_info = api.cluster.nosqlcomm.other.get_cluster_detail(c.id)[0]
         except Exception as e:
             logger.error(f"Error occurred while getting cluster_info: {e}")
             raise NotImplementedError("{} get cluster_info failed".format(c.immute_domain))
-        cluster_nodes.extend(cluster_info["redis_master_ips_set"])
-        cluster_nodes.extend(cluster_info["redis_slave_ips_set"])
-        cluster_nodes.extend(cluster_info["twemproxy_ips_set"])
+        cluster_nodes = get_cluster_nodes(cluster_info)
         logger.info("+===+++++===  cluster all nodes  is: {} +++++===++++ ".format(cluster_nodes))
         try:
             # 通过bk_biz_id获取dba列表,业务没设置的话，用平台的配置
@@ -144,67 +296,10 @@ def _check_dbmon_heart_beat():
             data["dimensions"]["target"] for data in dbmon_heartbeat_data if data["value"] == 1
         }
         logger.warning(_("+===+++++=== missing_heartbeat_ips 实例:{}  +++++===++++ ".format(missing_heartbeat_ips)))
-        for ip in missing_heartbeat_ips:
-            # 如果是后端存储节点，再区分cache ,ssd ,tendisplus
-            if ip in cluster_info["redis_master_ips_set"] or ip in cluster_info["redis_slave_ips_set"]:
-                heart_beat_subtype = get_report_subtype_for_storage(c.cluster_type)
-                # 获取端口范围：30000-30010
-                port_ranges = []
-                if ip in cluster_info["redis_master_ips_set"]:
-                    redis_set = cluster_info["redis_master_set"]
-                elif ip in cluster_info["redis_slave_ips_set"]:
-                    redis_set = cluster_info["redis_slave_set"]
-                else:
-                    raise NotImplementedError("Dbmon ip:{} not in cluster:{}".format(ip, c.immute_domain))
-                # ssd 和cache 有segment，tendisplus没有
-                for item in redis_set:
-                    if item.startswith(ip):
-                        if is_twemproxy_proxy_type(c.cluster_type):
-                            # 格式为 "ip:port range"
-                            ip_port, range = item.split(" ")
-                            ip, port = ip_port.split(IP_PORT_DIVIDER)
-                            port_ranges.append(port)
-                        elif c.cluster_type == ClusterType.TendisPredixyTendisplusCluster.value:
-                            # 格式为 "ip:port"
-                            ip, port = item.split(IP_PORT_DIVIDER)
-                            port_ranges.append(port)
-                        else:
-                            raise NotImplementedError("Dbmon Not supported tendis type:{}".format(c.cluster_type))
-                if len(port_ranges) > 1:
-                    start_port = min(port_ranges)
-                    end_port = max(port_ranges)
-                    port_range = f"{start_port}-{end_port}"
-                # tendisplus 后面线上是部署1个实例
-                elif len(port_ranges) == 1:
-                    port_range = port_ranges
-                else:
-                    raise NotImplementedError(
-                        "Dbmon ip:{} not get port_ranges for cluster:{}".format(ip, c.immute_domain)
-                    )
-                instance = "{} {}".format(ip, port_range)
-            # 如果是代理proxy，再区分是twemproxy还是predixy
-            elif ip in cluster_info["twemproxy_ips_set"]:
-                twemproxy_ports = cluster_info.get("twemproxy_ports", [])
-                instance = "{} {}".format(ip, twemproxy_ports[0])
-                heart_beat_subtype = get_report_subtype_for_proxy(c.cluster_type)
-            else:
-                raise NotImplementedError(" %s is not identified in Dbmon" % ip)
-            msg = _("实例 {} dbmon 心跳超时").format(instance)
-            try:
-                # 心跳超时的时间点就用这条记录的创建时间代替了，这里对时间要求不严格
-                DbmonHeartbeatReport.objects.create(
-                    creator=c.creator,
-                    bk_biz_id=c.bk_biz_id,
-                    bk_cloud_id=c.bk_cloud_id,
-                    status=False,
-                    msg=msg,
-                    cluster_type=heart_beat_subtype,
-                    cluster=c.immute_domain,
-                    instance=instance,
-                    app=app,
-                    dba=redis_dba,
-                )
-                logger.warning(_("+===+++++=== 实例 {} dbmon 心跳超时  +++++===++++ ".format(instance)))
-            except Exception as e:
-                logger.error(f"Error occurred while inserting data: {e}")
-                raise NotImplementedError("{} insert data failed".format(c.immute_domain))
+        reports = build_missing_heartbeat_reports(c, cluster_info, missing_heartbeat_ips, app, redis_dba)
+        try:
+            # 心跳超时的时间点就用这条记录的创建时间代替了，这里对时间要求不严格
+            DbmonHeartbeatReport.objects.bulk_create(reports)
+        except Exception as e:
+            logger.error(f"Error occurred while inserting data: {e}")
+            raise NotImplementedError("{} insert data failed".format(c.immute_domain))
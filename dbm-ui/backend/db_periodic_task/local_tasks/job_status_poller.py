@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import logging
+
+from backend import env
+from backend.db_periodic_task.local_tasks.register import register_periodic_task
+from backend.flow.utils.job_status_poller import JobStatusPoller
+
+logger = logging.getLogger("celery")
+
+
+@register_periodic_task(run_every=5)
+def poll_job_instance_status():
+    """集中轮询 BkJobService 节点等待中的 JOB 任务状态"""
+    if not env.JOB_STATUS_POLLER_ENABLE:
+        return
+    result = JobStatusPoller.poll()
+    if result["polled"] or result["dropped"]:
+        logger.info("[poll_job_instance_status] %s, stats: %s", result, JobStatusPoller.get_stats())
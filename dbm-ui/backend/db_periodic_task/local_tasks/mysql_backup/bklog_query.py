@@ -9,13 +9,10 @@ an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express o
 specific language governing permissions and limitations under the License.
 """
 import datetime
-import json
+from collections import defaultdict
 from typing import Dict, List
 
-from backend import env
-from backend.components.bklog.client import BKLogApi
-from backend.utils.string import pascal_to_snake
-from backend.utils.time import datetime2str
+from backend.components.bklog.handler import BKLogHandler
 
 
 def _get_log_from_bklog(collector, start_time, end_time, query_string="*") -> List[Dict]:
@@ -26,25 +23,72 @@ def _get_log_from_bklog(collector, start_time, end_time, query_string="*") -> Li
     @param end_time: 结束时间
     @param query_string: 过滤条件
     """
-    resp = BKLogApi.esquery_search(
-        {
-            "indices": f"{env.DBA_APP_BK_BIZ_ID}_bklog.{collector}",
-            "start_time": datetime2str(start_time),
-            "end_time": datetime2str(end_time),
-            # 这里需要精确查询集群域名，所以可以通过log: "key: \"value\""的格式查询
-            "query_string": query_string,
-            "start": 0,
-            "size": 6000,
-            "sort_list": [["dtEventTimeStamp", "asc"], ["gseIndex", "asc"], ["iterationIndex", "asc"]],
-        },
-        use_admin=True,
-    )
-    backup_logs = []
-    for hit in resp["hits"]["hits"]:
-        raw_log = json.loads(hit["_source"]["log"])
-        backup_logs.append({pascal_to_snake(key): value for key, value in raw_log.items()})
-
-    return backup_logs
+    # 这里需要精确查询集群域名，所以可以通过log: "key: \"value\""的格式查询
+    return list(BKLogHandler.iter_logs(collector, start_time, end_time, query_string))
+
+
+def _to_backup_file(log: Dict) -> Dict:
+    return {
+        "bk_biz_id": log["bk_biz_id"],
+        "backup_id": log["backup_id"],
+        "cluster_domain": log["cluster_address"],
+        "cluster_id": log["cluster_id"],
+        "mysql_host": log["backup_host"],
+        "mysql_port": log["backup_port"],
+        "mysql_role": log["mysql_role"],
+        "backup_type": log["backup_type"],
+        "file_list": log["file_list"],
+        "data_schema_grant": log["data_schema_grant"],
+        "is_full_backup": log["is_full_backup"],
+        "total_filesize": log["total_filesize"],
+        "encrypt_enable": log["encrypt_enable"],
+        "mysql_version": log["mysql_version"],
+        "backup_begin_time": log["backup_begin_time"],
+        "backup_end_time": log["backup_end_time"],
+        "backup_consistent_time": log["backup_consistent_time"],
+        "shard_value": log["shard_value"],
+    }
+
+
+def _to_binlog(log: Dict) -> Dict:
+    return {
+        "cluster_domain": log["cluster_domain"],
+        "cluster_id": log["cluster_id"],
+        "task_id": log["task_id"],
+        "file_name": log["filename"],  # file_name
+        "file_size": log["size"],
+        "file_mtime": log["file_mtime"],
+        "file_type": "binlog",
+        "mysql_host": log["host"],
+        "mysql_port": log["port"],
+        "mysql_role": log["db_role"],
+        "backup_status": log["backup_status"],
+        "backup_status_info": log["backup_status_info"],
+    }
+
+
+def query_backup_logs_by_cluster(start_time: datetime.datetime, end_time: datetime.datetime) -> Dict[str, List[Dict]]:
+    """
+    一次拉取时间范围内全平台的全备备份记录，按集群域名分组
+    """
+    backup_files = defaultdict(list)
+    for log in BKLogHandler.iter_logs("mysql_dbbackup_result", start_time, end_time):
+        backup_files[log["cluster_address"]].append(_to_backup_file(log))
+    return backup_files
+
+
+def query_binlogs_by_cluster(start_time: datetime.datetime, end_time: datetime.datetime) -> Dict[int, List[Dict]]:
+    """
+    一次拉取时间范围内全平台的 binlog 备份记录，按集群ID分组
+    """
+    binlogs = defaultdict(list)
+    for log in BKLogHandler.iter_logs("mysql_binlog_result", start_time, end_time):
+        try:
+            cluster_id = int(log["cluster_id"])
+        except (TypeError, ValueError):
+            continue
+        binlogs[cluster_id].append(_to_binlog(log))
+    return binlogs
 
 
 class ClusterBackup:
@@ -64,7 +108,6 @@ class ClusterBackup:
         :param start_time: 开始时间
         :param end_time: 结束时间
         """
-        backup_files = []
         backup_logs = _get_log_from_bklog(
             collector="mysql_dbbackup_result",
             start_time=start_time,
@@ -72,29 +115,7 @@ class ClusterBackup:
             # query_string=f'log: "cluster_id: {self.cluster_id}"',
             query_string=f'log: "cluster_address: \\"{self.cluster_domain}\\""',
         )
-        for log in backup_logs:
-            bf = {
-                "bk_biz_id": log["bk_biz_id"],
-                "backup_id": log["backup_id"],
-                "cluster_domain": log["cluster_address"],
-                "cluster_id": log["cluster_id"],
-                "mysql_host": log["backup_host"],
-                "mysql_port": log["backup_port"],
-                "mysql_role": log["mysql_role"],
-                "backup_type": log["backup_type"],
-                "file_list": log["file_list"],
-                "data_schema_grant": log["data_schema_grant"],
-                "is_full_backup": log["is_full_backup"],
-                "total_filesize": log["total_filesize"],
-                "encrypt_enable": log["encrypt_enable"],
-                "mysql_version": log["mysql_version"],
-                "backup_begin_time": log["backup_begin_time"],
-                "backup_end_time": log["backup_end_time"],
-                "backup_consistent_time": log["backup_consistent_time"],
-                "shard_value": log["shard_value"],
-            }
-            backup_files.append(bf)
-        return backup_files
+        return [_to_backup_file(log) for log in backup_logs]
 
     def query_binlog_from_bklog(self, start_time: datetime.datetime, end_time: datetime.datetime) -> List[Dict]:
         """
@@ -103,7 +124,6 @@ class ClusterBackup:
         :param start_time: 开始时间
         :param end_time: 结束时间
         """
-        binlogs = []
         backup_logs = _get_log_from_bklog(
             collector="mysql_binlog_result",
             start_time=start_time,
@@ -111,20 +131,4 @@ class ClusterBackup:
             query_string=f'log: "cluster_id: {self.cluster_id}"',
             # query_string=f'log: "cluster_address: \\"{self.cluster_domain}\\""',
         )
-        for log in backup_logs:
-            bl = {
-                "cluster_domain": log["cluster_domain"],
-                "cluster_id": log["cluster_id"],
-                "task_id": log["task_id"],
-                "file_name": log["filename"],  # file_name
-                "file_size": log["size"],
-                "file_mtime": log["file_mtime"],
-                "file_type": "binlog",
-                "mysql_host": log["host"],
-                "mysql_port": log["port"],
-                "mysql_role": log["db_role"],
-                "backup_status": log["backup_status"],
-                "backup_status_info": log["backup_status_info"],
-            }
-            binlogs.append(bl)
-        return binlogs
+        return [_to_binlog(log) for log in backup_logs]
@@ -10,46 +10,53 @@ specific language governing permissions and limitations under the License.
 """
 import logging
 from collections import defaultdict
+from typing import Dict, List, Optional
 
+from backend import env
 from backend.db_meta.enums import ClusterType
 from backend.db_meta.models import Cluster
 from backend.db_periodic_task.constants import BACKUP_TASK_SUCCESS
 from backend.db_report.enums import MysqlBackupCheckSubType
 from backend.db_report.models import MysqlBackupCheckReport
 
-from .bklog_query import ClusterBackup
-from .check_full_backup import get_query_date_time
+from .bklog_query import ClusterBackup, query_binlogs_by_cluster
+from .check_full_backup import MYSQL_BACKUP_REPORT_BATCH_SIZE, get_query_date_time
 
 logger = logging.getLogger("root")
 
 
 def check_binlog_backup(date_str: str):
-    _check_tendbha_binlog_backup(date_str)
-    _check_tendbcluster_binlog_backup(date_str)
+    # 批量模式下一次拉取全平台的 binlog 备份记录，两种集群类型共用
+    binlogs = None
+    if env.BACKUP_CHECK_BULK_QUERY:
+        binlogs = query_binlogs_by_cluster(*get_query_date_time(date_str))
+    _check_tendbha_binlog_backup(date_str, binlogs)
+    _check_tendbcluster_binlog_backup(date_str, binlogs)
 
 
-def _check_tendbha_binlog_backup(date_str: str):
+def _check_tendbha_binlog_backup(date_str: str, binlogs: Optional[Dict[int, List[Dict]]] = None):
     """
     master 实例必须要有备份binlog
     且binlog序号要连续
     """
     logger.info("==== start check binlog for cluster type {} ====".format(ClusterType.TenDBHA))
-    return _check_binlog_backup(ClusterType.TenDBHA, date_str)
+    return _check_binlog_backup(ClusterType.TenDBHA, date_str, binlogs)
 
 
-def _check_tendbcluster_binlog_backup(date_str: str):
+def _check_tendbcluster_binlog_backup(date_str: str, binlogs: Optional[Dict[int, List[Dict]]] = None):
     """
     master 实例必须要有备份binlog
     且binlog序号要连续
     """
     logger.info("==== start check binlog for cluster type {} ====".format(ClusterType.TenDBCluster))
-    return _check_binlog_backup(ClusterType.TenDBCluster, date_str)
+    return _check_binlog_backup(ClusterType.TenDBCluster, date_str, binlogs)
 
 
-def _check_binlog_backup(cluster_type, date_str):
+def _check_binlog_backup(cluster_type, date_str, binlogs: Optional[Dict[int, List[Dict]]] = None):
     """
     master 实例必须要有备份binlog
     且binlog序号要连续
+    binlogs 为按集群ID分组的 binlog 备份记录，为空时按集群逐个查询日志平台
     """
     start_time, end_time = get_query_date_time(date_str)
     logger.info(
@@ -57,6 +64,7 @@ def _check_binlog_backup(cluster_type, date_str):
             cluster_type, start_time, end_time
         )
     )
+    reports = []
     for c in Cluster.objects.filter(cluster_type=cluster_type):
         backup = ClusterBackup(c.id, c.immute_domain)
         logger.info(
@@ -66,7 +74,10 @@ def _check_binlog_backup(cluster_type, date_str):
         )
         # todo 需要获取集群的 master 分片实例，或者分片数
 
-        items = backup.query_binlog_from_bklog(start_time, end_time)
+        if binlogs is None:
+            items = backup.query_binlog_from_bklog(start_time, end_time)
+        else:
+            items = binlogs.get(c.id, [])
         instance_binlogs = defaultdict(list)
         shard_binlog_stat = {}
         for i in items:
@@ -80,22 +91,25 @@ def _check_binlog_backup(cluster_type, date_str):
         if not instance_binlogs:
             backup.success = False
 
-        for inst, binlogs in instance_binlogs.items():
-            suffixes = [f.split(".", 1)[1] for f in binlogs]
+        for inst, inst_binlogs in instance_binlogs.items():
+            suffixes = [f.split(".", 1)[1] for f in inst_binlogs]
             shard_binlog_stat[inst] = is_consecutive_strings(suffixes)
             if not shard_binlog_stat[inst]:
                 backup.success = False
 
         if not backup.success:
-            MysqlBackupCheckReport.objects.create(
-                bk_biz_id=c.bk_biz_id,
-                bk_cloud_id=c.bk_cloud_id,
-                cluster=c.immute_domain,
-                cluster_type=cluster_type,
-                status=False,
-                msg="binlog is not consecutive:{}".format(shard_binlog_stat),
-                subtype=MysqlBackupCheckSubType.BinlogSeq.value,
+            reports.append(
+                MysqlBackupCheckReport(
+                    bk_biz_id=c.bk_biz_id,
+                    bk_cloud_id=c.bk_cloud_id,
+                    cluster=c.immute_domain,
+                    cluster_type=cluster_type,
+                    status=False,
+                    msg="binlog is not consecutive:{}".format(shard_binlog_stat),
+                    subtype=MysqlBackupCheckSubType.BinlogSeq.value,
+                )
             )
+    MysqlBackupCheckReport.objects.bulk_create(reports, batch_size=MYSQL_BACKUP_REPORT_BATCH_SIZE)
 
 
 def is_consecutive_strings(str_list: list):
@@ -11,18 +11,23 @@ specific language governing permissions and limitations under the License.
 import logging
 from collections import defaultdict
 from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
 
 from django.utils import timezone
 
+from backend import env
 from backend.db_meta.enums import ClusterType
 from backend.db_meta.models import Cluster
 from backend.db_report.enums import MysqlBackupCheckSubType
 from backend.db_report.models import MysqlBackupCheckReport
 
-from .bklog_query import ClusterBackup
+from .bklog_query import ClusterBackup, query_backup_logs_by_cluster
 
 logger = logging.getLogger("root")
 
+# 批量写入巡检报告的批次大小
+MYSQL_BACKUP_REPORT_BATCH_SIZE = 1000
+
 
 def get_query_date_time(date_str: str):
     # date_str 为空时，取当前时间的前一天为查询区间，不为空时需要是 2024-05-20 这样的格式，指定查询这一天 00:00:01-23:59:59 的数据
@@ -36,10 +41,14 @@ def get_query_date_time(date_str: str):
 
 
 def check_full_backup(date_str: str):
+    # 批量模式下一次拉取全平台的备份记录，两种集群类型共用
+    backup_logs = None
+    if env.BACKUP_CHECK_BULK_QUERY:
+        backup_logs = query_backup_logs_by_cluster(*get_query_date_time(date_str))
     # tendbha 全备巡检
-    _check_tendbha_full_backup(date_str)
+    _check_tendbha_full_backup(date_str, backup_logs)
     # tendbcluster 全备巡检
-    _check_tendbcluster_full_backup(date_str)
+    _check_tendbcluster_full_backup(date_str, backup_logs)
 
 
 class BackupFile:
@@ -90,84 +99,96 @@ def _build_backup_info_files(backups_info: []):
     return backups
 
 
-def _check_tendbha_full_backup(date_str: str):
+def _check_cluster_full_backup(
+    cluster_type: str,
+    date_str: str,
+    evaluate: Callable[[ClusterBackup], Optional[str]],
+    backup_logs: Optional[Dict[str, List[Dict]]] = None,
+):
     """
-    tendbha 必须有一份完整的备份
+    逐个集群校验全备，只记录失败的结果，巡检报告批量写入
+    @param evaluate: 校验函数，备份不完整时返回失败信息
+    @param backup_logs: 按集群域名分组的备份记录，为空时按集群逐个查询日志平台
     """
     start_time, end_time = get_query_date_time(date_str)
     logger.info(
         "====  start check full backup for cluster type {}, time range[{},{}] ====".format(
-            ClusterType.TenDBHA, start_time, end_time
+            cluster_type, start_time, end_time
         )
     )
-    for c in Cluster.objects.filter(cluster_type=ClusterType.TenDBHA):
+    reports = []
+    for c in Cluster.objects.filter(cluster_type=cluster_type):
         logger.info("==== start check full backup for cluster {} ====".format(c.immute_domain))
         backup = ClusterBackup(c.id, c.immute_domain)
-
-        items = backup.query_backup_log_from_bklog(start_time, end_time)
+        if backup_logs is None:
+            items = backup.query_backup_log_from_bklog(start_time, end_time)
+        else:
+            items = backup_logs.get(c.immute_domain, [])
         backup.backups = _build_backup_info_files(items)
 
-        for bid, bk in backup.backups.items():
-            if bk.is_full_backup == 1:
-                if bk.file_index and bk.file_tar:
-                    backup.success = True
-                    break
+        msg = evaluate(backup)
         if not backup.success:
-            MysqlBackupCheckReport.objects.create(
-                bk_biz_id=c.bk_biz_id,
-                bk_cloud_id=c.bk_cloud_id,
-                cluster=c.immute_domain,
-                cluster_type=ClusterType.TenDBHA,
-                status=False,
-                msg="no success full backup found",
-                subtype=MysqlBackupCheckSubType.FullBackup.value,
+            reports.append(
+                MysqlBackupCheckReport(
+                    bk_biz_id=c.bk_biz_id,
+                    bk_cloud_id=c.bk_cloud_id,
+                    cluster=c.immute_domain,
+                    cluster_type=cluster_type,
+                    status=False,
+                    msg=msg,
+                    subtype=MysqlBackupCheckSubType.FullBackup.value,
+                )
             )
+    MysqlBackupCheckReport.objects.bulk_create(reports, batch_size=MYSQL_BACKUP_REPORT_BATCH_SIZE)
+    logger.info("==== finish check full backup for cluster type {}, {} failed ====".format(cluster_type, len(reports)))
 
 
-def _check_tendbcluster_full_backup(date_str: str):
+def _evaluate_tendbha_full_backup(backup: ClusterBackup) -> str:
     """
-    tendbcluster 集群必须有完整的备份
+    tendbha 必须有一份完整的备份
     """
-    start_time, end_time = get_query_date_time(date_str)
-    logger.info(
-        "==== start check full backup for cluster type {}, time range[{},{}] ====".format(
-            ClusterType.TenDBCluster, start_time, end_time
-        )
-    )
-
-    for c in Cluster.objects.filter(cluster_type=ClusterType.TenDBCluster):
-        logger.info("==== start check full backup for cluster {} ====".format(c.immute_domain))
-        backup = ClusterBackup(c.id, c.immute_domain)
-        items = backup.query_backup_log_from_bklog(start_time, end_time)
-        backup.backups = _build_backup_info_files(items)
-
-        backup_id_stat = defaultdict(list)
-        backup_id_invalid = {}
-        for bid, bk in backup.backups.items():
-            backup_id, shard_id = bid.split("#", 1)
-            if bk.is_full_backup == 1:
-                if bk.file_index and bk.file_tar:
-                    #  这一个 shard ok
-                    backup_id_stat[backup_id].append({shard_id: True})
-                else:
-                    # 这一个 shard 不ok，整个backup_id 无效
-                    backup_id_invalid[backup_id] = True
-                    backup_id_stat[backup_id].append({shard_id: False})
-        message = ""
-        for backup_id, stat in backup_id_stat.items():
-            if backup_id not in backup_id_invalid:
+    for bid, bk in backup.backups.items():
+        if bk.is_full_backup == 1:
+            if bk.file_index and bk.file_tar:
                 backup.success = True
-                message = "shard_id:{}".format(backup_id_stat[backup_id])
                 break
+    return "no success full backup found"
 
-        # 只记录失败的结果
-        if not backup.success:
-            MysqlBackupCheckReport.objects.create(
-                bk_biz_id=c.bk_biz_id,
-                bk_cloud_id=c.bk_cloud_id,
-                cluster=c.immute_domain,
-                cluster_type=ClusterType.TenDBCluster,
-                status=False,
-                msg="no success full backup found:{}".format(message),
-                subtype=MysqlBackupCheckSubType.FullBackup.value,
-            )
+
+def _evaluate_tendbcluster_full_backup(backup: ClusterBackup) -> str:
+    """
+    tendbcluster 集群必须有完整的备份，同一个 backup_id 的所有分片都完整
+    """
+    backup_id_stat = defaultdict(list)
+    backup_id_invalid = {}
+    for bid, bk in backup.backups.items():
+        backup_id, shard_id = bid.split("#", 1)
+        if bk.is_full_backup == 1:
+            if bk.file_index and bk.file_tar:
+                #  这一个 shard ok
+                backup_id_stat[backup_id].append({shard_id: True})
+            else:
+                # 这一个 shard 不ok，整个backup_id 无效
+                backup_id_invalid[backup_id] = True
+                backup_id_stat[backup_id].append({shard_id: False})
+    message = ""
+    for backup_id, stat in backup_id_stat.items():
+        if backup_id not in backup_id_invalid:
+            backup.success = True
+            message = "shard_id:{}".format(backup_id_stat[backup_id])
+            break
+    return "no success full backup found:{}".format(message)
+
+
+def _check_tendbha_full_backup(date_str: str, backup_logs: Optional[Dict[str, List[Dict]]] = None):
+    """
+    tendbha 必须有一份完整的备份
+    """
+    _check_cluster_full_backup(ClusterType.TenDBHA, date_str, _evaluate_tendbha_full_backup, backup_logs)
+
+
+def _check_tendbcluster_full_backup(date_str: str, backup_logs: Optional[Dict[str, List[Dict]]] = None):
+    """
+    tendbcluster 集群必须有完整的备份
+    """
+    _check_cluster_full_backup(ClusterType.TenDBCluster, date_str, _evaluate_tendbcluster_full_backup, backup_logs)
@@ -9,16 +9,13 @@ an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express o
 specific language governing permissions and limitations under the License.
 """
 import datetime
-import json
 import logging
-from typing import Dict, List
+from collections import defaultdict
+from typing import Dict, List, Tuple
 
 from django.utils.translation import ugettext as _
 
-from backend import env
-from backend.components.bklog.client import BKLogApi
-from backend.utils.string import pascal_to_snake
-from backend.utils.time import datetime2str
+from backend.components.bklog.handler import BKLogHandler
 
 logger = logging.getLogger("root")
 
@@ -33,25 +30,32 @@ def _get_log_from_bklog(
     @param end_time: 结束时间
     @param query_string: 过滤条件
     """
-    resp = BKLogApi.esquery_search(
-        {
-            "indices": f"{env.DBA_APP_BK_BIZ_ID}_bklog.{collector}",
-            "start_time": datetime2str(start_time),
-            "end_time": datetime2str(end_time),
-            # 这里需要精确查询集群域名，所以可以通过log: "key: \"value\""的格式查询
-            "query_string": query_string,
-            "start": 0,
-            "size": 6000,
-            "sort_list": [["dtEventTimeStamp", "asc"], ["gseIndex", "asc"], ["iterationIndex", "asc"]],
-        },
-        use_admin=True,
-    )
-    backup_logs = []
-    for hit in resp["hits"]["hits"]:
-        raw_log = json.loads(hit["_source"]["log"])
-        backup_logs.append({pascal_to_snake(key): value for key, value in raw_log.items()})
+    # 这里需要精确查询集群域名，所以可以通过log: "key: \"value\""的格式查询
+    return list(BKLogHandler.iter_logs(collector, start_time, end_time, query_string))
 
-    return backup_logs
+
+def query_full_logs_by_cluster(start_time: datetime.datetime, end_time: datetime.datetime) -> Dict[str, List[Dict]]:
+    """
+    一次拉取时间范围内全平台的全备份记录，按集群域名分组
+    """
+    backup_files = defaultdict(list)
+    for bklog in BKLogHandler.iter_logs("redis_fullbackup_result", start_time, end_time):
+        backup_files[bklog["domain"]].append(ClusterBackup.convert_to_backup_system_format(bklog))
+    return backup_files
+
+
+def query_binlogs_by_instance(
+    start_time: datetime.datetime, end_time: datetime.datetime
+) -> Dict[Tuple[str, str, int], List[Dict]]:
+    """
+    一次拉取时间范围内全平台的 binlog 备份记录，按 (集群域名, ip, port) 分组
+    """
+    binlogs = defaultdict(list)
+    for bklog in BKLogHandler.iter_logs("redis_binlog_backup_result", start_time, end_time):
+        binlogs[(bklog["domain"], bklog["server_ip"], int(bklog["server_port"]))].append(
+            ClusterBackup.convert_to_backup_system_format(bklog)
+        )
+    return binlogs
 
 
 class ClusterBackup:
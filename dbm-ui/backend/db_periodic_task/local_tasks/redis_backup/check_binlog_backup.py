@@ -8,24 +8,25 @@ an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express o
 specific language governing permissions and limitations under the License.
 """
 import logging
-from datetime import datetime, timedelta
+from datetime import timedelta
 from typing import Any, List
 
 from django.db.models import Q
 from django.utils import timezone
 from django.utils.translation import ugettext as _
 
+from backend import env
 from backend.components import DBConfigApi
 from backend.components.dbconfig.constants import FormatType, LevelName
-from backend.constants import IP_PORT_DIVIDER
-from backend.db_meta.enums import ClusterType, InstanceRole
+from backend.db_meta.enums import ClusterType
 from backend.db_meta.models import Cluster
 from backend.db_report.enums import RedisBackupCheckSubType
 from backend.db_report.models import RedisBackupCheckReport
 from backend.db_services.redis.util import is_tendisplus_instance_type, is_tendisssd_instance_type
 from backend.flow.consts import DEFAULT_DB_MODULE_ID, ConfigTypeEnum
 
-from .bklog_query import ClusterBackup
+from .bklog_query import ClusterBackup, query_binlogs_by_instance
+from .check_full_backup import REDIS_BACKUP_REPORT_BATCH_SIZE, get_cluster_master_slaves, get_yesterday_time_range
 
 logger = logging.getLogger("root")
 
@@ -49,11 +50,20 @@ def _check_tendis_binlog_backup():
         Q(cluster_type=ClusterType.TendisPredixyTendisplusCluster)
         | Q(cluster_type=ClusterType.TwemproxyTendisSSDInstance)
     ) & Q(create_at__lt=timezone.now() - timedelta(days=1))
+    clusters = list(Cluster.objects.filter(query))
+    master_slaves = get_cluster_master_slaves(clusters)
+
+    start_time, end_time = get_yesterday_time_range()
+    #  	 +===+++++=== start_time is: 2023-10-25 00:00:00 ,end_time is :2023-10-25 23:59:59 +++++===++++
+    logger.info("+===+++++=== start_time is: {} ,end_time is :{} +++++===++++ ".format(start_time, end_time))
+    # 批量模式下一次拉取全平台的 binlog 备份记录，按节点分组
+    instance_bklogs = query_binlogs_by_instance(start_time, end_time) if env.BACKUP_CHECK_BULK_QUERY else None
+
     # 遍历集群
-    for c in Cluster.objects.filter(query):
+    reports = []
+    for c in clusters:
         logger.info("+===+++++===  start check {} binlog backup +++++===++++ ".format(c.immute_domain))
         logger.info("+===+++++===  cluster type is: {} +++++===++++ ".format(c.cluster_type))
-        cluster_slave_instance = []  # 初始化集群slave列表，binlog只在slave上生成
         # 如果是tendisplus,需要单独校验每个节点的kvstore 的binlog连续性
         if is_tendisplus_instance_type(c.cluster_type):
             # 获取 kvstorecount
@@ -63,39 +73,28 @@ def _check_tendis_binlog_backup():
             kvstorecount = redis_config["kvstorecount"]
             logger.info("+===+++++===  kvstorecount is: {} +++++===++++ ".format(kvstorecount))
 
-        for master_obj in c.storageinstance_set.filter(instance_role=InstanceRole.REDIS_MASTER.value):
-            slave_obj = master_obj.as_ejector.get().receiver
-            current_datetime = timezone.now()
-            # 计算时间差
-            time_difference = current_datetime - slave_obj.create_at
-            # 判断时间差是否大于等于24小时  # 过滤掉 刚扩容，重建热备-> 创建时间小于24小时
-            if time_difference >= timedelta(hours=24):
-                # 进行相应的操作
-                cluster_slave_instance.append("{}{}{}".format(slave_obj.machine.ip, IP_PORT_DIVIDER, slave_obj.port))
-
+        # 集群slave列表，binlog只在slave上生成
+        cluster_slave_instance = [slave for __, slave in master_slaves[c.id]]
         logger.info("+===+++++===  cluster slave instance  is: {} +++++===++++ ".format(cluster_slave_instance))
         backup = ClusterBackup(c.id, c.immute_domain)
         # 集群纬度的，假设一开始是备份完整的，后面会去校验对这个值进行赋值，如果有存在异常会赋值为False
         # 不管是全备份还是binlog,只要有异常，这个就是False
 
-        now = datetime.now(timezone.utc)
-        yesterday = now - timedelta(days=1)
-        start_time = datetime(yesterday.year, yesterday.month, yesterday.day).astimezone(timezone.utc)
-        end_time = datetime(yesterday.year, yesterday.month, yesterday.day, 23, 59, 59).astimezone(timezone.utc)
-        #  	 +===+++++=== start_time is: 2023-10-25 00:00:00 ,end_time is :2023-10-25 23:59:59 +++++===++++
-        logger.info("+===+++++=== start_time is: {} ,end_time is :{} +++++===++++ ".format(start_time, end_time))
         # 对slave 进行统计
         for instance in cluster_slave_instance:
             # 单个节点的成功的binlog备份文件
             suceess_binlog_file_list = []
             ip, port = instance.split(":")
-            bklogs = backup.query_binlog_from_bklog(start_time, end_time, ip, port)
+            if instance_bklogs is None:
+                bklogs = backup.query_binlog_from_bklog(start_time, end_time, ip, port)
+            else:
+                bklogs = instance_bklogs.get((c.immute_domain, ip, int(port)), [])
             # 如果节点维度没有数据，就不用在进行下面的了
             # 这里如果提升为集群维度的话，一般会有40*10*24*3=28800个文件，所以按节点维度来查
             if not bklogs:
                 msg = _("无法查找到在时间范围内{}-{}，集群{}：{}的binlog备份日志").format(start_time, end_time, c.immute_domain, instance)
                 logger.error(msg)
-                binlog_backup_failed_record(c, instance, msg)
+                reports.append(binlog_backup_failed_record(c, instance, msg))
                 continue
             logger.info(_("+===+++++===  {} 集群{} 实例维度日志不为空 +++++===++++ ".format(c.immute_domain, instance)))
             for bklog in bklogs:
@@ -103,7 +102,7 @@ def _check_tendis_binlog_backup():
                 if bklog.get("backup_status", "") == "to_backup_system_failed":
                     logger.error("+===+++++=== to_backup_system_failed bklog: {} +++++===++++ ".format(bklog))
                     msg = bklog["backup_status_info"]
-                    binlog_backup_failed_record(c, instance, msg)
+                    reports.append(binlog_backup_failed_record(c, instance, msg))
 
                 # 对成功的进行处理，判断文件序号的完备性
                 if bklog.get("backup_status", "") == "to_backup_system_success":
@@ -126,7 +125,7 @@ def _check_tendis_binlog_backup():
                             len(bin_index_list), bin_index_list
                         )
                         logger.error("+===+++++=== {}+++++===++++ ".format(msg))
-                        binlog_backup_failed_record(c, instance, msg)
+                        reports.append(binlog_backup_failed_record(c, instance, msg))
                     # else:
                     # 这里打日志的话，有助于排查问题，但是日志有点多
                     # logger.info("+===+++++=== {} binlog 序号连续 +++++===++++ ".format(kvstore_filter))
@@ -140,17 +139,19 @@ def _check_tendis_binlog_backup():
                         len(bin_index_list), bin_index_list
                     )
                     logger.error("+===+++++=== {}+++++===++++ ".format(msg))
-                    binlog_backup_failed_record(c, instance, msg)
+                    reports.append(binlog_backup_failed_record(c, instance, msg))
                 else:
                     logger.info(_("+===+++++=== {} binlog 序号连续 +++++===++++ ".format(instance)))
 
+    RedisBackupCheckReport.objects.bulk_create(reports, batch_size=REDIS_BACKUP_REPORT_BATCH_SIZE)
+
 
-def binlog_backup_failed_record(c: Cluster, instance: str, msg: str):
+def binlog_backup_failed_record(c: Cluster, instance: str, msg: str) -> RedisBackupCheckReport:
     """
-    记录binlog备份失败的集群和实例
+    构造binlog备份失败的集群和实例记录，由调用方批量写入
     """
     logger.info(_("+===++=== 实例{}binlog备份失败，集群类型{}写入表 ++++++++ ".format(instance, c.cluster_type)))
-    RedisBackupCheckReport.objects.create(
+    return RedisBackupCheckReport(
         creator=c.creator,
         bk_biz_id=c.bk_biz_id,
         bk_cloud_id=c.bk_cloud_id,
@@ -11,21 +11,64 @@ specific language governing permissions and limitations under the License.
 import logging
 from collections import defaultdict
 from datetime import datetime, timedelta
+from typing import Dict, List, Tuple
 
 from django.db.models import Q
 from django.utils import timezone
 from django.utils.translation import ugettext as _
 
+from backend import env
 from backend.constants import IP_PORT_DIVIDER
 from backend.db_meta.enums import ClusterType, InstanceRole
-from backend.db_meta.models import Cluster
+from backend.db_meta.models import Cluster, StorageInstanceTuple
 from backend.db_report.enums import RedisBackupCheckSubType
 from backend.db_report.models import RedisBackupCheckReport
 
-from .bklog_query import ClusterBackup
+from .bklog_query import ClusterBackup, query_full_logs_by_cluster
 
 logger = logging.getLogger("root")
 
+# 批量写入巡检报告的批次大小
+REDIS_BACKUP_REPORT_BATCH_SIZE = 1000
+
+
+def get_yesterday_time_range() -> Tuple[datetime, datetime]:
+    """巡检前一天的时间范围"""
+    yesterday = datetime.now(timezone.utc) - timedelta(days=1)
+    start_time = datetime(yesterday.year, yesterday.month, yesterday.day).astimezone(timezone.utc)
+    end_time = datetime(yesterday.year, yesterday.month, yesterday.day, 23, 59, 59).astimezone(timezone.utc)
+    return start_time, end_time
+
+
+def get_cluster_master_slaves(clusters: List[Cluster]) -> Dict[int, List[Tuple[str, str]]]:
+    """
+    一次查询集群的主从对应关系，过滤掉 刚扩容，重建热备-> 创建时间小于24小时的slave
+    返回 {cluster_id: [(master ip:port, slave ip:port)]}
+    """
+    master_slaves = defaultdict(list)
+    for cluster_id, master_ip, master_port, slave_ip, slave_port in (
+        StorageInstanceTuple.objects.filter(
+            ejector__cluster__in=clusters,
+            ejector__instance_role=InstanceRole.REDIS_MASTER.value,
+            receiver__create_at__lte=timezone.now() - timedelta(hours=24),
+        )
+        .order_by("id")
+        .values_list(
+            "ejector__cluster",
+            "ejector__machine__ip",
+            "ejector__port",
+            "receiver__machine__ip",
+            "receiver__port",
+        )
+    ):
+        master_slaves[cluster_id].append(
+            (
+                "{}{}{}".format(master_ip, IP_PORT_DIVIDER, master_port),
+                "{}{}{}".format(slave_ip, IP_PORT_DIVIDER, slave_port),
+            )
+        )
+    return master_slaves
+
 
 def check_full_backup():
     _check_tendis_full_backup()
@@ -68,57 +111,41 @@ def _check_tendis_full_backup():
         | Q(cluster_type=ClusterType.TwemproxyTendisSSDInstance)
         | Q(cluster_type=ClusterType.TendisTwemproxyRedisInstance)
     ) & Q(create_at__lt=timezone.now() - timedelta(days=1))
+    clusters = list(Cluster.objects.filter(query))
+    master_slaves = get_cluster_master_slaves(clusters)
+
+    start_time, end_time = get_yesterday_time_range()
+    #  	 +===+++++=== start_time is: 2023-10-25 00:00:00 ,end_time is :2023-10-25 23:59:59 +++++===++++
+    logger.info("+===+++++=== start_time is: {} ,end_time is :{} +++++===++++ ".format(start_time, end_time))
+    # 批量模式下一次拉取全平台的全备份记录，按集群分组
+    cluster_bklogs = query_full_logs_by_cluster(start_time, end_time) if env.BACKUP_CHECK_BULK_QUERY else None
+
     # 遍历集群
-    for c in Cluster.objects.filter(query):
+    reports = []
+    for c in clusters:
         logger.info("+===+++++===  start check {} full backup +++++===++++ ".format(c.immute_domain))
         logger.info("+===+++++===  cluster type is: {} +++++===++++ ".format(c.cluster_type))
-        cluster_slave_instance = []  # 初始化集群slave列表
-        cluster_master_instance = []  # 初始化集群master列表
-        cluster_all_instance = []
-        bklog_success_instance_count = {}  # 初始化字典：节点和对应的备份次数
-        slave_ins_map = defaultdict()  # 主从节点对应关系
-
-        for master_obj in c.storageinstance_set.filter(instance_role=InstanceRole.REDIS_MASTER.value):
-            slave_obj = master_obj.as_ejector.get().receiver
-            current_datetime = timezone.now()
-            # 计算时间差
-            time_difference = current_datetime - slave_obj.create_at
-            # 判断时间差是否大于等于24小时  # 过滤掉 刚扩容，重建热备-> 创建时间小于24小时
-            if time_difference >= timedelta(hours=24):
-                # 进行相应的操作
-                cluster_slave_instance.append("{}{}{}".format(slave_obj.machine.ip, IP_PORT_DIVIDER, slave_obj.port))
-                cluster_master_instance.append(
-                    "{}{}{}".format(master_obj.machine.ip, IP_PORT_DIVIDER, master_obj.port)
-                )
-                slave_ins_map[
-                    "{}{}{}".format(slave_obj.machine.ip, IP_PORT_DIVIDER, slave_obj.port)
-                ] = "{}{}{}".format(master_obj.machine.ip, IP_PORT_DIVIDER, master_obj.port)
-
-        cluster_all_instance.extend(cluster_slave_instance)
-        cluster_all_instance.extend(cluster_master_instance)
+        # 主从节点对应关系
+        slave_ins_map = {slave: master for master, slave in master_slaves[c.id]}
+        cluster_slave_instance = list(slave_ins_map.keys())  # 集群slave列表
+        cluster_master_instance = list(slave_ins_map.values())  # 集群master列表
+        cluster_all_instance = cluster_slave_instance + cluster_master_instance
         logger.info("+===+++++===  cluster slave instance  is: {} +++++===++++ ".format(cluster_slave_instance))
 
-        # 初始化所有 instance 的计数为 0
-        for instance in cluster_all_instance:
-            bklog_success_instance_count[instance] = 0
+        # 初始化所有 instance 的计数为 0：节点和对应的备份次数
+        bklog_success_instance_count = {instance: 0 for instance in cluster_all_instance}
 
-        now = datetime.now(timezone.utc)
-        yesterday = now - timedelta(days=1)
-        start_time = datetime(yesterday.year, yesterday.month, yesterday.day).astimezone(timezone.utc)
-        end_time = datetime(yesterday.year, yesterday.month, yesterday.day, 23, 59, 59).astimezone(timezone.utc)
-        #  	 +===+++++=== start_time is: 2023-10-25 00:00:00 ,end_time is :2023-10-25 23:59:59 +++++===++++
-        logger.info("+===+++++=== start_time is: {} ,end_time is :{} +++++===++++ ".format(start_time, end_time))
         # 集群前一天对应的集群备份记录
-        backup = ClusterBackup(c.id, c.immute_domain)
-        # 集群纬度的，假设一开始是备份完整的，后面会去校验对这个值进行赋值，如果有存在异常会赋值为False
-
-        bklogs = backup.query_full_log_from_bklog(start_time, end_time)
+        if cluster_bklogs is None:
+            bklogs = ClusterBackup(c.id, c.immute_domain).query_full_log_from_bklog(start_time, end_time)
+        else:
+            bklogs = cluster_bklogs.get(c.immute_domain, [])
         # 如果集群维度没有数据，就不用在看节点维度了
         if not bklogs:
             msg = _("无法查找到在时间范围内{}-{}，集群{}的全备份日志").format(start_time, end_time, c.immute_domain)
             logger.error(msg)
             instance = "all instance"
-            full_backup_failed_record(c, instance, msg)
+            reports.append(full_backup_failed_record(c, instance, msg))
             continue
 
         logger.info(_("+===+++++===  {} 集群维度日志不为空 +++++===++++ ".format(c.immute_domain)))
@@ -128,20 +155,18 @@ def _check_tendis_full_backup():
                 logger.error("+===+++++=== to_backup_system_failed bklog: {} +++++===++++ ".format(bklog))
                 msg = bklog["backup_status_info"]
                 instance = bklog["redis_ip"] + IP_PORT_DIVIDER + str(bklog["redis_port"])
-                full_backup_failed_record(c, instance, msg)
+                reports.append(full_backup_failed_record(c, instance, msg))
 
-            # 对成功的进行处理
+            # 对成功的进行处理，集群的master和slave 都进行统计
             if bklog.get("backup_status", "") == "to_backup_system_success":
-                # 集群的master和slave 都进行统计
-                for instance in cluster_all_instance:
-                    ip, port = instance.split(":")
-                    if ip == bklog["redis_ip"] and int(port) == bklog["redis_port"]:
-                        # 找到匹配的项，更新计数
-                        bklog_success_instance_count[instance] += 1
+                instance = bklog["redis_ip"] + IP_PORT_DIVIDER + str(bklog["redis_port"])
+                if instance in bklog_success_instance_count:
+                    # 找到匹配的项，更新计数
+                    bklog_success_instance_count[instance] += 1
         # 校验instance和对应的计数：可能存在master备份，也可能存在slave的备份
         for instance, count in bklog_success_instance_count.items():
             # 默认是对slave进行备份，slave进行校验
-            if instance not in cluster_slave_instance:
+            if instance not in slave_ins_map:
                 continue
             logger.info(_("+===++==={}正常备份次数{}，集群类型{} ++++++++ ".format(instance, count, c.cluster_type)))
             # ssd,plus 每天备份一次
@@ -162,15 +187,17 @@ def _check_tendis_full_backup():
                     instance, count, master_instance, master_backup_count, expect_count
                 )
                 # 记录备份失败的集群和实例
-                full_backup_failed_record(c, instance, msg)
+                reports.append(full_backup_failed_record(c, instance, msg))
+
+    RedisBackupCheckReport.objects.bulk_create(reports, batch_size=REDIS_BACKUP_REPORT_BATCH_SIZE)
 
 
-def full_backup_failed_record(c: Cluster, instance: str, msg: str):
+def full_backup_failed_record(c: Cluster, instance: str, msg: str) -> RedisBackupCheckReport:
     """
-    记录全备备份失败的集群和实例
+    构造全备备份失败的集群和实例记录，由调用方批量写入
     """
     logger.info(_("+===++===  实例{}全备份失败，集群类型{}写入表 ++++++++ ".format(instance, c.cluster_type)))
-    RedisBackupCheckReport.objects.create(
+    return RedisBackupCheckReport(
         creator=c.creator,
         bk_biz_id=c.bk_biz_id,
         bk_cloud_id=c.bk_cloud_id,
@@ -39,6 +39,8 @@ class InstancesSerializer(BaseProxyPassSerializer):
     )
     hash_cnt = serializers.IntegerField(help_text=_("哈希分片数"), required=False)
     hash_value = serializers.IntegerField(help_text=_("哈希分片值"), required=False)
+    version = serializers.CharField(help_text=_("已持有的拓扑版本"), required=False, allow_blank=True)
+    delta = serializers.BooleanField(help_text=_("是否只返回相对version的增量"), required=False, default=False)
 
 
 class InstancesResponseSerializer(serializers.Serializer):
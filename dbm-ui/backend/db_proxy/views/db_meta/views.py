@@ -8,11 +8,13 @@ Unless required by applicable law or agreed to in writing, software distributed
 an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
 specific language governing permissions and limitations under the License.
 """
+from django.http import StreamingHttpResponse
 from django.utils.translation import ugettext_lazy as _
 from rest_framework import status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
+from backend import env
 from backend.bk_web.swagger import common_swagger_auto_schema
 from backend.db_meta import api
 from backend.db_meta.api import dbha as DBHA
@@ -37,6 +39,7 @@ from backend.db_proxy.views.db_meta.serializers import (
     UpdateStatusSerializer,
 )
 from backend.db_proxy.views.views import BaseProxyPassViewSet
+from backend.utils.local import local
 
 
 class DBMetaApiProxyPassViewSet(BaseProxyPassViewSet):
@@ -53,7 +56,16 @@ class DBMetaApiProxyPassViewSet(BaseProxyPassViewSet):
     @action(methods=["POST"], detail=False, serializer_class=InstancesSerializer, url_path="dbmeta/dbha/instances")
     def instances(self, request):
         validated_data = self.params_validate(self.get_serializer_class())
-        return Response(DBHA.instances(**validated_data))
+        version, delta = validated_data.pop("version", None), validated_data.pop("delta", False)
+        if not env.DBHA_TOPO_SNAPSHOT_ENABLE:
+            return Response(DBHA.instances(**validated_data))
+
+        # 携带版本号时返回带版本信息的结果(版本未变化时 not_modified=True)，否则保持原有的列表格式
+        result = DBHA.instances_snapshot(version=version, delta=delta, **validated_data)
+        headers = {"ETag": f'"{result["version"]}"'}
+        if version or delta:
+            return Response(result, headers=headers)
+        return Response(result["instances"], headers=headers)
 
     @common_swagger_auto_schema(
         operation_summary=_("[dbmeta]实例角色交换"),
@@ -107,6 +119,21 @@ class DBMetaApiProxyPassViewSet(BaseProxyPassViewSet):
         validated_data = self.params_validate(self.get_serializer_class())
         return Response(DBHA.update_status(validated_data["payloads"], validated_data["bk_cloud_id"]))
 
+    @common_swagger_auto_schema(
+        operation_summary=_("[dbmeta]批量状态更新"),
+        request_body=UpdateStatusSerializer(),
+        tags=[SWAGGER_TAG],
+    )
+    @action(
+        methods=["POST"],
+        detail=False,
+        serializer_class=UpdateStatusSerializer,
+        url_path="dbmeta/dbha/bulk_update_status",
+    )
+    def bulk_update_status(self, request):
+        validated_data = self.params_validate(self.get_serializer_class())
+        return Response(DBHA.bulk_update_status(validated_data["payloads"], validated_data["bk_cloud_id"]))
+
     @common_swagger_auto_schema(
         operation_summary=_("[dbmeta]查询entry信息"),
         request_body=EntryDetailSerializer(),
@@ -229,10 +256,15 @@ class DBMetaApiProxyPassViewSet(BaseProxyPassViewSet):
     )
     def biz_clusters(self, request):
         validated_data = self.params_validate(self.get_serializer_class())
-        data = api.priv_manager.biz_clusters(
-            bk_biz_id=validated_data["bk_biz_id"],
-            immute_domains=validated_data["immute_domains"],
-        )
+        bk_biz_id, immute_domains = validated_data["bk_biz_id"], validated_data["immute_domains"]
+        # 集群数很多的业务以流式返回，响应结构与 BKAPIRenderer 保持一致
+        if api.priv_manager.biz_clusters_need_stream(bk_biz_id, immute_domains):
+            envelope = {"code": 0, "message": "OK", "request_id": local.request_id}
+            return StreamingHttpResponse(
+                api.priv_manager.stream_biz_clusters(bk_biz_id, immute_domains, envelope=envelope),
+                content_type="application/json",
+            )
+        data = api.priv_manager.biz_clusters(bk_biz_id=bk_biz_id, immute_domains=immute_domains)
         return Response(data)
 
     @common_swagger_auto_schema(
@@ -18,6 +18,7 @@ from django.utils.translation import ugettext_lazy as _
 
 from backend.constants import IP_PORT_DIVIDER
 from backend.db_meta.enums import ClusterEntryType, ClusterType, InstanceRole
+from backend.db_meta.enums.cluster_status import ClusterStatusFlags
 from backend.db_meta.enums.comm import SystemTagEnum
 from backend.db_meta.models import AppCache, Cluster, ClusterEntry, DBModule, Machine, ProxyInstance, StorageInstance
 from backend.db_services.dbbase.instances.handlers import InstanceHandler
@@ -77,6 +78,8 @@ class CommonQueryResourceMixin(abc.ABC):
             clusters = clusters.filter(id__in=cluster_ids)
 
         cluster_entry_map = ClusterEntry.get_cluster_entry_map(cluster_ids=list(clusters.values_list("id", flat=True)))
+        # 批量获取集群的访问端口，避免逐个集群查询
+        cluster_access_info_map = Cluster.get_access_info_map(clusters)
 
         # 初始化用于存储Excel数据的字典列表
         headers = [
@@ -86,6 +89,7 @@ class CommonQueryResourceMixin(abc.ABC):
             {"id": "cluster_type", "name": _("集群类型")},
             {"id": "master_domain", "name": _("主域名")},
             {"id": "slave_domain", "name": _("从域名")},
+            {"id": "cluster_access_port", "name": _("访问端口")},
             {"id": "major_version", "name": _("主版本")},
             {"id": "region", "name": _("地域")},
             {"id": "disaster_tolerance_level", "name": _("容灾级别")},
@@ -120,6 +124,7 @@ class CommonQueryResourceMixin(abc.ABC):
                 "cluster_type": cluster.cluster_type,
                 "master_domain": cluster.immute_domain,
                 "slave_domain": cluster_entry_map[cluster.id].get("slave_domain", ""),
+                "cluster_access_port": cluster_access_info_map[cluster.id]["access_port"],
                 "major_version": cluster.major_version,
                 "region": cluster.region,
                 "disaster_tolerance_level": cluster.get_disaster_tolerance_level_display(),
@@ -434,7 +439,13 @@ class ListRetrieveResource(BaseListRetrieveResource):
             cluster_queryset = cluster_queryset.order_by(query_params.get("ordering"))
 
         cluster_infos = cls._filter_cluster_hook(
-            bk_biz_id, cluster_queryset, proxy_queryset, storage_queryset, limit, offset
+            bk_biz_id,
+            cluster_queryset,
+            proxy_queryset,
+            storage_queryset,
+            limit,
+            offset,
+            last_id=query_params.get("last_id"),
         )
         return cluster_infos
 
@@ -457,27 +468,32 @@ class ListRetrieveResource(BaseListRetrieveResource):
         @param storage_queryset: 过滤的storage查询集
         @param limit: 分页限制
         @param offset: 分页起始
+        @param kwargs: last_id 不为空时使用 keyset 分页，按集群ID倒序返回 id < last_id 的集群，忽略 offset
         """
 
-        count = cluster_queryset.count()
+        # 计数和分页都只涉及集群ID，去重也只在ID上进行
+        count = cluster_queryset.values("id").count()
         limit = count if limit == -1 else limit
         if count == 0:
             return ResourceList(count=0, data=[])
 
-        # 预取proxy_queryset，storage_queryset，clusterentry_set,加块查询效率
-        cluster_queryset = cluster_queryset[offset : limit + offset].prefetch_related(
+        last_id = kwargs.get("last_id")
+        if last_id is not None:
+            cluster_queryset, offset = cluster_queryset.filter(id__lt=last_id).order_by("-id"), 0
+        cluster_ids = list(dict.fromkeys(cluster_queryset.values_list("id", flat=True)[offset : limit + offset]))
+
+        # 只对当前页的集群预取proxy，storage，clusterentry，加快查询效率
+        clusters = Cluster.objects.filter(id__in=cluster_ids).prefetch_related(
             Prefetch("proxyinstance_set", queryset=proxy_queryset.select_related("machine"), to_attr="proxies"),
             Prefetch("storageinstance_set", queryset=storage_queryset.select_related("machine"), to_attr="storages"),
             "tag_set",
-            # 预取优化access_port。TODO: 如果access port作为集群字段则删除当前逻辑
-            "proxyinstance_set",
-            "storageinstance_set",
             Prefetch("clusterentry_set", to_attr="entries"),
         )
-        cluster_ids = list(cluster_queryset.values_list("id", flat=True))
+        cluster_id__cluster = {cluster.id: cluster for cluster in clusters}
+        cluster_queryset = [cluster_id__cluster[cluster_id] for cluster_id in cluster_ids]
 
         # 获取集群与访问入口的映射
-        cluster_entry_map = ClusterEntry.get_cluster_entry_map([cluster.id for cluster in cluster_queryset])
+        cluster_entry_map = ClusterEntry.get_cluster_entry_map(cluster_ids)
 
         # 获取DB模块的映射信息
         db_module_names_map = {
@@ -488,10 +504,19 @@ class ListRetrieveResource(BaseListRetrieveResource):
         # 获取集群操作记录的映射关系
         cluster_operate_records_map = ClusterOperateRecord.get_cluster_records_map(cluster_ids)
 
+        # 批量计算集群的状态标志
+        cluster_status_flags_map = Cluster.get_status_flags_map(cluster_queryset)
+
+        # 批量获取集群的访问端口等信息
+        cluster_access_info_map = Cluster.get_access_info_map(cluster_queryset)
+
         # 获取云区域信息和业务信息
         cloud_info = ResourceQueryHelper.search_cc_cloud(get_cache=True)
         biz_info = AppCache.objects.get(bk_biz_id=bk_biz_id)
 
+        # 集群统计信息每次请求只读取一次
+        cluster_stats_map = Cluster.get_cluster_stats(cls.cluster_types)
+
         # 将集群的查询结果序列化为集群字典信息
         clusters: List[Dict[str, Any]] = []
         for cluster in cluster_queryset:
@@ -506,7 +531,9 @@ class ListRetrieveResource(BaseListRetrieveResource):
                 cluster_operate_records_map=cluster_operate_records_map,
                 cloud_info=cloud_info,
                 biz_info=biz_info,
-                cluster_stats_map=Cluster.get_cluster_stats(cls.cluster_types),
+                cluster_stats_map=cluster_stats_map,
+                cluster_status_flags_map=cluster_status_flags_map,
+                cluster_access_info_map=cluster_access_info_map,
                 **kwargs,
             )
             clusters.append(cluster_info)
@@ -536,16 +563,20 @@ class ListRetrieveResource(BaseListRetrieveResource):
         """
         cluster_entry_map_value = cluster_entry_map.get(cluster.id, {})
         bk_cloud_name = cloud_info.get(str(cluster.bk_cloud_id), {}).get("bk_cloud_name", "")
+        status_flag = kwargs.get("cluster_status_flags_map", {}).get(cluster.id, ClusterStatusFlags(0))
+        access_info = kwargs.get("cluster_access_info_map", {}).get(cluster.id)
         return {
             "id": cluster.id,
             "phase": cluster.phase,
             "phase_name": cluster.get_phase_display(),
             "status": cluster.status,
+            "status_flag": status_flag.value,
+            "status_flag_text": status_flag.flag_text() if status_flag else [],
             "operations": cluster_operate_records_map.get(cluster.id, []),
             "cluster_time_zone": cluster.time_zone,
             "cluster_name": cluster.name,
             "cluster_alias": cluster.alias,
-            "cluster_access_port": cluster.access_port,
+            "cluster_access_port": access_info["access_port"] if access_info else cluster.access_port,
             "cluster_stats": cluster_stats_map.get(cluster.immute_domain, {}),
             "cluster_type": cluster.cluster_type,
             "cluster_type_name": ClusterType.get_choice_label(cluster.cluster_type),
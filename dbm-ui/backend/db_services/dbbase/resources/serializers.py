@@ -32,6 +32,7 @@ class ListResourceSLZ(serializers.Serializer):
     db_module_id = serializers.CharField(required=False, help_text=_("所属DB模块"))
     bk_cloud_id = serializers.CharField(required=False, help_text=_("管控区域"))
     cluster_type = serializers.CharField(required=False, help_text=_("集群类型"))
+    last_id = serializers.IntegerField(required=False, help_text=_("keyset分页: 上一页最后的集群ID，按集群ID倒序查询"))
 
 
 class ListMySQLResourceSLZ(ListResourceSLZ):
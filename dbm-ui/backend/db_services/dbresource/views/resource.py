@@ -57,6 +57,7 @@ from backend.db_services.ipchooser.handlers.topo_handler import TopoHandler
 from backend.db_services.ipchooser.query.resource import ResourceQueryHelper
 from backend.db_services.ipchooser.types import ScopeList
 from backend.flow.consts import FAILED_STATES, SUCCEED_STATES
+from backend.flow.engine.bamboo.scene.common.builder import FlowNodeBuffer
 from backend.flow.engine.controller.base import BaseController
 from backend.flow.models import FlowTree
 from backend.iam_app.dataclass import ResourceEnum
@@ -206,7 +207,8 @@ class DBResourceViewSet(viewsets.SystemViewSet):
         DBResourceApi.import_operation_create(params=import_record)
 
         # 执行资源导入的后台flow
-        BaseController(root_id=root_id, ticket_data=validated_data).import_resource_init_step()
+        with FlowNodeBuffer.scope():
+            BaseController(root_id=root_id, ticket_data=validated_data).import_resource_init_step()
 
         # 缓存当前任务，并删除过期导入任务
         now = int(time.time())
@@ -33,6 +33,7 @@ from backend.db_services.mysql.sql_import.exceptions import SQLImportBaseExcepti
 from backend.db_services.taskflow.handlers import TaskFlowHandler
 from backend.flow.consts import StateType
 from backend.flow.engine.bamboo.engine import BambooEngine
+from backend.flow.engine.bamboo.scene.common.builder import FlowNodeBuffer
 from backend.flow.engine.controller.mysql import MySQLController
 from backend.flow.engine.controller.spider import SpiderController
 from backend.flow.models import FlowNode, FlowTree
@@ -189,10 +190,11 @@ class SQLHandler(object):
             "is_auto_commit": is_auto_commit,
         }
         try:
-            if self.cluster_type == DBType.MySQL:
-                MySQLController(root_id=root_id, ticket_data=ticket_data).mysql_sql_semantic_check_scene()
-            elif self.cluster_type == DBType.TenDBCluster:
-                SpiderController(root_id=root_id, ticket_data=ticket_data).spider_semantic_check_scene()
+            with FlowNodeBuffer.scope():
+                if self.cluster_type == DBType.MySQL:
+                    MySQLController(root_id=root_id, ticket_data=ticket_data).mysql_sql_semantic_check_scene()
+                elif self.cluster_type == DBType.TenDBCluster:
+                    SpiderController(root_id=root_id, ticket_data=ticket_data).spider_semantic_check_scene()
         except Exception as e:  # pylint: disable=broad-except
             raise SQLImportBaseException(_("模拟流程构建失败，错误信息: {}").format(e))
 
@@ -19,7 +19,7 @@ from typing import Tuple
 from django.utils import timezone
 from django.utils.translation import ugettext as _
 
-from backend.components import DRSApi
+from backend.components.db_remote_service.handler import DRSHandler
 from backend.db_meta.enums import InstanceRole
 from backend.db_meta.models import Cluster
 from backend.db_services.redis.maxmemory_set.models import TbTendisMaxmemoryBackends
@@ -97,22 +97,26 @@ class RedisClusterMaxmemorySet:
     def get_cluster_masters_used_memory(self):
         self.master_addrs = []
         self.master_ip_ports = defaultdict(list)
-        for master_obj in self.cluster.storageinstance_set.filter(instance_role=InstanceRole.REDIS_MASTER.value):
+        for master_obj in self.cluster.storageinstance_set.filter(
+            instance_role=InstanceRole.REDIS_MASTER.value
+        ).select_related("machine"):
             self.master_addrs.append("{}:{}".format(master_obj.machine.ip, master_obj.port))
             self.master_ip_ports[master_obj.machine.ip].append(master_obj.port)
-        resp = DRSApi.redis_rpc(
-            {
-                "addresses": self.master_addrs,
-                "db_num": 0,
-                "password": self.cluster_password.get("redis_password"),
-                "command": "info memory",
-            }
+        results = DRSHandler.redis_rpc(
+            [(self.cluster.bk_cloud_id, addr) for addr in self.master_addrs],
+            {"db_num": 0, "password": self.cluster_password.get("redis_password"), "command": "info memory"},
         )
         self.masters_used_memory = {}
-        for item in resp:
-            info_ret = decode_info_cmd(item["result"])
+        for addr, ret in results.items():
+            # 查询失败的master跳过，由 should_update_cluter_maxmemory 判断是否继续
+            if ret.error:
+                logger.warning(
+                    "cluster %s master %s info memory failed: %s", self.cluster.immute_domain, addr, ret.error
+                )
+                continue
+            info_ret = decode_info_cmd(ret.result)
             if "used_memory" in info_ret:
-                self.masters_used_memory[item["address"]] = int(info_ret["used_memory"])
+                self.masters_used_memory[addr] = int(info_ret["used_memory"])
 
     def is_dts_task_dst_cluster(self):
         current_time = datetime.now(timezone.utc).astimezone()
@@ -161,6 +165,10 @@ class RedisClusterMaxmemorySet:
 
     # 是否满足更新cluster maxmemory的条件
     def should_update_cluter_maxmemory(self) -> Tuple[bool, str]:
+        # 部分master的used_memory获取失败时，本轮不更新，避免按不完整的数据设置maxmemory
+        failed_master_addrs = [addr for addr in self.master_addrs if addr not in self.masters_used_memory]
+        if failed_master_addrs:
+            return False, _("集群master {} 的 used_memory获取失败").format(",".join(failed_master_addrs))
         old_backends_row = TbTendisMaxmemoryBackends.objects.filter(cluster_domain=self.cluster.immute_domain).first()
         if not old_backends_row:
             return True, _("首次通过外围程序设置maxmemory")
@@ -8,15 +8,13 @@ Unless required by applicable law or agreed to in writing, software distributed
 an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
 specific language governing permissions and limitations under the License.
 """
-import json
 import logging.config
 from datetime import datetime, timedelta
 from typing import Any, Dict, List, Union
 
 from django.utils.translation import ugettext as _
 
-from backend import env
-from backend.components.bklog.client import BKLogApi
+from backend.components.bklog.handler import BKLogHandler
 from backend.db_meta.enums import ClusterType, InstanceInnerRole
 from backend.db_meta.models.cluster import Cluster
 from backend.db_services.redis.rollback.constants import (
@@ -24,7 +22,6 @@ from backend.db_services.redis.rollback.constants import (
     BACKUP_LOG_ROLLBACK_TIME_RANGE_HOURS,
 )
 from backend.exceptions import AppBaseException
-from backend.utils.string import pascal_to_snake
 from backend.utils.time import datetime2str, find_nearby_time, str2datetime
 
 logger = logging.getLogger("flow")
@@ -90,25 +87,8 @@ class DataStructureHandler:
         @param end_time: 结束时间
         @param query_string: 过滤条件
         """
-        resp = BKLogApi.esquery_search(
-            {
-                "indices": f"{env.DBA_APP_BK_BIZ_ID}_bklog.{collector}",
-                "start_time": datetime2str(start_time1),
-                "end_time": datetime2str(end_time1),
-                # 这里需要精确查询集群域名，所以可以通过log: "key: \"value\""的格式查询
-                "query_string": query_string,
-                "start": 0,
-                "size": 6000,
-                "sort_list": [["dtEventTimeStamp", "asc"], ["gseIndex", "asc"], ["iterationIndex", "asc"]],
-            },
-            use_admin=True,
-        )
-        backup_logs = []
-        for hit in resp["hits"]["hits"]:
-            raw_log = json.loads(hit["_source"]["log"])
-            backup_logs.append({pascal_to_snake(key): value for key, value in raw_log.items()})
-
-        return backup_logs
+        # 时间范围内的备份记录可能超过单页条数，这里滚动查询全部日志
+        return BKLogHandler.query_logs(collector, start_time1, end_time1, query_string, size=None)
 
     def get_bklog_by_domain(self, start_time: datetime, end_time: datetime) -> List[Dict]:
         """
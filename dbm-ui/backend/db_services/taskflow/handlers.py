@@ -9,6 +9,7 @@ an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express o
 specific language governing permissions and limitations under the License.
 """
 
+import heapq
 import json
 import logging
 import re
@@ -16,7 +17,7 @@ import time
 from datetime import timedelta
 from json import JSONDecodeError
 from operator import itemgetter
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterator, List, Optional
 
 from bamboo_engine.api import EngineAPIResult
 from bamboo_engine.eri import NodeType
@@ -25,7 +26,7 @@ from django.utils.translation import gettext as _
 
 from backend import env
 from backend.bk_web.constants import LogLevelName
-from backend.components import BKLogApi
+from backend.components.bklog.handler import BKLogHit, BKLogSearch
 from backend.db_services.taskflow import task
 from backend.db_services.taskflow.constants import LOG_START_STRIP_PATTERN
 from backend.db_services.taskflow.exceptions import (
@@ -38,7 +39,7 @@ from backend.flow.consts import StateType
 from backend.flow.engine.bamboo.engine import BambooEngine
 from backend.flow.models import FlowNode, FlowTree
 from backend.utils.string import format_json_string
-from backend.utils.time import calculate_cost_time, datetime2str
+from backend.utils.time import calculate_cost_time
 
 logger = logging.getLogger("root")
 
@@ -182,19 +183,9 @@ class TaskFlowHandler:
         return ""
 
     @staticmethod
-    def bklog_esquery_search(indices, query_string, start_time, end_time):
-        """esquery搜索"""
-        resp = BKLogApi.esquery_search(
-            {
-                "indices": indices,
-                "start_time": start_time,
-                "end_time": end_time,
-                "query_string": query_string,
-                "start": 0,
-                "size": 10000,
-            }
-        )
-        return resp["hits"]["hits"]
+    def bklog_esquery_search(collector, query_string, start_time, end_time) -> Iterator[BKLogHit]:
+        """esquery搜索，按时间顺序逐条返回时间范围内的全部日志"""
+        return iter(BKLogSearch(collector, start_time, end_time, query_string, use_admin=False))
 
     def get_version_logs(self, node_id: str, version_id: str) -> List[Dict[str, Dict[str, str]]]:
         """获取节点的日志信息"""
@@ -205,33 +196,35 @@ class TaskFlowHandler:
         if flow_node.updated_at < timezone.now() - timedelta(days=7):
             return [self.generate_log_record(message=_("节点日志仅保留7天"))]
 
-        start_time = datetime2str(flow_node.started_at)
-        end_time = datetime2str(flow_node.updated_at + timedelta(days=7))
+        start_time = flow_node.started_at
+        end_time = flow_node.updated_at + timedelta(days=7)
         dbm_logs = self.bklog_esquery_search(
-            indices=f"{env.DBA_APP_BK_BIZ_ID}_bklog.dbm_log",
+            collector="dbm_log",
             query_string=f"({self.root_id} AND {node_id} AND {version_id})"
             f" AND (__ext.io_kubernetes_pod:*worker* OR __ext.io_kubernetes_pod:*dbsimulation*)",
             start_time=start_time,
             end_time=end_time,
         )
         dbm_dbactuator_logs = self.bklog_esquery_search(
-            indices=f"{env.DBA_APP_BK_BIZ_ID}_bklog.dbm_dbactuator",
+            collector="dbm_dbactuator",
             query_string=f"{self.root_id} AND {node_id} AND {version_id}",
             start_time=start_time,
             end_time=end_time,
         )
         logs = []
-        sorted_hits = sorted(
-            dbm_logs + dbm_dbactuator_logs,
-            key=lambda x: (x["_source"]["dtEventTimeStamp"], x["_source"]["gseIndex"], x["_source"]["iterationIndex"]),
+        # 两个采集项的日志均已按 BKLOG_SORT_LIST 排序，归并即可，无需全部加载到内存后再排序
+        sorted_hits = heapq.merge(
+            dbm_logs,
+            dbm_dbactuator_logs,
+            key=lambda x: (x.source["dtEventTimeStamp"], x.source["gseIndex"], x.source["iterationIndex"]),
         )
 
         for hit in sorted_hits:
-            log = self._format_log(hit["_source"]["log"], hit["_source"]["serverIp"], hit["_index"])
+            log = self._format_log(hit.raw_log, hit.source["serverIp"], hit.index)
             if log:
                 logs.append(
                     self.generate_log_record(
-                        timestamp=hit["_source"].get("time"), levelname=log["levelname"], message=log["log"]
+                        timestamp=hit.source.get("time"), levelname=log["levelname"], message=log["log"]
                     )
                 )
         if not logs:
@@ -170,6 +170,34 @@ GCS_SCR_OPERATOR = get_type_env(key="GCS_SCR_OPERATOR", _type=str, default="scr-
 # 是否启动mysql-dbbackup程序的版本逻辑选择，不启动默认统一安装社区版本
 MYSQL_BACKUP_PKG_MAP_ENABLE = get_type_env(key="MYSQL_BACKUP_PKG_MAP_ENABLE", _type=bool, default=False)
 
+# 备份巡检一次拉取全平台当天的备份日志，按集群分组后统一校验，关闭时按集群逐个查询日志平台
+BACKUP_CHECK_BULK_QUERY = get_type_env(key="BACKUP_CHECK_BULK_QUERY", _type=bool, default=True)
+
 # bkdbm 通知机器人的key
 WECOM_ROBOT = get_type_env(key="WECOM_ROBOT", _type=str, default="")
 MYSQL_CHATID = get_type_env(key="MYSQL_CHATID", _type=str, default="")
+
+# DataAPI 连接池配置：进程内按域名复用 keep-alive 连接，避免每次请求都重新握手
+DATA_API_POOLED_TRANSPORT = get_type_env(key="DATA_API_POOLED_TRANSPORT", _type=bool, default=True)
+# 单个域名的最大连接数
+DATA_API_POOL_MAXSIZE = get_type_env(key="DATA_API_POOL_MAXSIZE", _type=int, default=20)
+# 单个域名的最大连接数(按域名单独配置)，格式: host1=30,host2=10
+DATA_API_POOL_HOST_MAXSIZE = get_type_env(key="DATA_API_POOL_HOST_MAXSIZE", _type=dict, default={})
+# 连接池满时是否阻塞等待空闲连接，默认不阻塞(超出的连接用完即关闭)
+DATA_API_POOL_BLOCK = get_type_env(key="DATA_API_POOL_BLOCK", _type=bool, default=False)
+
+# dbha/instances 拓扑快照开关及最长缓存时间(秒)，拓扑变更信号之外的批量更新最多延迟该时间生效
+DBHA_TOPO_SNAPSHOT_ENABLE = get_type_env(key="DBHA_TOPO_SNAPSHOT_ENABLE", _type=bool, default=True)
+DBHA_TOPO_SNAPSHOT_TTL = get_type_env(key="DBHA_TOPO_SNAPSHOT_TTL", _type=int, default=60)
+
+# BkJobService 节点的 JOB 任务状态集中轮询开关
+JOB_STATUS_POLLER_ENABLE = get_type_env(key="JOB_STATUS_POLLER_ENABLE", _type=bool, default=True)
+
+# dbmon 心跳巡检按集群分批聚合查询监控，关闭后退化为逐个集群查询
+DBMON_HEARTBEAT_GROUPED_QUERY = get_type_env(key="DBMON_HEARTBEAT_GROUPED_QUERY", _type=bool, default=True)
+
+# 构造流程时 DBConfig 的流程级读缓存开关
+DBCONFIG_FLOW_CACHE_ENABLE = get_type_env(key="DBCONFIG_FLOW_CACHE_ENABLE", _type=bool, default=True)
+
+# 单据互斥矩阵的编译缓存文件，excel 或单据类型变化后自动重新编译，为空时使用系统临时目录(见 settings)
+EXCLUSIVE_TICKET_MATRIX_CACHE_PATH = get_type_env(key="EXCLUSIVE_TICKET_MATRIX_CACHE_PATH", _type=str, default="")
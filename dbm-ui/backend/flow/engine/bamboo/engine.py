@@ -8,7 +8,6 @@ Unless required by applicable law or agreed to in writing, software distributed
 an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
 specific language governing permissions and limitations under the License.
 """
-import copy
 import logging
 from collections import defaultdict
 from typing import Any, Dict, List, Optional, Union
@@ -22,6 +21,7 @@ from pipeline.eri.models import State
 from pipeline.eri.runtime import BambooDjangoRuntime
 
 from backend.flow.engine.bamboo.builder import Builder
+from backend.flow.engine.bamboo.scene.common.builder import hide_sensitive_data
 from backend.flow.engine.exceptions import PipelineError
 from backend.flow.models import FlowNode, FlowTree, StateType
 from backend.ticket.constants import TicketType
@@ -48,8 +48,7 @@ class BambooEngine:
         if not start:
             return None
         pipeline = builder.build_tree(start_elem=start, id=self.root_id, data=pipeline_data)
-        pipeline_copy = copy.deepcopy(pipeline)
-        insensitive_data = self.hide_sensitive_data(pipeline_copy)
+        insensitive_data = hide_sensitive_data(pipeline)
         # 考虑到有些任务没有单据关联，因此uid一般为root_id，此时创建FlowTree的时候uid应该为null
         uid = self.data.get("uid") if isinstance(self.data.get("uid"), int) else None
         tree = FlowTree.objects.create(
@@ -143,16 +142,6 @@ class BambooEngine:
                 elif StateType.SUSPENDED in child_status:
                     status_tree["state"] = StateType.SUSPENDED
 
-    def hide_sensitive_data(self, copy_data: Dict):
-        """隐藏pipeline中敏感数据"""
-        for key, value in list(copy_data.items()):
-            if key == "inputs":
-                copy_data.pop(key)
-                continue
-            if type(value) == dict:
-                self.hide_sensitive_data(value)
-        return copy_data
-
     def recursion_subprocess_status(
         self, activities: Dict, flow_node_maps: Dict, node_children_status: Dict[str, Dict[str, Union[str, List]]]
     ):
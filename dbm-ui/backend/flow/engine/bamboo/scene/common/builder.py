@@ -8,9 +8,11 @@ Unless required by applicable law or agreed to in writing, software distributed
 an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
 specific language governing permissions and limitations under the License.
 """
-import copy
 import logging
-from typing import Any, Dict, Optional
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
 
 from bamboo_engine import api, builder
 from bamboo_engine.builder import (
@@ -36,6 +38,82 @@ from backend.ticket.constants import TicketType
 
 logger = logging.getLogger("json")
 
+# FlowNode 批量写入时每批的条数
+FLOW_NODE_BULK_CREATE_BATCH_SIZE = 1000
+
+
+class FlowNodeBuffer(object):
+    """
+    流程构建期间缓存 FlowNode 记录，在流程运行前按 root_id 一次性批量写入
+    主流程和子流程的 Builder 共用同一个 root_id，因此子流程的节点也会缓存到同一批次中
+    流程构造的入口需在 scope 作用域内执行，构造中途失败(未执行到 run_pipeline)时由作用域清理缓存
+    """
+
+    _local = threading.local()
+
+    @classmethod
+    def _buffers(cls) -> Dict[str, List[FlowNode]]:
+        if not hasattr(cls._local, "buffers"):
+            cls._local.buffers = defaultdict(list)
+        return cls._local.buffers
+
+    @classmethod
+    def add(cls, flow_node: FlowNode):
+        cls._buffers()[flow_node.root_id].append(flow_node)
+
+    @classmethod
+    def flush(cls, root_id: str) -> int:
+        """写入 root_id 下缓存的所有节点，返回写入的节点数"""
+        flow_nodes = cls._buffers().pop(root_id, [])
+        FlowNode.objects.bulk_create(flow_nodes, batch_size=FLOW_NODE_BULK_CREATE_BATCH_SIZE)
+        return len(flow_nodes)
+
+    @classmethod
+    def discard(cls, root_id: str) -> int:
+        """丢弃 root_id 下未写入的节点(流程构造或运行失败时)，返回丢弃的节点数"""
+        return len(cls._buffers().pop(root_id, []))
+
+    @classmethod
+    def discard_stale(cls, root_id: str) -> int:
+        """
+        不在 scope 作用域内时，同一线程同时只会构造一个主流程，其他 root_id 下的节点均为之前构造失败的残留
+        主流程初始化时丢弃这些节点，返回丢弃的节点数
+        """
+        if getattr(cls._local, "depth", 0):
+            return 0
+        stale_root_ids = [stale_root_id for stale_root_id in cls._buffers() if stale_root_id != root_id]
+        if stale_root_ids:
+            logger.warning("[flow_node_buffer] discard unflushed flow nodes of %s", stale_root_ids)
+        return sum(cls.discard(stale_root_id) for stale_root_id in stale_root_ids)
+
+    @classmethod
+    @contextmanager
+    def scope(cls):
+        """
+        流程构造的作用域，覆盖从 Builder 初始化到 run_pipeline 的整个过程，可嵌套
+        最外层作用域结束时丢弃线程中所有未写入的节点，避免构造失败的节点残留在长期运行的工作线程中
+        """
+        cls._local.depth = getattr(cls._local, "depth", 0) + 1
+        try:
+            yield
+        finally:
+            cls._local.depth -= 1
+            if not cls._local.depth:
+                buffers, cls._local.buffers = cls._buffers(), defaultdict(list)
+                if buffers:
+                    logger.warning("[flow_node_buffer] discard unflushed flow nodes of %s", list(buffers))
+
+
+def hide_sensitive_data(tree: Dict) -> Dict:
+    """
+    生成隐藏了 inputs 的流程树，只重建字典结构，不会拷贝 inputs 以及其他叶子节点的数据
+    """
+    return {
+        key: hide_sensitive_data(value) if type(value) == dict else value
+        for key, value in tree.items()
+        if key != "inputs"
+    }
+
 
 class Builder(object):
     """
@@ -76,6 +154,10 @@ class Builder(object):
         # 定义流程数据上下文参数trans_data
         self.rewritable_node_source_keys = []
 
+        # 主流程开始构造时清理之前构造失败残留的节点(子流程与主流程共用 root_id，不做清理)
+        if not isinstance(self, SubBuilder):
+            FlowNodeBuffer.discard_stale(self.root_id)
+
         # 判断是否添加临时账号的流程逻辑
         if self.need_random_pass_cluster_ids:
             self.create_random_pass_act()
@@ -137,7 +219,7 @@ class Builder(object):
 
         self.rewritable_node_source_keys.append({"source_act": act.id, "source_key": "trans_data"})
 
-        FlowNode.objects.create(uid=self.data.get("uid"), root_id=self.root_id, node_id=act.id)
+        FlowNodeBuffer.add(FlowNode(uid=self.data.get("uid"), root_id=self.root_id, node_id=act.id))
         if extend:
             self.pipe = self.pipe.extend(act)
         return act
@@ -150,7 +232,6 @@ class Builder(object):
         pg = ParallelGateway()
         cg = ConvergeGateway()
         acts = []
-        flow_node_list = []
 
         # 增加对传入的acts_list做合法判断
         if not isinstance(acts_list, list) or len(acts_list) == 0:
@@ -174,10 +255,9 @@ class Builder(object):
 
             self.rewritable_node_source_keys.append({"source_act": act.id, "source_key": "trans_data"})
 
-            flow_node_list.append(FlowNode(uid=self.data["uid"], root_id=self.root_id, node_id=act.id))
+            FlowNodeBuffer.add(FlowNode(uid=self.data["uid"], root_id=self.root_id, node_id=act.id))
             acts.append(act)
 
-        FlowNode.objects.bulk_create(flow_node_list)
         self.pipe = self.pipe.extend(pg).connect(*acts).to(pg).converge(cg)
 
     def add_sub_pipeline(self, sub_flow):
@@ -218,37 +298,35 @@ class Builder(object):
             source_act=self.rewritable_node_source_keys, type=Var.SPLICE, value=init_trans_data_class
         )
         self.pipe.extend(self.end_act)
-        pipeline = builder.build_tree(self.start_act, id=self.root_id, data=self.global_data)
-        pipeline_copy = copy.deepcopy(pipeline)
-        insensitive_data = self.hide_sensitive_data(pipeline_copy)
-        # 考虑到有些任务没有单据关联，因此uid一般为root_id，此时创建FlowTree的时候uid应该为null
-        uid = self.data.get("uid") if isinstance(self.data.get("uid"), int) else None
-        FlowTree.objects.create(
-            uid=uid,
-            ticket_type=self.data["ticket_type"],
-            root_id=self.root_id,
-            tree=insensitive_data,
-            bk_biz_id=self.data["bk_biz_id"],
-            status=StateType.CREATED,
-            created_by=self.data["created_by"],
-            db_type=TicketType.get_db_type_by_ticket(self.data["ticket_type"]),
-        )
+        try:
+            pipeline = builder.build_tree(self.start_act, id=self.root_id, data=self.global_data)
+            insensitive_data = self.hide_sensitive_data(pipeline)
+            FlowNodeBuffer.flush(self.root_id)
+            # 考虑到有些任务没有单据关联，因此uid一般为root_id，此时创建FlowTree的时候uid应该为null
+            uid = self.data.get("uid") if isinstance(self.data.get("uid"), int) else None
+            FlowTree.objects.create(
+                uid=uid,
+                ticket_type=self.data["ticket_type"],
+                root_id=self.root_id,
+                tree=insensitive_data,
+                bk_biz_id=self.data["bk_biz_id"],
+                status=StateType.CREATED,
+                created_by=self.data["created_by"],
+                db_type=TicketType.get_db_type_by_ticket(self.data["ticket_type"]),
+            )
 
-        if not api.run_pipeline(runtime=BambooDjangoRuntime(), pipeline=pipeline).result:
-            logger.error(_("部署bamboo流程任务创建失败，任务结束"))
-            return False
+            if not api.run_pipeline(runtime=BambooDjangoRuntime(), pipeline=pipeline).result:
+                logger.error(_("部署bamboo流程任务创建失败，任务结束"))
+                return False
 
-        return True
+            return True
+        finally:
+            # 构造或运行失败时不会执行 flush，这里清理缓存，避免节点残留在工作线程中
+            FlowNodeBuffer.discard(self.root_id)
 
-    def hide_sensitive_data(self, copy_data: Optional[Dict]) -> Optional[Dict]:
-        """隐藏pipeline中敏感数据"""
-        for key, value in list(copy_data.items()):
-            if key == "inputs":
-                copy_data.pop(key)
-                continue
-            if type(value) == dict:
-                self.hide_sensitive_data(value)
-        return copy_data
+    def hide_sensitive_data(self, pipeline: Optional[Dict]) -> Optional[Dict]:
+        """隐藏pipeline中敏感数据，返回新的流程树，不会修改原pipeline"""
+        return hide_sensitive_data(pipeline)
 
     @staticmethod
     def get_ip_list(ips: list) -> list:
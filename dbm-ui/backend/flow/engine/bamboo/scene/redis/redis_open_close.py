@@ -378,9 +378,23 @@ class RedisInsOpenCloseFlow(object):
 
         sub_pipeline_list = []
         suffix = "_shutdown"
+        # 获取各集群的密码，密码服务中没有密码的集群回退到 dbconfig 查询，只对这些集群批量预取
+        clusters = Cluster.objects.in_bulk({ins_info["cluster_id"] for ins_info in all_ins_info["ins_info_list"]})
+        cluster_passwords = {
+            cluster_id: PayloadHandler.redis_get_cluster_pass_from_priv_manager(cluster)
+            for cluster_id, cluster in clusters.items()
+        }
+        fallback_clusters = [
+            clusters[cluster_id] for cluster_id, passwords in cluster_passwords.items() if not any(passwords.values())
+        ]
+        if fallback_clusters:
+            PayloadHandler.redis_prefetch_cluster_pass_from_dbconfig(fallback_clusters)
+            for cluster in fallback_clusters:
+                cluster_passwords[cluster.id] = PayloadHandler.redis_get_cluster_pass_from_dbconfig(cluster)
+
         for ins_info in all_ins_info["ins_info_list"]:
             # 获取ip:port的密码
-            old_pwd = PayloadHandler.redis_get_password_by_cluster_id(ins_info["cluster_id"]).get("redis_password")
+            old_pwd = cluster_passwords[ins_info["cluster_id"]].get("redis_password")
             if self.data["ticket_type"] == TicketType.REDIS_INSTANCE_OPEN:
                 # if old_pwd.endwith(suffix):
                 new_pwd = old_pwd.removesuffix(suffix)
@@ -12,9 +12,11 @@ import copy
 import json
 import logging
 import re
+import time
 from abc import ABCMeta
 from collections import defaultdict
-from typing import Any, Dict, List, Optional, Union
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
 
 from bamboo_engine import states
 from django.utils import translation
@@ -28,13 +30,19 @@ from backend.core.encrypt.constants import AsymmetricCipherConfigType
 from backend.core.encrypt.handlers import AsymmetricHandler
 from backend.core.translation.constants import Language
 from backend.flow.consts import DEFAULT_FLOW_CACHE_EXPIRE_TIME, SUCCESS_LIST, WriteContextOpType
+from backend.flow.utils.job_status_poller import JobStatusPoller
 from backend.ticket.constants import TicketFlowStatus
 from backend.ticket.models import Flow
+from backend.utils.basic import chunk_lists
 from backend.utils.redis import RedisConn
 
 logger = logging.getLogger("flow")
 cpl = re.compile("<ctx>(?P<context>.+?)</ctx>")  # 非贪婪模式，只匹配第一次出现的自定义tag
 
+# 批量获取JOB日志时每批的IP数及并发批次数
+JOB_LOG_BATCH_SIZE = 100
+JOB_LOG_CONCURRENCY = 5
+
 
 class ServiceLogMixin:
     def log_info(self, msg: str):
@@ -217,73 +225,96 @@ class BkJobService(BaseService, metaclass=ABCMeta):
     @staticmethod
     def __status__(instance_id: str) -> Optional[Dict]:
         """
-        获取任务状态
+        获取任务状态，由 JobStatusPoller 集中轮询并缓存
         """
-        payload = {
-            "bk_biz_id": env.JOB_BLUEKING_BIZ_ID,
-            "job_instance_id": instance_id,
-            "return_ip_result": True,
-        }
-        resp = JobApi.get_job_instance_status(payload, raw=True)
-        return resp
+        return JobStatusPoller.get_status(instance_id)
 
-    def __log__(
-        self,
-        job_instance_id: int,
-        step_instance_id: int,
-        ip_dict: dict,
-    ):
+    def __batch_log__(
+        self, job_instance_id: int, step_instance_id: int, ip_dicts: List[dict]
+    ) -> Iterator[Tuple[dict, Optional[str]]]:
         """
-        获取任务日志
+        批量获取任务日志，按 JOB_LOG_BATCH_SIZE 分批并发查询，逐个产出 (ip_dict, log_content)
+        每次只有 JOB_LOG_CONCURRENCY 个批次的日志在内存中，查询失败的 IP 日志为 None
         """
-        payload = {
-            "bk_biz_id": env.JOB_BLUEKING_BIZ_ID,
-            "job_instance_id": job_instance_id,
-            "step_instance_id": step_instance_id,
-        }
-        return JobApi.get_job_instance_ip_log({**payload, **ip_dict}, raw=True)
 
-    def __get_target_ip_context(
+        def _query(batch: List[dict]) -> Dict[Tuple[int, str], str]:
+            payload = {
+                "bk_biz_id": env.JOB_BLUEKING_BIZ_ID,
+                "job_instance_id": job_instance_id,
+                "step_instance_id": step_instance_id,
+                "ip_list": [{"bk_cloud_id": ip_dict["bk_cloud_id"], "ip": ip_dict["ip"]} for ip_dict in batch],
+            }
+            try:
+                resp = JobApi.batch_get_job_instance_ip_log(payload, raw=True)
+            except Exception as err:  # pylint: disable=broad-except
+                self.log_error(_("[批量获取任务日志失败] failed: {}").format(err))
+                return {}
+            if not resp.get("result"):
+                self.log_error(_("[批量获取任务日志失败] failed: {}").format(resp.get("message")))
+                return {}
+            return {
+                (int(log["bk_cloud_id"]), log["ip"]): log["log_content"]
+                for log in resp["data"].get("script_task_logs") or []
+            }
+
+        batches = list(chunk_lists(ip_dicts, JOB_LOG_BATCH_SIZE))
+        with ThreadPoolExecutor(max_workers=JOB_LOG_CONCURRENCY) as executor:
+            for window in chunk_lists(batches, JOB_LOG_CONCURRENCY):
+                for batch, logs in zip(window, executor.map(_query, window)):
+                    for ip_dict in batch:
+                        yield ip_dict, logs.pop((int(ip_dict["bk_cloud_id"]), ip_dict["ip"]), None)
+
+    @staticmethod
+    def __extract_context(log_content: str) -> Any:
+        """
+        提取日志中第一个 <ctx></ctx> 标签的内容，先定位标签再匹配，避免对整段日志做正则扫描
+        """
+        begin = log_content.find("<ctx>")
+        match = cpl.search(log_content, begin) if begin >= 0 else None
+        if not match:
+            raise ValueError(_("日志中没有找到<ctx>标签"))
+        return json.loads(match.group("context"))
+
+    def __write_target_ip_context(
         self,
-        job_instance_id: int,
-        step_instance_id: int,
-        ip_dict: dict,
+        ip_logs: Iterator[Tuple[dict, Optional[str]]],
         data,
         trans_data,
         write_payload_var: str,
         write_op: str,
-    ):
+        node_name: str,
+    ) -> bool:
         """
-        对单个节点获取执行后log，并赋值给定义好流程上下文的trans_data
+        对节点执行后log提取上下文，并赋值给定义好流程上下文的trans_data
         write_op 控制写入变量的方式，rewrite是默认值，代表覆盖写入；append代表以{"ip":xxx} 形式追加里面变量里面
         """
-        resp = self.__log__(job_instance_id, step_instance_id, ip_dict)
-        if not resp["result"]:
-            # 结果返回异常，则异常退出
-            return False
-        try:
-            # 以dict形式追加写入
-            result = json.loads(re.search(cpl, resp["data"]["log_content"]).group("context"))
-            if write_op == WriteContextOpType.APPEND.value:
-                context = copy.deepcopy(getattr(trans_data, write_payload_var))
-                ip = ip_dict["ip"]
-                if context:
-                    context[ip] = copy.deepcopy(result)
-                else:
-                    context = {ip: copy.deepcopy(result)}
+        is_success, has_result, result = True, False, None
+        context = None
+        if write_op == WriteContextOpType.APPEND.value:
+            context = copy.deepcopy(getattr(trans_data, write_payload_var)) or {}
+
+        for ip_dict, log_content in ip_logs:
+            try:
+                if log_content is None:
+                    raise ValueError(_("获取日志失败"))
+                result = self.__extract_context(log_content)
+            except Exception as e:
+                self.log_error(_("[写入上下文结果失败] failed: {}").format(e))
+                self.log_error(_("[{}] 获取执行后写入流程上下文失败，ip:[{}]").format(node_name, ip_dict["ip"]))
+                is_success = False
+                continue
 
-                setattr(trans_data, write_payload_var, copy.deepcopy(context))
+            has_result = True
+            if context is not None:
+                # 以dict形式追加写入
+                context[ip_dict["ip"]] = result
 
-            else:
-                # 默认覆盖写入
-                setattr(trans_data, write_payload_var, copy.deepcopy(result))
+        if has_result:
+            # 默认覆盖写入，多个IP时以最后一个IP的结果为准
+            setattr(trans_data, write_payload_var, context if context is not None else result)
             data.outputs["trans_data"] = trans_data
 
-            return True
-
-        except Exception as e:
-            self.log_error(_("[写入上下文结果失败] failed: {}").format(e))
-            return False
+        return is_success
 
     def _schedule(self, data, parent_data, callback_data=None) -> bool:
         ext_result = data.get_one_of_outputs("ext_result")
@@ -346,10 +377,13 @@ class BkJobService(BaseService, metaclass=ABCMeta):
 
             # 转载job脚本节点报错日志，兼容多IP执行场景的日志输出
             if ip_dicts:
-                for ip_dict in ip_dicts:
-                    resp = self.__log__(job_instance_id, step_instance_id, ip_dict)
-                    if resp.get("result"):
-                        self.log_error(f"{ip_dict}:{resp['data']['log_content']}")
+                start_time = time.time()
+                for ip_dict, log_content in self.__batch_log__(job_instance_id, step_instance_id, ip_dicts):
+                    if log_content is not None:
+                        self.log_error(f"{ip_dict}:{log_content}")
+                self.log_info(
+                    _("[{}] 获取{}个IP的执行日志耗时{:.2f}s").format(node_name, len(ip_dicts), time.time() - start_time)
+                )
 
             self.finish_schedule()
             return False
@@ -365,21 +399,18 @@ class BkJobService(BaseService, metaclass=ABCMeta):
         # 追加写入是特殊行为，如果想IP日志结果都写入，可以选择追加写入，上下文变成list，每个元素是{"ip":"log"} WriteContextOpType.APPEND
         self.log_info(_("[{}]该节点需要获取执行后日志，赋值到流程上下文").format(node_name))
 
-        is_false = False
-        for ip_dict in ip_dicts:
-            if not self.__get_target_ip_context(
-                job_instance_id=job_instance_id,
-                step_instance_id=step_instance_id,
-                ip_dict=ip_dict,
-                data=data,
-                trans_data=trans_data,
-                write_payload_var=write_payload_var,
-                write_op=kwargs.get("write_op", WriteContextOpType.REWRITE.value),
-            ):
-                self.log_error(_("[{}] 获取执行后写入流程上下文失败，ip:[{}]").format(node_name, ip_dict["ip"]))
-                is_false = True
+        start_time = time.time()
+        is_success = self.__write_target_ip_context(
+            ip_logs=self.__batch_log__(job_instance_id, step_instance_id, ip_dicts),
+            data=data,
+            trans_data=trans_data,
+            write_payload_var=write_payload_var,
+            write_op=kwargs.get("write_op", WriteContextOpType.REWRITE.value),
+            node_name=node_name,
+        )
+        self.log_info(_("[{}] 获取{}个IP的执行日志并写入上下文耗时{:.2f}s").format(node_name, len(ip_dicts), time.time() - start_time))
 
-        if is_false:
+        if not is_success:
             self.finish_schedule()
             return False
 
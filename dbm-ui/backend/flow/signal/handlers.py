@@ -15,8 +15,8 @@ from django.utils.translation import ugettext as _
 
 from backend.db_dirty.handlers import DBDirtyMachineHandler
 from backend.flow.consts import StateType
-from backend.flow.engine.bamboo.engine import BambooEngine
 from backend.flow.models import FlowNode, FlowTree
+from backend.flow.signal.state_aggregator import FlowStateAggregator
 from backend.ticket.constants import FlowCallbackType, FlowMsgType, FlowType, TicketFlowStatus
 from backend.ticket.flow_manager.inner import InnerFlow
 from backend.ticket.flow_manager.manager import TicketFlowManager
@@ -27,8 +27,9 @@ logger = logging.getLogger("flow")
 
 
 def post_set_state_signal_handler(sender, node_id, to_state, version, root_id, *args, **kwargs):
-    engine = BambooEngine(root_id=root_id)
-    pipeline_states = engine.get_pipeline_states().data
+    # 增量维护流程状态，避免每次状态流转都读取全量状态树
+    aggregator = FlowStateAggregator(root_id=root_id)
+    pipeline_state = aggregator.transit(node_id, to_state)
 
     now = timezone.now()
     logger.debug(_("【状态信号捕获】{} root_id={}, node_id={}, status:{}").format(now, root_id, node_id, to_state))
@@ -48,20 +49,24 @@ def post_set_state_signal_handler(sender, node_id, to_state, version, root_id, *
     # 流转当前的flow状态
     origin_tree_status = tree.status
     # 如果当前节点或者流程已失败，则状态为失败
-    if to_state == StateType.FAILED or pipeline_states[root_id]["state"] == StateType.FAILED:
+    if to_state == StateType.FAILED or pipeline_state == StateType.FAILED:
         target_tree_status = StateType.FAILED
     # 如果流程已撤销，则状态为撤销
-    elif pipeline_states[root_id]["state"] == StateType.REVOKED:
+    elif pipeline_state == StateType.REVOKED:
         target_tree_status = StateType.REVOKED
     # 如果当前节点和流程都已完成，则状态为完成
-    elif to_state == StateType.FINISHED and pipeline_states[root_id]["state"] == StateType.FINISHED:
+    elif to_state == StateType.FINISHED and pipeline_state == StateType.FINISHED:
         target_tree_status = StateType.FINISHED
     # 如果当前节点已完成，流程不处于完成态，则状态为进行
-    elif to_state == StateType.FINISHED and pipeline_states[root_id]["state"] != StateType.FINISHED:
+    elif to_state == StateType.FINISHED and pipeline_state != StateType.FINISHED:
         target_tree_status = StateType.RUNNING
     else:
         target_tree_status = to_state
 
+    # 流程已结束，清理状态计数
+    if node_id == root_id and to_state in [StateType.FINISHED, StateType.REVOKED]:
+        aggregator.clear()
+
     # 如果状态发生改变，则触发单据回调和污点池转移
     if origin_tree_status != target_tree_status:
         try:
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import logging
+from typing import Any, Dict, Optional
+
+from bamboo_engine import api
+from pipeline.eri.runtime import BambooDjangoRuntime
+from redis.exceptions import RedisError
+
+from backend.flow.consts import StateType
+from backend.flow.engine.bamboo.engine import BambooEngine
+from backend.utils.redis import RedisConn
+
+logger = logging.getLogger("flow")
+
+# 流程节点状态 node_id -> state
+FLOW_NODE_STATES_KEY = "flow_state_aggregator:{root_id}:nodes"
+# 流程各状态的节点计数 state -> count
+FLOW_STATE_COUNTS_KEY = "flow_state_aggregator:{root_id}:counts"
+# 全局统计：节省的全量状态树读取次数/实际的全量读取次数
+FLOW_STATE_AGGREGATOR_STATS_KEY = "flow_state_aggregator:stats"
+# 计数的过期时间，流程长时间无状态流转后退化为全量读取
+FLOW_STATE_EXPIRE_TIME = 7 * 24 * 60 * 60
+
+# 原子地记录节点状态并维护各状态计数；流程还没有计数时不写入(需要先由全量状态初始化)，返回 0
+APPLY_TRANSITION_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+local old = redis.call('HGET', KEYS[1], ARGV[1])
+if old ~= ARGV[2] then
+    redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+    if old then
+        redis.call('HINCRBY', KEYS[2], old, -1)
+    end
+    redis.call('HINCRBY', KEYS[2], ARGV[2], 1)
+end
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+return 1
+"""
+
+# 原子地用全量状态初始化计数，已有计数时(其他信号已完成初始化)不覆盖，返回是否写入
+# ARGV: 过期时间, node_id1, state1, node_id2, state2...
+SEED_STATES_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return 0
+end
+redis.call('DEL', KEYS[2])
+for i = 2, #ARGV, 2 do
+    redis.call('HSET', KEYS[1], ARGV[i], ARGV[i + 1])
+    redis.call('HINCRBY', KEYS[2], ARGV[i + 1], 1)
+end
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+redis.call('EXPIRE', KEYS[2], ARGV[1])
+return 1
+"""
+
+
+class FlowStateAggregator(object):
+    """
+    增量维护流程根节点状态
+
+    post_set_state 信号会在每个节点状态流转时触发，这里在 redis 中记录每个节点的最新状态和各状态的节点数，
+    根节点的聚合状态(与 BambooEngine.format_bamboo_engine_status 的规则一致)可以直接由计数得出:
+    - 根节点处于 RUNNING 时，只要存在 FAILED/REVOKED/SUSPENDED 的节点，流程即为对应状态
+    - 其余情况下流程状态即为根节点自身的状态
+    只有在流程首次出现、计数过期或者 redis 不可用时，才会读取一次全量状态树并以此初始化计数
+    初始化使用未经格式化的原始状态，且只在没有计数时写入，并发的信号不会互相覆盖；
+    初始化后会再次记录本次的状态流转，避免全量状态读取早于本次流转落库
+    """
+
+    _apply_transition = RedisConn.register_script(APPLY_TRANSITION_SCRIPT)
+    _seed_states = RedisConn.register_script(SEED_STATES_SCRIPT)
+
+    def __init__(self, root_id: str):
+        self.root_id = root_id
+        self.nodes_key = FLOW_NODE_STATES_KEY.format(root_id=root_id)
+        self.counts_key = FLOW_STATE_COUNTS_KEY.format(root_id=root_id)
+
+    @classmethod
+    def _flatten_states(cls, states_tree: Dict[str, Any], node_states: Dict[str, str]) -> Dict[str, str]:
+        for node_id, tree in states_tree.items():
+            node_states[node_id] = tree["state"]
+            cls._flatten_states(tree.get("children") or {}, node_states)
+        return node_states
+
+    def _load_full_states(self) -> bool:
+        """
+        读取全量状态树初始化节点状态计数，返回流程是否存在
+        format_bamboo_engine_status 会把 RUNNING 的根节点/子流程改写为子节点的异常状态，
+        计数需要的是节点自身的状态，因此这里读取未格式化的原始状态
+        """
+        RedisConn.hincrby(FLOW_STATE_AGGREGATOR_STATS_KEY, "full_reads", 1)
+        pipeline_states = api.get_pipeline_states(runtime=BambooDjangoRuntime(), root_id=self.root_id).data
+        if self.root_id not in pipeline_states:
+            return False
+
+        node_states = self._flatten_states(pipeline_states, {})
+        args = [FLOW_STATE_EXPIRE_TIME]
+        for node_id, state in node_states.items():
+            args.extend([node_id, state])
+        self._seed_states(keys=[self.nodes_key, self.counts_key], args=args)
+        return True
+
+    def _apply(self, node_id: str, to_state: str) -> bool:
+        return bool(
+            self._apply_transition(
+                keys=[self.nodes_key, self.counts_key], args=[node_id, to_state, FLOW_STATE_EXPIRE_TIME]
+            )
+        )
+
+    def _aggregate(self) -> Optional[str]:
+        pipe = RedisConn.pipeline()
+        pipe.hget(self.nodes_key, self.root_id)
+        pipe.hgetall(self.counts_key)
+        root_state, counts = pipe.execute()
+        if not root_state:
+            return None
+
+        if root_state == StateType.RUNNING:
+            for state in [StateType.FAILED, StateType.REVOKED, StateType.SUSPENDED]:
+                if int(counts.get(state, 0)) > 0:
+                    return state.value
+        return root_state
+
+    def transit(self, node_id: str, to_state: str) -> Optional[str]:
+        """
+        记录节点状态流转，并返回流程根节点的聚合状态
+        @param node_id: 流转的节点ID
+        @param to_state: 流转后的状态
+        """
+        try:
+            if self._apply(node_id, to_state):
+                RedisConn.hincrby(FLOW_STATE_AGGREGATOR_STATS_KEY, "avoided_full_reads", 1)
+            else:
+                if not self._load_full_states():
+                    return None
+                self._apply(node_id, to_state)
+            return self._aggregate()
+        except RedisError as err:
+            logger.warning("[flow_state_aggregator] redis error: %s, fallback to full states read", err)
+            pipeline_states = BambooEngine(root_id=self.root_id).get_pipeline_states().data
+            return pipeline_states.get(self.root_id, {}).get("state")
+
+    def clear(self):
+        RedisConn.delete(self.nodes_key, self.counts_key)
+
+    @staticmethod
+    def get_stats() -> Dict[str, int]:
+        """获取全量状态树读取的统计：avoided_full_reads/full_reads"""
+        stats = RedisConn.hgetall(FLOW_STATE_AGGREGATOR_STATS_KEY)
+        return {key: int(stats.get(key, 0)) for key in ["avoided_full_reads", "full_reads"]}
@@ -11,9 +11,12 @@ specific language governing permissions and limitations under the License.
 import base64
 import logging
 import re
+from collections import defaultdict
+from typing import List
 
 from backend import env
 from backend.components import DBConfigApi, DBPrivManagerApi
+from backend.components.dbconfig.cache import get_current_scope, get_prefetched_conf_items, prefetch_conf_items
 from backend.components.dbconfig.constants import FormatType, LevelName, ReqType
 from backend.constants import IP_RE_PATTERN
 from backend.core.encrypt.constants import AsymmetricCipherConfigType
@@ -35,6 +38,10 @@ apply_list = [
 
 logger = logging.getLogger("flow")
 
+# redis 集群在 dbconfig 中保存的密码配置项
+REDIS_PROXY_PASSWORD_CONF_NAMES = ["password", "predixy_admin_passwd"]
+REDIS_PASSWORD_CONF_NAMES = ["requirepass"]
+
 
 class PayloadHandler(object):
     def __init__(self, bk_cloud_id: int, ticket_data: dict, cluster: dict, cluster_type: str = None):
@@ -229,8 +236,53 @@ class PayloadHandler(object):
             "pwd": partition_yw["password"],
         }
 
+    @staticmethod
+    def redis_prefetch_cluster_pass_from_dbconfig(clusters: List[Cluster]):
+        """
+        批量预取一批集群在 dbconfig 中保存的密码，按配置文件分组，每组一次 batchget
+        需在 dbconfig_cache_scope 作用域内调用，redis_get_cluster_pass_from_dbconfig 会优先读取预取结果
+        """
+        if get_current_scope() is None:
+            return
+
+        groups = defaultdict(list)
+        for cluster in clusters:
+            domain = cluster.immute_domain
+            groups[(cluster.cluster_type, ConfigTypeEnum.ProxyConf, cluster.proxy_version)].append(domain)
+            groups[(cluster.cluster_type, ConfigTypeEnum.DBConf, cluster.major_version)].append(domain)
+
+        for (namespace, conf_type, conf_file), domains in groups.items():
+            conf_names = (
+                REDIS_PROXY_PASSWORD_CONF_NAMES if conf_type == ConfigTypeEnum.ProxyConf else REDIS_PASSWORD_CONF_NAMES
+            )
+            prefetch_conf_items(namespace, conf_type, conf_file, LevelName.CLUSTER.value, domains, conf_names)
+
     @staticmethod
     def redis_get_cluster_pass_from_dbconfig(cluster: Cluster):
+        proxy_items = get_prefetched_conf_items(
+            cluster.cluster_type,
+            ConfigTypeEnum.ProxyConf,
+            cluster.proxy_version,
+            LevelName.CLUSTER.value,
+            cluster.immute_domain,
+            REDIS_PROXY_PASSWORD_CONF_NAMES,
+        )
+        redis_items = get_prefetched_conf_items(
+            cluster.cluster_type,
+            ConfigTypeEnum.DBConf,
+            cluster.major_version,
+            LevelName.CLUSTER.value,
+            cluster.immute_domain,
+            REDIS_PASSWORD_CONF_NAMES,
+        )
+        # 预取的是集群层级的配置，不包含继承的配置，密码不在集群层级时仍然走完整查询
+        if proxy_items and redis_items and proxy_items.get("password") and redis_items.get("requirepass"):
+            return {
+                "redis_password": redis_items["requirepass"],
+                "redis_proxy_password": proxy_items["password"],
+                "redis_proxy_admin_password": proxy_items.get("predixy_admin_passwd", ""),
+            }
+
         proxy_conf = DBConfigApi.query_conf_item(
             params={
                 "bk_biz_id": str(cluster.bk_biz_id),
@@ -265,11 +317,9 @@ class PayloadHandler(object):
         }
 
     @staticmethod
-    def redis_get_cluster_password(cluster: Cluster):
+    def redis_get_cluster_pass_from_priv_manager(cluster: Cluster):
         """
-        获取redis集群的密码
-        - 优先从密码服务中获取
-        - 如果密码服务为空,则从dbconfig中获取
+        从密码服务中获取redis集群的密码，密码服务中没有时各密码均为空
         """
         # cluster_port 先全部统一设置为 0,便于DBHA获取密码
         cluster_port = 0
@@ -299,6 +349,16 @@ class PayloadHandler(object):
                 and item["component"] == MySQLPrivComponent.REDIS.value
             ):
                 ret["redis_password"] = base64.b64decode(item["password"]).decode("utf-8")
+        return ret
+
+    @staticmethod
+    def redis_get_cluster_password(cluster: Cluster):
+        """
+        获取redis集群的密码
+        - 优先从密码服务中获取
+        - 如果密码服务为空,则从dbconfig中获取
+        """
+        ret = PayloadHandler.redis_get_cluster_pass_from_priv_manager(cluster)
         if (
             ret["redis_password"] == ""
             and ret["redis_proxy_password"] == ""
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from backend import env
+from backend.components import JobApi
+from backend.utils.basic import chunk_lists
+from backend.utils.redis import RedisConn
+
+logger = logging.getLogger("flow")
+
+"""
+JOB 任务状态的集中轮询
+
+所有 BkJobService 节点在调度时不再各自调用 get_job_instance_status，而是:
+1. 节点读取状态时优先读取缓存，缓存缺失时才直接查询，并把任务登记到待轮询集合中
+2. 周期任务(见 db_periodic_task.local_tasks.job_status_poller)分批并发查询到期的任务，并把结果写入缓存
+3. 长时间运行的任务按运行时长退避轮询间隔，长时间无节点读取的任务会被移出轮询集合
+"""
+
+# 待轮询任务 job_instance_id -> 下次轮询的时间戳
+JOB_STATUS_PENDING_KEY = "job_status_poller:pending"
+# 任务首次登记的时间戳，用于计算退避间隔
+JOB_STATUS_FIRST_SEEN_KEY = "job_status_poller:first_seen"
+# 节点最后一次读取的时间戳
+JOB_STATUS_LAST_ACCESS_KEY = "job_status_poller:last_access"
+# 任务状态缓存
+JOB_STATUS_CACHE_KEY = "job_status_poller:status:{job_instance_id}"
+# 统计信息: status_reads/cache_hits/api_calls
+JOB_STATUS_STATS_KEY = "job_status_poller:stats"
+
+# 节点的调度间隔，也是最小轮询间隔
+JOB_STATUS_MIN_INTERVAL = 5
+# 最大轮询间隔
+JOB_STATUS_MAX_INTERVAL = 60
+# 已结束任务状态的缓存时间
+JOB_STATUS_FINISHED_EXPIRE = 10 * 60
+# 超过该时间无节点读取的任务不再轮询
+JOB_STATUS_IDLE_TIMEOUT = 5 * 60
+# 每批查询的任务数及并发数
+JOB_STATUS_BATCH_SIZE = 50
+JOB_STATUS_CONCURRENCY = 10
+
+
+class JobStatusPoller(object):
+    @staticmethod
+    def _query(job_instance_id: int) -> Dict:
+        payload = {
+            "bk_biz_id": env.JOB_BLUEKING_BIZ_ID,
+            "job_instance_id": job_instance_id,
+            "return_ip_result": True,
+        }
+        RedisConn.hincrby(JOB_STATUS_STATS_KEY, "api_calls", 1)
+        return JobApi.get_job_instance_status(payload, raw=True)
+
+    @staticmethod
+    def get_interval(first_seen: float, now: float) -> int:
+        """
+        退避轮询间隔: 运行一分钟内按调度间隔轮询，之后按运行时长的 1/10 退避，最长 JOB_STATUS_MAX_INTERVAL
+        """
+        elapsed = now - first_seen
+        if elapsed < 60:
+            return JOB_STATUS_MIN_INTERVAL
+        return int(min(max(elapsed / 10, JOB_STATUS_MIN_INTERVAL), JOB_STATUS_MAX_INTERVAL))
+
+    @classmethod
+    def _save(cls, job_instance_id: int, resp: Dict, now: float, first_seen: Optional[float] = None):
+        """缓存任务状态，并维护待轮询集合"""
+        cache_key = JOB_STATUS_CACHE_KEY.format(job_instance_id=job_instance_id)
+        pipe = RedisConn.pipeline()
+        # 已结束的任务从轮询集合中移除
+        if resp.get("result") and (resp.get("data") or {}).get("finished"):
+            pipe.set(cache_key, json.dumps(resp), ex=JOB_STATUS_FINISHED_EXPIRE)
+            pipe.zrem(JOB_STATUS_PENDING_KEY, job_instance_id)
+            pipe.hdel(JOB_STATUS_FIRST_SEEN_KEY, job_instance_id)
+            pipe.hdel(JOB_STATUS_LAST_ACCESS_KEY, job_instance_id)
+        else:
+            interval = cls.get_interval(first_seen or now, now)
+            # 缓存到下一次轮询之后，保证节点在两次轮询之间都能读到缓存
+            pipe.set(cache_key, json.dumps(resp), ex=interval + JOB_STATUS_MIN_INTERVAL)
+            pipe.zadd(JOB_STATUS_PENDING_KEY, {job_instance_id: now + interval})
+            pipe.hsetnx(JOB_STATUS_FIRST_SEEN_KEY, job_instance_id, now)
+        pipe.execute()
+
+    @classmethod
+    def get_status(cls, job_instance_id: int) -> Dict:
+        """
+        节点读取任务状态，优先读取集中轮询的缓存
+        """
+        if not env.JOB_STATUS_POLLER_ENABLE:
+            return cls._query(job_instance_id)
+
+        now = time.time()
+        pipe = RedisConn.pipeline()
+        pipe.get(JOB_STATUS_CACHE_KEY.format(job_instance_id=job_instance_id))
+        pipe.hset(JOB_STATUS_LAST_ACCESS_KEY, job_instance_id, now)
+        pipe.hincrby(JOB_STATUS_STATS_KEY, "status_reads", 1)
+        cached, __, __ = pipe.execute()
+        if cached:
+            RedisConn.hincrby(JOB_STATUS_STATS_KEY, "cache_hits", 1)
+            return json.loads(cached)
+
+        resp = cls._query(job_instance_id)
+        first_seen = float(RedisConn.hget(JOB_STATUS_FIRST_SEEN_KEY, job_instance_id) or now)
+        cls._save(job_instance_id, resp, now, first_seen)
+        return resp
+
+    @classmethod
+    def _poll_one(cls, job_instance_id: int, first_seen: float, now: float):
+        try:
+            resp = cls._query(job_instance_id)
+        except Exception as err:  # pylint: disable=broad-except
+            # 查询失败时不写缓存，由节点自行查询
+            logger.warning("[job_status_poller] query job %s status failed: %s", job_instance_id, err)
+            return
+        cls._save(job_instance_id, resp, now, first_seen)
+
+    @classmethod
+    def poll(cls) -> Dict[str, int]:
+        """
+        查询所有到期的待轮询任务，由周期任务调用
+        """
+        now = time.time()
+        due_ids: List[str] = RedisConn.zrangebyscore(JOB_STATUS_PENDING_KEY, "-inf", now)
+        if not due_ids:
+            return {"polled": 0, "dropped": 0}
+
+        first_seen_list = RedisConn.hmget(JOB_STATUS_FIRST_SEEN_KEY, due_ids)
+        last_access_list = RedisConn.hmget(JOB_STATUS_LAST_ACCESS_KEY, due_ids)
+
+        # 长时间没有节点读取的任务(节点已撤销/失败等)不再轮询
+        polling, dropped = [], []
+        for job_id, first_seen, last_access in zip(due_ids, first_seen_list, last_access_list):
+            if now - float(last_access or 0) > JOB_STATUS_IDLE_TIMEOUT:
+                dropped.append(job_id)
+            else:
+                polling.append((int(job_id), float(first_seen or now)))
+
+        if dropped:
+            pipe = RedisConn.pipeline()
+            pipe.zrem(JOB_STATUS_PENDING_KEY, *dropped)
+            pipe.hdel(JOB_STATUS_FIRST_SEEN_KEY, *dropped)
+            pipe.hdel(JOB_STATUS_LAST_ACCESS_KEY, *dropped)
+            pipe.execute()
+
+        with ThreadPoolExecutor(max_workers=JOB_STATUS_CONCURRENCY) as executor:
+            for batch in chunk_lists(polling, JOB_STATUS_BATCH_SIZE):
+                list(executor.map(lambda job: cls._poll_one(job[0], job[1], now), batch))
+
+        return {"polled": len(polling), "dropped": len(dropped)}
+
+    @staticmethod
+    def get_stats() -> Dict[str, int]:
+        """
+        获取轮询统计，节省的 JOB 调用次数即为节点读取命中缓存的次数
+        """
+        stats = RedisConn.hgetall(JOB_STATUS_STATS_KEY)
+        stats = {key: int(stats.get(key, 0)) for key in ["status_reads", "cache_hits", "api_calls"]}
+        stats["pending"] = RedisConn.zcard(JOB_STATUS_PENDING_KEY)
+        return stats
@@ -18,6 +18,7 @@ from typing import Any, Dict, List, Tuple
 from django.utils.translation import ugettext as _
 
 from backend.components import DBConfigApi, DRSApi
+from backend.components.db_remote_service.handler import DRSHandler
 from backend.components.dbconfig.constants import FormatType, LevelName, OpType, ReqType
 from backend.configuration.constants import DBType
 from backend.constants import IP_PORT_DIVIDER
@@ -166,23 +167,20 @@ def check_cluster_proxy_backends_consistent(cluster_id: int):
         raise Exception("src_cluster {} does not exist".format(cluster_id))
 
     passwd_ret = PayloadHandler.redis_get_password_by_cluster_id(cluster_id)
-    proxy_addrs = []
     proxys_backend_md5 = []
+    proxies = cluster.proxyinstance_set.select_related("machine")
     if is_twemproxy_proxy_type(cluster.cluster_type):
         # twemproxy 集群
-        for proxy in cluster.proxyinstance_set.all():
-            proxy_addrs.append(proxy.machine.ip + ":" + str(proxy.port + DEFAULT_TWEMPROXY_ADMIN_PORT_EXTRA))
-        resp = DRSApi.twemproxy_rpc(
-            {
-                "addresses": proxy_addrs,
-                "db_num": DEFAULT_REDIS_DBNUM,
-                "password": "",
-                "command": "get nosqlproxy servers",
-                "bk_cloud_id": cluster.bk_cloud_id,
-            }
+        proxy_addrs = [
+            (cluster.bk_cloud_id, proxy.machine.ip + ":" + str(proxy.port + DEFAULT_TWEMPROXY_ADMIN_PORT_EXTRA))
+            for proxy in proxies
+        ]
+        results = DRSHandler.twemproxy_rpc(
+            proxy_addrs, {"db_num": DEFAULT_REDIS_DBNUM, "password": "", "command": "get nosqlproxy servers"}
         )
-        for ele in resp:
-            backends_ret, _ = decode_twemproxy_backends(ele["result"])
+        DRSHandler.raise_for_errors(results)
+        for ele in results.values():
+            backends_ret, _ = decode_twemproxy_backends(ele.result)
             sorted_backends = sorted(backends_ret, key=lambda x: x.segment_start)
             sorted_str = ""
             for bck in sorted_backends:
@@ -191,25 +189,24 @@ def check_cluster_proxy_backends_consistent(cluster_id: int):
             md5 = hashlib.md5(sorted_str.encode("utf-8")).hexdigest()
             proxys_backend_md5.append(
                 {
-                    "proxy_addr": ele["address"],
+                    "proxy_addr": ele.address,
                     "backend_md5": md5,
                 }
             )
     elif is_predixy_proxy_type(cluster.cluster_type):
         # predixy 集群
-        for proxy in cluster.proxyinstance_set.all():
-            proxy_addrs.append(proxy.machine.ip + ":" + str(proxy.port))
-        resp = DRSApi.redis_rpc(
+        proxy_addrs = [(cluster.bk_cloud_id, proxy.machine.ip + ":" + str(proxy.port)) for proxy in proxies]
+        results = DRSHandler.redis_rpc(
+            proxy_addrs,
             {
-                "addresses": proxy_addrs,
                 "db_num": DEFAULT_REDIS_DBNUM,
                 "password": passwd_ret.get("redis_proxy_password"),
                 "command": "info servers",
-                "bk_cloud_id": cluster.bk_cloud_id,
-            }
+            },
         )
-        for ele in resp:
-            backends_ret: list[PredixyInfoServer] = decode_predixy_info_servers(ele["result"])
+        DRSHandler.raise_for_errors(results)
+        for ele in results.values():
+            backends_ret: list[PredixyInfoServer] = decode_predixy_info_servers(ele.result)
             sorted_backends: list[PredixyInfoServer] = sorted(backends_ret, key=lambda x: x.server)
             sorted_str = ""
             for bck in sorted_backends:
@@ -219,7 +216,7 @@ def check_cluster_proxy_backends_consistent(cluster_id: int):
             md5 = hashlib.md5(sorted_str.encode("utf-8")).hexdigest()
             proxys_backend_md5.append(
                 {
-                    "proxy_addr": ele["address"],
+                    "proxy_addr": ele.address,
                     "backend_md5": md5,
                 }
             )
@@ -523,51 +520,81 @@ def get_twemproxy_cluster_hash_tag(cluster_type: str, cluster_id: int) -> str:
         return ""
 
 
-def get_online_twemproxy_version(ip: str, port: int, bk_cloud_id: int) -> str:
+def parse_twemproxy_version(stats_result: str) -> str:
     """
-    连接twemproxy执行 stats 获取版本信息
-    返回结果示例: 0.4.1-rc-v0.28
+    解析twemproxy stats 结果中的版本信息
+    返回结果示例: twemproxy-0.4.1-v28
     """
-    admin_port = port + DEFAULT_TWEMPROXY_ADMIN_PORT_EXTRA
-    resp = DRSApi.twemproxy_rpc(
-        {
-            "addresses": [f"{ip}:{admin_port}"],
-            "db_num": DEFAULT_REDIS_DBNUM,
-            "password": "",
-            "command": "stats",
-            "bk_cloud_id": bk_cloud_id,
-        }
-    )
-    if not resp or len(resp) == 0:
-        return ""
-    version_str = json.loads(resp[0]["result"])["version"]
+    version_str = json.loads(stats_result)["version"]
     version_str = "twemproxy-" + version_str.replace("rc-", "")
     version_str = version_str.replace("v0.", "v")
     return version_str
 
 
-def get_online_predixy_version(ip: str, port: int, bk_cloud_id: int, proxy_password: str) -> str:
+def parse_predixy_version(info_result: str) -> str:
     """
-    连接predixy执行 info Proxy 获取版本信息
-    返回结果示例: 1.4.0
+    解析predixy info Proxy 结果中的版本信息
+    返回结果示例: predixy-1.4.0
     """
-    resp = DRSApi.redis_rpc(
-        {
-            "addresses": [f"{ip}:{port}"],
-            "db_num": DEFAULT_REDIS_DBNUM,
-            "password": proxy_password,
-            "command": "info Proxy",
-            "bk_cloud_id": bk_cloud_id,
-        }
-    )
-    if not resp or len(resp) == 0:
-        return ""
-    for line in resp[0]["result"].split("\n"):
+    for line in info_result.split("\n"):
         if line.startswith("Version:"):
             return "predixy-" + line.split(":")[1]
     return ""
 
 
+def get_online_twemproxy_versions(ip_ports: List[Tuple[str, int]], bk_cloud_id: int) -> Dict[str, str]:
+    """
+    批量连接twemproxy执行 stats 获取版本信息，返回 {ip:port: version}
+    """
+    admin_addr_map = {f"{ip}:{port + DEFAULT_TWEMPROXY_ADMIN_PORT_EXTRA}": f"{ip}:{port}" for ip, port in ip_ports}
+    results = DRSHandler.twemproxy_rpc(
+        [(bk_cloud_id, admin_addr) for admin_addr in admin_addr_map],
+        {"db_num": DEFAULT_REDIS_DBNUM, "password": "", "command": "stats"},
+    )
+    versions = {}
+    for admin_addr, ret in results.items():
+        # 连接失败的twemproxy版本为空，不影响其他twemproxy
+        if ret.error:
+            logger.warning("get twemproxy %s version failed: %s", admin_addr, ret.error)
+        versions[admin_addr_map[admin_addr]] = parse_twemproxy_version(ret.result) if ret.result else ""
+    return versions
+
+
+def get_online_predixy_versions(
+    ip_ports: List[Tuple[str, int]], bk_cloud_id: int, proxy_password: str
+) -> Dict[str, str]:
+    """
+    批量连接predixy执行 info Proxy 获取版本信息，返回 {ip:port: version}
+    """
+    results = DRSHandler.redis_rpc(
+        [(bk_cloud_id, f"{ip}:{port}") for ip, port in ip_ports],
+        {"db_num": DEFAULT_REDIS_DBNUM, "password": proxy_password, "command": "info Proxy"},
+    )
+    versions = {}
+    for address, ret in results.items():
+        # 连接失败的predixy版本为空，不影响其他predixy
+        if ret.error:
+            logger.warning("get predixy %s version failed: %s", address, ret.error)
+        versions[address] = parse_predixy_version(ret.result)
+    return versions
+
+
+def get_online_twemproxy_version(ip: str, port: int, bk_cloud_id: int) -> str:
+    """
+    连接twemproxy执行 stats 获取版本信息
+    返回结果示例: 0.4.1-rc-v0.28
+    """
+    return get_online_twemproxy_versions([(ip, port)], bk_cloud_id).get(f"{ip}:{port}", "")
+
+
+def get_online_predixy_version(ip: str, port: int, bk_cloud_id: int, proxy_password: str) -> str:
+    """
+    连接predixy执行 info Proxy 获取版本信息
+    返回结果示例: 1.4.0
+    """
+    return get_online_predixy_versions([(ip, port)], bk_cloud_id, proxy_password).get(f"{ip}:{port}", "")
+
+
 def get_online_redis_version(ip: str, port: int, bk_cloud_id: int, redis_password: str) -> str:
     """
     连接redis 连接rediso server 获取版本信息
@@ -602,16 +629,13 @@ def get_cluster_proxy_version(cluster_id: int) -> list:
     cluster = Cluster.objects.get(id=cluster_id)
     versions = set()
     passwd_ret = PayloadHandler.redis_get_password_by_cluster_id(cluster_id)
+    ip_ports = list(cluster.proxyinstance_set.filter(status=InstanceStatus.RUNNING).values_list("machine__ip", "port"))
     if is_predixy_proxy_type(cluster.cluster_type):
-        for proxy in cluster.proxyinstance_set.filter(status=InstanceStatus.RUNNING):
-            versions.add(
-                get_online_predixy_version(
-                    proxy.machine.ip, proxy.port, cluster.bk_cloud_id, passwd_ret.get("redis_proxy_password")
-                )
-            )
+        versions.update(
+            get_online_predixy_versions(ip_ports, cluster.bk_cloud_id, passwd_ret.get("redis_proxy_password")).values()
+        )
     elif is_twemproxy_proxy_type(cluster.cluster_type):
-        for proxy in cluster.proxyinstance_set.filter(status=InstanceStatus.RUNNING):
-            versions.add(get_online_twemproxy_version(proxy.machine.ip, proxy.port, cluster.bk_cloud_id))
+        versions.update(get_online_twemproxy_versions(ip_ports, cluster.bk_cloud_id).values())
     return list(versions)
 
 
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import json
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock, patch
+
+from django.utils import timezone
+
+from backend.components.bklog import handler
+from backend.components.bklog.handler import BKLogHandler, BKLogSearch
+from backend.utils.time import str2datetime
+
+START_TIME = datetime(2024, 7, 1, tzinfo=timezone.utc)
+END_TIME = START_TIME + timedelta(hours=1)
+
+
+def _make_hit(log_time: datetime, index: int, includes=None):
+    log = {"LogIndex": index, "ClusterId": index % 3}
+    # 模拟 json 清洗的采集项，日志内容同时提取为字段
+    source = {"log": json.dumps(log), **log, "dtEventTimeStamp": str(int(log_time.timestamp() * 1000))}
+    if includes:
+        source = {key: value for key, value in source.items() if key in includes}
+    return {"_id": str(index), "_source": source}
+
+
+def _mock_search(log_count: int, max_result_window: int, scroll: bool = False, interval=timedelta(seconds=1)):
+    """按固定间隔生成日志，模拟日志平台按时间范围(精确到秒)过滤、排序、字段投影、分页和 scroll"""
+    logs = [(START_TIME + interval * index, index) for index in range(log_count)]
+    scroll_contexts = {}
+
+    def esquery_search(params, use_admin=False):
+        start_time, end_time = params["start_time"], params["end_time"]
+        start, size = params["start"], params["size"]
+        includes = params.get("_source", {}).get("includes")
+        matched = [(log_time, index) for log_time, index in logs if start_time <= log_time <= end_time]
+        if params["sort_list"][0][1] == "desc":
+            matched.reverse()
+        resp = {"hits": {"total": {"value": len(matched), "relation": "eq"}, "hits": []}}
+        if scroll and params.get("scroll"):
+            scroll_id = f"scroll-{len(scroll_contexts)}"
+            scroll_contexts[scroll_id] = (matched[start + size :], size, includes)
+            resp["_scroll_id"] = scroll_id
+        assert start + size <= max_result_window
+        resp["hits"]["hits"] = [_make_hit(*log, includes) for log in matched[start : start + size]]
+        return resp
+
+    def esquery_scroll(params, use_admin=False):
+        matched, size, includes = scroll_contexts[params["scroll_id"]]
+        page, rest = matched[:size], matched[size:]
+        scroll_contexts[params["scroll_id"]] = (rest, size, includes)
+        return {"_scroll_id": params["scroll_id"], "hits": {"hits": [_make_hit(*log, includes) for log in page]}}
+
+    def to_datetime_params(api):
+        def wrapper(params, use_admin=False):
+            params = {**params}
+            for key in ["start_time", "end_time"]:
+                if key in params:
+                    params[key] = str2datetime(params[key])
+            return api(params, use_admin)
+
+        return wrapper
+
+    return to_datetime_params(esquery_search), to_datetime_params(esquery_scroll)
+
+
+class TestBKLogSearch:
+    def _patch_api(self, search, scroll):
+        return patch.multiple(handler.BKLogApi, esquery_search=search, esquery_scroll=scroll)
+
+    def test_paginate_by_offset(self):
+        search, scroll = _mock_search(2500, handler.BKLOG_MAX_RESULT_WINDOW)
+        with self._patch_api(search, scroll):
+            bklog_search = BKLogSearch("collector", START_TIME, END_TIME)
+            logs = list(bklog_search.iter_logs())
+
+        # 不受单页条数限制，日志已转换为蛇形命名
+        assert [log["log_index"] for log in logs] == list(range(2500))
+        assert bklog_search.stats["query_count"] == 3
+        assert bklog_search.stats["hit_count"] == 2500
+
+    def test_paginate_split_time_range(self):
+        search, scroll = _mock_search(250, 100)
+        with patch.object(handler, "BKLOG_MAX_RESULT_WINDOW", 100), self._patch_api(search, scroll):
+            logs = list(BKLogHandler.iter_logs("collector", START_TIME, END_TIME, page_size=40))
+
+        # 超过最大翻页条数时按时间拆分，既不截断也不重复
+        assert [log["log_index"] for log in logs] == list(range(250))
+
+    def test_paginate_split_sub_second(self):
+        # 每半秒一条日志，拆分点所在这一秒内的日志(如 xx:xx:xx.500)既不能遗漏，也不能重复
+        search, scroll = _mock_search(250, 100, interval=timedelta(milliseconds=500))
+        with patch.object(handler, "BKLOG_MAX_RESULT_WINDOW", 100), self._patch_api(search, scroll):
+            logs = list(BKLogHandler.iter_logs("collector", START_TIME, END_TIME, page_size=40))
+
+        assert [log["log_index"] for log in logs] == list(range(250))
+
+    def test_paginate_split_desc(self):
+        search, scroll = _mock_search(250, 100, interval=timedelta(milliseconds=500))
+        with patch.object(handler, "BKLOG_MAX_RESULT_WINDOW", 100), self._patch_api(search, scroll):
+            bklog_search = BKLogSearch(
+                "collector", START_TIME, END_TIME, sort_list=[["dtEventTimeStamp", "desc"]], page_size=40
+            )
+            logs = list(bklog_search.iter_logs())
+
+        # 倒序查询时先返回较晚的一段
+        assert [log["log_index"] for log in logs] == list(range(249, -1, -1))
+
+    def test_scroll(self):
+        search, scroll = _mock_search(250, 100, scroll=True)
+        with patch.object(handler, "BKLOG_MAX_RESULT_WINDOW", 100), self._patch_api(search, scroll):
+            bklog_search = BKLogSearch("collector", START_TIME, END_TIME, page_size=100)
+            logs = list(bklog_search.iter_logs())
+
+        # scroll 翻页不受最大翻页条数限制，无需拆分时间范围
+        assert [log["log_index"] for log in logs] == list(range(250))
+        assert bklog_search.stats["query_count"] == 3
+
+    def test_limit_and_fields(self):
+        search, scroll = _mock_search(2500, handler.BKLOG_MAX_RESULT_WINDOW)
+        search = MagicMock(side_effect=search)
+        with self._patch_api(search, scroll):
+            logs = BKLogHandler.query_logs("collector", START_TIME, END_TIME, size=1)
+            hits = list(BKLogSearch("collector", START_TIME, END_TIME, fields=["ClusterId"], limit=3))
+
+        assert logs == [{"log_index": 0, "cluster_id": 0}]
+        # 字段投影下推到查询中，时间和排序字段始终返回
+        assert search.call_args[0][0]["_source"] == {
+            "includes": ["ClusterId", "dtEventTimeStamp", "gseIndex", "iterationIndex"]
+        }
+        # 未返回原始日志，日志内容直接取自投影的字段
+        assert all("log" not in hit.source for hit in hits)
+        assert [hit.log for hit in hits] == [{"ClusterId": 0}, {"ClusterId": 1}, {"ClusterId": 2}]
+
+    def test_query_logs_default_size(self):
+        search, scroll = _mock_search(2500, handler.BKLOG_MAX_RESULT_WINDOW, scroll=True)
+        search = MagicMock(side_effect=search)
+        with self._patch_api(search, scroll):
+            logs = BKLogHandler.query_logs("collector", START_TIME, END_TIME)
+
+        # 默认只返回一页，一次查询即可，不创建 scroll 上下文
+        assert [log["log_index"] for log in logs] == list(range(handler.BKLOG_PAGE_SIZE))
+        search.assert_called_once()
+        assert "scroll" not in search.call_args[0][0]
+
+    def test_query_logs_unlimited(self):
+        search, scroll = _mock_search(2500, handler.BKLOG_MAX_RESULT_WINDOW, scroll=True)
+        with self._patch_api(search, scroll):
+            logs = BKLogHandler.query_logs("collector", START_TIME, END_TIME, size=None)
+
+        assert [log["log_index"] for log in logs] == list(range(2500))
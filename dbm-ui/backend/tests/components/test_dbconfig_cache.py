@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+from unittest.mock import MagicMock, patch
+
+from backend.components.dbconfig.cache import (
+    CachedQueryConfItem,
+    InvalidatingConfItemWriter,
+    dbconfig_cache_scope,
+    get_prefetched_conf_items,
+    prefetch_conf_items,
+)
+from backend.components.dbconfig.constants import FormatType, LevelName, ReqType
+
+QUERY_PARAMS = {
+    "bk_biz_id": "3",
+    "level_name": LevelName.CLUSTER,
+    "level_value": "cache.redis.db",
+    "level_info": {"module": "0"},
+    "conf_file": "Redis-6",
+    "conf_type": "dbconf",
+    "namespace": "TwemproxyRedisInstance",
+    "format": FormatType.MAP,
+}
+
+
+class TestDBConfigCache:
+    def test_query_cached_in_scope(self):
+        api = MagicMock(return_value={"content": {"requirepass": "xxx"}})
+        query_conf_item = CachedQueryConfItem(api)
+
+        # 作用域外不缓存
+        query_conf_item(params=QUERY_PARAMS)
+        query_conf_item(params=QUERY_PARAMS)
+        assert api.call_count == 2
+
+        api.reset_mock()
+        with dbconfig_cache_scope():
+            for __ in range(10):
+                data = query_conf_item(params=QUERY_PARAMS)
+                # 调用方修改返回值不影响缓存
+                data["content"]["requirepass"] = "changed"
+            assert query_conf_item(params=QUERY_PARAMS)["content"]["requirepass"] == "xxx"
+            # 有副作用的请求不缓存
+            query_conf_item(params={**QUERY_PARAMS, "method": ReqType.GENERATE_AND_PUBLISH})
+            query_conf_item(params={**QUERY_PARAMS, "method": ReqType.GENERATE_AND_PUBLISH})
+        assert api.call_count == 3
+
+    def test_invalidate_on_upsert(self):
+        api = MagicMock(return_value={"content": {}})
+        query_conf_item = CachedQueryConfItem(api)
+        upsert_conf_item = InvalidatingConfItemWriter(MagicMock())
+
+        with dbconfig_cache_scope():
+            query_conf_item(params=QUERY_PARAMS)
+            query_conf_item(params=QUERY_PARAMS)
+            upsert_conf_item(
+                {
+                    "conf_file_info": {
+                        "conf_file": QUERY_PARAMS["conf_file"],
+                        "conf_type": QUERY_PARAMS["conf_type"],
+                        "namespace": QUERY_PARAMS["namespace"],
+                    },
+                    "level_name": LevelName.APP,
+                    "level_value": "3",
+                }
+            )
+            query_conf_item(params=QUERY_PARAMS)
+        assert api.call_count == 2
+
+    @patch("backend.components.DBConfigApi.batch_get_conf_item")
+    def test_prefetch(self, batch_get_conf_item):
+        domains = [f"cache{i}.redis.db" for i in range(500)]
+        batch_get_conf_item.side_effect = lambda params: {
+            "content": {domain: {"requirepass": f"{domain}-pass"} for domain in params["level_values"]}
+        }
+
+        with dbconfig_cache_scope():
+            prefetch_conf_items("TwemproxyRedisInstance", "dbconf", "Redis-6", "cluster", domains, ["requirepass"])
+            # 已预取的对象不重复查询
+            prefetch_conf_items("TwemproxyRedisInstance", "dbconf", "Redis-6", "cluster", domains, ["requirepass"])
+            items = get_prefetched_conf_items(
+                "TwemproxyRedisInstance", "dbconf", "Redis-6", "cluster", "cache1.redis.db", ["requirepass"]
+            )
+        assert batch_get_conf_item.call_count == 3
+        assert items == {"requirepass": "cache1.redis.db-pass"}
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+from unittest.mock import MagicMock, patch
+
+from backend.components.db_remote_service.handler import DRSHandler
+
+
+def _inline_multi_thread(func, params_list, get_data, in_order):
+    return [get_data((params, func(**params))) for params in params_list]
+
+
+class TestDRSHandler:
+    @patch("backend.components.db_remote_service.handler.request_multi_thread", side_effect=_inline_multi_thread)
+    def test_multi_rpc(self, mock_multi_thread):
+        def rpc(params):
+            if params["bk_cloud_id"] == 1:
+                raise Exception("proxy unavailable")
+            # 只返回部分地址的结果
+            return [{"address": addr, "result": f"ok-{addr}", "error": ""} for addr in params["addresses"][:-1]]
+
+        rpc = MagicMock(side_effect=rpc)
+        addresses = [(0, f"127.0.0.1:{port}") for port in range(30000, 30005)] + [(1, "127.0.0.2:30000")]
+        results = DRSHandler.multi_rpc(rpc, addresses + addresses[:1], {"command": "info"}, batch_size=2)
+
+        # 按云区域分组、分批请求，重复地址只请求一次
+        assert [call.args[0]["addresses"] for call in rpc.call_args_list] == [
+            ["127.0.0.1:30000", "127.0.0.1:30001"],
+            ["127.0.0.1:30002", "127.0.0.1:30003"],
+            ["127.0.0.1:30004"],
+            ["127.0.0.2:30000"],
+        ]
+        assert all(call.args[0]["command"] == "info" for call in rpc.call_args_list)
+
+        assert len(results) == 6
+        assert results["127.0.0.1:30000"].result == "ok-127.0.0.1:30000"
+        assert not results["127.0.0.1:30000"].error
+        # 未返回结果的地址、请求失败的地址都有对应的错误信息
+        assert results["127.0.0.1:30001"].error
+        assert results["127.0.0.2:30000"].error == "proxy unavailable"
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+from backend.components.transport import PooledTransport, TransportStats
+
+
+class TestPooledTransport:
+    def test_adapter_shared_per_host(self):
+        transport = PooledTransport()
+        prefix, adapter = transport.get_adapter("https://bkapi.example.com/api/cmdb/search_business/")
+        _, same_adapter = transport.get_adapter("https://bkapi.example.com/api/job/get_job_instance_status/")
+        _, cert_adapter = transport.get_adapter("https://bkapi.example.com/api/cmdb/", with_cert=True)
+        _, other_adapter = transport.get_adapter("http://drs.example.com:8888/mysql/rpc/")
+
+        assert prefix == "https://bkapi.example.com/"
+        assert adapter is same_adapter
+        assert adapter is not cert_adapter
+        assert adapter is not other_adapter
+
+        session = transport.session("https://bkapi.example.com/api/cmdb/search_business/")
+        assert session.get_adapter("https://bkapi.example.com/api/cmdb/search_business/") is adapter
+        transport.clear()
+
+    def test_stats_snapshot(self):
+        stats = TransportStats()
+        for __ in range(10):
+            stats.record_request("bkapi.example.com:443")
+        stats.record_handshake("bkapi.example.com:443", 0.05)
+        stats.record_handshake("bkapi.example.com:443", 0.05)
+
+        snapshot = stats.snapshot()["bkapi.example.com:443"]
+        assert snapshot["requests"] == 10
+        assert snapshot["pool_hits"] == 8
+        assert snapshot["pool_misses"] == 2
+        assert snapshot["handshake_time"] == 0.1
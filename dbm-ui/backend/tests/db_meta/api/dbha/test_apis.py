@@ -9,12 +9,16 @@ an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express o
 specific language governing permissions and limitations under the License.
 """
 import ipaddress
+import logging
+import time
 
 import pytest
+from django.core.cache import cache
 from rest_framework.exceptions import ValidationError
 
 from backend.constants import IP_PORT_DIVIDER
 from backend.db_meta import api, models
+from backend.db_meta.api.dbha.snapshot import TopoSnapshotManager
 from backend.db_meta.enums import (
     AccessLayer,
     ClusterPhase,
@@ -25,10 +29,12 @@ from backend.db_meta.enums import (
     InstanceStatus,
     MachineType,
 )
+from backend.db_meta.signals import DBHA_TOPO_CHANGE_COUNTER_KEY
 from backend.tests.mock_data import constant
 from backend.tests.mock_data.components import cc
 
 pytestmark = pytest.mark.django_db
+logger = logging.getLogger("test")
 
 TEST_PROXY_PORT1 = 10000
 TEST_PROXY_PORT2 = 10001
@@ -164,6 +170,28 @@ class TestDBHA:
     def test_instance_filter2(self, dbha_fixture):
         assert len(api.dbha.instances(statuses=[InstanceStatus.UNAVAILABLE.value])) == 4
 
+    def test_instance_snapshot(self, dbha_fixture):
+        manager = TopoSnapshotManager()
+        result = manager.query()
+        assert len(result["instances"]) == len(api.dbha.instances())
+        assert len(manager.query(logical_city_ids=[1])["instances"]) == 3
+        assert len(manager.query(statuses=[InstanceStatus.UNAVAILABLE.value])["instances"]) == 4
+        assert manager.query(version=result["version"])["not_modified"]
+
+    def test_instance_snapshot_delta(self, dbha_fixture):
+        manager = TopoSnapshotManager()
+        version = manager.query()["version"]
+
+        models.StorageInstance.objects.filter(machine__ip=cc.NORMAL_IP2, port=TEST_STORAGE_PORT1).update(
+            status=InstanceStatus.UNAVAILABLE.value
+        )
+        cache.set(DBHA_TOPO_CHANGE_COUNTER_KEY, (cache.get(DBHA_TOPO_CHANGE_COUNTER_KEY) or 0) + 1, None)
+
+        result = manager.query(version=version, delta=True, statuses=[InstanceStatus.RUNNING.value])
+        assert result["delta"] and result["version"] != version
+        assert result["instances"] == []
+        assert result["removed"] == [f"{cc.NORMAL_IP2}{IP_PORT_DIVIDER}{TEST_STORAGE_PORT1}"]
+
     def test_update_success(self, dbha_fixture):
         api.dbha.update_status(
             [
@@ -231,6 +259,51 @@ class TestDBHA:
         with pytest.raises(ValidationError):
             api.dbha.update_status([{"ip": cc.NORMAL_IP, "port": "aa", "status": InstanceStatus.RUNNING.value}], 0)
 
+    def test_bulk_update_status(self, dbha_fixture):
+        results = api.dbha.bulk_update_status(
+            [
+                {"ip": cc.NORMAL_IP, "port": TEST_PROXY_PORT1, "status": InstanceStatus.UNAVAILABLE.value},
+                {"ip": cc.IP_NOT_IN_BKCC, "port": TEST_PROXY_PORT1, "status": InstanceStatus.RUNNING.value},
+            ],
+            bk_cloud_id=0,
+        )
+        assert [res["result"] for res in results] == [True, False]
+        assert models.Cluster.objects.get(immute_domain=constant.CLUSTER_IMMUTE_DOMAIN).status == (
+            ClusterStatus.ABNORMAL.value
+        )
+
+    def test_bulk_update_status_benchmark(self, create_city, django_assert_max_num_queries):
+        """5000 个实例的批量状态上报，查询次数与实例数量无关"""
+        bk_city = models.BKCity.objects.first()
+        machines = models.Machine.objects.bulk_create(
+            [
+                models.Machine(
+                    ip=f"10.0.0.{idx}", bk_biz_id=constant.BK_BIZ_ID, bk_city=bk_city, bk_host_id=100000 + idx
+                )
+                for idx in range(1, 51)
+            ]
+        )
+        models.StorageInstance.objects.bulk_create(
+            [
+                models.StorageInstance(machine=machine, port=port, status=InstanceStatus.RUNNING.value)
+                for machine in models.Machine.objects.filter(ip__in=[m.ip for m in machines])
+                for port in range(20000, 20100)
+            ]
+        )
+        payloads = [
+            {"ip": machine.ip, "port": port, "status": InstanceStatus.UNAVAILABLE.value}
+            for machine in machines
+            for port in range(20000, 20100)
+        ]
+
+        start_time = time.time()
+        with django_assert_max_num_queries(10):
+            results = api.dbha.bulk_update_status(payloads, bk_cloud_id=0)
+        logger.info("bulk update %s instances status cost %.3fs", len(payloads), time.time() - start_time)
+
+        assert len(results) == 5000 and all(res["result"] for res in results)
+        assert models.StorageInstance.objects.filter(status=InstanceStatus.UNAVAILABLE.value).count() == 5000
+
     def test_swap_success(self, dbha_fixture):
         api.dbha.swap_role(
             [
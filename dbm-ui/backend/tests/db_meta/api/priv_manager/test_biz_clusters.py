@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import json
+
+import pytest
+
+from backend.db_meta import api, models
+from backend.db_meta.enums import (
+    AccessLayer,
+    ClusterPhase,
+    ClusterStatus,
+    ClusterType,
+    InstanceInnerRole,
+    InstanceRole,
+    InstanceStatus,
+    MachineType,
+)
+from backend.tests.mock_data import constant
+
+pytestmark = pytest.mark.django_db
+
+
+def create_clusters(count: int, offset: int = 0):
+    city = models.BKCity.objects.first()
+    proxy_machine, __ = models.Machine.objects.get_or_create(
+        ip="127.0.1.1",
+        defaults=dict(
+            bk_biz_id=constant.BK_BIZ_ID,
+            machine_type=MachineType.PROXY,
+            access_layer=AccessLayer.PROXY,
+            bk_city=city,
+            bk_host_id=1001,
+        ),
+    )
+    storage_machine, __ = models.Machine.objects.get_or_create(
+        ip="127.0.1.2",
+        defaults=dict(
+            bk_biz_id=constant.BK_BIZ_ID,
+            machine_type=MachineType.BACKEND,
+            access_layer=AccessLayer.STORAGE,
+            bk_city=city,
+            bk_host_id=1002,
+        ),
+    )
+    for index in range(offset, offset + count):
+        cluster = models.Cluster.objects.create(
+            bk_biz_id=constant.BK_BIZ_ID,
+            name=f"cluster{index}",
+            db_module_id=constant.DB_MODULE_ID,
+            immute_domain=f"cluster{index}.db",
+            cluster_type=ClusterType.TenDBHA.value,
+            phase=ClusterPhase.ONLINE.value,
+            status=ClusterStatus.NORMAL.value,
+        )
+        master = models.StorageInstance.objects.create(
+            port=20000 + index,
+            machine=storage_machine,
+            status=InstanceStatus.RUNNING,
+            instance_role=InstanceRole.BACKEND_MASTER,
+            instance_inner_role=InstanceInnerRole.MASTER,
+        )
+        slave = models.StorageInstance.objects.create(
+            port=30000 + index,
+            machine=storage_machine,
+            status=InstanceStatus.RUNNING,
+            instance_role=InstanceRole.BACKEND_SLAVE,
+            instance_inner_role=InstanceInnerRole.SLAVE,
+        )
+        proxy = models.ProxyInstance.objects.create(
+            port=10000 + index, machine=proxy_machine, status=InstanceStatus.RUNNING
+        )
+        cluster.storageinstance_set.add(master, slave)
+        cluster.proxyinstance_set.add(proxy)
+
+
+class TestBizClusters:
+    def test_biz_clusters(self, create_city):
+        create_clusters(3)
+        # 没有实例的集群
+        models.Cluster.objects.create(
+            bk_biz_id=constant.BK_BIZ_ID,
+            name="empty",
+            db_module_id=constant.DB_MODULE_ID,
+            immute_domain="empty.db",
+            cluster_type=ClusterType.TenDBHA.value,
+        )
+
+        result = api.priv_manager.biz_clusters(constant.BK_BIZ_ID, [])
+        clusters = {cluster["immute_domain"]: cluster for cluster in result}
+        assert len(clusters) == 4
+
+        cluster = clusters["cluster1.db"]
+        assert [ele["port"] for ele in cluster["master_storage_instances"]] == [20001]
+        assert [ele["port"] for ele in cluster["slave_storage_instances"]] == [30001]
+        assert len(cluster["storages"]) == 2
+        assert cluster["proxies"][0]["ip"] == "127.0.1.1"
+        assert clusters["empty.db"]["storages"] == clusters["empty.db"]["proxies"] == []
+
+        filtered = api.priv_manager.biz_clusters(constant.BK_BIZ_ID, ["cluster2.db"])
+        assert [cluster["immute_domain"] for cluster in filtered] == ["cluster2.db"]
+
+    def test_query_count_constant(self, create_city, django_assert_max_num_queries):
+        create_clusters(5)
+        with django_assert_max_num_queries(4):
+            assert len(api.priv_manager.biz_clusters(constant.BK_BIZ_ID, [])) == 5
+
+        create_clusters(50, offset=5)
+        with django_assert_max_num_queries(4):
+            assert len(api.priv_manager.biz_clusters(constant.BK_BIZ_ID, [])) == 55
+
+    def test_stream_biz_clusters(self, create_city):
+        create_clusters(3)
+        content = "".join(
+            api.priv_manager.stream_biz_clusters(constant.BK_BIZ_ID, [], envelope={"msg": "", "code": 0})
+        )
+        resp = json.loads(content)
+        assert resp["code"] == 0
+        assert resp["data"] == api.priv_manager.biz_clusters(constant.BK_BIZ_ID, [])
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import pytest
+
+from backend.db_meta import models
+from backend.db_meta.enums import (
+    ClusterDBHAStatusFlags,
+    ClusterType,
+    InstanceInnerRole,
+    InstanceRole,
+    InstanceStatus,
+    TenDBClusterSpiderRole,
+)
+from backend.db_meta.enums.cluster_status import ClusterDBSingleStatusFlags
+from backend.tests.mock_data import constant
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def status_flag_clusters(create_city):
+    """
+    构造一批集群: 第 i 个 TenDBHA 集群按 i%4 依次为 正常/proxy异常/master异常/slave异常，另有一个异常的 TenDBSingle
+    """
+    bk_city = models.BKCity.objects.first()
+    models.Cluster.objects.bulk_create(
+        [
+            models.Cluster(
+                name=f"status-flag-{idx}",
+                immute_domain=f"status-flag-{idx}.db",
+                bk_biz_id=constant.BK_BIZ_ID,
+                cluster_type=ClusterType.TenDBHA.value,
+            )
+            for idx in range(20)
+        ]
+        + [
+            models.Cluster(
+                name="status-flag-single",
+                immute_domain="status-flag-single.db",
+                bk_biz_id=constant.BK_BIZ_ID,
+                cluster_type=ClusterType.TenDBSingle.value,
+            )
+        ]
+    )
+    clusters = list(models.Cluster.objects.filter(name__startswith="status-flag").order_by("id"))
+    machine = models.Machine.objects.create(
+        ip="10.0.1.1", bk_biz_id=constant.BK_BIZ_ID, bk_city=bk_city, bk_host_id=200001
+    )
+    for idx, cluster in enumerate(clusters[:-1]):
+        proxy = models.ProxyInstance.objects.create(
+            machine=machine,
+            port=10000 + idx,
+            status=InstanceStatus.UNAVAILABLE if idx % 4 == 1 else InstanceStatus.RUNNING,
+        )
+        master = models.StorageInstance.objects.create(
+            machine=machine,
+            port=20000 + idx,
+            instance_role=InstanceRole.BACKEND_MASTER,
+            instance_inner_role=InstanceInnerRole.MASTER,
+            status=InstanceStatus.UNAVAILABLE if idx % 4 == 2 else InstanceStatus.RUNNING,
+        )
+        slave = models.StorageInstance.objects.create(
+            machine=machine,
+            port=30000 + idx,
+            instance_role=InstanceRole.BACKEND_SLAVE,
+            instance_inner_role=InstanceInnerRole.SLAVE,
+            status=InstanceStatus.UNAVAILABLE if idx % 4 == 3 else InstanceStatus.RUNNING,
+        )
+        proxy.cluster.add(cluster)
+        master.cluster.add(cluster)
+        slave.cluster.add(cluster)
+
+    orphan = models.StorageInstance.objects.create(
+        machine=machine,
+        port=40000,
+        instance_role=InstanceRole.ORPHAN,
+        instance_inner_role=InstanceInnerRole.ORPHAN,
+        status=InstanceStatus.UNAVAILABLE,
+    )
+    orphan.cluster.add(clusters[-1])
+    return clusters
+
+
+class TestClusterStatusFlag:
+    def test_get_status_flags_map(self, status_flag_clusters, django_assert_max_num_queries):
+        # 查询次数与集群数量无关
+        with django_assert_max_num_queries(2):
+            status_flags_map = models.Cluster.get_status_flags_map(status_flag_clusters)
+
+        expected_flags = [
+            ClusterDBHAStatusFlags(0),
+            ClusterDBHAStatusFlags.ProxyUnavailable,
+            ClusterDBHAStatusFlags.BackendMasterUnavailable,
+            ClusterDBHAStatusFlags.BackendSlaveUnavailable,
+        ]
+        for idx, cluster in enumerate(status_flag_clusters[:-1]):
+            assert status_flags_map[cluster.id] == expected_flags[idx % 4]
+        assert status_flags_map[status_flag_clusters[-1].id] == ClusterDBSingleStatusFlags.SingleUnavailable
+
+    def test_status_flag_consistent(self, status_flag_clusters):
+        status_flags_map = models.Cluster.get_status_flags_map(status_flag_clusters)
+        for cluster in status_flag_clusters:
+            assert cluster.status_flag == status_flags_map[cluster.id].value
+
+
+class TestClusterAccessPort:
+    def test_get_access_info_map(self, status_flag_clusters, django_assert_max_num_queries):
+        machine = models.Machine.objects.first()
+        spider_cluster = models.Cluster.objects.create(
+            name="access-port-spider",
+            immute_domain="access-port-spider.db",
+            bk_biz_id=constant.BK_BIZ_ID,
+            cluster_type=ClusterType.TenDBCluster.value,
+        )
+        for port, spider_role in [
+            (25000, TenDBClusterSpiderRole.SPIDER_SLAVE),
+            (25001, TenDBClusterSpiderRole.SPIDER_MASTER),
+        ]:
+            spider = models.ProxyInstance.objects.create(machine=machine, port=port)
+            models.TenDBClusterSpiderExt.objects.create(instance=spider, spider_role=spider_role)
+            spider.cluster.add(spider_cluster)
+        empty_cluster = models.Cluster.objects.create(
+            name="access-port-empty",
+            immute_domain="access-port-empty.db",
+            bk_biz_id=constant.BK_BIZ_ID,
+            cluster_type=ClusterType.TenDBHA.value,
+        )
+        clusters = [*status_flag_clusters, spider_cluster, empty_cluster]
+
+        # 存储和接入层各一次查询，与集群数量无关
+        with django_assert_max_num_queries(2):
+            access_info_map = models.Cluster.get_access_info_map(clusters)
+
+        for idx, cluster in enumerate(status_flag_clusters[:-1]):
+            assert access_info_map[cluster.id]["access_port"] == 10000 + idx
+        assert access_info_map[status_flag_clusters[-1].id]["access_port"] == 40000
+        assert access_info_map[spider_cluster.id]["access_port"] == 25001
+        assert access_info_map[empty_cluster.id]["access_port"] == 0
+        for cluster in clusters:
+            assert access_info_map[cluster.id]["access_port"] == cluster.access_port
+            assert access_info_map[cluster.id]["proxy_version"] == cluster.proxy_version
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import json
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import pytest
+from django.utils import timezone
+
+from backend.components.bklog.handler import BKLogHit
+from backend.db_meta import models
+from backend.db_meta.enums import ClusterType, InstanceInnerRole, InstanceRole
+from backend.db_periodic_task.local_tasks.check_checksum import check_clusters_checksum
+from backend.db_report.models import ChecksumCheckReport, ChecksumInstance
+from backend.tests.mock_data import constant
+
+pytestmark = pytest.mark.django_db
+
+START_TIME = datetime(2024, 7, 1, tzinfo=timezone.utc)
+END_TIME = START_TIME + timedelta(days=1) - timedelta(seconds=1)
+LOG_START_TIME = START_TIME - timedelta(days=1)
+
+
+@pytest.fixture
+def checksum_clusters(create_city):
+    bk_city = models.BKCity.objects.first()
+    machines = [
+        models.Machine.objects.create(ip=ip, bk_biz_id=constant.BK_BIZ_ID, bk_city=bk_city, bk_host_id=host_id)
+        for ip, host_id in [("10.0.3.1", 310001), ("10.0.3.2", 310002)]
+    ]
+    clusters = []
+    for index, (machine, port) in enumerate([(machines[0], 20001), (machines[0], 20002), (machines[1], 20003)]):
+        cluster = models.Cluster.objects.create(
+            name=f"checksum-{index}",
+            immute_domain=f"checksum-{index}.db",
+            bk_biz_id=constant.BK_BIZ_ID,
+            cluster_type=ClusterType.TenDBHA.value,
+        )
+        slave = models.StorageInstance.objects.create(
+            machine=machine,
+            port=port,
+            instance_role=InstanceRole.BACKEND_SLAVE,
+            instance_inner_role=InstanceInnerRole.SLAVE,
+            cluster_type=ClusterType.TenDBHA.value,
+        )
+        slave.cluster.add(cluster)
+        clusters.append(cluster)
+    return clusters
+
+
+def _checksum_hit(cluster_id: int, ip: str, port: int, log_time: datetime, consistent: bool = True):
+    log = {
+        "cluster_id": cluster_id,
+        "ip": ip,
+        "port": port,
+        "master_port": 20000,
+        "master_crc": 1,
+        "this_crc": 1 if consistent else 2,
+        "master_cnt": 10,
+        "this_cnt": 10,
+        "db": "db1",
+        "tbl": "tb1",
+    }
+    return BKLogHit({"_source": {"log": json.dumps(log), "dtEventTimeStamp": str(int(log_time.timestamp() * 1000))}})
+
+
+class TestCheckClustersChecksum:
+    def test_check_clusters_checksum(self, checksum_clusters):
+        ok_cluster, fail_cluster, missing_cluster = checksum_clusters
+        hits = [
+            _checksum_hit(ok_cluster.id, "10.0.3.1", 20001, START_TIME + timedelta(hours=1)),
+            _checksum_hit(fail_cluster.id, "10.0.3.1", 20002, START_TIME + timedelta(hours=1), consistent=False),
+            # 近1天之前的不一致日志不记录到报告中
+            _checksum_hit(ok_cluster.id, "10.0.3.1", 20001, LOG_START_TIME + timedelta(hours=1), consistent=False),
+        ]
+        with patch("backend.db_periodic_task.local_tasks.check_checksum.BKLogSearch", return_value=hits) as search:
+            check_clusters_checksum(
+                [cluster.id for cluster in checksum_clusters] + [0], START_TIME, END_TIME, LOG_START_TIME
+            )
+
+        # 同一云区域的集群只查询一次日志
+        search.assert_called_once()
+        assert search.call_args.kwargs["filters"][0]["value"] == ["10.0.3.1", "10.0.3.2"]
+
+        reports = {report.cluster: report for report in ChecksumCheckReport.objects.all()}
+        assert len(reports) == 3
+        assert reports[ok_cluster.immute_domain].status
+        assert not reports[fail_cluster.immute_domain].status
+        assert reports[fail_cluster.immute_domain].fail_slaves == 1
+        assert not reports[missing_cluster.immute_domain].status
+
+        instances = {(inst.report.cluster, inst.port): inst for inst in ChecksumInstance.objects.all()}
+        assert instances.keys() == {(fail_cluster.immute_domain, "20002"), (missing_cluster.immute_domain, "20003")}
+        assert instances[(fail_cluster.immute_domain, "20002")].details == {"db1": ["tb1"]}
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import pytest
+
+from backend.db_meta import models
+from backend.db_meta.enums import ClusterType, InstanceInnerRole, InstanceRole, InstanceStatus, MachineType
+from backend.db_periodic_task.local_tasks.db_meta.db_meta_check import task  # noqa
+from backend.db_periodic_task.local_tasks.db_meta.db_meta_check.check_cluster_topo import check_cluster_topo
+from backend.db_periodic_task.local_tasks.db_meta.db_meta_check.check_instance_belong import check_instance_belong
+from backend.db_periodic_task.local_tasks.db_meta.db_meta_check.engine import (
+    META_CHECK_RULES,
+    MetaCheckRule,
+    MetaCheckRuleError,
+    run_meta_check_rules,
+)
+from backend.db_report.enums import MetaCheckSubType
+from backend.db_report.models import MetaCheckReport
+from backend.tests.mock_data import constant
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def meta_topo(create_city):
+    bk_city = models.BKCity.objects.first()
+    machine = models.Machine.objects.create(
+        ip="10.0.2.1", bk_biz_id=constant.BK_BIZ_ID, bk_city=bk_city, bk_host_id=300001
+    )
+    single_machine = models.Machine.objects.create(
+        ip="10.0.2.2",
+        bk_biz_id=constant.BK_BIZ_ID,
+        bk_city=bk_city,
+        bk_host_id=300002,
+        machine_type=MachineType.SINGLE.value,
+    )
+    ha_cluster = models.Cluster.objects.create(
+        name="meta-check-ha",
+        immute_domain="meta-check-ha.db",
+        bk_biz_id=constant.BK_BIZ_ID,
+        cluster_type=ClusterType.TenDBHA.value,
+    )
+    single_cluster = models.Cluster.objects.create(
+        name="meta-check-single",
+        immute_domain="meta-check-single.db",
+        bk_biz_id=constant.BK_BIZ_ID,
+        cluster_type=ClusterType.TenDBSingle.value,
+    )
+
+    # TenDBHA 只有一个 proxy，且 slave 作为同步的 ejector
+    proxy = models.ProxyInstance.objects.create(machine=machine, port=10000, status=InstanceStatus.RUNNING)
+    master = models.StorageInstance.objects.create(
+        machine=machine,
+        port=20000,
+        instance_role=InstanceRole.BACKEND_MASTER,
+        instance_inner_role=InstanceInnerRole.MASTER,
+        cluster_type=ClusterType.TenDBHA.value,
+    )
+    slave = models.StorageInstance.objects.create(
+        machine=machine,
+        port=20001,
+        instance_role=InstanceRole.BACKEND_SLAVE,
+        instance_inner_role=InstanceInnerRole.SLAVE,
+        cluster_type=ClusterType.TenDBHA.value,
+    )
+    proxy.cluster.add(ha_cluster)
+    master.cluster.add(ha_cluster)
+    slave.cluster.add(ha_cluster)
+    models.StorageInstanceTuple.objects.create(ejector=master, receiver=slave)
+    models.StorageInstanceTuple.objects.create(ejector=slave, receiver=master)
+
+    # 正常的 TenDBSingle
+    orphan = models.StorageInstance.objects.create(
+        machine=single_machine,
+        port=30000,
+        instance_role=InstanceRole.ORPHAN,
+        instance_inner_role=InstanceInnerRole.ORPHAN,
+    )
+    orphan.cluster.add(single_cluster)
+
+    # 不属于任何集群的实例
+    models.StorageInstance.objects.create(machine=machine, port=40000)
+
+
+class TestMetaCheckRules:
+    def test_run_meta_check_rules(self, meta_topo, django_assert_max_num_queries):
+        # 查询次数与集群和实例数量无关
+        with django_assert_max_num_queries(10):
+            report_count = run_meta_check_rules()
+
+        reports = {(report.subtype, report.port): report for report in MetaCheckReport.objects.all()}
+        assert report_count == len(reports) == 3
+
+        # 集群拓扑巡检不在每日巡检中执行
+        assert MetaCheckSubType.ClusterTopo.value not in {subtype for subtype, _port in reports}
+
+        assert reports[(MetaCheckSubType.InstanceBelong.value, 40000)].ip == "10.0.2.1"
+
+        # 同一个元组中 slave 作为 ejector、master 作为 receiver 都需要报告
+        assert reports[(MetaCheckSubType.ReplicateRole.value, 20001)].cluster == "meta-check-ha.db"
+        assert reports[(MetaCheckSubType.ReplicateRole.value, 20000)].cluster == "meta-check-ha.db"
+        assert reports[(MetaCheckSubType.ReplicateRole.value, 20000)].bk_biz_id == constant.BK_BIZ_ID
+
+    def test_run_selected_rules(self, meta_topo):
+        check_instance_belong()
+        assert list(MetaCheckReport.objects.values_list("subtype", "port")) == [
+            (MetaCheckSubType.InstanceBelong.value, 40000)
+        ]
+
+    def test_run_cluster_topo(self, meta_topo):
+        check_cluster_topo()
+        # 正常的 TenDBSingle 集群没有拓扑异常，TenDBHA 的拓扑规则未实现
+        assert not MetaCheckReport.objects.filter(subtype=MetaCheckSubType.ClusterTopo.value).exists()
+
+    def test_rule_error(self, meta_topo):
+        def broken_rule(snapshot):
+            raise ValueError("broken")
+
+        META_CHECK_RULES["test.broken_rule"] = MetaCheckRule(name="test.broken_rule", func=broken_rule)
+        try:
+            # 失败的规则不影响其他规则写入报告，但需要抛出异常
+            with pytest.raises(MetaCheckRuleError, match="broken"):
+                run_meta_check_rules()
+        finally:
+            META_CHECK_RULES.pop("test.broken_rule")
+        assert MetaCheckReport.objects.filter(subtype=MetaCheckSubType.InstanceBelong.value).exists()
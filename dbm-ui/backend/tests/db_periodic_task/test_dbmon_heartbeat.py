@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+
+from backend.db_meta.enums import ClusterType
+from backend.db_meta.models import AppCache
+from backend.db_periodic_task.local_tasks.dbmon_heartbeat import heartbeat_report
+from backend.db_report.enums import DbmonHeartbeatReportSubType
+from backend.db_report.models import DbmonHeartbeatReport
+from backend.tests.mock_data import constant
+
+pytestmark = pytest.mark.django_db
+
+# 三个集群共用同一个 proxy IP，心跳需要按集群域名区分
+PROXY_IP = "127.0.0.100"
+
+
+def make_cluster(cluster_id):
+    return SimpleNamespace(
+        id=cluster_id,
+        bk_biz_id=constant.BK_BIZ_ID,
+        bk_cloud_id=0,
+        creator="admin",
+        immute_domain=f"cache{cluster_id}.redis.db",
+        cluster_type=ClusterType.TendisTwemproxyRedisInstance.value,
+    )
+
+
+def make_cluster_info(cluster_id):
+    master_ip, slave_ip = f"127.0.{cluster_id}.1", f"127.0.{cluster_id}.2"
+    return {
+        "id": cluster_id,
+        "redis_master_ips_set": {master_ip},
+        "redis_slave_ips_set": {slave_ip},
+        "twemproxy_ips_set": {PROXY_IP},
+        "redis_master_set": [f"{master_ip}:30000 0-419999"],
+        "redis_slave_set": [f"{slave_ip}:30000 0-419999"],
+        "twemproxy_ports": [50000],
+    }
+
+
+def make_series(domain, target, value):
+    return {"dimensions": {"cluster_domain": domain, "target": target}, "datapoints": [[None, 1], [value, 2]]}
+
+
+class TestDbmonHeartbeatGrouped:
+    @patch.object(heartbeat_report, "DBMON_HEARTBEAT_QUERY_CHUNK_SIZE", 2)
+    @patch.object(heartbeat_report.DBAdministrator, "get_biz_db_type_admins", return_value=["dba"])
+    @patch.object(heartbeat_report.api.cluster.nosqlcomm.other, "get_clusters_details")
+    @patch.object(heartbeat_report.BKMonitorV3Api, "unify_query")
+    def test_check_dbmon_heart_beat_grouped(self, unify_query, get_clusters_details, get_admins):
+        AppCache.objects.create(bk_biz_id=constant.BK_BIZ_ID, db_app_abbr="DBA", bk_biz_name="dba")
+        clusters = [make_cluster(cluster_id) for cluster_id in [1, 2, 3]]
+        get_clusters_details.side_effect = lambda cluster_ids: [make_cluster_info(_id) for _id in cluster_ids]
+
+        def mock_unify_query(params, use_admin):
+            # 集群1所有节点心跳正常；集群2的 master 心跳为空，proxy 心跳只出现在集群1的域名下；集群3没有心跳
+            return {
+                "series": [
+                    make_series("cache1.redis.db", "127.0.1.1", 1),
+                    make_series("cache1.redis.db", "127.0.1.2", 1),
+                    make_series("cache1.redis.db", PROXY_IP, 1),
+                    make_series("cache2.redis.db", "127.0.2.1", None),
+                    make_series("cache2.redis.db", "127.0.2.2", 1),
+                ]
+            }
+
+        unify_query.side_effect = mock_unify_query
+        heartbeat_report._check_dbmon_heart_beat_grouped(clusters)
+
+        # 按批次查询监控和集群拓扑，每批一次
+        assert unify_query.call_count == 2
+        assert [call.args[0] for call in get_clusters_details.call_args_list] == [[1, 2], [3]]
+        promql = unify_query.call_args_list[0].args[0]["query_configs"][0]["promql"]
+        assert 'cluster_domain=~"cache1\\\\.redis\\\\.db|cache2\\\\.redis\\\\.db"' in promql
+        # 同一业务只查询一次 DBA
+        assert get_admins.call_count == 1
+
+        reports = {
+            (report.cluster, report.instance, report.cluster_type)
+            for report in DbmonHeartbeatReport.objects.filter(status=False)
+        }
+        assert reports == {
+            ("cache2.redis.db", "127.0.2.1 ['30000']", DbmonHeartbeatReportSubType.REDIS_CACHE.value),
+            ("cache2.redis.db", f"{PROXY_IP} 50000", DbmonHeartbeatReportSubType.TWEMPROXY.value),
+            ("cache3.redis.db", "127.0.3.1 ['30000']", DbmonHeartbeatReportSubType.REDIS_CACHE.value),
+            ("cache3.redis.db", "127.0.3.2 ['30000']", DbmonHeartbeatReportSubType.REDIS_CACHE.value),
+            ("cache3.redis.db", f"{PROXY_IP} 50000", DbmonHeartbeatReportSubType.TWEMPROXY.value),
+        }
+        assert all(report.app == "DBA" and report.dba == ["dba"] for report in DbmonHeartbeatReport.objects.all())
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+from unittest.mock import patch
+
+import pytest
+
+from backend.db_periodic_task.local_tasks import job_status_poller
+from backend.db_periodic_task.local_tasks.job_status_poller import poll_job_instance_status
+
+pytestmark = pytest.mark.django_db
+
+
+class TestPollJobInstanceStatus:
+    @patch.object(job_status_poller.JobStatusPoller, "poll")
+    def test_poll_disabled(self, poll):
+        with patch.object(job_status_poller.env, "JOB_STATUS_POLLER_ENABLE", False):
+            poll_job_instance_status()
+        poll.assert_not_called()
+
+    @patch.object(job_status_poller.JobStatusPoller, "get_stats", return_value={})
+    @patch.object(job_status_poller.JobStatusPoller, "poll")
+    def test_poll_enabled(self, poll, get_stats):
+        with patch.object(job_status_poller.env, "JOB_STATUS_POLLER_ENABLE", True):
+            poll.return_value = {"polled": 0, "dropped": 0}
+            poll_job_instance_status()
+            # 没有轮询任何任务时不查询统计
+            get_stats.assert_not_called()
+
+            poll.return_value = {"polled": 3, "dropped": 1}
+            poll_job_instance_status()
+            get_stats.assert_called_once()
+        assert poll.call_count == 2
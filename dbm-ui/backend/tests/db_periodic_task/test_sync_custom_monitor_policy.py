@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+from unittest.mock import patch
+
+import pytest
+from django.core.cache.backends.locmem import LocMemCache
+
+from backend.configuration.constants import PLAT_BIZ_ID
+from backend.db_monitor.models import MonitorPolicy, NoticeGroup
+from backend.db_periodic_task.local_tasks import db_monitor
+from backend.db_periodic_task.local_tasks.db_monitor import sync_custom_monitor_policy
+
+pytestmark = pytest.mark.django_db
+
+BK_BIZ_ID = 3
+
+
+@pytest.fixture
+def groups():
+    # bulk_create 跳过告警组同步到监控
+    return NoticeGroup.objects.bulk_create(
+        [
+            NoticeGroup(bk_biz_id=PLAT_BIZ_ID, name="plat_dba", db_type="mysql", is_built_in=True),
+            NoticeGroup(bk_biz_id=BK_BIZ_ID, name="biz_dba", db_type="mysql", is_built_in=True),
+        ]
+    )
+
+
+@pytest.fixture
+def fake_cache():
+    with patch.object(db_monitor, "cache", LocMemCache("sync_custom_monitor_policy", {})):
+        yield
+
+
+class TestSyncCustomMonitorPolicy:
+    def test_skip_unchanged_groups(self, groups, fake_cache):
+        MonitorPolicy.objects.bulk_create(
+            [
+                MonitorPolicy(bk_biz_id=BK_BIZ_ID, name="policy_a", db_type="mysql", target_priority=0),
+                MonitorPolicy(bk_biz_id=BK_BIZ_ID, name="policy_b", db_type="redis", target_priority=0),
+            ]
+        )
+        with patch.object(db_monitor, "update_app_policy") as update_app_policy:
+            assert sync_custom_monitor_policy() == 2
+            update_app_policy.assert_any_call(BK_BIZ_ID, NoticeGroup.objects.get(name="biz_dba").id, "mysql")
+
+            # 告警组和策略都未变化时不再更新
+            update_app_policy.reset_mock()
+            assert sync_custom_monitor_policy() == 0
+            update_app_policy.assert_not_called()
+
+            # 业务告警组删除后，回退到平台告警组
+            NoticeGroup.objects.filter(name="biz_dba").delete()
+            assert sync_custom_monitor_policy() == 1
+            update_app_policy.assert_called_once_with(BK_BIZ_ID, NoticeGroup.objects.get(name="plat_dba").id, "mysql")
+
+            # 新增策略后需要重新同步
+            update_app_policy.reset_mock()
+            MonitorPolicy.objects.bulk_create(
+                [MonitorPolicy(bk_biz_id=BK_BIZ_ID, name="policy_c", db_type="redis", target_priority=0)]
+            )
+            assert sync_custom_monitor_policy() == 1
+            update_app_policy.assert_called_once_with(BK_BIZ_ID, None, "redis")
+
+    def test_retry_failed_update(self, groups, fake_cache):
+        MonitorPolicy.objects.bulk_create(
+            [MonitorPolicy(bk_biz_id=BK_BIZ_ID, name="policy_a", db_type="mysql", target_priority=0)]
+        )
+        with patch.object(db_monitor, "update_app_policy", side_effect=Exception("bkm error")):
+            assert sync_custom_monitor_policy() == 0
+        with patch.object(db_monitor, "update_app_policy") as update_app_policy:
+            assert sync_custom_monitor_policy() == 1
+            update_app_policy.assert_called_once()
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import json
+from unittest.mock import patch
+
+import pytest
+from django.core.cache.backends.locmem import LocMemCache
+
+from backend.configuration.constants import PLAT_BIZ_ID
+from backend.db_monitor.models import MonitorPolicy
+from backend.db_periodic_task.local_tasks import db_monitor
+from backend.db_periodic_task.local_tasks.db_monitor import PlatPolicySyncResult, sync_plat_monitor_policy
+
+pytestmark = pytest.mark.django_db
+
+
+def _write_template(tpl_dir, name, version=1, deleted=False):
+    template = {
+        "bk_biz_id": PLAT_BIZ_ID,
+        "name": name,
+        "db_type": "mysql",
+        "version": version,
+        "details": {"labels": ["DBM"], "notice": {"options": {}}},
+        "export_at": "2024-07-01 00:00:00",
+    }
+    if deleted:
+        template["deleted"] = True
+    (tpl_dir / f"{name}.json").write_text(json.dumps(template))
+
+
+@pytest.fixture
+def close_all():
+    # 测试库的事务对其他线程不可见，同步在测试线程中串行执行，不能关闭测试线程的连接
+    with patch.object(db_monitor.connections, "close_all") as close_all:
+        yield close_all
+
+
+@pytest.fixture
+def tpl_dir(tmp_path, close_all):
+    tpl_dir = tmp_path / "mysql"
+    tpl_dir.mkdir()
+    with patch.object(db_monitor, "TPLS_ALARM_DIR", str(tmp_path)), patch.object(
+        db_monitor, "cache", LocMemCache("sync_plat_monitor_policy", {})
+    ), patch.object(
+        db_monitor,
+        "request_multi_thread",
+        side_effect=lambda func, params_list, get_data, in_order: [
+            get_data((params, func(**params))) for params in params_list
+        ],
+    ):
+        yield tpl_dir
+
+
+@pytest.fixture
+def bkm_save():
+    with patch.object(MonitorPolicy, "parse_details", return_value={"target_priority": 0}), patch.object(
+        MonitorPolicy, "patch_all", lambda policy: policy.details
+    ), patch("backend.db_monitor.models.alarm.bkm_save_alarm_strategy", return_value={"id": 1}) as bkm_save:
+        yield bkm_save
+
+
+class TestSyncPlatMonitorPolicy:
+    def test_skip_unchanged_templates(self, tpl_dir, bkm_save, close_all):
+        _write_template(tpl_dir, "policy_a")
+        _write_template(tpl_dir, "policy_b")
+        result = sync_plat_monitor_policy()
+        assert result[PlatPolicySyncResult.SYNCED] == 2
+        assert bkm_save.call_count == 2
+        # 每个同步策略的工作线程结束时都关闭了数据库连接
+        assert close_all.call_count == 2
+
+        # 模板未变化时不再解析和下发
+        bkm_save.reset_mock()
+        with patch.object(db_monitor, "load_plat_policy_template") as load_template:
+            result = sync_plat_monitor_policy()
+        assert result == {"unchanged": 2}
+        load_template.assert_not_called()
+        bkm_save.assert_not_called()
+
+        # 只同步内容变化的模板
+        _write_template(tpl_dir, "policy_b", version=2)
+        result = sync_plat_monitor_policy()
+        assert result == {"unchanged": 1, PlatPolicySyncResult.SYNCED: 1}
+        assert MonitorPolicy.objects.get(name="policy_b").version == 2
+
+    def test_resync_when_stored_policy_changed(self, tpl_dir, bkm_save):
+        _write_template(tpl_dir, "policy_a")
+        sync_plat_monitor_policy()
+
+        # 重置版本后即使模板未变化也需要重新同步
+        MonitorPolicy.objects.update(version=0)
+        result = sync_plat_monitor_policy()
+        assert result == {"unchanged": 0, PlatPolicySyncResult.SYNCED: 1}
+
+        # 已删除的模板删除策略，之后跳过
+        _write_template(tpl_dir, "policy_a", version=2, deleted=True)
+        with patch("backend.db_monitor.models.alarm.bkm_delete_alarm_strategy"):
+            result = sync_plat_monitor_policy()
+        assert result == {"unchanged": 0, PlatPolicySyncResult.DELETED: 1}
+        assert not MonitorPolicy.objects.filter(name="policy_a").exists()
+        assert sync_plat_monitor_policy() == {"unchanged": 1}
+
+    def test_failed_template_retried(self, tpl_dir, bkm_save, close_all):
+        _write_template(tpl_dir, "policy_a")
+        bkm_save.side_effect = Exception("bkm error")
+        result = sync_plat_monitor_policy()
+        assert result == {"unchanged": 0, PlatPolicySyncResult.FAILED: 1}
+        # 同步失败时也关闭连接
+        close_all.assert_called_once()
+
+        bkm_save.side_effect = None
+        result = sync_plat_monitor_policy()
+        assert result == {"unchanged": 0, PlatPolicySyncResult.SYNCED: 1}
@@ -8,18 +8,43 @@ Unless required by applicable law or agreed to in writing, software distributed
 an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
 specific language governing permissions and limitations under the License.
 """
+import logging
+import time
 from unittest.mock import patch
 
 import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
+from backend.db_meta.enums import ClusterType
+from backend.db_meta.models import AppCache, Cluster
+from backend.db_services.ipchooser.query.resource import ResourceQueryHelper
 from backend.db_services.mysql.resources import views
+from backend.db_services.mysql.resources.tendbsingle.query import ListRetrieveResource
 from backend.utils.pytest import AuthorizedAPIRequestFactory
 
 pytestmark = pytest.mark.django_db
+logger = logging.getLogger("test")
 
 factory = AuthorizedAPIRequestFactory()
 
 
+def bulk_create_clusters(bk_biz_id, db_module_id, start, count):
+    Cluster.objects.bulk_create(
+        [
+            Cluster(
+                name=f"bench-{idx}",
+                immute_domain=f"bench-{idx}.blueking.db",
+                cluster_type=ClusterType.TenDBSingle,
+                bk_biz_id=bk_biz_id,
+                db_module_id=db_module_id,
+            )
+            for idx in range(start, start + count)
+        ],
+        batch_size=1000,
+    )
+
+
 class TestListResource:
     @patch.object(views.ListResourceViewSet, "get_permissions", lambda x: [])
     def test_list(self, dbsingle_cluster, dbha_cluster, bk_biz_id, dbsingle_module):
@@ -52,3 +77,38 @@ class TestResourceTree:
         response = view(request, bk_biz_id=bk_biz_id)
         data = response.data
         assert data[0]["children"][0]["extra"]["domain"] == dbsingle_cluster.immute_domain
+
+
+@patch.object(ResourceQueryHelper, "search_cc_cloud", lambda *args, **kwargs: {})
+class TestListClustersBenchmark:
+    def list_clusters(self, bk_biz_id, query_params, limit=10, offset=0):
+        with CaptureQueriesContext(connection) as ctx:
+            start_time = time.time()
+            resource_list = ListRetrieveResource.list_clusters(bk_biz_id, query_params, limit, offset)
+            cost = time.time() - start_time
+        return resource_list, len(ctx.captured_queries), cost
+
+    def test_list_clusters_benchmark(self, bk_biz_id, dbsingle_module):
+        """分页查询的 SQL 数量与业务下的集群总数无关"""
+        AppCache.objects.create(bk_biz_id=bk_biz_id, db_app_abbr="bench", bk_biz_name="bench")
+        bulk_create_clusters(bk_biz_id, dbsingle_module.db_module_id, 0, 100)
+        small_list, small_queries, _ = self.list_clusters(bk_biz_id, {})
+
+        bulk_create_clusters(bk_biz_id, dbsingle_module.db_module_id, 100, 10000)
+        large_list, large_queries, large_cost = self.list_clusters(bk_biz_id, {}, offset=5000)
+        logger.info("list 10 of %s clusters: %s queries, cost %.3fs", large_list.count, large_queries, large_cost)
+
+        assert small_list.count == 100 and large_list.count == 10100
+        assert len(large_list.data) == 10
+        assert small_queries == large_queries
+
+    def test_list_clusters_keyset(self, bk_biz_id, dbsingle_module):
+        AppCache.objects.create(bk_biz_id=bk_biz_id, db_app_abbr="bench", bk_biz_name="bench")
+        bulk_create_clusters(bk_biz_id, dbsingle_module.db_module_id, 0, 30)
+        cluster_ids = sorted(Cluster.objects.filter(bk_biz_id=bk_biz_id).values_list("id", flat=True), reverse=True)
+
+        first_page, _, _ = self.list_clusters(bk_biz_id, {"last_id": cluster_ids[0] + 1})
+        next_page, _, _ = self.list_clusters(bk_biz_id, {"last_id": first_page.data[-1]["id"]}, offset=100)
+
+        assert [info["id"] for info in first_page.data] == cluster_ids[:10]
+        assert [info["id"] for info in next_page.data] == cluster_ids[10:20]
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from backend.components.db_remote_service.handler import DRSHandler, DRSRpcResult
+from backend.db_services.redis.maxmemory_set.maxmemory_set import RedisClusterMaxmemorySet
+
+pytestmark = pytest.mark.django_db
+
+MASTER_ADDRS = ["127.0.0.1:30000", "127.0.0.1:30001", "127.0.0.2:30000"]
+
+
+def make_maxmemory_set() -> RedisClusterMaxmemorySet:
+    maxmemory_set = RedisClusterMaxmemorySet(cluster_id=1)
+    masters = []
+    for addr in MASTER_ADDRS:
+        ip, port = addr.split(":")
+        masters.append(SimpleNamespace(machine=SimpleNamespace(ip=ip), port=int(port)))
+    maxmemory_set.cluster = MagicMock(bk_cloud_id=0, immute_domain="cache.test.db")
+    maxmemory_set.cluster.storageinstance_set.filter.return_value.select_related.return_value = masters
+    maxmemory_set.cluster_password = {"redis_password": "redis_pass"}
+    return maxmemory_set
+
+
+def info_memory(used_memory):
+    return f"# Memory\r\nused_memory:{used_memory}\r\nused_memory_human:1M\r\n"
+
+
+class TestRedisClusterMaxmemorySet:
+    @patch.object(DRSHandler, "redis_rpc")
+    def test_get_masters_used_memory(self, redis_rpc):
+        redis_rpc.return_value = {addr: DRSRpcResult(address=addr, result=info_memory(1024)) for addr in MASTER_ADDRS}
+        maxmemory_set = make_maxmemory_set()
+        maxmemory_set.get_cluster_masters_used_memory()
+
+        assert redis_rpc.call_args.args[0] == [(0, addr) for addr in MASTER_ADDRS]
+        assert redis_rpc.call_args.args[1]["password"] == "redis_pass"
+        assert maxmemory_set.masters_used_memory == {addr: 1024 for addr in MASTER_ADDRS}
+        assert maxmemory_set.master_ip_ports == {"127.0.0.1": [30000, 30001], "127.0.0.2": [30000]}
+        assert maxmemory_set.should_update_cluter_maxmemory()[0]
+
+    @patch.object(DRSHandler, "redis_rpc")
+    def test_get_masters_used_memory_error(self, redis_rpc):
+        redis_rpc.return_value = {addr: DRSRpcResult(address=addr, result=info_memory(1024)) for addr in MASTER_ADDRS}
+        redis_rpc.return_value[MASTER_ADDRS[-1]] = DRSRpcResult(address=MASTER_ADDRS[-1], error="connect refused")
+        maxmemory_set = make_maxmemory_set()
+
+        # 查询失败的master被跳过，不会抛出异常
+        maxmemory_set.get_cluster_masters_used_memory()
+        assert maxmemory_set.masters_used_memory == {addr: 1024 for addr in MASTER_ADDRS[:-1]}
+
+        # 数据不完整时本轮不更新 maxmemory
+        should_update, msg = maxmemory_set.should_update_cluter_maxmemory()
+        assert not should_update
+        assert MASTER_ADDRS[-1] in msg
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import json
+from unittest.mock import patch
+
+import pytest
+from django.utils import timezone
+
+from backend import env
+from backend.components.bklog.handler import BKLogHit
+from backend.db_services.taskflow.handlers import TaskFlowHandler
+from backend.flow.models import FlowNode
+
+pytestmark = pytest.mark.django_db
+
+ROOT_ID = "test_root_id"
+NODE_ID = "test_node_id"
+VERSION_ID = "test_version_id"
+
+
+def _make_hits(collector: str, timestamps):
+    """按时间顺序生成采集项的日志，与日志平台的返回顺序一致"""
+    for gse_index, timestamp in enumerate(timestamps):
+        yield BKLogHit(
+            {
+                "_index": f"{env.DBA_APP_BK_BIZ_ID}_bklog_{collector}",
+                "_source": {
+                    "dtEventTimeStamp": timestamp,
+                    "gseIndex": gse_index,
+                    "iterationIndex": 0,
+                    "serverIp": "127.0.0.1",
+                    "time": timestamp,
+                    "log": json.dumps({"levelname": "INFO", "msg": f"{collector}-{timestamp}"}),
+                },
+            }
+        )
+
+
+class TestTaskFlowHandler:
+    def test_get_version_logs_merge(self):
+        FlowNode.objects.create(root_id=ROOT_ID, node_id=NODE_ID, version_id=VERSION_ID, started_at=timezone.now())
+        hits = {"dbm_log": [1, 3, 5], "dbm_dbactuator": [2, 3, 4]}
+
+        def bklog_esquery_search(collector, query_string, start_time, end_time):
+            return _make_hits(collector, hits[collector])
+
+        with patch.object(TaskFlowHandler, "bklog_esquery_search", side_effect=bklog_esquery_search):
+            logs = TaskFlowHandler(ROOT_ID).get_version_logs(NODE_ID, VERSION_ID)
+
+        # 两个采集项的日志按时间归并，时间相同时保持采集项的先后顺序
+        assert [log["timestamp"] for log in logs] == [1, 2, 3, 3, 4, 5]
+        assert "dbm_log-3" in logs[2]["message"] and "dbm_dbactuator-3" in logs[3]["message"]
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+from unittest.mock import MagicMock, patch
+
+from backend.flow.plugins.components.collections.common import base_service
+from backend.flow.plugins.components.collections.common.base_service import BkJobService
+
+JOB_INSTANCE_ID = 1
+STEP_INSTANCE_ID = 2
+
+
+class DummyJobService(BkJobService):
+    pass
+
+
+def make_service() -> DummyJobService:
+    service = DummyJobService()
+    service.log_error = MagicMock()
+    return service
+
+
+def mock_batch_log(payload, raw):
+    """按请求的 IP 列表返回日志，日志内容标记了云区域和 IP"""
+    logs = [
+        {"bk_cloud_id": ip["bk_cloud_id"], "ip": ip["ip"], "log_content": f"{ip['bk_cloud_id']}:{ip['ip']}"}
+        for ip in payload["ip_list"]
+    ]
+    # 返回的日志顺序与请求不一致
+    return {"result": True, "data": {"script_task_logs": list(reversed(logs))}}
+
+
+@patch.object(base_service, "JOB_LOG_BATCH_SIZE", 2)
+@patch.object(base_service, "JOB_LOG_CONCURRENCY", 2)
+class TestBkJobServiceBatchLog:
+    @patch.object(base_service.JobApi, "batch_get_job_instance_ip_log", side_effect=mock_batch_log)
+    def test_batch_log(self, batch_log):
+        # 同一 IP 在不同云区域的日志需要分开
+        ip_dicts = [{"bk_cloud_id": 0, "ip": f"127.0.0.{idx}"} for idx in range(4)] + [
+            {"bk_cloud_id": 1, "ip": "127.0.0.0", "port": 3306}
+        ]
+        results = list(make_service().__batch_log__(JOB_INSTANCE_ID, STEP_INSTANCE_ID, ip_dicts))
+
+        # 按批次查询，每批只携带云区域和 IP
+        assert [len(call.args[0]["ip_list"]) for call in batch_log.call_args_list] == [2, 2, 1]
+        assert batch_log.call_args_list[-1].args[0] == {
+            "bk_biz_id": base_service.env.JOB_BLUEKING_BIZ_ID,
+            "job_instance_id": JOB_INSTANCE_ID,
+            "step_instance_id": STEP_INSTANCE_ID,
+            "ip_list": [{"bk_cloud_id": 1, "ip": "127.0.0.0"}],
+        }
+        # 按请求顺序产出，并按云区域和 IP 对应日志
+        assert [ip_dict for ip_dict, __ in results] == ip_dicts
+        assert [log for __, log in results] == [f"{ip['bk_cloud_id']}:{ip['ip']}" for ip in ip_dicts]
+
+    def test_batch_log_error(self):
+        def batch_log(payload, raw):
+            ip = payload["ip_list"][0]["ip"]
+            if ip == "127.0.0.0":
+                raise Exception("job api timeout")
+            if ip == "127.0.0.2":
+                return {"result": False, "message": "job instance not found", "data": None}
+            return mock_batch_log(payload, raw)
+
+        service = make_service()
+        ip_dicts = [{"bk_cloud_id": 0, "ip": f"127.0.0.{idx}"} for idx in range(6)]
+        with patch.object(base_service.JobApi, "batch_get_job_instance_ip_log", side_effect=batch_log):
+            logs = [log for __, log in service.__batch_log__(JOB_INSTANCE_ID, STEP_INSTANCE_ID, ip_dicts)]
+
+        # 失败批次的 IP 日志为 None，不影响其他批次
+        assert logs == [None, None, None, None, "0:127.0.0.4", "0:127.0.0.5"]
+        assert service.log_error.call_count == 2
+        # 接口未返回部分 IP 的日志时，同样为 None
+        with patch.object(
+            base_service.JobApi,
+            "batch_get_job_instance_ip_log",
+            return_value={"result": True, "data": {"script_task_logs": []}},
+        ):
+            results = list(service.__batch_log__(JOB_INSTANCE_ID, STEP_INSTANCE_ID, ip_dicts[:1]))
+        assert results == [(ip_dicts[0], None)]
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import logging
+import time
+import tracemalloc
+from unittest.mock import MagicMock, patch
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from backend.flow.engine.bamboo.scene.common.builder import Builder, FlowNodeBuffer, SubBuilder
+from backend.flow.models import FlowNode, FlowTree
+from backend.flow.plugins.components.collections.common.pause import PauseComponent
+from backend.ticket.constants import TicketType
+
+pytestmark = pytest.mark.django_db
+logger = logging.getLogger("test")
+
+ROOT_ID = "benchmarkflowroot"
+FLOW_DATA = {
+    "uid": "1",
+    "bk_biz_id": 1,
+    "created_by": "admin",
+    "ticket_type": TicketType.REDIS_CLUSTER_SHARD_NUM_UPDATE,
+}
+
+
+def build_synthetic_flow(sub_flow_count: int, acts_per_sub_flow: int) -> Builder:
+    """构造 sub_flow_count 个并行子流程，每个子流程包含 acts_per_sub_flow 个串行节点和一组并行节点"""
+    pipeline = Builder(root_id=ROOT_ID, data=dict(FLOW_DATA))
+    sub_pipelines = []
+    for sub_idx in range(sub_flow_count):
+        sub_pipeline = SubBuilder(root_id=ROOT_ID, data=dict(FLOW_DATA))
+        for act_idx in range(acts_per_sub_flow):
+            sub_pipeline.add_act(
+                act_name=f"act-{sub_idx}-{act_idx}",
+                act_component_code=PauseComponent.code,
+                kwargs={"payload": "x" * 256, "ips": [f"127.0.0.{act_idx}"]},
+            )
+        sub_pipeline.add_parallel_acts(
+            acts_list=[
+                {"act_name": f"parallel-{sub_idx}-{idx}", "act_component_code": PauseComponent.code, "kwargs": {}}
+                for idx in range(2)
+            ]
+        )
+        sub_pipelines.append(sub_pipeline.build_sub_process(sub_name=f"sub-{sub_idx}"))
+    pipeline.add_parallel_sub_pipeline(sub_flow_list=sub_pipelines)
+    return pipeline
+
+
+class TestBuilder:
+    @patch("backend.flow.engine.bamboo.scene.common.builder.api.run_pipeline", MagicMock())
+    def test_build_large_flow_benchmark(self):
+        """构造 3000+ 节点的流程，统计耗时、SQL 数量和内存峰值"""
+        sub_flow_count, acts_per_sub_flow = 100, 30
+
+        tracemalloc.start()
+        start_time = time.time()
+        with CaptureQueriesContext(connection) as ctx:
+            pipeline = build_synthetic_flow(sub_flow_count, acts_per_sub_flow)
+            pipeline.run_pipeline()
+        cost = time.time() - start_time
+        __, peak_memory = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        node_count = sub_flow_count * (acts_per_sub_flow + 2)
+        logger.info(
+            "build flow with %s nodes: cost %.3fs, %s queries, peak memory %.1fMB",
+            node_count,
+            cost,
+            len(ctx.captured_queries),
+            peak_memory / 1024 / 1024,
+        )
+
+        assert FlowNode.objects.filter(root_id=ROOT_ID).count() == node_count
+        # FlowNode 按批写入(外加批量写入的 savepoint)，以及 FlowTree 的写入，与节点数基本无关
+        assert len(ctx.captured_queries) <= node_count // 1000 + 5
+
+    @patch("backend.flow.engine.bamboo.scene.common.builder.api.run_pipeline")
+    def test_hide_sensitive_data(self, run_pipeline):
+        build_synthetic_flow(2, 2).run_pipeline()
+
+        def has_inputs(tree):
+            return "inputs" in tree or any(has_inputs(value) for value in tree.values() if isinstance(value, dict))
+
+        # 存入 FlowTree 的流程树不包含 inputs，传给引擎的 pipeline 保持不变
+        assert not has_inputs(FlowTree.objects.get(root_id=ROOT_ID).tree)
+        assert has_inputs(run_pipeline.call_args.kwargs["pipeline"])
+
+    @pytest.mark.parametrize("failed_target", ["builder.build_tree", "api.run_pipeline"])
+    def test_buffer_cleared_on_failure(self, failed_target):
+        pipeline = build_synthetic_flow(2, 2)
+        assert FlowNodeBuffer._buffers()[ROOT_ID]
+
+        target = f"backend.flow.engine.bamboo.scene.common.builder.{failed_target}"
+        with patch(target, side_effect=Exception("build or run failed")), pytest.raises(Exception):
+            pipeline.run_pipeline()
+
+        # 失败后缓存的节点被清理，不会残留到同一线程的下一个流程
+        assert ROOT_ID not in FlowNodeBuffer._buffers()
+
+    def test_buffer_cleared_by_scope(self):
+        with pytest.raises(Exception, match="build failed"), FlowNodeBuffer.scope():
+            with FlowNodeBuffer.scope():
+                build_synthetic_flow(2, 2)
+            # 嵌套的作用域结束时不清理
+            assert FlowNodeBuffer._buffers()[ROOT_ID]
+            # 构造中途失败，未执行到 run_pipeline
+            raise Exception("build failed")
+
+        assert not FlowNodeBuffer._buffers()
+
+    def test_stale_buffer_discarded(self):
+        build_synthetic_flow(2, 2)
+
+        # 不在作用域内时，新的主流程开始构造会清理之前构造失败残留的节点
+        Builder(root_id="otherflowroot", data=dict(FLOW_DATA))
+        assert ROOT_ID not in FlowNodeBuffer._buffers()
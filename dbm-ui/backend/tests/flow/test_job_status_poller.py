@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import json
+import threading
+import time
+from collections import defaultdict
+from unittest.mock import patch
+
+import pytest
+
+from backend.flow.utils import job_status_poller
+from backend.flow.utils.job_status_poller import (
+    JOB_STATUS_CACHE_KEY,
+    JOB_STATUS_FIRST_SEEN_KEY,
+    JOB_STATUS_IDLE_TIMEOUT,
+    JOB_STATUS_LAST_ACCESS_KEY,
+    JOB_STATUS_PENDING_KEY,
+    JobStatusPoller,
+)
+from backend.utils.basic import chunk_lists
+
+
+class FakeRedis:
+    """用内存字典模拟轮询器用到的 redis 命令，与 redis 一样只存储字符串"""
+
+    def __init__(self):
+        self.values = {}
+        self.hashes = defaultdict(dict)
+        self.zsets = defaultdict(dict)
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def set(self, key, value, ex=None):
+        self.values[key] = value
+
+    def hget(self, key, field):
+        return self.hashes[key].get(str(field))
+
+    def hmget(self, key, fields):
+        return [self.hashes[key].get(str(field)) for field in fields]
+
+    def hgetall(self, key):
+        return dict(self.hashes[key])
+
+    def hset(self, key, field, value):
+        self.hashes[key][str(field)] = str(value)
+
+    def hsetnx(self, key, field, value):
+        self.hashes[key].setdefault(str(field), str(value))
+
+    def hincrby(self, key, field, amount=1):
+        self.hashes[key][str(field)] = str(int(self.hashes[key].get(str(field), 0)) + amount)
+
+    def hdel(self, key, *fields):
+        for field in fields:
+            self.hashes[key].pop(str(field), None)
+
+    def zadd(self, key, mapping):
+        for member, score in mapping.items():
+            self.zsets[key][str(member)] = score
+
+    def zrem(self, key, *members):
+        for member in members:
+            self.zsets[key].pop(str(member), None)
+
+    def zrangebyscore(self, key, min_score, max_score):
+        return [member for member, score in sorted(self.zsets[key].items(), key=lambda x: x[1]) if score <= max_score]
+
+    def zcard(self, key):
+        return len(self.zsets[key])
+
+    def pipeline(self):
+        redis, commands = self, []
+
+        class Pipeline:
+            def __getattr__(self, name):
+                return lambda *args, **kwargs: commands.append((name, args, kwargs))
+
+            def execute(self):
+                with redis.lock:
+                    return [getattr(redis, name)(*args, **kwargs) for name, args, kwargs in commands]
+
+        return Pipeline()
+
+
+def job_resp(job_instance_id, finished, result=True):
+    return {"result": result, "data": {"finished": finished, "job_instance": {"job_instance_id": job_instance_id}}}
+
+
+@pytest.fixture
+def fake_redis():
+    redis = FakeRedis()
+    with patch.object(job_status_poller, "RedisConn", redis), patch.object(
+        job_status_poller.env, "JOB_STATUS_POLLER_ENABLE", True
+    ):
+        yield redis
+
+
+def register_due_jobs(redis, job_ids, last_access):
+    now = time.time()
+    for job_id in job_ids:
+        redis.zadd(JOB_STATUS_PENDING_KEY, {job_id: now - 1})
+        redis.hset(JOB_STATUS_FIRST_SEEN_KEY, job_id, now - 10)
+        redis.hset(JOB_STATUS_LAST_ACCESS_KEY, job_id, last_access)
+
+
+class TestJobStatusPoller:
+    def test_get_interval(self):
+        assert JobStatusPoller.get_interval(first_seen=0, now=30) == job_status_poller.JOB_STATUS_MIN_INTERVAL
+        assert JobStatusPoller.get_interval(first_seen=0, now=300) == 30
+        assert JobStatusPoller.get_interval(first_seen=0, now=3600) == job_status_poller.JOB_STATUS_MAX_INTERVAL
+
+    @patch.object(job_status_poller.JobApi, "get_job_instance_status")
+    def test_get_status_cached(self, get_job_status, fake_redis):
+        get_job_status.return_value = job_resp(1, finished=False)
+
+        # 首次读取直接查询并登记到轮询集合，之后的读取命中缓存
+        assert JobStatusPoller.get_status(1) == job_resp(1, finished=False)
+        assert JobStatusPoller.get_status(1) == job_resp(1, finished=False)
+        assert get_job_status.call_count == 1
+        assert fake_redis.zsets[JOB_STATUS_PENDING_KEY]["1"] > time.time()
+        assert JobStatusPoller.get_stats() == {"status_reads": 2, "cache_hits": 1, "api_calls": 1, "pending": 1}
+
+    @patch.object(job_status_poller.JobApi, "get_job_instance_status")
+    def test_get_status_disabled(self, get_job_status, fake_redis):
+        get_job_status.return_value = job_resp(1, finished=False)
+        with patch.object(job_status_poller.env, "JOB_STATUS_POLLER_ENABLE", False):
+            JobStatusPoller.get_status(1)
+            JobStatusPoller.get_status(1)
+        assert get_job_status.call_count == 2
+        assert not fake_redis.zsets[JOB_STATUS_PENDING_KEY]
+
+    @patch.object(job_status_poller, "JOB_STATUS_BATCH_SIZE", 2)
+    @patch.object(job_status_poller, "chunk_lists", wraps=chunk_lists)
+    @patch.object(job_status_poller.JobApi, "get_job_instance_status")
+    def test_poll(self, get_job_status, mock_chunk_lists, fake_redis):
+        def query(payload, raw):
+            job_id = payload["job_instance_id"]
+            if job_id == 4:
+                raise Exception("job api timeout")
+            return job_resp(job_id, finished=job_id in [1, 2], result=job_id != 5)
+
+        get_job_status.side_effect = query
+        now = time.time()
+        register_due_jobs(fake_redis, [1, 2, 3, 4, 5], last_access=now)
+        # 长时间无节点读取的任务直接移出轮询集合，不再查询
+        register_due_jobs(fake_redis, [6], last_access=now - JOB_STATUS_IDLE_TIMEOUT - 1)
+
+        assert JobStatusPoller.poll() == {"polled": 5, "dropped": 1}
+        assert sorted(call.args[0]["job_instance_id"] for call in get_job_status.call_args_list) == [1, 2, 3, 4, 5]
+        # 按批次并发查询
+        batches = list(chunk_lists(*mock_chunk_lists.call_args.args))
+        assert [len(batch) for batch in batches] == [2, 2, 1]
+
+        pending = fake_redis.zsets[JOB_STATUS_PENDING_KEY]
+        # 已结束的任务缓存最终状态并移出轮询集合
+        for job_id in ["1", "2"]:
+            assert job_id not in pending and job_id not in fake_redis.hashes[JOB_STATUS_FIRST_SEEN_KEY]
+            cached = fake_redis.values[JOB_STATUS_CACHE_KEY.format(job_instance_id=job_id)]
+            assert json.loads(cached)["data"]["finished"]
+        # 未结束和接口返回失败的任务缓存当前状态，推迟到下一次轮询
+        for job_id in ["3", "5"]:
+            assert pending[job_id] > now
+            assert JOB_STATUS_CACHE_KEY.format(job_instance_id=job_id) in fake_redis.values
+        # 查询异常的任务不写缓存，保持到期，由节点自行查询
+        assert pending["4"] < now
+        assert JOB_STATUS_CACHE_KEY.format(job_instance_id=4) not in fake_redis.values
+        # 空闲任务的记录被清理
+        assert "6" not in pending and "6" not in fake_redis.hashes[JOB_STATUS_LAST_ACCESS_KEY]
+
+    def test_poll_empty(self, fake_redis):
+        assert JobStatusPoller.poll() == {"polled": 0, "dropped": 0}
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import json
+from unittest.mock import patch
+
+from backend.components.db_remote_service.handler import DRSHandler, DRSRpcResult
+from backend.flow.consts import DEFAULT_TWEMPROXY_ADMIN_PORT_EXTRA
+from backend.flow.utils.redis.redis_proxy_util import get_online_predixy_versions, get_online_twemproxy_versions
+
+IP_PORTS = [("127.0.0.1", 50000), ("127.0.0.2", 50000)]
+
+
+class TestOnlineProxyVersions:
+    @patch.object(DRSHandler, "twemproxy_rpc")
+    def test_twemproxy_versions(self, twemproxy_rpc):
+        admin_addrs = [f"{ip}:{port + DEFAULT_TWEMPROXY_ADMIN_PORT_EXTRA}" for ip, port in IP_PORTS]
+        twemproxy_rpc.return_value = {
+            admin_addrs[0]: DRSRpcResult(address=admin_addrs[0], result=json.dumps({"version": "0.4.1-rc-v0.28"})),
+            admin_addrs[1]: DRSRpcResult(address=admin_addrs[1], error="connect refused"),
+        }
+
+        # 连接失败的twemproxy版本为空，不抛出异常
+        assert get_online_twemproxy_versions(IP_PORTS, bk_cloud_id=0) == {
+            "127.0.0.1:50000": "twemproxy-0.4.1-v28",
+            "127.0.0.2:50000": "",
+        }
+        assert twemproxy_rpc.call_args.args[0] == [(0, addr) for addr in admin_addrs]
+
+    @patch.object(DRSHandler, "redis_rpc")
+    def test_predixy_versions(self, redis_rpc):
+        redis_rpc.return_value = {
+            "127.0.0.1:50000": DRSRpcResult(address="127.0.0.1:50000", result="# Proxy\nVersion:1.4.0\n"),
+            "127.0.0.2:50000": DRSRpcResult(address="127.0.0.2:50000", error="auth failed"),
+        }
+
+        # 连接失败的predixy版本为空，不抛出异常
+        assert get_online_predixy_versions(IP_PORTS, bk_cloud_id=0, proxy_password="proxy_pass") == {
+            "127.0.0.1:50000": "predixy-1.4.0",
+            "127.0.0.2:50000": "",
+        }
+        assert redis_rpc.call_args.args[1]["password"] == "proxy_pass"
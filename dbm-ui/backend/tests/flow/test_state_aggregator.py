@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+from collections import defaultdict
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from backend.flow.consts import StateType
+from backend.flow.signal import state_aggregator
+from backend.flow.signal.state_aggregator import FlowStateAggregator
+
+ROOT_ID = "root"
+SUB_ID = "sub"
+NODE_ID = "node"
+SUB_NODE_ID = "sub_node"
+
+
+def _str(value):
+    return getattr(value, "value", value)
+
+
+class FakeRedis:
+    """用内存字典模拟聚合器用到的 redis 命令和脚本，与 redis 一样只存储字符串"""
+
+    def __init__(self):
+        self.hashes = defaultdict(dict)
+        self.seed_calls = 0
+
+    def hget(self, key, field):
+        return self.hashes[key].get(field) if key in self.hashes else None
+
+    def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    def hincrby(self, key, field, amount):
+        self.hashes[key][field] = int(self.hashes[key].get(field, 0)) + amount
+
+    def delete(self, *keys):
+        for key in keys:
+            self.hashes.pop(key, None)
+
+    def pipeline(self):
+        redis, commands = self, []
+
+        class Pipeline:
+            def __getattr__(self, name):
+                return lambda *args: commands.append(getattr(redis, name)(*args))
+
+            def execute(self):
+                return list(commands)
+
+        return Pipeline()
+
+    def apply_transition(self, keys, args):
+        nodes_key, counts_key = keys
+        node_id, to_state = args[0], _str(args[1])
+        if nodes_key not in self.hashes:
+            return 0
+        old = self.hashes[nodes_key].get(node_id)
+        if old != to_state:
+            self.hashes[nodes_key][node_id] = to_state
+            if old:
+                self.hincrby(counts_key, old, -1)
+            self.hincrby(counts_key, to_state, 1)
+        return 1
+
+    def seed_states(self, keys, args):
+        self.seed_calls += 1
+        nodes_key, counts_key = keys
+        if nodes_key in self.hashes:
+            return 0
+        self.hashes.pop(counts_key, None)
+        for node_id, state in zip(args[1::2], args[2::2]):
+            self.hashes[nodes_key][node_id] = _str(state)
+            self.hincrby(counts_key, _str(state), 1)
+        return 1
+
+
+def _states_tree(root_state, sub_state, node_state, sub_node_state):
+    return {
+        ROOT_ID: {
+            "state": root_state,
+            "children": {
+                NODE_ID: {"state": node_state, "children": {}},
+                SUB_ID: {"state": sub_state, "children": {SUB_NODE_ID: {"state": sub_node_state, "children": {}}}},
+            },
+        }
+    }
+
+
+@pytest.fixture
+def fake_redis():
+    redis = FakeRedis()
+    with patch.object(state_aggregator, "RedisConn", redis), patch.object(
+        FlowStateAggregator, "_apply_transition", redis.apply_transition
+    ), patch.object(FlowStateAggregator, "_seed_states", redis.seed_states):
+        yield redis
+
+
+def _mock_raw_states(tree):
+    return patch.object(state_aggregator.api, "get_pipeline_states", return_value=MagicMock(data=tree))
+
+
+class TestFlowStateAggregator:
+    def test_seed_from_raw_states_and_retry(self, fake_redis):
+        aggregator = FlowStateAggregator(ROOT_ID)
+        # 子流程中的节点失败，原始状态中根节点和子流程仍为 RUNNING
+        tree = _states_tree(StateType.RUNNING, StateType.RUNNING, StateType.FINISHED, StateType.FAILED)
+        with _mock_raw_states(tree) as get_states:
+            assert aggregator.transit(SUB_NODE_ID, StateType.FAILED) == StateType.FAILED
+        get_states.assert_called_once()
+        assert fake_redis.hget(aggregator.nodes_key, ROOT_ID) == StateType.RUNNING
+
+        # 重试失败节点后，根节点恢复为 RUNNING，不再读取全量状态
+        with _mock_raw_states(tree) as get_states:
+            assert aggregator.transit(SUB_NODE_ID, StateType.RUNNING) == StateType.RUNNING
+            assert aggregator.transit(SUB_NODE_ID, StateType.FINISHED) == StateType.RUNNING
+            assert aggregator.transit(SUB_ID, StateType.FINISHED) == StateType.RUNNING
+            assert aggregator.transit(ROOT_ID, StateType.FINISHED) == StateType.FINISHED
+        get_states.assert_not_called()
+
+    def test_subprocess_suspended_and_revoked(self, fake_redis):
+        aggregator = FlowStateAggregator(ROOT_ID)
+        tree = _states_tree(StateType.RUNNING, StateType.RUNNING, StateType.RUNNING, StateType.RUNNING)
+        with _mock_raw_states(tree):
+            assert aggregator.transit(SUB_ID, StateType.SUSPENDED) == StateType.SUSPENDED
+            assert aggregator.transit(SUB_ID, StateType.RUNNING) == StateType.RUNNING
+            assert aggregator.transit(ROOT_ID, StateType.REVOKED) == StateType.REVOKED
+
+    def test_concurrent_seed_not_overwritten(self, fake_redis):
+        aggregator = FlowStateAggregator(ROOT_ID)
+        # 全量状态读取早于本次流转落库，初始化后需要再次记录本次流转
+        stale_tree = _states_tree(StateType.RUNNING, StateType.RUNNING, StateType.RUNNING, StateType.RUNNING)
+        with _mock_raw_states(stale_tree):
+            assert aggregator.transit(NODE_ID, StateType.FAILED) == StateType.FAILED
+
+        # 其他信号已完成初始化时，过期的全量状态不会覆盖已有计数
+        assert not FlowStateAggregator(ROOT_ID)._seed_states(
+            keys=[aggregator.nodes_key, aggregator.counts_key],
+            args=[state_aggregator.FLOW_STATE_EXPIRE_TIME, NODE_ID, StateType.RUNNING],
+        )
+        assert fake_redis.hget(aggregator.nodes_key, NODE_ID) == StateType.FAILED
+        assert int(fake_redis.hgetall(aggregator.counts_key)[StateType.FAILED]) == 1
+
+    def test_unknown_flow(self, fake_redis):
+        with _mock_raw_states({}):
+            assert FlowStateAggregator(ROOT_ID).transit(NODE_ID, StateType.RUNNING) is None
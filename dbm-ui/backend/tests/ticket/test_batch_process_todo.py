@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+from unittest.mock import MagicMock, patch
+
+import pytest
+from django.db import connections
+
+from backend.ticket.constants import FlowType, TodoStatus, TodoType
+from backend.ticket.handler import TicketHandler
+from backend.ticket.models import Flow, Ticket, Todo, TodoHistory
+from backend.ticket.todos import ActionType
+
+pytestmark = pytest.mark.django_db
+
+
+def run_in_order(func, params_list, get_data, in_order):
+    """测试库的事务对其他线程不可见，这里串行执行"""
+    return [get_data((params, func(**params))) for params in params_list]
+
+
+def create_pause_todos(count):
+    todos = []
+    for __ in range(count):
+        ticket = Ticket.objects.create(bk_biz_id=1, creator="admin")
+        flow = Flow.objects.create(ticket=ticket, flow_type=FlowType.PAUSE)
+        todos.append(Todo(ticket=ticket, flow=flow, type=TodoType.APPROVE, operators=["admin"]))
+    return todos
+
+
+class TestBatchProcessTodo:
+    @patch("backend.ticket.handler.request_multi_thread", run_in_order)
+    # 串行执行时运行在测试线程中，不能关闭测试线程的数据库连接
+    @patch.object(connections, "close_all", MagicMock())
+    # 测试用例运行在事务中，on_commit 的回调不会触发，这里直接执行
+    @patch("backend.ticket.todos.pause_todo.transaction.on_commit", lambda func: func())
+    @patch("backend.ticket.todos.pause_todo.manager.TicketFlowManager")
+    def test_batch_process_todos(self, mock_flow_manager, django_assert_max_num_queries):
+        todos = create_pause_todos(5)
+        # 最后一个待办的处理人不是当前用户，处理失败
+        todos[-1].operators = ["other"]
+        # bulk_create 不会发送待办通知
+        Todo.objects.bulk_create(todos)
+        todo_ids = list(Todo.objects.order_by("id").values_list("id", flat=True))
+
+        operations = [{"todo_id": str(todo_id), "params": {}} for todo_id in todo_ids]
+        # 预取与结果查询各一次，每个待办的处理(保存、历史、检查未完成待办)查询数固定
+        with django_assert_max_num_queries(2 + 6 * len(operations)):
+            results = TicketHandler.batch_process_todos("admin", ActionType.APPROVE, operations)
+
+        assert [result["todo_id"] for result in results] == todo_ids
+        assert [result["result"] for result in results] == [True] * 4 + [False]
+        assert results[-1]["message"]
+        assert results[-1]["status"] == TodoStatus.TODO
+        assert all(result["status"] == TodoStatus.DONE_SUCCESS for result in results[:4])
+        assert mock_flow_manager.return_value.run_next_flow.call_count == 4
+
+    @patch("backend.ticket.todos.pipeline_todo.BambooEngine")
+    def test_pipeline_todo_callback_failed(self, mock_engine):
+        mock_engine.return_value.callback.return_value = MagicMock(result=False, exc=Exception("callback failed"))
+        ticket = Ticket.objects.create(bk_biz_id=1, creator="admin")
+        flow = Flow.objects.create(ticket=ticket, flow_type=FlowType.INNER_FLOW)
+        todo = Todo(
+            ticket=ticket,
+            flow=flow,
+            type=TodoType.INNER_APPROVE,
+            operators=["admin"],
+            context={"root_id": "root_id", "node_id": "node_id"},
+        )
+        Todo.objects.bulk_create([todo])
+        todo = Todo.objects.get(ticket=ticket)
+
+        results = TicketHandler.batch_process_todos("admin", ActionType.APPROVE, [{"todo_id": todo.id, "params": {}}])
+
+        assert results[0]["result"] is False
+        assert results[0]["message"] == "callback failed"
+        assert results[0]["status"] == TodoStatus.TODO
+        # 回调失败时的操作记录不会被回滚
+        assert TodoHistory.objects.filter(todo=todo, creator="admin", action=ActionType.APPROVE).exists()
+
+
+@pytest.mark.django_db(transaction=True)
+class TestBatchProcessTodoInThreads:
+    @patch("backend.ticket.todos.pause_todo.manager.TicketFlowManager")
+    def test_batch_process_todos_in_threads(self, mock_flow_manager):
+        Todo.objects.bulk_create(create_pause_todos(3))
+        todo_ids = list(Todo.objects.order_by("id").values_list("id", flat=True))
+
+        # 推进流程时，待办的状态必须已提交，对流程推进所用的连接可见
+        committed_statuses = []
+
+        def flow_manager(ticket):
+            committed_statuses.append(Todo.objects.get(ticket=ticket).status)
+            return mock_flow_manager.return_value
+
+        mock_flow_manager.side_effect = flow_manager
+
+        operations = [{"todo_id": todo_id, "params": {}} for todo_id in todo_ids]
+        with patch.object(connections, "close_all", wraps=connections.close_all) as close_all:
+            results = TicketHandler.batch_process_todos("admin", ActionType.APPROVE, operations)
+
+        assert all(result["result"] and result["status"] == TodoStatus.DONE_SUCCESS for result in results)
+        assert mock_flow_manager.return_value.run_next_flow.call_count == 3
+        assert committed_statuses == [TodoStatus.DONE_SUCCESS] * 3
+        # 每个工作线程结束时都关闭了数据库连接
+        assert close_all.call_count == 3
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+from unittest.mock import patch
+
+import pytest
+
+from backend.db_meta.exceptions import ClusterExclusiveOperateException
+from backend.db_meta.models import Cluster
+from backend.ticket.constants import FlowType, TicketFlowStatus, TicketType
+from backend.ticket.exclusive import ExclusiveTicketMatrix, _dump_cache, _load_cache
+from backend.ticket.models import ClusterOperateRecord, Flow, Ticket
+
+pytestmark = pytest.mark.django_db
+
+EXCLUSIVE_TICKET_MAP = {
+    TicketType.MYSQL_HA_DB_TABLE_BACKUP: {TicketType.MYSQL_HA_RENAME_DATABASE: True, TicketType.MYSQL_FLASHBACK: False}
+}
+EXCLUSIVE_TICKET_MATRIX = ExclusiveTicketMatrix.from_map(EXCLUSIVE_TICKET_MAP)
+
+
+def create_running_record(ticket_id, ticket_type, cluster_ids, flow_type=FlowType.INNER_FLOW):
+    ticket = Ticket.objects.create(id=ticket_id, bk_biz_id=1, ticket_type=ticket_type)
+    flow = Flow.objects.create(
+        ticket=ticket, flow_type=flow_type, flow_obj_id=f"root{ticket_id}", status=TicketFlowStatus.RUNNING
+    )
+    for cluster_id in cluster_ids:
+        ClusterOperateRecord.objects.create(cluster_id=cluster_id, flow=flow, ticket=ticket)
+
+
+@patch("backend.ticket.models.ticket.get_exclusive_ticket_matrix", lambda: EXCLUSIVE_TICKET_MATRIX)
+class TestExclusiveOperations:
+    def test_get_exclusive_operations(self, django_assert_max_num_queries):
+        create_running_record(1, TicketType.MYSQL_HA_RENAME_DATABASE, range(1, 201))
+        create_running_record(2, TicketType.MYSQL_FLASHBACK, range(1, 201))
+        create_running_record(3, TicketType.MYSQL_HA_RENAME_DATABASE, [300], flow_type=FlowType.BK_ITSM)
+
+        with django_assert_max_num_queries(1):
+            exclusive_infos = ClusterOperateRecord.objects.get_exclusive_operations(
+                TicketType.MYSQL_HA_DB_TABLE_BACKUP, list(range(1, 301))
+            )
+            assert sorted(exclusive_infos) == list(range(1, 201))
+            assert {info["root_id"] for infos in exclusive_infos.values() for info in infos} == {"root1"}
+
+        exclusive_infos = ClusterOperateRecord.objects.get_exclusive_operations(
+            TicketType.MYSQL_HA_DB_TABLE_BACKUP, list(range(1, 301)), exclude_ticket_ids=[1]
+        )
+        assert not exclusive_infos
+        assert ClusterOperateRecord.objects.has_exclusive_operations(TicketType.MYSQL_HA_DB_TABLE_BACKUP, 1)
+
+    def test_handle_exclusive_operations(self):
+        create_running_record(1, TicketType.MYSQL_HA_RENAME_DATABASE, [1, 2])
+
+        with pytest.raises(ClusterExclusiveOperateException) as err:
+            Cluster.handle_exclusive_operations([1, 2, 3], TicketType.MYSQL_HA_DB_TABLE_BACKUP)
+        assert "id:1" in str(err.value) and "id:2" in str(err.value)
+
+        Cluster.handle_exclusive_operations([1, 2], TicketType.MYSQL_FLASHBACK)
+        Cluster.handle_exclusive_operations([1, 2], TicketType.MYSQL_HA_DB_TABLE_BACKUP, exclude_ticket_ids=[1])
+
+
+class TestExclusiveTicketMatrix:
+    def test_matrix(self, tmp_path):
+        matrix = EXCLUSIVE_TICKET_MATRIX
+        assert matrix.is_exclusive(TicketType.MYSQL_HA_DB_TABLE_BACKUP, TicketType.MYSQL_HA_RENAME_DATABASE)
+        assert not matrix.is_exclusive(TicketType.MYSQL_HA_DB_TABLE_BACKUP, TicketType.MYSQL_FLASHBACK)
+        assert not matrix.is_exclusive(TicketType.MYSQL_FLASHBACK, TicketType.MYSQL_HA_DB_TABLE_BACKUP)
+        assert not matrix.is_exclusive(TicketType.MYSQL_SINGLE_APPLY, TicketType.MYSQL_FLASHBACK)
+        assert matrix.get_exclusive_types(TicketType.MYSQL_HA_DB_TABLE_BACKUP) == [TicketType.MYSQL_HA_RENAME_DATABASE]
+
+        active_mask = matrix.get_exclusive_mask([TicketType.MYSQL_FLASHBACK, TicketType.MYSQL_HA_RENAME_DATABASE])
+        assert matrix.has_exclusive(TicketType.MYSQL_HA_DB_TABLE_BACKUP, active_mask)
+        assert not matrix.has_exclusive(TicketType.MYSQL_FLASHBACK, active_mask)
+
+        # 缓存文件读写，摘要不一致时视为过期
+        cache_path = str(tmp_path / "matrix.json")
+        _dump_cache(matrix, cache_path, "digest")
+        assert _load_cache(cache_path, "digest").to_map() == matrix.to_map()
+        assert _load_cache(cache_path, "other") is None
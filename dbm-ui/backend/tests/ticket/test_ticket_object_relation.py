@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import logging
+import os
+import time
+from unittest.mock import MagicMock
+
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from backend.ticket.constants import TicketStatus, TicketType
+from backend.ticket.contexts import TicketContext
+from backend.ticket.exceptions import TicketDuplicationException
+from backend.ticket.handler import TicketHandler
+from backend.ticket.models import Ticket, TicketClusterRelation, TicketInstanceRelation
+from backend.ticket.serializers import TicketListSerializer
+from backend.ticket.views import TicketViewSet
+
+pytestmark = pytest.mark.django_db
+logger = logging.getLogger("test")
+
+# 基准测试的单据数，只有设置了该环境变量(如 1000000)时才在测试库上压测
+BENCHMARK_TICKET_COUNT = int(os.getenv("TICKET_RELATION_BENCHMARK_COUNT") or 0)
+
+
+def build_details(cluster_ids):
+    return {
+        "infos": [{"cluster_ids": cluster_ids, "db_list": ["db%"] * 100}],
+        "clusters": {str(cluster_id): {"immute_domain": f"cluster{cluster_id}.db"} for cluster_id in cluster_ids},
+    }
+
+
+class TestTicketObjectRelation:
+    def test_sync_on_save(self):
+        ticket = Ticket.objects.create(
+            bk_biz_id=1, ticket_type=TicketType.MYSQL_HA_DB_TABLE_BACKUP, details={"infos": [{"cluster_ids": [1, 2]}]}
+        )
+        assert list(ticket.cluster_relations.values_list("cluster_id", "immute_domain")) == [(1, ""), (2, "")]
+
+        # patch 单据详情后补充集群域名
+        ticket.update_details(clusters={"1": {"immute_domain": "cluster1.db"}, "2": {"immute_domain": "cluster2.db"}})
+        assert list(ticket.cluster_relations.values_list("immute_domain", flat=True)) == ["cluster1.db", "cluster2.db"]
+
+        ticket.update_details(infos=[{"instance_ids": [10]}], instances={"10": {"instance": "127.0.0.1:3306"}})
+        assert not ticket.cluster_relations.exists()
+        assert list(ticket.instance_relations.values_list("instance_id", "instance")) == [("10", "127.0.0.1:3306")]
+
+    def test_add_related_object(self, django_assert_max_num_queries):
+        ticket_type = TicketType.MYSQL_HA_DB_TABLE_BACKUP
+        tickets = [
+            Ticket.objects.create(bk_biz_id=1, ticket_type=ticket_type, details=build_details(cluster_ids))
+            for cluster_ids in [[1, 2], [3], []]
+        ]
+        with django_assert_max_num_queries(2):
+            ticket_data = TicketHandler.add_related_object([{"id": ticket.id} for ticket in tickets])
+        assert ticket_data[0]["related_object"]["objects"] == ["cluster1.db", "cluster2.db"]
+        assert ticket_data[1]["related_object"]["objects"] == ["cluster3.db"]
+        assert "related_object" not in ticket_data[2]
+        assert ticket_data[0]["summary"] == {
+            "cluster_count": 2,
+            "cluster_ids": [1, 2],
+            "domain_preview": ["cluster1.db", "cluster2.db"],
+            "instance_count": 0,
+            "instance_ids": [],
+        }
+        assert ticket_data[2]["summary"]["cluster_count"] == 0
+
+    def test_slim_list_serializer(self, django_assert_max_num_queries):
+        ticket_type = TicketType.MYSQL_HA_DB_TABLE_BACKUP
+        ticket_ids = [
+            Ticket.objects.create(bk_biz_id=1, ticket_type=ticket_type, details=build_details([idx])).id
+            for idx in range(10)
+        ]
+        context = {"ticket_ctx": TicketContext()}
+        queryset = Ticket.objects.filter(id__in=ticket_ids).defer("details", "send_msg_config")
+        with CaptureQueriesContext(connection) as ctx:
+            data = TicketListSerializer(queryset, many=True, context=context).data
+        # 精简列表只查询一次单据表，且不加载 details
+        assert len(ctx.captured_queries) == 1
+        assert "`details`" not in ctx.captured_queries[0]["sql"]
+        assert all(item["details"] == {} and "send_msg_config" not in item for item in data)
+
+        # 精简列表的概览中带有关联对象的 ID，从单据关联关系表中读取
+        with django_assert_max_num_queries(2):
+            results = TicketHandler.add_related_object(data)
+        assert {item["id"]: item["summary"]["cluster_ids"] for item in results} == {
+            ticket_id: [idx] for idx, ticket_id in enumerate(ticket_ids)
+        }
+        assert all(item["summary"]["instance_ids"] == [] for item in results)
+
+    @pytest.mark.parametrize(
+        "query_params, is_slim",
+        [
+            ({}, False),
+            ({"slim": "0"}, False),
+            ({"slim": "false"}, False),
+            ({"slim": "1"}, True),
+            ({"slim": "true"}, True),
+        ],
+    )
+    def test_slim_list_opt_in(self, query_params, is_slim):
+        view = TicketViewSet(action="list", request=MagicMock(query_params=query_params))
+        assert view._is_slim_list() is is_slim
+        assert (view.get_serializer_class() is TicketListSerializer) is is_slim
+
+
+@pytest.mark.skipif(not BENCHMARK_TICKET_COUNT, reason="TICKET_RELATION_BENCHMARK_COUNT is not set")
+class TestTicketObjectRelationBenchmark:
+    def test_backfill_and_lookup_benchmark(self):
+        batch_size = 5000
+        for start in range(0, BENCHMARK_TICKET_COUNT, batch_size):
+            # bulk_create 不会触发信号，模拟需要回填的存量单据
+            Ticket.objects.bulk_create(
+                [
+                    Ticket(
+                        bk_biz_id=1,
+                        ticket_type=TicketType.MYSQL_HA_DB_TABLE_BACKUP,
+                        status=TicketStatus.RUNNING,
+                        creator="admin",
+                        details=build_details([idx, idx + 1]),
+                    )
+                    for idx in range(start, min(start + batch_size, BENCHMARK_TICKET_COUNT))
+                ]
+            )
+
+        start_time = time.time()
+        call_command("backfill_ticket_relations", batch_size=batch_size)
+        logger.info("backfill %s tickets cost %.3fs", BENCHMARK_TICKET_COUNT, time.time() - start_time)
+        assert TicketClusterRelation.objects.count() == BENCHMARK_TICKET_COUNT * 2
+        assert not TicketInstanceRelation.objects.exists()
+
+        # 单据列表的关联对象与重复提交校验的 SQL 数量与单据总数无关
+        page_ids = list(Ticket.objects.order_by("-id").values_list("id", flat=True)[:10])
+        # 集群被相邻的两个单据关联，冲突单据取其中较新的一个
+        duplicate_ticket_id = Ticket.objects.order_by("id").values_list("id", flat=True)[BENCHMARK_TICKET_COUNT // 2]
+        with CaptureQueriesContext(connection) as ctx:
+            start_time = time.time()
+            ticket_data = TicketHandler.add_related_object([{"id": ticket_id} for ticket_id in page_ids])
+            view = TicketViewSet(action="create", request=MagicMock(query_params={}))
+            with pytest.raises(TicketDuplicationException) as exc_info:
+                view._verify_duplicate_ticket(
+                    TicketType.MYSQL_HA_DB_TABLE_BACKUP, build_details([BENCHMARK_TICKET_COUNT // 2]), "admin"
+                )
+            cost = time.time() - start_time
+        logger.info("related object and duplicate lookups: %s queries, cost %.3fs", len(ctx.captured_queries), cost)
+
+        assert len(ctx.captured_queries) == 3
+        assert all(len(item["related_object"]["objects"]) == 2 for item in ticket_data)
+        assert exc_info.value.data == {
+            "duplicate_cluster_ids": [BENCHMARK_TICKET_COUNT // 2],
+            "duplicate_ticket_id": duplicate_ticket_id,
+        }
@@ -31,11 +31,12 @@ class TicketConfig(AppConfig):
 
     def ready(self):
         from backend.ticket.builders import register_all_builders
-        from backend.ticket.models import Flow
-        from backend.ticket.signals import update_ticket_status
+        from backend.ticket.models import Flow, Ticket
+        from backend.ticket.signals import sync_ticket_object_relations, update_ticket_status
         from backend.ticket.todos import register_all_todos
 
         register_all_builders()
         register_all_todos()
         post_migrate.connect(init_ticket_flow_config, sender=self)
         post_save.connect(update_ticket_status, sender=Flow)
+        post_save.connect(sync_ticket_object_relations, sender=Ticket)
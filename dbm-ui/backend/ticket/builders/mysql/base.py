@@ -90,18 +90,20 @@ class MySQLBaseOperateDetailSerializer(SkipToRepresentationMixin, serializers.Se
 
     def validate_cluster_can_access(self, attrs):
         """校验集群状态是否可以提单"""
-        clusters = Cluster.objects.filter(id__in=fetch_cluster_ids(details=attrs))
+        clusters = Cluster.objects.filter(id__in=fetch_cluster_ids(details=attrs)).only("id", "cluster_type")
         ticket_type = self.context["ticket_type"]
+        status_flags_map = Cluster.get_status_flags_map(clusters)
 
         for cluster in clusters:
+            cluster_status_flag = status_flags_map[cluster.id]
             if cluster.cluster_type == ClusterType.TenDBSingle:
                 # 如果单节点异常，则直接报错
-                if cluster.status_flag:
+                if cluster_status_flag:
                     raise serializers.ValidationError(_("单节点实例状态异常，暂时无法执行该单据类型：{}").format(ticket_type))
                 continue
 
             for status_flag, whitelist in self.unavailable_whitelist__status_flag.items():
-                if cluster.status_flag & status_flag and ticket_type not in whitelist:
+                if cluster_status_flag & status_flag and ticket_type not in whitelist:
                     raise serializers.ValidationError(
                         _("集群实例状态异常:{}，暂时无法执行该单据类型：{}").format(status_flag.flag_text(), ticket_type)
                     )
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import hashlib
+import json
+import logging
+import os
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.utils import translation
+
+from backend.ticket.constants import EXCLUSIVE_TICKET_EXCEL_PATH, TicketType
+from backend.utils.excel import ExcelHandler
+
+logger = logging.getLogger("root")
+
+"""
+单据互斥矩阵
+
+互斥矩阵维护在 exclusive_ticket.xlsx 中(行列均为单据类型名称)，这里将其编译为按单据类型下标索引的位图:
+- ticket_types 为矩阵涉及的单据类型，每个单据类型对应一个整数下标
+- rows[i] 的第 j 位为 1 表示单据类型 i 与正在运行的单据类型 j 互斥
+编译结果持久化到缓存文件中，缓存文件记录了 excel 和单据类型定义的摘要，任一变化后会重新编译
+"""
+
+# 缓存文件格式版本，格式变化时递增
+EXCLUSIVE_MATRIX_CACHE_VERSION = 1
+
+
+class ExclusiveTicketMatrix(object):
+    def __init__(self, ticket_types: List[str], rows: List[int]):
+        self.ticket_types = ticket_types
+        self.type_index: Dict[str, int] = {ticket_type: index for index, ticket_type in enumerate(ticket_types)}
+        self.rows = rows
+        # 每个单据类型的互斥单据类型列表，查询时直接返回
+        self._exclusive_types: List[List[str]] = [
+            [ticket_types[col] for col in range(len(ticket_types)) if row >> col & 1] for row in rows
+        ]
+
+    @classmethod
+    def from_map(cls, exclusive_ticket_map: Dict[str, Dict[str, bool]]) -> "ExclusiveTicketMatrix":
+        """由 {ticket_type: {active_type: is_exclusive}} 构造互斥矩阵"""
+        ticket_types = sorted(
+            set(exclusive_ticket_map) | {active for actives in exclusive_ticket_map.values() for active in actives}
+        )
+        type_index = {ticket_type: index for index, ticket_type in enumerate(ticket_types)}
+        rows = [0] * len(ticket_types)
+        for ticket_type, actives in exclusive_ticket_map.items():
+            for active_type, is_exclusive in actives.items():
+                if is_exclusive:
+                    rows[type_index[ticket_type]] |= 1 << type_index[active_type]
+        return cls(ticket_types, rows)
+
+    def to_dict(self) -> Dict:
+        return {"ticket_types": self.ticket_types, "rows": [format(row, "x") for row in self.rows]}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "ExclusiveTicketMatrix":
+        return cls(data["ticket_types"], [int(row, 16) for row in data["rows"]])
+
+    def to_map(self) -> Dict[str, Dict[str, bool]]:
+        """还原为 {ticket_type: {active_type: is_exclusive}}，只包含互斥的单据类型"""
+        return {
+            ticket_type: {active_type: True for active_type in self._exclusive_types[index]}
+            for index, ticket_type in enumerate(self.ticket_types)
+            if self.rows[index]
+        }
+
+    def is_exclusive(self, ticket_type: str, active_type: str) -> bool:
+        """判断单据类型与正在运行的单据类型是否互斥"""
+        row, col = self.type_index.get(ticket_type), self.type_index.get(active_type)
+        if row is None or col is None:
+            return False
+        return bool(self.rows[row] >> col & 1)
+
+    def get_exclusive_types(self, ticket_type: str) -> List[str]:
+        """获取与单据类型互斥的正在运行的单据类型"""
+        row = self.type_index.get(ticket_type)
+        return [] if row is None else self._exclusive_types[row]
+
+    def get_exclusive_mask(self, active_types: Iterable[str]) -> int:
+        """将一批正在运行的单据类型转换为位图，配合 has_exclusive 批量判断"""
+        mask = 0
+        for active_type in active_types:
+            col = self.type_index.get(active_type)
+            if col is not None:
+                mask |= 1 << col
+        return mask
+
+    def has_exclusive(self, ticket_type: str, active_mask: int) -> bool:
+        """判断单据类型是否与位图中的任一正在运行的单据类型互斥"""
+        row = self.type_index.get(ticket_type)
+        return row is not None and bool(self.rows[row] & active_mask)
+
+
+def _get_ticket_type_label_map() -> Dict[str, str]:
+    """单据类型名称到单据类型的映射，excel 中维护的是未翻译的名称"""
+    with translation.override(None):
+        return {str(label): value for value, label in TicketType.get_choices()}
+
+
+def _get_source_digest(excel_path: str) -> str:
+    """excel 内容和单据类型定义的摘要，用于判断缓存文件是否过期"""
+    digest = hashlib.sha1()
+    with open(excel_path, "rb") as excel:
+        digest.update(excel.read())
+    digest.update(json.dumps(_get_ticket_type_label_map(), sort_keys=True).encode())
+    digest.update(str(EXCLUSIVE_MATRIX_CACHE_VERSION).encode())
+    return digest.hexdigest()
+
+
+def compile_exclusive_ticket_matrix(excel_path: str = EXCLUSIVE_TICKET_EXCEL_PATH) -> ExclusiveTicketMatrix:
+    """解析 excel 编译互斥矩阵"""
+    label_map = _get_ticket_type_label_map()
+
+    def get_ticket_type(label: str) -> str:
+        if label in label_map:
+            return label_map[label]
+        # 兼容 excel 中的名称为单据类型名称的一部分
+        for type_label, ticket_type in label_map.items():
+            if label in type_label:
+                return ticket_type
+        return label
+
+    exclusive_ticket_map: Dict[str, Dict[str, bool]] = {}
+    for row_key, inner_dict in ExcelHandler.paser_matrix(excel_path).items():
+        actives = exclusive_ticket_map.setdefault(get_ticket_type(row_key), {})
+        for col_key, value in inner_dict.items():
+            actives[get_ticket_type(col_key)] = value == "N"
+    return ExclusiveTicketMatrix.from_map(exclusive_ticket_map)
+
+
+def _load_cache(cache_path: str, source_digest: str) -> Optional[ExclusiveTicketMatrix]:
+    try:
+        with open(cache_path) as cache_file:
+            data = json.load(cache_file)
+        if data.get("source_digest") != source_digest:
+            return None
+        return ExclusiveTicketMatrix.from_dict(data)
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _dump_cache(matrix: ExclusiveTicketMatrix, cache_path: str, source_digest: str):
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as cache_file:
+        json.dump({"source_digest": source_digest, **matrix.to_dict()}, cache_file)
+    os.replace(tmp_path, cache_path)
+
+
+def dump_exclusive_ticket_matrix(
+    excel_path: str = EXCLUSIVE_TICKET_EXCEL_PATH, cache_path: str = None
+) -> ExclusiveTicketMatrix:
+    """编译互斥矩阵并写入缓存文件，可在构建时调用预先生成"""
+    matrix = compile_exclusive_ticket_matrix(excel_path)
+    _dump_cache(matrix, cache_path or settings.EXCLUSIVE_TICKET_MATRIX_CACHE_PATH, _get_source_digest(excel_path))
+    return matrix
+
+
+@lru_cache(maxsize=1)
+def get_exclusive_ticket_matrix() -> ExclusiveTicketMatrix:
+    """获取互斥矩阵，优先读取缓存文件，缓存不存在或过期时重新编译并尝试写入缓存，每个进程只加载一次"""
+    excel_path, cache_path = EXCLUSIVE_TICKET_EXCEL_PATH, settings.EXCLUSIVE_TICKET_MATRIX_CACHE_PATH
+    source_digest = _get_source_digest(excel_path)
+    matrix = _load_cache(cache_path, source_digest)
+    if matrix is not None:
+        return matrix
+
+    matrix = compile_exclusive_ticket_matrix(excel_path)
+    try:
+        _dump_cache(matrix, cache_path, source_digest)
+    except OSError as e:
+        # 缓存目录不可写时不影响使用，只是每个进程都需要重新编译
+        logger.warning("[exclusive_ticket_matrix] dump cache to %s failed: %s", cache_path, e)
+    return matrix
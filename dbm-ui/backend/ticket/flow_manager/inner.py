@@ -16,10 +16,12 @@ from typing import Any, Dict, Union
 from django.utils.translation import gettext as _
 
 from backend import env
+from backend.components.dbconfig.cache import dbconfig_cache_scope
 from backend.db_dirty.handlers import DBDirtyMachineHandler
 from backend.db_meta.exceptions import ClusterExclusiveOperateException
 from backend.db_meta.models import Cluster
 from backend.flow.consts import StateType
+from backend.flow.engine.bamboo.scene.common.builder import FlowNodeBuffer
 from backend.flow.models import FlowTree
 from backend.ticket import constants
 from backend.ticket.builders.common.base import fetch_cluster_ids
@@ -162,7 +164,9 @@ class InnerFlow(BaseTicketFlow):
         controller_class = getattr(controller_module, controller_info["class_name"])
         controller_inst = controller_class(root_id=root_id, ticket_data=flow_details["ticket_data"])
 
-        return getattr(controller_inst, controller_info["func_name"])()
+        # 流程构造期间复用 DBConfig 的查询结果，构造失败时清理缓存的流程节点
+        with dbconfig_cache_scope(), FlowNodeBuffer.scope():
+            return getattr(controller_inst, controller_info["func_name"])()
 
     def _retry(self) -> Any:
         # 重试则将机器挪出污点池
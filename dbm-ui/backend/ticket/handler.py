@@ -8,71 +8,127 @@ Unless required by applicable law or agreed to in writing, software distributed
 an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
 specific language governing permissions and limitations under the License.
 """
+import logging
+from collections import defaultdict
 from typing import Dict, List
 
+from django.db import connections
 from django.utils.translation import ugettext as _
 
 from backend import env
 from backend.configuration.constants import PLAT_BIZ_ID
 from backend.db_services.ipchooser.handlers.host_handler import HostHandler
 from backend.ticket.builders import BuilderFactory
-from backend.ticket.builders.common.base import fetch_cluster_ids, fetch_instance_ids
 from backend.ticket.constants import FlowTypeConfig, TicketType
-from backend.ticket.models import Ticket, TicketFlowsConfig
+from backend.ticket.models import Ticket, TicketFlowsConfig, TicketObjectRelationHandler, Todo
+from backend.ticket.serializers import TodoSerializer
+from backend.ticket.todos import TodoActorFactory
+from backend.utils.batch_request import inject_request, request_multi_thread
+
+logger = logging.getLogger("root")
+
+# 单据概览中展示的域名数量
+TICKET_DOMAIN_PREVIEW_SIZE = 5
 
 
 class TicketHandler:
     @classmethod
     def add_related_object(cls, ticket_data: List[Dict]) -> List[Dict]:
         """
-        补充单据的关联对象
+        补充单据的关联对象和概览
         - 针对集群操作，则补充集群域名
         - 针对实例操作，则补充集群 IP:PORT
+        - 概览: 关联的集群/实例数量、ID 以及部分域名预览，供精简列表展示
         - ...
         """
-        ticket_ids = [ticket["id"] for ticket in ticket_data]
-        # 单据关联对象映射表
-        ticket_id_obj_ids_map: Dict[int, Dict[str, List[int]]] = {}
-
-        # 查询单据对应的集群列表、实例列表等
-        cluster_id_immute_domain_map, instance_id_ip_port_map = {}, {}
-        for ticket in Ticket.objects.filter(id__in=ticket_ids):
-            clusters = ticket.details.get("clusters", {})
-            cluster_id_immute_domain_map.update(
-                {int(cluster_id): info["immute_domain"] for cluster_id, info in clusters.items()}
-            )
-            instances = ticket.details.get("instances", {})
-            instance_id_ip_port_map.update({int(inst_id): info["instance"] for inst_id, info in instances.items()})
-            ticket_id_obj_ids_map[ticket.id] = {
-                "cluster_ids": fetch_cluster_ids(ticket.details),
-                "instance_ids": fetch_instance_ids(ticket.details),
-            }
+        # 关联对象从单据关联关系表中读取，无需加载单据的 details
+        related_objects = TicketObjectRelationHandler.get_related_objects([ticket["id"] for ticket in ticket_data])
 
         # 补充关联对象信息
         for item in ticket_data:
-            ticket_cluster_ids = ticket_id_obj_ids_map[item["id"]]["cluster_ids"]
-            if ticket_cluster_ids:
+            related = related_objects.get(item["id"]) or {
+                "cluster_ids": [],
+                "clusters": [],
+                "instance_ids": [],
+                "instances": [],
+            }
+            item["summary"] = {
+                "cluster_count": len(related["cluster_ids"]),
+                "cluster_ids": related["cluster_ids"],
+                "domain_preview": [domain for domain in related["clusters"] if domain][:TICKET_DOMAIN_PREVIEW_SIZE],
+                "instance_count": len(related["instance_ids"]),
+                "instance_ids": related["instance_ids"],
+            }
+
+            if related["clusters"]:
                 item["related_object"] = {
                     "title": _("集群"),
-                    "objects": [
-                        cluster_id_immute_domain_map.get(cluster_id)
-                        for cluster_id in ticket_cluster_ids
-                        if cluster_id_immute_domain_map.get(cluster_id)
-                    ],
+                    "objects": [immute_domain for immute_domain in related["clusters"] if immute_domain],
                 }
 
-            ticket_instance_ids = ticket_id_obj_ids_map[item["id"]]["instance_ids"]
-            if ticket_instance_ids:
+            if related["instances"]:
                 item["related_object"] = {
                     "title": _("实例"),
-                    "objects": [
-                        instance_id_ip_port_map.get(instance_id)
-                        for instance_id in ticket_instance_ids
-                        if instance_id_ip_port_map.get(instance_id)
-                    ],
+                    "objects": [instance for instance in related["instances"] if instance],
                 }
         return ticket_data
 
+    @classmethod
+    def _process_todo(cls, todo: Todo, username: str, action: str, params: Dict) -> Dict:
+        """
+        处理单个待办，失败时不影响其他待办
+        待办及单据的状态更新在各自的事务中提交(见 Todo.set_success/set_terminated)，
+        流程回调、资源重试等外部调用以及失败时的操作记录不在事务中，不会因回滚而与外部状态不一致
+        """
+        try:
+            TodoActorFactory.actor(todo).process(username, action, params)
+        except Exception as e:  # pylint: disable=broad-except
+            logger.exception(_("待办{}处理失败: {}").format(todo.id, e))
+            return {"todo_id": todo.id, "result": False, "message": str(e)}
+        return {"todo_id": todo.id, "result": True, "message": ""}
+
+    @classmethod
+    def batch_process_todos(cls, username: str, action: str, operations: List[Dict]) -> List[Dict]:
+        """
+        批量处理待办，返回每个待办处理后的信息和处理结果
+        - 待办及其关联的单据、流程一次查询预取
+        - 不同单据的待办并发处理，同一单据的待办串行处理，避免并发推进同一单据的流程
+        - 单个待办处理失败不影响其他待办
+        """
+        todo_ids = [int(operation["todo_id"]) for operation in operations]
+        todos = Todo.objects.select_related("ticket", "flow").in_bulk(todo_ids)
+
+        ticket_todo_params = defaultdict(list)
+        for operation in operations:
+            todo = todos[int(operation["todo_id"])]
+            ticket_todo_params[todo.ticket_id].append((todo, operation["params"]))
+
+        def process_ticket_todos(todo_params):
+            return [cls._process_todo(todo, username, action, params) for todo, params in todo_params]
+
+        def process_ticket_todos_in_thread(todo_params):
+            try:
+                return process_ticket_todos(todo_params)
+            finally:
+                # 工作线程的数据库连接不会被请求结束时的信号关闭，这里主动关闭
+                connections.close_all()
+
+        params_list = [{"todo_params": todo_params} for todo_params in ticket_todo_params.values()]
+        if len(params_list) == 1:
+            ticket_results = [process_ticket_todos(**params_list[0])]
+        else:
+            ticket_results = request_multi_thread(
+                inject_request(process_ticket_todos_in_thread), params_list, get_data=lambda x: x[1], in_order=True
+            )
+        todo_results = {result["todo_id"]: result for results in ticket_results for result in results}
+
+        # 重新查询待办的最新状态，与处理结果一并返回
+        latest_todos = Todo.objects.in_bulk(todo_ids)
+        return [
+            {**TodoSerializer(latest_todos[todo_id]).data, **todo_results[todo_id]}
+            for todo_id in dict.fromkeys(todo_ids)
+        ]
+
     @classmethod
     def fast_create_cloud_component_method(cls, bk_biz_id, bk_cloud_id, ips, user="admin"):
         # 默认agent城市为1(sg环境的集群默认逻辑城市ID都是1)
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+
+from backend.ticket.models import Ticket, TicketObjectRelationHandler
+
+logger = logging.getLogger("root")
+
+
+class Command(BaseCommand):
+    help = "回填存量单据与集群/实例的关联关系"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", dest="batch_size", type=int, default=500, help="每批处理的单据数")
+        parser.add_argument("--start-id", dest="start_id", type=int, default=0, help="从该单据ID之后开始回填，用于断点续跑")
+        parser.add_argument("--end-id", dest="end_id", type=int, default=0, help="回填到该单据ID为止，0 表示不限制")
+
+    def handle(self, *args, **options):
+        batch_size, last_id, end_id = options["batch_size"], options["start_id"], options["end_id"]
+        start_time = time.time()
+        ticket_count = cluster_count = instance_count = 0
+
+        # 按主键分段读取，每批只加载 id 和 details
+        while True:
+            qs = Ticket.objects.filter(id__gt=last_id).order_by("id").only("id", "details")
+            if end_id:
+                qs = qs.filter(id__lte=end_id)
+            tickets = list(qs[:batch_size])
+            if not tickets:
+                break
+
+            clusters, instances = TicketObjectRelationHandler.rebuild(tickets)
+            ticket_count += len(tickets)
+            cluster_count += clusters
+            instance_count += instances
+            last_id = tickets[-1].id
+            self.stdout.write(
+                f"backfill tickets to id {last_id}, tickets: {ticket_count}, "
+                f"clusters: {cluster_count}, instances: {instance_count}, cost: {time.time() - start_time:.1f}s"
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"backfill finished, tickets: {ticket_count}, clusters: {cluster_count}, "
+                f"instances: {instance_count}, cost: {time.time() - start_time:.1f}s"
+            )
+        )
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from backend.ticket.exclusive import dump_exclusive_ticket_matrix
+
+
+class Command(BaseCommand):
+    help = "编译单据互斥矩阵并写入缓存文件，用于构建时预先生成"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--output",
+            dest="output",
+            type=str,
+            default=settings.EXCLUSIVE_TICKET_MATRIX_CACHE_PATH,
+            help="缓存文件路径",
+        )
+
+    def handle(self, *args, **options):
+        matrix = dump_exclusive_ticket_matrix(cache_path=options["output"])
+        self.stdout.write(
+            f"compiled {len(matrix.ticket_types)} ticket types, "
+            f"{sum(bin(row).count('1') for row in matrix.rows)} exclusive pairs -> {options['output']}"
+        )
@@ -0,0 +1,66 @@
+# Generated by Django 3.2.25 on 2024-07-01 10:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ticket", "0009_auto_20240621_1216"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TicketClusterRelation",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("cluster_id", models.IntegerField(verbose_name="集群ID")),
+                ("immute_domain", models.CharField(default="", max_length=255, verbose_name="集群域名")),
+                (
+                    "ticket",
+                    models.ForeignKey(
+                        help_text="关联工单",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="cluster_relations",
+                        to="ticket.ticket",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "单据关联集群(TicketClusterRelation)",
+                "verbose_name_plural": "单据关联集群(TicketClusterRelation)",
+                "unique_together": {("ticket", "cluster_id")},
+            },
+        ),
+        migrations.CreateModel(
+            name="TicketInstanceRelation",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("instance_id", models.CharField(max_length=128, verbose_name="实例ID")),
+                ("instance", models.CharField(default="", max_length=255, verbose_name="实例地址")),
+                (
+                    "ticket",
+                    models.ForeignKey(
+                        help_text="关联工单",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="instance_relations",
+                        to="ticket.ticket",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "单据关联实例(TicketInstanceRelation)",
+                "verbose_name_plural": "单据关联实例(TicketInstanceRelation)",
+                "unique_together": {("ticket", "instance_id")},
+            },
+        ),
+        migrations.AddIndex(
+            model_name="ticketclusterrelation",
+            index=models.Index(fields=["cluster_id"], name="ticket_tick_cluster_370bee_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="ticketinstancerelation",
+            index=models.Index(fields=["instance_id"], name="ticket_tick_instanc_e64b03_idx"),
+        ),
+    ]
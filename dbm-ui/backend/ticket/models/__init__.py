@@ -9,5 +9,6 @@ an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express o
 specific language governing permissions and limitations under the License.
 """
 from .ticket import *
+from .ticket_object_relation import TicketClusterRelation, TicketInstanceRelation, TicketObjectRelationHandler
 from .ticket_result_relation import TicketResultRelation
 from .todo import *
@@ -22,15 +22,8 @@ from backend.bk_web.constants import LEN_LONG, LEN_MIDDLE, LEN_NORMAL, LEN_SHORT
 from backend.bk_web.models import AuditedModel
 from backend.configuration.constants import PLAT_BIZ_ID, DBType
 from backend.db_monitor.exceptions import AutofixException
-from backend.ticket.constants import (
-    EXCLUSIVE_TICKET_EXCEL_PATH,
-    FlowRetryType,
-    FlowType,
-    TicketFlowStatus,
-    TicketStatus,
-    TicketType,
-)
-from backend.utils.excel import ExcelHandler
+from backend.ticket.constants import FlowRetryType, FlowType, TicketFlowStatus, TicketStatus, TicketType
+from backend.ticket.exclusive import get_exclusive_ticket_matrix
 from backend.utils.time import calculate_cost_time
 
 logger = logging.getLogger("root")
@@ -272,33 +265,41 @@ class ClusterOperateRecordManager(models.Manager):
 
     def has_exclusive_operations(self, ticket_type, cluster_id, **kwargs):
         """判断当前单据类型与集群正在进行中的单据是否互斥"""
-        active_tickets = self.filter_inner_actives(cluster_id, **kwargs)
-        exclusive_infos = []
-        for active_ticket in active_tickets:
-            try:
-                if self.exclusive_ticket_map[ticket_type][active_ticket.ticket.ticket_type]:
-                    exclusive_infos.append(
-                        {"exclusive_ticket": active_ticket.ticket, "root_id": active_ticket.flow.flow_obj_id}
-                    )
-            except KeyError:
-                pass
-
-        return exclusive_infos
+        return self.get_exclusive_operations(ticket_type, [cluster_id], **kwargs).get(cluster_id, [])
+
+    def get_exclusive_operations(self, ticket_type, cluster_ids: List[int], **kwargs) -> Dict[int, List[Dict]]:
+        """
+        批量判断当前单据类型与一批集群正在进行中的单据是否互斥，返回存在互斥的集群及其互斥信息
+        只需要一次联表查询，互斥矩阵中与当前单据类型互斥的单据类型直接作为查询条件
+        """
+        exclusive_types = self.exclusive_ticket_matrix.get_exclusive_types(ticket_type)
+        if not cluster_ids or not exclusive_types:
+            return {}
+
+        exclude_ticket_ids = kwargs.pop("exclude_ticket_ids", [])
+        active_records = (
+            self.filter(
+                cluster_id__in=cluster_ids,
+                flow__flow_type=FlowType.INNER_FLOW,
+                flow__status=TicketFlowStatus.RUNNING,
+                ticket__ticket_type__in=exclusive_types,
+                **kwargs,
+            )
+            .exclude(flow__ticket_id__in=exclude_ticket_ids)
+            .select_related("ticket", "flow")
+            .order_by("id")
+        )
+
+        cluster_exclusive_infos: Dict[int, List[Dict]] = defaultdict(list)
+        for record in active_records:
+            cluster_exclusive_infos[record.cluster_id].append(
+                {"exclusive_ticket": record.ticket, "root_id": record.flow.flow_obj_id}
+            )
+        return cluster_exclusive_infos
 
     @property
-    def exclusive_ticket_map(self):
-        if hasattr(self, "_exclusive_ticket_map"):
-            return self._exclusive_ticket_map
-
-        _exclusive_matrix = ExcelHandler.paser_matrix(EXCLUSIVE_TICKET_EXCEL_PATH)
-        _exclusive_ticket_map = defaultdict(dict)
-        for row_key, inner_dict in _exclusive_matrix.items():
-            for col_key, value in inner_dict.items():
-                row_key, col_key = TicketType.get_choice_value(row_key), TicketType.get_choice_value(col_key)
-                _exclusive_ticket_map[row_key][col_key] = value == "N"
-
-        setattr(self, "_exclusive_ticket_map", _exclusive_ticket_map)
-        return self._exclusive_ticket_map
+    def exclusive_ticket_matrix(self):
+        return get_exclusive_ticket_matrix()
 
 
 class ClusterOperateRecord(AuditedModel):
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+from django.db import models, transaction
+from django.utils.translation import ugettext_lazy as _
+
+from backend.bk_web.constants import LEN_LONG
+
+# 批量写入关联关系的批次大小
+RELATION_BULK_SIZE = 1000
+
+
+class TicketClusterRelation(models.Model):
+    """
+    单据与集群的关联关系，由单据 details 中提取，单据创建/修改 details 时维护
+    用于单据列表的关联对象、重复提交校验以及按集群查询单据，避免加载单据的 details
+    """
+
+    ticket = models.ForeignKey(
+        "Ticket", help_text=_("关联工单"), related_name="cluster_relations", on_delete=models.CASCADE
+    )
+    cluster_id = models.IntegerField(_("集群ID"))
+    immute_domain = models.CharField(_("集群域名"), max_length=LEN_LONG, default="")
+
+    class Meta:
+        verbose_name_plural = verbose_name = _("单据关联集群(TicketClusterRelation)")
+        unique_together = (("ticket", "cluster_id"),)
+        indexes = [models.Index(fields=["cluster_id"])]
+
+
+class TicketInstanceRelation(models.Model):
+    """
+    单据与实例的关联关系，instance_id 与 InstanceOperateRecord 一致使用字符串存储
+    """
+
+    ticket = models.ForeignKey(
+        "Ticket", help_text=_("关联工单"), related_name="instance_relations", on_delete=models.CASCADE
+    )
+    instance_id = models.CharField(_("实例ID"), max_length=128)
+    instance = models.CharField(_("实例地址"), max_length=LEN_LONG, default="")
+
+    class Meta:
+        verbose_name_plural = verbose_name = _("单据关联实例(TicketInstanceRelation)")
+        unique_together = (("ticket", "instance_id"),)
+        indexes = [models.Index(fields=["instance_id"])]
+
+
+class TicketObjectRelationHandler(object):
+    @staticmethod
+    def extract(ticket_id: int, details: Dict) -> Tuple[List[TicketClusterRelation], List[TicketInstanceRelation]]:
+        """从单据 details 中提取关联的集群和实例，按 ID 排序保证每次提取的结果稳定"""
+        from backend.ticket.builders.common.base import fetch_cluster_ids, fetch_instance_ids
+
+        details = details or {}
+        clusters, instances = details.get("clusters") or {}, details.get("instances") or {}
+        # influxdb 等单据的 instances 为列表，这里只取字典形式的实例信息
+        clusters = clusters if isinstance(clusters, dict) else {}
+        instances = instances if isinstance(instances, dict) else {}
+
+        cluster_relations = [
+            TicketClusterRelation(
+                ticket_id=ticket_id,
+                cluster_id=cluster_id,
+                immute_domain=(clusters.get(str(cluster_id)) or {}).get("immute_domain", ""),
+            )
+            for cluster_id in sorted(set(fetch_cluster_ids(details)))
+        ]
+        instance_relations = [
+            TicketInstanceRelation(
+                ticket_id=ticket_id,
+                instance_id=instance_id,
+                instance=(instances.get(instance_id) or {}).get("instance", ""),
+            )
+            for instance_id in sorted({str(inst_id) for inst_id in fetch_instance_ids(details)})
+        ]
+        return cluster_relations, instance_relations
+
+    @classmethod
+    def sync(cls, ticket):
+        """根据单据当前的 details 同步关联关系，关联关系没有变化时不写入"""
+        cluster_relations, instance_relations = cls.extract(ticket.id, ticket.details)
+        for model, relations, fields in [
+            (TicketClusterRelation, cluster_relations, ("cluster_id", "immute_domain")),
+            (TicketInstanceRelation, instance_relations, ("instance_id", "instance")),
+        ]:
+            existing = list(model.objects.filter(ticket_id=ticket.id).order_by("id").values_list(*fields))
+            expected = [tuple(getattr(relation, field) for field in fields) for relation in relations]
+            if existing == expected:
+                continue
+            with transaction.atomic():
+                model.objects.filter(ticket_id=ticket.id).delete()
+                model.objects.bulk_create(relations, batch_size=RELATION_BULK_SIZE)
+
+    @classmethod
+    def rebuild(cls, tickets: List) -> Tuple[int, int]:
+        """批量重建一批单据的关联关系，用于存量数据回填，返回写入的集群和实例关联数"""
+        ticket_ids = [ticket.id for ticket in tickets]
+        cluster_relations, instance_relations = [], []
+        for ticket in tickets:
+            clusters, instances = cls.extract(ticket.id, ticket.details)
+            cluster_relations.extend(clusters)
+            instance_relations.extend(instances)
+
+        with transaction.atomic():
+            TicketClusterRelation.objects.filter(ticket_id__in=ticket_ids).delete()
+            TicketInstanceRelation.objects.filter(ticket_id__in=ticket_ids).delete()
+            TicketClusterRelation.objects.bulk_create(cluster_relations, batch_size=RELATION_BULK_SIZE)
+            TicketInstanceRelation.objects.bulk_create(instance_relations, batch_size=RELATION_BULK_SIZE)
+        return len(cluster_relations), len(instance_relations)
+
+    @staticmethod
+    def get_related_objects(ticket_ids: List[int]) -> Dict[int, Dict[str, List]]:
+        """
+        获取单据关联的集群和实例，details 中没有集群/实例信息的对象，其域名/地址为空字符串
+        @return: {ticket_id: {"cluster_ids": [...], "clusters": [immute_domain...],
+                              "instance_ids": [...], "instances": [ip:port...]}}
+        """
+        related_objects: Dict[int, Dict[str, List]] = defaultdict(
+            lambda: {"cluster_ids": [], "clusters": [], "instance_ids": [], "instances": []}
+        )
+        for ticket_id, cluster_id, immute_domain in (
+            TicketClusterRelation.objects.filter(ticket_id__in=ticket_ids)
+            .order_by("id")
+            .values_list("ticket_id", "cluster_id", "immute_domain")
+        ):
+            related_objects[ticket_id]["cluster_ids"].append(cluster_id)
+            related_objects[ticket_id]["clusters"].append(immute_domain)
+        for ticket_id, instance_id, instance in (
+            TicketInstanceRelation.objects.filter(ticket_id__in=ticket_ids)
+            .order_by("id")
+            .values_list("ticket_id", "instance_id", "instance")
+        ):
+            related_objects[ticket_id]["instance_ids"].append(instance_id)
+            related_objects[ticket_id]["instances"].append(instance)
+        return related_objects
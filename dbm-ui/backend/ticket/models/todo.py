@@ -10,7 +10,7 @@ specific language governing permissions and limitations under the License.
 """
 import logging
 
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
 
@@ -86,10 +86,12 @@ class Todo(AuditedModel):
 
         self.save()
 
+    @transaction.atomic
     def set_success(self, username, action):
         self.set_status(username, TodoStatus.DONE_SUCCESS)
         TodoHistory.objects.create(creator=username, todo=self, action=action)
 
+    @transaction.atomic
     def set_terminated(self, username, action):
         self.set_status(username, TodoStatus.DONE_FAILED)
         self.ticket.set_terminated()
@@ -129,6 +129,23 @@ class TicketSerializer(AuditedSerializer, serializers.ModelSerializer):
         return self.context["ticket_ctx"].app_abbr_map.get(obj.bk_biz_id) or ""
 
 
+class TicketListSerializer(TicketSerializer):
+    """
+    单据精简列表序列化，不加载单据的 details 和 send_msg_config
+    列表中的 details 本身就不展示，这里保留空字典以兼容前端，关联对象和概览由 TicketHandler.add_related_object 补充
+    """
+
+    details = serializers.SerializerMethodField(help_text=_("单据详情(列表中不展示)"))
+    send_msg_config = None
+
+    class Meta(TicketSerializer.Meta):
+        fields = None
+        exclude = ("send_msg_config",)
+
+    def get_details(self, obj):
+        return {}
+
+
 class TicketFlowSerializer(TranslationSerializerMixin, serializers.ModelSerializer):
     status = serializers.SerializerMethodField(help_text=_("流程状态"))
     todos = serializers.SerializerMethodField(help_text=_("流程待办"))
@@ -374,5 +391,5 @@ class BatchTodoOperateSerializer(serializers.Serializer):
         # 检查每个todo_id是否存在
         for todo_id in todo_ids:
             if todo_id not in existing_todo_ids:
-                raise serializers.ValidationError(_("待办id{}不存在".format(attrs["todo_id"])))
+                raise serializers.ValidationError(_("待办id{}不存在").format(todo_id))
         return attrs
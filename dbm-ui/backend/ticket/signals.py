@@ -9,7 +9,7 @@ an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express o
 specific language governing permissions and limitations under the License.
 """
 from backend.ticket.flow_manager.manager import TicketFlowManager
-from backend.ticket.models import Flow
+from backend.ticket.models import Flow, Ticket, TicketObjectRelationHandler
 
 
 def update_ticket_status(sender, instance: Flow, **kwargs):
@@ -19,3 +19,12 @@ def update_ticket_status(sender, instance: Flow, **kwargs):
     if not instance.pk:
         return
     TicketFlowManager(instance.ticket).update_ticket_status()
+
+
+def sync_ticket_object_relations(sender, instance: Ticket, created: bool, update_fields=None, **kwargs):
+    """
+    单据创建或者 details 变更时，同步单据与集群/实例的关联关系
+    """
+    if not created and update_fields and "details" not in update_fields:
+        return
+    TicketObjectRelationHandler.sync(instance)
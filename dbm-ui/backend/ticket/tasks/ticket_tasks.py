@@ -8,7 +8,6 @@ Unless required by applicable law or agreed to in writing, software distributed
 an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
 specific language governing permissions and limitations under the License.
 """
-import json
 import logging
 import operator
 from collections import defaultdict
@@ -22,8 +21,8 @@ from django.db.models import Q
 from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
 
-from backend import env
-from backend.components import BKLogApi, ItsmApi
+from backend.components import ItsmApi
+from backend.components.bklog.handler import BKLogSearch
 from backend.components.cmsi.handler import CmsiHandler
 from backend.db_meta.enums import ClusterType, InstanceInnerRole
 from backend.db_meta.models import AppCache, Cluster, StorageInstance
@@ -80,24 +79,10 @@ class TicketTask(object):
         # 例行时间校验默认间隔一天
         now = datetime.now(timezone.utc)
         start_time, end_time = now - timedelta(days=1), now
-        # TODO: 目前这个esquery_search最多支持10000条查询，后续可以改造成scroll进行查询
-        resp = BKLogApi.esquery_search(
-            {
-                "indices": f"{env.DBA_APP_BK_BIZ_ID}_bklog.mysql_checksum_result",
-                "start_time": datetime2str(start_time),
-                "end_time": datetime2str(end_time),
-                "query_string": "*",
-                "start": 0,
-                "size": 10000,
-                "sort_list": [["dtEventTimeStamp", "asc"], ["gseIndex", "asc"], ["iterationIndex", "asc"]],
-            }
-        )
-
         # 根据集群ID聚合日志
         cluster__checksum_logs_map: Dict[int, List[Dict]] = defaultdict(list)
-        for hit in resp["hits"]["hits"]:
-            checksum_log = json.loads(hit["_source"]["log"])
-            cluster__checksum_logs_map[checksum_log["cluster_id"]].append(checksum_log)
+        for hit in BKLogSearch("mysql_checksum_result", start_time, end_time, use_admin=False):
+            cluster__checksum_logs_map[hit.log["cluster_id"]].append(hit.log)
 
         # 为每个待修复的集群生成修复单据
         for cluster_id, checksum_logs in cluster__checksum_logs_map.items():
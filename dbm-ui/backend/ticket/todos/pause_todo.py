@@ -10,6 +10,7 @@ specific language governing permissions and limitations under the License.
 """
 from dataclasses import dataclass
 
+from django.db import transaction
 from django.utils.translation import gettext as _
 
 from backend.ticket import todos
@@ -46,9 +47,10 @@ class PauseTodo(todos.TodoActor):
 
         self.todo.set_success(username, action)
 
-        # 所有待办完成后，执行后面的flow
+        # 所有待办完成后，执行后面的flow。待办状态需先提交，因此在事务提交后再推进流程(不在事务中时立即执行)
         if not self.todo.ticket.todo_of_ticket.exist_unfinished():
-            manager.TicketFlowManager(ticket=self.todo.ticket).run_next_flow()
+            ticket = self.todo.ticket
+            transaction.on_commit(lambda: manager.TicketFlowManager(ticket=ticket).run_next_flow())
 
 
 @todos.TodoActorFactory.register(TodoType.RESOURCE_REPLENISH)
@@ -9,6 +9,7 @@ an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express o
 specific language governing permissions and limitations under the License.
 """
 import operator
+from collections import defaultdict
 from functools import reduce
 from typing import Dict, List
 
@@ -51,7 +52,15 @@ from backend.ticket.contexts import TicketContext
 from backend.ticket.exceptions import TicketDuplicationException
 from backend.ticket.flow_manager.manager import TicketFlowManager
 from backend.ticket.handler import TicketHandler
-from backend.ticket.models import ClusterOperateRecord, Flow, InstanceOperateRecord, Ticket, TicketFlowsConfig, Todo
+from backend.ticket.models import (
+    ClusterOperateRecord,
+    Flow,
+    InstanceOperateRecord,
+    Ticket,
+    TicketClusterRelation,
+    TicketFlowsConfig,
+    Todo,
+)
 from backend.ticket.serializers import (
     BatchApprovalSerializer,
     BatchTodoOperateSerializer,
@@ -68,6 +77,7 @@ from backend.ticket.serializers import (
     SensitiveTicketSerializer,
     TicketFlowDescribeSerializer,
     TicketFlowSerializer,
+    TicketListSerializer,
     TicketSerializer,
     TicketTypeResponseSLZ,
     TicketTypeSLZ,
@@ -95,6 +105,8 @@ class TicketViewSet(viewsets.AuditedModelViewSet):
         "status": ["exact", "in"],
         "create_at": ["gte", "lte"],
         "creator": ["exact"],
+        # 按集群查询关联单据，走单据关联集群表的索引
+        "cluster_relations__cluster_id": ["exact"],
     }
 
     def _get_custom_permissions(self):
@@ -143,12 +155,29 @@ class TicketViewSet(viewsets.AuditedModelViewSet):
         # 需要豁免的接口方法与名字
         return {"post": [cls.callback.__name__], "put": [], "get": [], "delete": []}
 
+    def _is_slim_list(self):
+        """单据列表默认返回完整字段，slim=1/true 时为精简模式，不加载 details 等大字段"""
+        slim = self.request.query_params.get("slim")
+        return self.action == "list" and slim in serializers.BooleanField.TRUE_VALUES
+
+    def get_serializer_class(self):
+        if self._is_slim_list():
+            return TicketListSerializer
+        return super().get_serializer_class()
+
     def get_queryset(self):
         """
         单据queryset规则--针对list：
         1. self_manage=0 只返回自己管理的单据
         2. self_manage=1，则返回自己管理组件的单据，如果是管理员则返回所有单据
+        3. 精简列表模式下，延迟加载 details 和 send_msg_config
         """
+        queryset = self._get_manage_queryset()
+        if self._is_slim_list():
+            queryset = queryset.defer("details", "send_msg_config")
+        return queryset
+
+    def _get_manage_queryset(self):
         if self.action != "list" or "self_manage" not in self.request.query_params:
             return super().get_queryset()
 
@@ -200,15 +229,23 @@ class TicketViewSet(viewsets.AuditedModelViewSet):
                     )
             return
 
+        # 通过单据关联集群表查找冲突单据，无需加载运行中单据的 details
         cluster_ids = fetch_cluster_ids(details=details)
-        for ticket in active_tickets:
-            active_cluster_ids = fetch_cluster_ids(details=ticket.details)
-            duplicate_ids = list(set(active_cluster_ids).intersection(cluster_ids))
-            if duplicate_ids:
-                raise TicketDuplicationException(
-                    context=_("集群{}已存在相同类型的单据[{}]正在运行，请确认是否重复提交").format(duplicate_ids, ticket.id),
-                    data={"duplicate_cluster_ids": duplicate_ids, "duplicate_ticket_id": ticket.id},
-                )
+        if not cluster_ids:
+            return
+        ticket_duplicate_ids: Dict[int, List[int]] = defaultdict(list)
+        for ticket_id, cluster_id in TicketClusterRelation.objects.filter(
+            ticket__in=active_tickets, cluster_id__in=cluster_ids
+        ).values_list("ticket_id", "cluster_id"):
+            ticket_duplicate_ids[ticket_id].append(cluster_id)
+        if ticket_duplicate_ids:
+            # 与按单据倒序逐个校验的行为保持一致，取最新的冲突单据
+            ticket_id = max(ticket_duplicate_ids)
+            duplicate_ids = ticket_duplicate_ids[ticket_id]
+            raise TicketDuplicationException(
+                context=_("集群{}已存在相同类型的单据[{}]正在运行，请确认是否重复提交").format(duplicate_ids, ticket_id),
+                data={"duplicate_cluster_ids": duplicate_ids, "duplicate_ticket_id": ticket_id},
+            )
 
     def perform_create(self, serializer):
         ticket_type = self.request.data["ticket_type"]
@@ -692,20 +729,12 @@ class TicketViewSet(viewsets.AuditedModelViewSet):
     @action(methods=["POST"], detail=False, serializer_class=BatchTodoOperateSerializer)
     def batch_process_todo(self, request, *args, **kwargs):
         """
-        批量处理待办: 返回处理后的待办列表
+        批量处理待办: 返回处理后的待办列表，单个待办处理失败不影响其他待办
         """
         # 使用 BatchTodoOperateSerializer 验证请求数据
         validated_data = self.params_validate(self.get_serializer_class())
         act = validated_data["action"]
 
-        # 批量处理待办操作
-        results = []
-        for operation in validated_data["operations"]:
-            todo_id = operation["todo_id"]
-            params = operation["params"]
-            todo = Todo.objects.get(id=todo_id)
-            TodoActorFactory.actor(todo).process(request.user.username, act, params)
-            results.append(todo)
-
-        # 使用 TodoSerializer 序列化响应数据
-        return Response(TodoSerializer(results, many=True).data)
+        # 批量处理待办操作，返回每个待办的最新信息及处理结果(result/message)
+        results = TicketHandler.batch_process_todos(request.user.username, act, validated_data["operations"])
+        return Response(results)
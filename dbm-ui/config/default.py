@@ -8,6 +8,7 @@ Unless required by applicable law or agreed to in writing, software distributed
 an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
 specific language governing permissions and limitations under the License.
 """
+import tempfile
 from pathlib import Path
 from typing import Dict
 
@@ -283,6 +284,11 @@ ENABLE_CLEAN_EXPIRED_FLOW_INSTANCE = env.ENABLE_CLEAN_EXPIRED_FLOW_INSTANCE  # 
 BAMBOO_TASK_VALIDITY_DAY = env.BAMBOO_TASK_VALIDITY_DAY  # 流程任务合法时间(旧于这个日期的数据会被删除)
 BAMBOO_TASK_EXPIRE_ONE_BATCH_NUM = 100  # 一批淘汰的最大任务数。一般来说，此数量级应该>=淘汰时间内产生的任务数
 
+# 单据互斥矩阵的编译缓存文件，未配置时写入系统临时目录，避免依赖进程的工作目录
+EXCLUSIVE_TICKET_MATRIX_CACHE_PATH = env.EXCLUSIVE_TICKET_MATRIX_CACHE_PATH or os.path.join(
+    tempfile.gettempdir(), "bkdbm_exclusive_ticket_matrix.json"
+)
+
 
 # APIGW 蓝鲸网关配置
 BK_APIGW_STATIC_VERSION = env.BK_APIGW_STATIC_VERSION